@@ -206,11 +206,11 @@ def create_summary_file(output_dir, total_records, timestamp):
 
 ### 3. Transações (transacoes.csv)
 - Histórico de transações financeiras
-- Campos: id, id_transacao_origem, assinatura_id, cliente_id, plataforma, status, valor, valor_liquido, valor_bruto, taxa_reembolso, metodo_pagamento, data_transacao, motivo_recusa, json_completo, tipo_recusa, produto_nome, nome_oferta
+- Campos: id, id_transacao_origem, assinatura_id, cliente_id, plataforma, status, valor, valor_liquido, valor_bruto, taxa_reembolso, metodo_pagamento, data_transacao, motivo_recusa, tipo_recusa, produto_nome, nome_oferta
 
 ## Observações:
 - Todos os arquivos estão em formato CSV com encoding UTF-8
-- O campo 'json_completo' da tabela transações contém dados adicionais em formato JSON
+- Os payloads originais das transações ficam na tabela payloads_transacoes (não exportada)
 - Os relacionamentos entre tabelas são mantidos através dos campos de ID
 """
         
@@ -1,9 +1,25 @@
 # Webhooks endpoints com autenticação e segurança
 
-from fastapi import FastAPI, Request, Depends
-from src.services.webhook_handler import processar_guru_assinatura, processar_guru_transacao, processar_ticto
-from src.utils.security_middleware import guru_webhook_middleware, ticto_webhook_middleware
-from src.utils.security_config import security_config
+import asyncio
+from typing import List, Optional
+from pydantic import BaseModel
+from fastapi import FastAPI, Request, Response, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
+from services.webhook_handler import processar_webhook, processar_lote_webhooks
+from services.webhook_inbox import enfileirar_evento, inbox_worker_pool, obter_estatisticas_inbox
+from services.webhook_executor import webhook_executor, ExecutorSaturado
+from utils.security_middleware import guru_webhook_middleware, ticto_webhook_middleware
+from utils.security_config import security_config
+from utils.ingestion_config import ingestion_config
+from utils.validators import validar_payload_guru, validar_payload_ticto
+from services.idempotencia import obter_estatisticas_idempotencia
+from services.cache_entidades import obter_estatisticas_cache_entidades
+from services.bulk_writer import bulk_writer
+from services.dead_letter import dead_letter_retrier, listar_eventos, reenfileirar, obter_estatisticas_dead_letter
+from services.particoes import garantir_particoes_se_necessario
+from services.catalogo import catalogo
+from middleware.auth_middleware import require_admin
+from database.auth_models import User
 
 app = FastAPI(
     title="Dashboard Comu - Webhooks API",
@@ -11,6 +27,54 @@ app = FastAPI(
     version="1.0.0"
 )
 
+def iniciar_servicos_ingestao():
+    """
+    Inicia os workers da inbox quando o modo de ingestão assíncrona está ativo
+    e o escritor em lote quando habilitado, garante as partições mensais
+    de transacoes e carrega o catálogo de produtos/ofertas.
+    Registrado como evento de startup pela aplicação principal.
+    """
+    garantir_particoes_se_necessario()
+    catalogo.recarregar_se_necessario()
+    if ingestion_config.BULK_ENABLED:
+        bulk_writer.iniciar()
+    if ingestion_config.inbox_enabled():
+        inbox_worker_pool.iniciar()
+    if ingestion_config.DLQ_ENABLED:
+        dead_letter_retrier.iniciar()
+
+def parar_servicos_ingestao():
+    """
+    Para os workers da inbox, aguarda os handlers em execução e grava os
+    lotes pendentes (evento de shutdown).
+    """
+    if inbox_worker_pool.ativo:
+        inbox_worker_pool.parar()
+    if dead_letter_retrier.ativo:
+        dead_letter_retrier.parar()
+    webhook_executor.encerrar(aguardar=True)
+    if bulk_writer.ativo:
+        bulk_writer.parar()
+
+async def executar_handler(fn, *args):
+    """
+    Executa um handler síncrono no executor limitado, fora do event loop.
+    Retorna (resultado, duracao_ms); converte saturação em 503 com Retry-After.
+    """
+    try:
+        return await webhook_executor.executar(fn, *args)
+    except ExecutorSaturado:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Webhook queue is full. Retry later.",
+            headers={"Retry-After": str(ingestion_config.RETRY_AFTER_SECONDS)}
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Webhook processing timed out"
+        )
+
 @app.get("/health")
 def health():
     """
@@ -20,11 +84,58 @@ def health():
         "status": "ok",
         "security_configured": security_config.is_configured(),
         "guru_token_configured": bool(security_config.GURU_ACCOUNT_TOKEN),
-        "ticto_tokens_configured": len(security_config.get_ticto_tokens()) > 0
+        "ticto_tokens_configured": len(security_config.get_ticto_tokens()) > 0,
+        "ingestion_mode": ingestion_config.WEBHOOK_INGESTION_MODE
     }
 
+@app.get("/webhook/inbox/status")
+def inbox_status():
+    """
+    Profundidade e atraso da inbox de webhooks
+    """
+    return {
+        "ingestion_mode": ingestion_config.WEBHOOK_INGESTION_MODE,
+        "workers_ativos": inbox_worker_pool.ativo,
+        "inbox": obter_estatisticas_inbox(),
+        "executor": webhook_executor.estatisticas(),
+        "idempotencia": obter_estatisticas_idempotencia(),
+        "bulk_writer": bulk_writer.estatisticas(),
+        "cache_ids": obter_estatisticas_cache_entidades(),
+        "catalogo": catalogo.estatisticas(),
+        "dead_letter": obter_estatisticas_dead_letter()
+    }
+
+class ReenfileirarRequest(BaseModel):
+    ids: Optional[List[int]] = None  # Vazio: todos os eventos que casam com os filtros
+    status: Optional[str] = None  # pendente | esgotado
+    plataforma: Optional[str] = None
+
+@app.get("/webhook/dead-letter")
+def dead_letter_listar(
+    status: Optional[str] = None,
+    plataforma: Optional[str] = None,
+    limite: int = 50,
+    offset: int = 0,
+    current_user: User = Depends(require_admin)
+):
+    """
+    Lista os eventos da dead-letter (apenas admin)
+    """
+    return {"eventos": listar_eventos(status=status, plataforma=plataforma, limite=min(limite, 500), offset=offset)}
+
+@app.post("/webhook/dead-letter/requeue")
+def dead_letter_reenfileirar(
+    requisicao: ReenfileirarRequest,
+    current_user: User = Depends(require_admin)
+):
+    """
+    Reenfileira eventos da dead-letter para tentativa imediata (apenas admin)
+    """
+    total = reenfileirar(ids=requisicao.ids, status=requisicao.status, plataforma=requisicao.plataforma)
+    return {"reenfileirados": total}
+
 @app.post("/webhook/guru")
-async def webhook_guru(request: Request):
+async def webhook_guru(request: Request, response: Response):
     """
     Endpoint para webhooks da plataforma Guru
     Requer autenticação via api_token no payload
@@ -39,20 +150,32 @@ async def webhook_guru(request: Request):
     
     webhook_type = payload.get("webhook_type", "transaction")
     
-    if webhook_type == "subscription":
-        resultado = processar_guru_assinatura(payload)
+    if ingestion_config.inbox_enabled():
+        # Modo inbox: valida, grava o corpo bruto e responde sem tocar nas tabelas principais
+        if not validar_payload_guru(payload):
+            resultado = {"status": "erro", "motivo": "Payload inválido"}
+        else:
+            evento_id, duracao_ms = await executar_handler(enfileirar_evento, "guru", request.state.validated_payload)
+            return JSONResponse(status_code=202, content={
+                "received": True,
+                "platform": "guru",
+                "webhook_type": webhook_type,
+                "result": {"status": "enfileirado", "evento_id": evento_id}
+            }, headers={"X-Process-Time-Ms": f"{duracao_ms:.1f}"})
     else:
-        resultado = processar_guru_transacao(payload)
+        # Roteia por webhook_type; reentregas já processadas retornam "duplicado"
+        resultado, duracao_ms = await executar_handler(processar_webhook, "guru", payload)
+        response.headers["X-Process-Time-Ms"] = f"{duracao_ms:.1f}"
     
     return {
-        "received": True, 
-        "platform": "guru", 
+        "received": True,
+        "platform": "guru",
         "webhook_type": webhook_type,
         "result": resultado
     }
 
 @app.post("/webhook/ticto")
-async def webhook_ticto(request: Request):
+async def webhook_ticto(request: Request, response: Response):
     """
     Endpoint para webhooks da plataforma Ticto
     Requer autenticação via token no nível raiz
@@ -61,20 +184,58 @@ async def webhook_ticto(request: Request):
     # Usa o payload validado do request.state
     payload = request.state.validated_payload
     
-    resultado = processar_ticto(payload)
+    if ingestion_config.inbox_enabled():
+        # Modo inbox: valida, grava o corpo bruto e responde sem tocar nas tabelas principais
+        if not validar_payload_ticto(payload):
+            resultado = {"status": "erro", "motivo": "Payload inválido"}
+        else:
+            evento_id, duracao_ms = await executar_handler(enfileirar_evento, "ticto", payload)
+            return JSONResponse(status_code=202, content={
+                "received": True,
+                "platform": "ticto",
+                "status": payload.get("status", "unknown"),
+                "result": {"status": "enfileirado", "evento_id": evento_id}
+            }, headers={"X-Process-Time-Ms": f"{duracao_ms:.1f}"})
+    else:
+        resultado, duracao_ms = await executar_handler(processar_webhook, "ticto", payload)
+        response.headers["X-Process-Time-Ms"] = f"{duracao_ms:.1f}"
     
     return {
-        "received": True, 
-        "platform": "ticto", 
+        "received": True,
+        "platform": "ticto",
         "status": payload.get("status", "unknown"),
         "result": resultado
     }
 
+@app.post("/webhook/{platform}/batch")
+async def webhook_lote(platform: str, request: Request, response: Response):
+    """
+    Endpoint de lote: array JSON de eventos da Guru ou da Ticto
+    Cada evento passa pelas mesmas regras de token do endpoint individual;
+    o lote é gravado em uma única transação e o resultado vem por evento
+    """
+    if platform not in ("guru", "ticto"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unsupported platform: {platform}")
+    # Middleware de segurança já validou os tokens de todos os eventos
+    payloads = request.state.validated_payloads
+    
+    resultados, duracao_ms = await executar_handler(processar_lote_webhooks, platform, payloads)
+    response.headers["X-Process-Time-Ms"] = f"{duracao_ms:.1f}"
+    
+    return {
+        "received": True,
+        "platform": platform,
+        "total": len(resultados),
+        "results": resultados
+    }
+
 # Middleware de segurança para Guru
 @app.middleware("http")
 async def guru_security_middleware(request: Request, call_next):
     if request.url.path == "/webhook/guru":
         await guru_webhook_middleware(request)
+    elif request.url.path == "/webhook/guru/batch":
+        await guru_webhook_middleware.validar_lote(request)
     return await call_next(request)
 
 # Middleware de segurança para Ticto
@@ -82,4 +243,6 @@ async def guru_security_middleware(request: Request, call_next):
 async def ticto_security_middleware(request: Request, call_next):
     if request.url.path == "/webhook/ticto":
         await ticto_webhook_middleware(request)
+    elif request.url.path == "/webhook/ticto/batch":
+        await ticto_webhook_middleware.validar_lote(request)
     return await call_next(request)
\ No newline at end of file
@@ -65,34 +65,35 @@ def register_area_chart_callbacks(app):
             # Importa MetricsCalculator e busca dados reais por produto
             try:
                 from services.metrics_calculator import MetricsCalculator
-                from database.connection import get_db_session
+                from database.connection import get_read_session
                 from sqlalchemy import text
                 
                 # Cria sessão e calculadora
-                db_session = get_db_session()
+                db_session = get_read_session()
                 calculator = MetricsCalculator(db_session)
                 
                 # Se temos período selecionado, busca dados reais por produto
                 if start_dt and end_dt:
                     logger.info(f"📊 Buscando dados reais por produto do período: {start_dt} a {end_dt}")
                     
-                    # Busca dados por produto no período
+                    # Busca dados por produto no período (resumos diários)
                     query_produtos = text("""
                         SELECT 
                             produto_nome,
-                            DATE(data_transacao) as data,
-                            COUNT(*) as vendas_diarias
-                        FROM transacoes
-                        WHERE data_transacao BETWEEN :start_date AND :end_date
-                        AND status IN ('approved', 'paid', 'authorized')
+                            dia as data,
+                            SUM(quantidade) as vendas_diarias
+                        FROM resumo_diario_transacoes_atual
+                        WHERE dia BETWEEN :start_date AND :end_date
+                        AND classe_status = 'aprovada'
                         AND produto_nome IS NOT NULL
-                        GROUP BY produto_nome, DATE(data_transacao)
+                        GROUP BY produto_nome, dia
+                        HAVING SUM(quantidade) > 0
                         ORDER BY produto_nome, data
                     """)
                     
                     result_produtos = calculator.db.execute(query_produtos, {
-                        "start_date": start_dt,
-                        "end_date": end_dt
+                        "start_date": start_dt.date(),
+                        "end_date": end_dt.date()
                     }).fetchall()
                     
                     # Processa dados por produto
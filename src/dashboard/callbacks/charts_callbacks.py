@@ -70,10 +70,10 @@ def register_charts_callbacks(app):
             # Importa MetricsCalculator
             try:
                 from services.metrics_calculator import MetricsCalculator
-                from database.connection import get_session
+                from database.connection import get_read_session
                 
                 # Cria sessão e calculadora
-                db_session = get_session()
+                db_session = get_read_session()
                 calculator = MetricsCalculator(db_session)
                 
                 # Busca dados reais de compras por produto baseado no período
@@ -82,24 +82,22 @@ def register_charts_callbacks(app):
                     dashboard_metrics = calculator.calculate_dashboard_metrics_for_period(start_dt, end_dt)
                     
                     # Busca dados de produtos/plataformas no período (apenas com transações aprovadas)
+                    # nos resumos diários de alunos
                     from sqlalchemy import text
                     query_produtos = text("""
                         SELECT 
-                            a.plataforma,
-                            COUNT(DISTINCT a.id) as total_compras
-                        FROM assinaturas a
-                        INNER JOIN transacoes t ON a.id = t.assinatura_id
-                        WHERE a.data_inicio BETWEEN :start_date AND :end_date
-                        AND a.status NOT IN ('refunded', 'chargeback')
-                        AND t.status IN ('approved', 'paid', 'authorized')
-                        AND t.valor_bruto > 0
-                        GROUP BY a.plataforma
+                            plataforma,
+                            SUM(alunos) as total_compras
+                        FROM resumo_diario_alunos_atual
+                        WHERE dia BETWEEN :start_date AND :end_date
+                        GROUP BY plataforma
+                        HAVING SUM(alunos) > 0
                         ORDER BY total_compras DESC
                     """)
                     
                     result_produtos = calculator.db.execute(query_produtos, {
-                        "start_date": start_dt,
-                        "end_date": end_dt
+                        "start_date": start_dt.date(),
+                        "end_date": end_dt.date()
                     }).fetchall()
                     
                     platforms = [row.plataforma for row in result_produtos]
@@ -204,31 +202,31 @@ def register_charts_callbacks(app):
             # Importa MetricsCalculator
             try:
                 from services.metrics_calculator import MetricsCalculator
-                from database.connection import get_session
+                from database.connection import get_read_session
                 
                 # Cria sessão e calculadora
-                db_session = get_session()
+                db_session = get_read_session()
                 calculator = MetricsCalculator(db_session)
                 
                 # Busca dados reais de receita por produto baseado no período
                 if start_dt and end_dt:
-                    # Busca dados de receita por plataforma no período
+                    # Busca dados de receita por plataforma no período (resumos diários)
                     from sqlalchemy import text
                     query_receita = text("""
                         SELECT 
                             plataforma,
                             SUM(valor_bruto) as total_receita
-                        FROM transacoes 
-                        WHERE data_transacao BETWEEN :start_date AND :end_date
-                        AND status IN ('approved', 'paid', 'authorized')
-                        AND valor_bruto > 0
+                        FROM resumo_diario_transacoes_atual 
+                        WHERE dia BETWEEN :start_date AND :end_date
+                        AND classe_status = 'aprovada'
                         GROUP BY plataforma
+                        HAVING SUM(vendas) > 0
                         ORDER BY total_receita DESC
                     """)
                     
                     result_receita = calculator.db.execute(query_receita, {
-                        "start_date": start_dt,
-                        "end_date": end_dt
+                        "start_date": start_dt.date(),
+                        "end_date": end_dt.date()
                     }).fetchall()
                     
                     platforms = [row.plataforma for row in result_receita]
@@ -336,31 +334,31 @@ def register_charts_callbacks(app):
             # Importa MetricsCalculator
             try:
                 from services.metrics_calculator import MetricsCalculator
-                from database.connection import get_session
+                from database.connection import get_read_session
                 
                 # Cria sessão e calculadora
-                db_session = get_session()
+                db_session = get_read_session()
                 calculator = MetricsCalculator(db_session)
                 
                 # Busca dados reais de vendas por data baseado no período
                 if start_dt and end_dt:
-                    # Busca vendas por dia no período selecionado
+                    # Busca vendas por dia no período selecionado (resumos diários)
                     from sqlalchemy import text
                     query_vendas_dia = text("""
                         SELECT 
-                            DATE(data_transacao) as data_venda,
-                            COUNT(*) as total_vendas
-                        FROM transacoes 
-                        WHERE data_transacao BETWEEN :start_date AND :end_date
-                        AND status IN ('approved', 'paid', 'authorized')
-                        AND valor_bruto > 0
-                        GROUP BY DATE(data_transacao)
+                            dia as data_venda,
+                            SUM(vendas) as total_vendas
+                        FROM resumo_diario_transacoes_atual 
+                        WHERE dia BETWEEN :start_date AND :end_date
+                        AND classe_status = 'aprovada'
+                        GROUP BY dia
+                        HAVING SUM(vendas) > 0
                         ORDER BY data_venda
                     """)
                     
                     result_vendas_dia = calculator.db.execute(query_vendas_dia, {
-                        "start_date": start_dt,
-                        "end_date": end_dt
+                        "start_date": start_dt.date(),
+                        "end_date": end_dt.date()
                     }).fetchall()
                     
                     dates = [row.data_venda for row in result_vendas_dia]
@@ -75,11 +75,11 @@ def register_final_metrics_callbacks(app):
             # Importa MetricsCalculator e busca dados reais
             try:
                 from services.metrics_calculator import MetricsCalculator
-                from database.connection import get_db_session
+                from database.connection import get_read_session
                 from sqlalchemy import text
                 
                 # Cria sessão e calculadora
-                db_session = get_db_session()
+                db_session = get_read_session()
                 calculator = MetricsCalculator(db_session)
                 
                 # Se temos período selecionado, busca dados reais do período
@@ -87,17 +87,17 @@ def register_final_metrics_callbacks(app):
                     logger.info(f"📊 Buscando métricas finais do período: {start_dt} a {end_dt}")
                     
                     # 1. MRR Total (Monthly Recurring Revenue) - CORRIGIDO: usar filtro de datas
+                    # Resumos diários: valor_liquido já soma só as transações com valor_liquido > 0
                     query_mrr_total = text("""
                         SELECT SUM(valor_liquido) as mrr_total
-                        FROM transacoes
-                        WHERE data_transacao BETWEEN :start_date AND :end_date
-                        AND status IN ('approved', 'paid', 'authorized')
-                        AND valor_liquido > 0
+                        FROM resumo_diario_transacoes_atual
+                        WHERE dia BETWEEN :start_date AND :end_date
+                        AND classe_status = 'aprovada'
                     """)
                     
                     result_mrr_total = calculator.db.execute(query_mrr_total, {
-                        "start_date": start_dt,
-                        "end_date": end_dt
+                        "start_date": start_dt.date(),
+                        "end_date": end_dt.date()
                     }).fetchone()
                     
                     mrr_total = float(result_mrr_total.mrr_total) if result_mrr_total and result_mrr_total.mrr_total else 0
@@ -115,15 +115,14 @@ def register_final_metrics_callbacks(app):
                     
                     query_mrr_anterior = text("""
                         SELECT SUM(valor_liquido) as mrr_anterior
-                        FROM transacoes
-                        WHERE data_transacao BETWEEN :start_date AND :end_date
-                        AND status IN ('approved', 'paid', 'authorized')
-                        AND valor_liquido > 0
+                        FROM resumo_diario_transacoes_atual
+                        WHERE dia BETWEEN :start_date AND :end_date
+                        AND classe_status = 'aprovada'
                     """)
                     
                     result_mrr_anterior = calculator.db.execute(query_mrr_anterior, {
-                        "start_date": periodo_anterior_start,
-                        "end_date": periodo_anterior_end
+                        "start_date": periodo_anterior_start.date(),
+                        "end_date": periodo_anterior_end.date()
                     }).fetchone()
                     
                     mrr_anterior = float(result_mrr_anterior.mrr_anterior) if result_mrr_anterior and result_mrr_anterior.mrr_anterior else 0
@@ -136,16 +135,15 @@ def register_final_metrics_callbacks(app):
                     # 5. MRR Mensal - CORRIGIDO: usar filtro de datas (mesmo que zerado)
                     query_mrr_mensal = text("""
                         SELECT SUM(valor_liquido) as mrr_mensal
-                        FROM transacoes
-                        WHERE data_transacao BETWEEN :start_date AND :end_date
-                        AND status IN ('approved', 'paid', 'authorized')
-                        AND (produto_nome ILIKE '%mensal%' OR produto_nome ILIKE '%monthly%')
-                        AND valor_liquido > 0
+                        FROM resumo_diario_transacoes_atual
+                        WHERE dia BETWEEN :start_date AND :end_date
+                        AND classe_status = 'aprovada'
+                        AND tipo_plano = 'mensal'
                     """)
                     
                     result_mrr_mensal = calculator.db.execute(query_mrr_mensal, {
-                        "start_date": start_dt,
-                        "end_date": end_dt
+                        "start_date": start_dt.date(),
+                        "end_date": end_dt.date()
                     }).fetchone()
                     
                     mrr_mensal = float(result_mrr_mensal.mrr_mensal) if result_mrr_mensal and result_mrr_mensal.mrr_mensal else 0
@@ -182,25 +180,18 @@ def register_final_metrics_callbacks(app):
                     
                     assinaturas_canceladas = result_canceladas.canceladas if result_canceladas else 0
                     
-                    # 9. MRR Anual - CORRIGIDO: detectar planos anuais por valor alto ou duração longa
-                    # Primeiro tenta por nome, depois por valor alto (acima de R$ 200)
+                    # 9. MRR Anual - tipo_plano gravado na transação (produto/oferta do plano anual)
                     query_mrr_anual = text("""
                         SELECT SUM(valor_liquido) as mrr_anual
-                        FROM transacoes
-                        WHERE data_transacao BETWEEN :start_date AND :end_date
-                        AND status IN ('approved', 'paid', 'authorized')
-                        AND (
-                            produto_nome ILIKE '%anual%' OR 
-                            produto_nome ILIKE '%yearly%' OR 
-                            produto_nome ILIKE '%year%' OR
-                            valor_liquido > 200
-                        )
-                        AND valor_liquido > 0
+                        FROM resumo_diario_transacoes_atual
+                        WHERE dia BETWEEN :start_date AND :end_date
+                        AND classe_status = 'aprovada'
+                        AND tipo_plano = 'anual'
                     """)
                     
                     result_mrr_anual = calculator.db.execute(query_mrr_anual, {
-                        "start_date": start_dt,
-                        "end_date": end_dt
+                        "start_date": start_dt.date(),
+                        "end_date": end_dt.date()
                     }).fetchone()
                     
                     mrr_anual = float(result_mrr_anual.mrr_anual) if result_mrr_anual and result_mrr_anual.mrr_anual else 0
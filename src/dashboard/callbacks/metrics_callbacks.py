@@ -82,11 +82,11 @@ def register_metrics_callbacks(app):
             try:
                 logger.info("   Importando MetricsCalculator...")
                 from services.metrics_calculator import MetricsCalculator
-                from database.connection import get_session
+                from database.connection import get_read_session
                 
                 # Cria sessão e calculadora
                 logger.info("   Criando sessão do banco...")
-                db_session = get_session()
+                db_session = get_read_session()
                 calculator = MetricsCalculator(db_session)
                 
                 logger.info("   Calculando métricas principais...")
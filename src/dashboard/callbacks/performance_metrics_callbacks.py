@@ -79,10 +79,10 @@ def register_performance_metrics_callbacks(app):
             # Importa MetricsCalculator
             try:
                 from services.metrics_calculator import MetricsCalculator
-                from database.connection import get_session
+                from database.connection import get_read_session
                 
                 # Cria sessão e calculadora
-                db_session = get_session()
+                db_session = get_read_session()
                 calculator = MetricsCalculator(db_session)
                 
                 # Calcula métricas de performance baseadas no período
@@ -196,18 +196,17 @@ def register_performance_metrics_callbacks(app):
             start_anterior = start_dt - timedelta(days=periodo_dias)
             end_anterior = start_dt - timedelta(days=1)
             
-            # Busca receita do período anterior
+            # Busca receita do período anterior (dias inteiros, nos resumos diários)
             query_receita_anterior = text("""
                 SELECT COALESCE(SUM(valor_liquido), 0) as receita_anterior
-                FROM transacoes
-                WHERE data_transacao BETWEEN :start_date AND :end_date
-                AND status IN ('approved', 'paid', 'authorized')
-                AND valor_liquido > 0
+                FROM resumo_diario_transacoes_atual
+                WHERE dia BETWEEN :start_date AND :end_date
+                AND classe_status = 'aprovada'
             """)
             
             result_anterior = calculator.db.execute(query_receita_anterior, {
-                "start_date": start_anterior,
-                "end_date": end_anterior
+                "start_date": start_anterior.date(),
+                "end_date": end_anterior.date()
             }).fetchone()
             
             receita_anterior = float(result_anterior.receita_anterior) if result_anterior.receita_anterior else 0
@@ -0,0 +1,39 @@
+"""
+Configuração do gunicorn para o dashboard
+Uso: gunicorn -c src/dashboard/gunicorn_conf.py
+Os valores vêm de utils/servidor_config.py (mesmas variáveis de ambiente da API).
+"""
+
+import os
+import sys
+
+# Adiciona o diretório src ao path (imports sem prefixo "src.")
+DIRETORIO_SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, DIRETORIO_SRC)
+
+from utils.servidor_config import servidor_config
+
+wsgi_app = "dashboard.wsgi:server"
+pythonpath = DIRETORIO_SRC
+
+bind = f"{servidor_config.DASHBOARD_HOST}:{servidor_config.DASHBOARD_PORT}"
+workers = servidor_config.DASHBOARD_WORKERS
+# Threads por worker: callbacks esperando o banco não bloqueiam o worker inteiro
+worker_class = "gthread"
+threads = servidor_config.DASHBOARD_THREADS
+timeout = servidor_config.DASHBOARD_TIMEOUT
+graceful_timeout = servidor_config.GRACEFUL_TIMEOUT
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    # Antes do fork dos workers: métricas Prometheus somadas entre eles
+    servidor_config.preparar_metricas("dashboard")
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -141,18 +141,25 @@ class DashboardDataService:
     def _get_purchases_by_product(self, start_date: datetime, end_date: datetime) -> Dict[str, int]:
         """
         Busca número de compras por produto.
+        Agrupa pelo produto_id e busca o nome na tabela produtos.
         """
         query = text("""
+            WITH por_produto AS (
+                SELECT produto_id, COUNT(*) as compras
+                FROM assinaturas 
+                WHERE 
+                    data_inicio BETWEEN :start_date AND :end_date
+                    AND status NOT IN ('refunded', 'chargeback')
+                GROUP BY produto_id
+                ORDER BY compras DESC
+                LIMIT 10
+            )
             SELECT 
-                COALESCE(produto_nome, 'Produto Não Identificado') as produto,
-                COUNT(*) as compras
-            FROM assinaturas 
-            WHERE 
-                data_inicio BETWEEN :start_date AND :end_date
-                AND status NOT IN ('refunded', 'chargeback')
-            GROUP BY produto_nome
-            ORDER BY compras DESC
-            LIMIT 10
+                COALESCE(p.nome, 'Produto Não Identificado') as produto,
+                pp.compras
+            FROM por_produto pp
+            LEFT JOIN produtos p ON p.id = pp.produto_id
+            ORDER BY pp.compras DESC
         """)
         
         result = self.db.execute(query, {
@@ -160,29 +167,34 @@ class DashboardDataService:
             "end_date": end_date
         }).fetchall()
         
-        return {row.produto: row.compras for row in result}
+        # Produtos de plataformas diferentes podem ter o mesmo nome
+        compras = {}
+        for row in result:
+            compras[row.produto] = compras.get(row.produto, 0) + row.compras
+        return compras
     
     def _get_revenue_by_product(self, start_date: datetime, end_date: datetime) -> Dict[str, float]:
         """
         Busca receita por produto.
+        Agrupa pelo produto_id e busca o nome na tabela produtos.
         """
         query = text("""
+            WITH por_produto AS (
+                SELECT produto_id, SUM(COALESCE(mrr_contribuicao * 12, 0)) as receita
+                FROM assinaturas 
+                WHERE 
+                    data_inicio BETWEEN :start_date AND :end_date
+                    AND status NOT IN ('refunded', 'chargeback')
+                GROUP BY produto_id
+                ORDER BY receita DESC
+                LIMIT 10
+            )
             SELECT 
-                COALESCE(produto_nome, 'Produto Não Identificado') as produto,
-                SUM(
-                    CASE 
-                        WHEN valor_anual IS NOT NULL THEN valor_anual
-                        WHEN valor_mensal IS NOT NULL THEN valor_mensal * 12
-                        ELSE 0
-                    END
-                ) as receita
-            FROM assinaturas 
-            WHERE 
-                data_inicio BETWEEN :start_date AND :end_date
-                AND status NOT IN ('refunded', 'chargeback')
-            GROUP BY produto_nome
-            ORDER BY receita DESC
-            LIMIT 10
+                COALESCE(p.nome, 'Produto Não Identificado') as produto,
+                pp.receita
+            FROM por_produto pp
+            LEFT JOIN produtos p ON p.id = pp.produto_id
+            ORDER BY pp.receita DESC
         """)
         
         result = self.db.execute(query, {
@@ -190,7 +202,11 @@ class DashboardDataService:
             "end_date": end_date
         }).fetchall()
         
-        return {row.produto: float(row.receita) for row in result}
+        # Produtos de plataformas diferentes podem ter o mesmo nome
+        receitas = {}
+        for row in result:
+            receitas[row.produto] = receitas.get(row.produto, 0.0) + float(row.receita)
+        return receitas
     
     def _get_sales_by_date(self, start_date: datetime, end_date: datetime) -> Dict[str, float]:
         """
@@ -199,13 +215,7 @@ class DashboardDataService:
         query = text("""
             SELECT 
                 DATE_TRUNC('month', data_inicio) as mes,
-                SUM(
-                    CASE 
-                        WHEN valor_anual IS NOT NULL THEN valor_anual
-                        WHEN valor_mensal IS NOT NULL THEN valor_mensal * 12
-                        ELSE 0
-                    END
-                ) as vendas
+                SUM(COALESCE(mrr_contribuicao * 12, 0)) as vendas
             FROM assinaturas 
             WHERE 
                 data_inicio BETWEEN :start_date AND :end_date
@@ -231,13 +241,7 @@ class DashboardDataService:
         query = text("""
             SELECT 
                 DATE_TRUNC('month', data_inicio) as mes,
-                SUM(
-                    CASE 
-                        WHEN valor_anual IS NOT NULL THEN valor_anual / 12.0
-                        WHEN valor_mensal IS NOT NULL THEN valor_mensal
-                        ELSE 0
-                    END
-                ) as mrr
+                SUM(COALESCE(mrr_contribuicao, 0)) as mrr
             FROM assinaturas 
             WHERE 
                 data_inicio BETWEEN :start_date AND :end_date
@@ -340,13 +344,7 @@ class DashboardDataService:
         query = text("""
             SELECT 
                 COUNT(DISTINCT cliente_id) as total_clientes,
-                SUM(
-                    CASE 
-                        WHEN valor_anual IS NOT NULL THEN valor_anual
-                        WHEN valor_mensal IS NOT NULL THEN valor_mensal * 12
-                        ELSE 0
-                    END
-                ) as receita_total
+                SUM(COALESCE(mrr_contribuicao * 12, 0)) as receita_total
             FROM assinaturas 
             WHERE 
                 data_expiracao_acesso >= :end_date
@@ -396,13 +394,7 @@ class DashboardDataService:
         """Calcula Ticket Médio."""
         query = text("""
             SELECT 
-                AVG(
-                    CASE 
-                        WHEN valor_anual IS NOT NULL THEN valor_anual
-                        WHEN valor_mensal IS NOT NULL THEN valor_mensal * 12
-                        ELSE 0
-                    END
-                ) as ticket_medio
+                AVG(COALESCE(mrr_contribuicao * 12, 0)) as ticket_medio
             FROM assinaturas 
             WHERE 
                 data_inicio BETWEEN :start_date AND :end_date
@@ -0,0 +1,41 @@
+"""
+Ponto de entrada WSGI do dashboard (processo separado da API)
+O servidor Flask do Dash roda sob gunicorn com vários workers:
+
+    gunicorn -c src/dashboard/gunicorn_conf.py
+    python -m src.main dashboard   # equivalente
+
+Callbacks pesados do dashboard não disputam o GIL nem o pool de threads da
+ingestão de webhooks.
+"""
+
+import os
+
+from flask import Response, jsonify
+
+from dashboard.app import create_dashboard_app
+from database.connection import verificar_banco
+from utils.metricas_prometheus import resposta_metricas
+
+app = create_dashboard_app()
+server = app.server
+
+
+@server.route("/health")
+def health():
+    """Liveness: o worker está respondendo"""
+    return jsonify(status="ok", processo="dashboard", pid=os.getpid())
+
+
+@server.route("/health/ready")
+def health_ready():
+    """Readiness: o banco de leitura usado pelos callbacks responde"""
+    banco = verificar_banco(leitura=True)
+    return jsonify(status="ok" if banco else "indisponivel", processo="dashboard", banco=banco), 200 if banco else 503
+
+
+@server.route("/metrics")
+def metrics():
+    """Métricas Prometheus do dashboard (tempo por método do MetricsCalculator, SQL por método)"""
+    corpo, content_type = resposta_metricas()
+    return Response(corpo, headers={"Content-Type": content_type})
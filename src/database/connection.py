@@ -1,27 +1,120 @@
 # Database connection 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-import os
+from contextlib import contextmanager
+
+from utils.database_config import database_config
+from utils.json_codec import serializar, desserializar
+from utils.metricas_prometheus import instrumentar_engine, registrar_profundidade
 
 # Base para modelos SQLAlchemy
 Base = declarative_base()
 
-# Busca a URL do banco de dados das variáveis de ambiente ou usa o padrão do docker-compose
-DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://metrics_user:asdfghjkl@db:5432/metrics_db")
+# URL do primário (variável de ambiente ou padrão do docker-compose)
+DATABASE_URL = database_config.DATABASE_URL
+
+
+def _criar_engine(url: str, papel: str, pool_size: int, max_overflow: int, pool_timeout: float,
+                  statement_timeout_ms: int, somente_leitura: bool = False):
+    """
+    Engine de um papel ("escrita" ou "leitura") com pool próprio: uma agregação
+    longa do dashboard ocupa conexões do pool de leitura, nunca as da ingestão.
+    statement_timeout e application_name vão nas opções de conexão (visíveis
+    em pg_stat_activity).
+    """
+    opcoes = f"-c statement_timeout={statement_timeout_ms}"
+    if somente_leitura:
+        opcoes += " -c default_transaction_read_only=on"
+    novo_engine = create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=database_config.POOL_RECYCLE,
+        pool_pre_ping=database_config.POOL_PRE_PING,
+        connect_args={"options": opcoes, "application_name": f"dashboard_comu_{papel}"},
+        # Colunas JSON/JSONB passam pelo codec da ingestão
+        json_serializer=serializar,
+        json_deserializer=desserializar,
+    )
+    # Tempo de cada statement SQL, por handler (db_statement_duracao_segundos)
+    instrumentar_engine(novo_engine)
+    # Conexões emprestadas do pool (fila_profundidade{fila="pool_<papel>"})
+    registrar_profundidade(f"pool_{papel}", lambda: novo_engine.pool.checkedout())
+    return novo_engine
+
 
-# Cria o engine do SQLAlchemy
-engine = create_engine(DATABASE_URL)
+# Engine de escrita: ingestão de webhooks, inbox, bulk writer, autenticação
+engine = _criar_engine(
+    DATABASE_URL, "escrita",
+    pool_size=database_config.WRITE_POOL_SIZE,
+    max_overflow=database_config.WRITE_MAX_OVERFLOW,
+    pool_timeout=database_config.WRITE_POOL_TIMEOUT,
+    statement_timeout_ms=database_config.WRITE_STATEMENT_TIMEOUT_MS,
+)
 
-# Cria a fábrica de sessões
+# Engine de leitura: consultas analíticas do dashboard (réplica, se DATABASE_READ_URL)
+read_engine = _criar_engine(
+    database_config.DATABASE_READ_URL, "leitura",
+    pool_size=database_config.READ_POOL_SIZE,
+    max_overflow=database_config.READ_MAX_OVERFLOW,
+    pool_timeout=database_config.READ_POOL_TIMEOUT,
+    statement_timeout_ms=database_config.READ_STATEMENT_TIMEOUT_MS,
+    somente_leitura=database_config.READ_ONLY,
+)
+
+# Cria as fábricas de sessões
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 def get_session():
     """
-    Retorna uma nova sessão do banco de dados.
+    Retorna uma nova sessão do banco de dados (escrita).
     """
     return SessionLocal()
 
+def get_read_session():
+    """
+    Retorna uma nova sessão de leitura (pool analítico, réplica se configurada).
+    """
+    return ReadSessionLocal()
+
+
+@contextmanager
+def unit_of_work(session=None):
+    """
+    Escopo transacional de um evento: tudo o que for gravado dentro do bloco
+    é confirmado com um único commit (ou desfeito por completo em caso de erro).
+    Se uma sessão for fornecida, o bloco participa da transação dela e o
+    commit fica a cargo de quem a abriu.
+    """
+    if session is not None:
+        yield session
+        return
+    session = SessionLocal()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def verificar_banco(leitura: bool = False) -> bool:
+    """
+    Readiness: indica se o banco responde (SELECT 1 em uma conexão do pool de
+    escrita, ou do de leitura com leitura=True).
+    """
+    try:
+        with (read_engine if leitura else engine).connect() as conexao:
+            conexao.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+
 
 def get_db_session():
     """
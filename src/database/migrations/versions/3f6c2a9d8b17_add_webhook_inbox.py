@@ -0,0 +1,44 @@
+"""add webhook_inbox
+
+Revision ID: 3f6c2a9d8b17
+Revises: 04a31709c5d5
+Create Date: 2026-10-17 09:12:31.418220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6c2a9d8b17'
+down_revision: Union[str, None] = '04a31709c5d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('webhook_inbox',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('plataforma', sa.String(length=50), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False, server_default='pendente'),
+    sa.Column('tentativas', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('resultado_status', sa.String(length=50), nullable=True),
+    sa.Column('erro', sa.Text(), nullable=True),
+    sa.Column('recebido_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('iniciado_em', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('processado_em', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Índice parcial: os workers só varrem eventos pendentes, em ordem de chegada
+    op.create_index('ix_webhook_inbox_pendentes', 'webhook_inbox', ['id'], unique=False,
+                    postgresql_where=sa.text("status = 'pendente'"))
+    op.create_index('ix_webhook_inbox_status', 'webhook_inbox', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_inbox_status', table_name='webhook_inbox')
+    op.drop_index('ix_webhook_inbox_pendentes', table_name='webhook_inbox')
+    op.drop_table('webhook_inbox')
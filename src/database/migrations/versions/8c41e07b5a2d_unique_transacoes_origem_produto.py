@@ -0,0 +1,57 @@
+"""unique transacoes (id_transacao_origem, produto_nome)
+
+Revision ID: 8c41e07b5a2d
+Revises: 3f6c2a9d8b17
+Create Date: 2026-10-17 11:47:05.102934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41e07b5a2d'
+down_revision: Union[str, None] = '3f6c2a9d8b17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Duplicatas geradas antes dos upserts: mantém a linha mais recente de cada chave
+    # (último estado da transação), preservando o vínculo com a assinatura caso só a
+    # duplicata o tenha
+    op.execute("""
+        UPDATE transacoes t
+        SET assinatura_id = d.assinatura_id
+        FROM (
+            SELECT DISTINCT ON (id_transacao_origem, produto_nome)
+                   id_transacao_origem, produto_nome, assinatura_id
+            FROM transacoes
+            WHERE assinatura_id IS NOT NULL
+            ORDER BY id_transacao_origem, produto_nome, data_transacao DESC NULLS LAST, id DESC
+        ) d
+        WHERE t.assinatura_id IS NULL
+          AND t.id_transacao_origem = d.id_transacao_origem
+          AND t.produto_nome IS NOT DISTINCT FROM d.produto_nome
+    """)
+    op.execute("""
+        DELETE FROM transacoes
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY id_transacao_origem, produto_nome
+                    ORDER BY data_transacao DESC NULLS LAST, id DESC
+                ) AS rn
+                FROM transacoes
+            ) duplicadas
+            WHERE rn > 1
+        )
+    """)
+    # NULLS NOT DISTINCT (PostgreSQL 15): produto_nome nulo também conflita
+    op.create_index('uq_transacoes_origem_produto', 'transacoes', ['id_transacao_origem', 'produto_nome'],
+                    unique=True, postgresql_nulls_not_distinct=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_transacoes_origem_produto', table_name='transacoes')
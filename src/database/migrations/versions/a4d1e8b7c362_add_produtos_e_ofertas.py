@@ -0,0 +1,251 @@
+"""add produtos e ofertas com chaves inteiras em assinaturas e transacoes
+
+Revision ID: a4d1e8b7c362
+Revises: f2a6c8d4b931
+Create Date: 2026-10-18 09:41:27.553018
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d1e8b7c362'
+down_revision: Union[str, None] = 'f2a6c8d4b931'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Cópia dos dicionários de utils/helpers.py (PRODUTOS_GURU, PRODUTOS_TICTO,
+# OFFERS_TICTO e OFFER_CODES_ESPECIAIS) na data da migração, com os nomes dos
+# comentários: (plataforma, product_id ou offer_code, nome, tipo)
+PRODUTOS = [
+    ('guru', '1741887379', 'Plano Anual - Comu Academy', 'anual'),
+    ('guru', '1741871695', 'Plano Mensal', 'mensal'),
+    ('guru', '1742214167', 'Ebook - Como Criar Personagens', 'orderbump_ebook'),
+    ('guru', '1742215996', 'Comissions na Gringa', 'ebook_vitalicio'),
+    ('guru', '1752494625', 'Pack de Ebooks', 'orderbump_ebook'),
+    ('ticto', '41146', 'Plano Anual', 'anual'),
+    ('ticto', '41145', 'Plano Mensal', 'mensal'),
+]
+OFERTAS = [
+    ('ticto', 'O8578C9AB', 'Plano Anual', 'anual'),
+    ('ticto', 'O84ABA07F', 'Plano Mensal', 'mensal'),
+    ('ticto', 'O0AB56C79', None, 'orderbump_ebook'),
+    ('ticto', 'O06463C35', None, 'ebook_vitalicio'),
+]
+
+# atualizado_em muda a cada UPDATE: o catálogo em memória (services/catalogo.py)
+# compara max(atualizado_em) para saber quando reler as tabelas
+FUNCAO_ATUALIZADO_EM = """
+    CREATE FUNCTION catalogo_atualizado_em() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.atualizado_em := now();
+        RETURN NEW;
+    END
+    $$
+"""
+
+
+def _particoes_arquivadas():
+    """Meses destacados de transacoes (services/particoes.py), em qualquer schema"""
+    return op.get_bind().execute(sa.text("""
+        SELECT format('%I.%I', n.nspname, c.relname)
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind = 'r' AND NOT c.relispartition
+        AND c.relname ~ '^transacoes_[0-9]{4}_[0-9]{2}$'
+    """)).scalars().all()
+
+
+def _literal(valor):
+    return 'NULL' if valor is None else "'" + valor.replace("'", "''") + "'"
+
+
+def _valores(linhas):
+    return ", ".join("(" + ", ".join(_literal(valor) for valor in linha) + ")" for linha in linhas)
+
+
+def _preencher_transacoes(tabela):
+    # Guru: a oferta é identificada pelo nome (os webhooks não trazem o id)
+    op.execute(f"""
+        INSERT INTO ofertas (plataforma, chave, nome, produto_id)
+        SELECT DISTINCT ON (t.nome_oferta) 'guru', t.nome_oferta, t.nome_oferta, p.id
+        FROM {tabela} t
+        LEFT JOIN catalogo_payloads c ON c.transacao_id = t.id
+        LEFT JOIN produtos p ON p.plataforma = c.plataforma AND p.id_origem = c.produto
+        WHERE t.plataforma = 'guru' AND t.nome_oferta IS NOT NULL
+        ORDER BY t.nome_oferta, p.id IS NULL, t.data_transacao DESC
+        ON CONFLICT (plataforma, chave) DO NOTHING
+    """)
+    # Produto pelo último payload arquivado de cada transação; oferta pelo
+    # offer_code (Ticto) ou pelo nome_oferta da própria linha (Guru)
+    op.execute(f"""
+        UPDATE {tabela} t
+        SET produto_id = p.id,
+            oferta_id = CASE WHEN t.plataforma = 'guru'
+                             THEN (SELECT og.id FROM ofertas og WHERE og.plataforma = 'guru' AND og.chave = t.nome_oferta)
+                             ELSE o.id END
+        FROM catalogo_payloads c
+        LEFT JOIN produtos p ON p.plataforma = c.plataforma AND p.id_origem = c.produto
+        LEFT JOIN ofertas o ON o.plataforma = c.plataforma AND o.chave = c.oferta
+        WHERE c.transacao_id = t.id
+    """)
+
+
+def _colunas_transacoes(tabela):
+    op.execute(f"ALTER TABLE {tabela} ADD COLUMN produto_id smallint")
+    op.execute(f"ALTER TABLE {tabela} ADD COLUMN oferta_id smallint")
+
+
+def upgrade() -> None:
+    op.create_table('produtos',
+    sa.Column('id', sa.SmallInteger(), nullable=False),
+    sa.Column('plataforma', sa.String(length=50), nullable=False),
+    sa.Column('id_origem', sa.String(length=50), nullable=False),
+    sa.Column('nome', sa.String(length=255), nullable=True),
+    sa.Column('tipo', sa.String(length=30), nullable=True),
+    sa.Column('atualizado_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_produtos_plataforma_origem', 'produtos', ['plataforma', 'id_origem'], unique=True)
+    op.create_table('ofertas',
+    sa.Column('id', sa.SmallInteger(), nullable=False),
+    sa.Column('plataforma', sa.String(length=50), nullable=False),
+    sa.Column('chave', sa.String(length=255), nullable=False),
+    sa.Column('nome', sa.String(length=255), nullable=True),
+    sa.Column('produto_id', sa.SmallInteger(), nullable=True),
+    sa.Column('tipo', sa.String(length=30), nullable=True),
+    sa.Column('atualizado_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['produto_id'], ['produtos.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_ofertas_plataforma_chave', 'ofertas', ['plataforma', 'chave'], unique=True)
+    op.execute(FUNCAO_ATUALIZADO_EM)
+    for tabela in ['produtos', 'ofertas']:
+        op.execute(f"""
+            CREATE TRIGGER {tabela}_atualizado_em BEFORE UPDATE ON {tabela}
+            FOR EACH ROW EXECUTE FUNCTION catalogo_atualizado_em()
+        """)
+
+    # Produtos e ofertas já classificados no código
+    op.execute(f"INSERT INTO produtos (plataforma, id_origem, nome, tipo) VALUES {_valores(PRODUTOS)}")
+    op.execute(f"""
+        INSERT INTO ofertas (plataforma, chave, nome, tipo, produto_id)
+        SELECT v.plataforma, v.chave, v.nome, v.tipo, p.id
+        FROM (VALUES {_valores(OFERTAS)}) AS v (plataforma, chave, nome, tipo)
+        LEFT JOIN produtos p ON p.plataforma = v.plataforma AND p.tipo = v.tipo
+    """)
+
+    op.add_column('assinaturas', sa.Column('produto_id', sa.SmallInteger(), nullable=True))
+    op.add_column('assinaturas', sa.Column('oferta_id', sa.SmallInteger(), nullable=True))
+    op.create_foreign_key('assinaturas_produto_id_fkey', 'assinaturas', 'produtos', ['produto_id'], ['id'])
+    op.create_foreign_key('assinaturas_oferta_id_fkey', 'assinaturas', 'ofertas', ['oferta_id'], ['id'])
+    # Em transacoes (particionada) as colunas valem para todas as partições; os meses
+    # arquivados recebem as mesmas colunas para que possam ser reanexados
+    arquivadas = _particoes_arquivadas()
+    for tabela in ['transacoes', *arquivadas]:
+        _colunas_transacoes(tabela)
+    op.create_foreign_key('transacoes_produto_id_fkey', 'transacoes', 'produtos', ['produto_id'], ['id'])
+    op.create_foreign_key('transacoes_oferta_id_fkey', 'transacoes', 'ofertas', ['oferta_id'], ['id'])
+
+    # Produtos e ofertas que aparecem nos payloads arquivados (Guru: product.id;
+    # Ticto: item.product_id e item.offer_code; backfill da Ticto:
+    # mapeamento.produto.id e mapeamento.oferta.codigo), pelo último payload de cada transação
+    op.execute("""
+        CREATE TEMPORARY TABLE catalogo_payloads ON COMMIT DROP AS
+        SELECT DISTINCT ON (transacao_id) transacao_id, plataforma,
+               left(nullif(coalesce(payload #>> '{product,id}', payload #>> '{item,product_id}',
+                                    payload #>> '{mapeamento,produto,id}'), ''), 50) AS produto,
+               left(coalesce(payload #>> '{product,name}', payload #>> '{item,product_name}',
+                             payload #>> '{mapeamento,produto,nome}'), 255) AS produto_nome,
+               left(nullif(coalesce(payload #>> '{item,offer_code}', payload #>> '{mapeamento,oferta,codigo}'), ''), 255) AS oferta,
+               left(coalesce(payload #>> '{item,offer_name}', payload #>> '{mapeamento,oferta,nome}'), 255) AS oferta_nome
+        FROM payloads_transacoes
+        ORDER BY transacao_id, id DESC
+    """)
+    op.execute("""
+        INSERT INTO produtos (plataforma, id_origem, nome)
+        SELECT DISTINCT ON (plataforma, produto) plataforma, produto, produto_nome
+        FROM catalogo_payloads
+        WHERE produto IS NOT NULL
+        ORDER BY plataforma, produto, produto_nome IS NULL, transacao_id DESC
+        ON CONFLICT (plataforma, id_origem) DO NOTHING
+    """)
+    op.execute("""
+        INSERT INTO ofertas (plataforma, chave, nome, produto_id)
+        SELECT DISTINCT ON (c.plataforma, c.oferta) c.plataforma, c.oferta, c.oferta_nome, p.id
+        FROM catalogo_payloads c
+        LEFT JOIN produtos p ON p.plataforma = c.plataforma AND p.id_origem = c.produto
+        WHERE c.oferta IS NOT NULL
+        ORDER BY c.plataforma, c.oferta, p.id IS NULL, c.transacao_id DESC
+        ON CONFLICT (plataforma, chave) DO UPDATE
+        SET nome = coalesce(ofertas.nome, excluded.nome), produto_id = coalesce(ofertas.produto_id, excluded.produto_id)
+    """)
+
+    # produto_id/oferta_id não fazem parte das chaves dos resumos: os triggers ignoram as linhas
+    op.execute("SET LOCAL resumos.ignorar = 'on'")
+    for tabela in ['transacoes', *arquivadas]:
+        _preencher_transacoes(tabela)
+
+    # Assinaturas: produto e oferta da transação mais recente vinculada; na
+    # Guru a oferta pelo nome; sem transação, o produto pelo nome quando ele é único na plataforma
+    op.execute("""
+        UPDATE assinaturas a SET produto_id = u.produto_id, oferta_id = u.oferta_id
+        FROM (
+            SELECT DISTINCT ON (assinatura_id) assinatura_id, produto_id, oferta_id
+            FROM transacoes
+            WHERE assinatura_id IS NOT NULL AND produto_id IS NOT NULL
+            ORDER BY assinatura_id, data_transacao DESC
+        ) u
+        WHERE u.assinatura_id = a.id
+    """)
+    op.execute("""
+        INSERT INTO ofertas (plataforma, chave, nome, produto_id)
+        SELECT DISTINCT ON (nome_oferta) 'guru', nome_oferta, nome_oferta, produto_id
+        FROM assinaturas
+        WHERE plataforma = 'guru' AND nome_oferta IS NOT NULL
+        ORDER BY nome_oferta, produto_id IS NULL, ultima_atualizacao DESC NULLS LAST
+        ON CONFLICT (plataforma, chave) DO NOTHING
+    """)
+    op.execute("""
+        UPDATE assinaturas a SET oferta_id = o.id
+        FROM ofertas o
+        WHERE a.plataforma = 'guru' AND o.plataforma = 'guru' AND o.chave = a.nome_oferta
+    """)
+    op.execute("""
+        UPDATE assinaturas a SET produto_id = p.id
+        FROM (
+            SELECT plataforma, nome, min(id) AS id
+            FROM produtos
+            WHERE nome IS NOT NULL
+            GROUP BY plataforma, nome
+            HAVING count(*) = 1
+        ) p
+        WHERE a.produto_id IS NULL AND p.plataforma = a.plataforma AND p.nome = a.produto_nome
+    """)
+    op.execute("SET LOCAL resumos.ignorar = 'off'")
+
+    op.execute("ANALYZE produtos")
+    op.execute("ANALYZE ofertas")
+    op.execute("ANALYZE assinaturas")
+    op.execute("ANALYZE transacoes")
+
+
+def downgrade() -> None:
+    op.drop_constraint('transacoes_oferta_id_fkey', 'transacoes', type_='foreignkey')
+    op.drop_constraint('transacoes_produto_id_fkey', 'transacoes', type_='foreignkey')
+    for tabela in ['transacoes', *_particoes_arquivadas()]:
+        op.execute(f"ALTER TABLE {tabela} DROP COLUMN oferta_id")
+        op.execute(f"ALTER TABLE {tabela} DROP COLUMN produto_id")
+    op.drop_constraint('assinaturas_oferta_id_fkey', 'assinaturas', type_='foreignkey')
+    op.drop_constraint('assinaturas_produto_id_fkey', 'assinaturas', type_='foreignkey')
+    op.drop_column('assinaturas', 'oferta_id')
+    op.drop_column('assinaturas', 'produto_id')
+    op.drop_index('uq_ofertas_plataforma_chave', table_name='ofertas')
+    op.drop_table('ofertas')
+    op.drop_index('uq_produtos_plataforma_origem', table_name='produtos')
+    op.drop_table('produtos')
+    op.execute("DROP FUNCTION catalogo_atualizado_em()")
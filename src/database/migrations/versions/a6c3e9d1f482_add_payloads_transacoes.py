@@ -0,0 +1,86 @@
+"""add payloads_transacoes (arquivo de payloads brutos fora de transacoes)
+
+Revision ID: a6c3e9d1f482
+Revises: e4a81c6f2d53
+Create Date: 2026-10-17 21:12:40.518207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c3e9d1f482'
+down_revision: Union[str, None] = 'e4a81c6f2d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Faixa de ids de transacoes copiada por statement no backfill
+LOTE_BACKFILL = 5000
+
+
+def upgrade() -> None:
+    op.create_table('payloads_transacoes',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('transacao_id', sa.Integer(), nullable=False),
+    sa.Column('plataforma', sa.String(length=50), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('recebido_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['transacao_id'], ['transacoes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_payloads_transacoes_transacao', 'payloads_transacoes', ['transacao_id', 'id'], unique=False)
+    # lz4 (PostgreSQL 14+) comprime mais rápido que o pglz padrão; com toast_tuple_target
+    # baixo, payloads pequenos também são comprimidos
+    op.execute("ALTER TABLE payloads_transacoes ALTER COLUMN payload SET COMPRESSION lz4")
+    op.execute("ALTER TABLE payloads_transacoes SET (toast_tuple_target = 256)")
+    # Append-only: payloads arquivados nunca são reescritos
+    op.execute("""
+        CREATE FUNCTION payloads_transacoes_append_only() RETURNS trigger AS $$
+        BEGIN
+            RAISE EXCEPTION 'payloads_transacoes é append-only';
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER payloads_transacoes_sem_update
+        BEFORE UPDATE ON payloads_transacoes
+        FOR EACH ROW EXECUTE FUNCTION payloads_transacoes_append_only()
+    """)
+
+    # Backfill: o json_completo atual de cada transação vira a primeira linha do arquivo
+    conexao = op.get_bind()
+    maior_id = conexao.execute(sa.text("SELECT coalesce(max(id), 0) FROM transacoes")).scalar()
+    for inicio in range(0, maior_id, LOTE_BACKFILL):
+        conexao.execute(sa.text("""
+            INSERT INTO payloads_transacoes (transacao_id, plataforma, payload)
+            SELECT id, plataforma, json_completo
+            FROM transacoes
+            WHERE id > :inicio AND id <= :fim AND json_completo IS NOT NULL
+            ORDER BY id
+        """), {"inicio": inicio, "fim": inicio + LOTE_BACKFILL})
+
+    # DROP COLUMN não reescreve a tabela: o espaço do heap/TOAST é recuperado
+    # com VACUUM FULL transacoes (ou pg_repack) após a migração
+    op.drop_column('transacoes', 'json_completo')
+
+
+def downgrade() -> None:
+    op.add_column('transacoes', sa.Column('json_completo', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    # Restaura o payload mais recente de cada transação
+    op.execute("""
+        UPDATE transacoes t
+        SET json_completo = p.payload
+        FROM (
+            SELECT DISTINCT ON (transacao_id) transacao_id, payload
+            FROM payloads_transacoes
+            ORDER BY transacao_id, id DESC
+        ) p
+        WHERE t.id = p.transacao_id
+    """)
+    op.execute("DROP TRIGGER payloads_transacoes_sem_update ON payloads_transacoes")
+    op.execute("DROP FUNCTION payloads_transacoes_append_only()")
+    op.drop_index('ix_payloads_transacoes_transacao', table_name='payloads_transacoes')
+    op.drop_table('payloads_transacoes')
@@ -0,0 +1,77 @@
+"""add índices de métricas (transacoes, assinaturas, clientes)
+
+Revision ID: b7d4e2a9c315
+Revises: a6c3e9d1f482
+Create Date: 2026-10-17 23:05:18.337120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d4e2a9c315'
+down_revision: Union[str, None] = 'a6c3e9d1f482'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Status de venda confirmada usados pelas métricas de receita
+STATUS_APROVADOS = "status IN ('approved', 'paid', 'authorized')"
+# Assinaturas válidas para MRR/ativas
+STATUS_VALIDOS = "status NOT IN ('refunded', 'chargeback')"
+STATUS_CANCELADOS = "status IN ('canceled', 'subscription_canceled')"
+
+# (nome, tabela, colunas, opções de create_index); predicados copiados das
+# consultas do MetricsCalculator e dos callbacks do dashboard. A consulta dos
+# webhooks por (id_transacao_origem, produto_nome) já usa uq_transacoes_origem_produto.
+INDICES = [
+    # data_transacao BETWEEN ... AND status IN (aprovados) [AND valor*/valor_liquido/valor_bruto > 0]
+    # e status = 'approved' AND data_transacao <= :data_ref, agrupados por plataforma
+    ('ix_transacoes_aprovadas_data', 'transacoes', ['data_transacao'], dict(
+        postgresql_include=['plataforma', 'status', 'valor', 'valor_liquido', 'valor_bruto'],
+        postgresql_where=sa.text(STATUS_APROVADOS),
+    )),
+    # Períodos sem filtro de status (total de transações, volume por dia)
+    ('ix_transacoes_data', 'transacoes', ['data_transacao'], {}),
+    # JOIN assinaturas a ON a.id = t.assinatura_id (e a FK, no DELETE de assinaturas)
+    ('ix_transacoes_assinatura', 'transacoes', ['assinatura_id'], {}),
+    # data_inicio BETWEEN / <= :data_ref (novas assinaturas, base de churn)
+    ('ix_assinaturas_data_inicio', 'assinaturas', ['data_inicio'], {}),
+    # data_expiracao_acesso >= :data_ref AND status NOT IN (reembolso/chargeback): MRR e ativas
+    ('ix_assinaturas_validas_expiracao', 'assinaturas', ['data_expiracao_acesso'], dict(
+        postgresql_include=['plataforma', 'data_inicio', 'valor_mensal', 'valor_anual'],
+        postgresql_where=sa.text(STATUS_VALIDOS),
+    )),
+    # Cancelamentos: status IN (cancelados) AND ultima_atualizacao BETWEEN ...
+    ('ix_assinaturas_canceladas_atualizacao', 'assinaturas', ['ultima_atualizacao'], dict(
+        postgresql_include=['plataforma', 'data_inicio'],
+        postgresql_where=sa.text(STATUS_CANCELADOS),
+    )),
+    # data_cancelamento BETWEEN ... (nula na maioria das linhas)
+    ('ix_assinaturas_data_cancelamento', 'assinaturas', ['data_cancelamento'], dict(
+        postgresql_where=sa.text('data_cancelamento IS NOT NULL'),
+    )),
+    # Busca de cliente por e-mail sem diferenciar maiúsculas
+    ('ix_clientes_email_lower', 'clientes', [sa.text('lower(email)')], {}),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY não bloqueia os INSERTs dos webhooks, mas não roda dentro de transação.
+    # Cada índice é confirmado sozinho: uma execução interrompida é retomada pelo
+    # IF NOT EXISTS (um índice INVALID deixado pela falha precisa de DROP antes)
+    with op.get_context().autocommit_block():
+        for nome, tabela, colunas, opcoes in INDICES:
+            op.create_index(nome, tabela, colunas, unique=False, postgresql_concurrently=True,
+                            if_not_exists=True, **opcoes)
+        op.execute("ANALYZE transacoes")
+        op.execute("ANALYZE assinaturas")
+        op.execute("ANALYZE clientes")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for nome, tabela, _, _ in reversed(INDICES):
+            op.drop_index(nome, table_name=tabela, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,153 @@
+"""particionar transacoes por mês de data_transacao
+
+Revision ID: c3f8a1e6d924
+Revises: b7d4e2a9c315
+Create Date: 2026-10-18 00:41:09.254873
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f8a1e6d924'
+down_revision: Union[str, None] = 'b7d4e2a9c315'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Meses anteriores a este (datas inválidas vindas das plataformas) ficam na partição padrão
+PRIMEIRO_MES_MINIMO = date(2020, 1, 1)
+# Meses futuros criados já na migração (depois, services/particoes.py)
+MESES_FUTUROS = 3
+
+COLUNAS = (
+    "id, id_transacao_origem, assinatura_id, cliente_id, plataforma, status, valor, valor_liquido, "
+    "valor_bruto, taxa_reembolso, metodo_pagamento, data_transacao, motivo_recusa, tipo_recusa, "
+    "produto_nome, nome_oferta"
+)
+
+STATUS_APROVADOS = "status IN ('approved', 'paid', 'authorized')"
+
+
+def _colunas_transacoes(id_padrao=None):
+    return [
+        sa.Column('id', sa.Integer(), server_default=id_padrao, nullable=False),
+        sa.Column('id_transacao_origem', sa.String(length=255), nullable=False),
+        sa.Column('assinatura_id', sa.Integer(), nullable=True),
+        sa.Column('cliente_id', sa.Integer(), nullable=False),
+        sa.Column('plataforma', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=50), nullable=False),
+        sa.Column('valor', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('valor_liquido', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('valor_bruto', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('taxa_reembolso', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('metodo_pagamento', sa.String(length=50), nullable=True),
+        sa.Column('data_transacao', sa.DateTime(), nullable=False),
+        sa.Column('motivo_recusa', sa.Text(), nullable=True),
+        sa.Column('tipo_recusa', sa.String(length=50), nullable=True),
+        sa.Column('produto_nome', sa.String(length=255), nullable=True),
+        sa.Column('nome_oferta', sa.String(length=255), nullable=True),
+        sa.ForeignKeyConstraint(['assinatura_id'], ['assinaturas.id']),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id']),
+    ]
+
+
+def _criar_indices_metricas():
+    # Em tabela particionada o índice é criado em cada partição (sem CONCURRENTLY)
+    op.create_index('ix_transacoes_aprovadas_data', 'transacoes', ['data_transacao'], unique=False,
+                    postgresql_include=['plataforma', 'status', 'valor', 'valor_liquido', 'valor_bruto'],
+                    postgresql_where=sa.text(STATUS_APROVADOS))
+    op.create_index('ix_transacoes_data', 'transacoes', ['data_transacao'], unique=False)
+    op.create_index('ix_transacoes_assinatura', 'transacoes', ['assinatura_id'], unique=False)
+
+
+def _somar_meses(inicio: date, meses: int) -> date:
+    indice = inicio.year * 12 + inicio.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    conexao = op.get_bind()
+
+    # 1. Chave natural -> id fora da tabela particionada (data_transacao muda entre eventos)
+    op.create_table('transacoes_chaves',
+    sa.Column('transacao_id', sa.Integer(), server_default=sa.text("nextval('transacoes_id_seq')"), nullable=False),
+    sa.Column('id_transacao_origem', sa.String(length=255), nullable=False),
+    sa.Column('produto_nome', sa.String(length=255), nullable=True),
+    sa.PrimaryKeyConstraint('transacao_id')
+    )
+    op.execute("""
+        INSERT INTO transacoes_chaves (transacao_id, id_transacao_origem, produto_nome)
+        SELECT id, id_transacao_origem, produto_nome FROM transacoes
+    """)
+    op.create_index('uq_transacoes_chaves_origem_produto', 'transacoes_chaves', ['id_transacao_origem', 'produto_nome'],
+                    unique=True, postgresql_nulls_not_distinct=True)
+
+    # 2. O arquivo de payloads passa a referenciar a chave (id sozinho não é único na particionada)
+    op.drop_constraint('payloads_transacoes_transacao_id_fkey', 'payloads_transacoes', type_='foreignkey')
+    op.create_foreign_key('payloads_transacoes_transacao_id_fkey', 'payloads_transacoes', 'transacoes_chaves',
+                          ['transacao_id'], ['transacao_id'], ondelete='CASCADE')
+
+    # 3. Tabela atual vira a origem da cópia; a sequência dos ids passa para as chaves
+    op.rename_table('transacoes', 'transacoes_legado')
+    op.execute("ALTER TABLE transacoes_legado ALTER COLUMN id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE transacoes_id_seq OWNED BY transacoes_chaves.transacao_id")
+    op.execute("ALTER TABLE transacoes_legado RENAME CONSTRAINT transacoes_pkey TO transacoes_legado_pkey")
+    for indice in ('uq_transacoes_origem_produto', 'ix_transacoes_aprovadas_data', 'ix_transacoes_data', 'ix_transacoes_assinatura'):
+        op.drop_index(indice, table_name='transacoes_legado')
+
+    # 4. Tabela particionada, partição padrão e um mês por partição
+    op.create_table('transacoes',
+    *_colunas_transacoes(),
+    sa.PrimaryKeyConstraint('id', 'data_transacao'),
+    postgresql_partition_by='RANGE (data_transacao)'
+    )
+    op.execute("CREATE TABLE transacoes_padrao PARTITION OF transacoes DEFAULT")
+
+    hoje = date.today()
+    menor = conexao.execute(
+        sa.text("SELECT min(data_transacao) FROM transacoes_legado WHERE data_transacao >= :minimo"),
+        {"minimo": PRIMEIRO_MES_MINIMO},
+    ).scalar()
+    mes = date((menor or hoje).year, (menor or hoje).month, 1)
+    ultimo = _somar_meses(date(hoje.year, hoje.month, 1), MESES_FUTUROS)
+    while mes <= ultimo:
+        seguinte = _somar_meses(mes, 1)
+        op.execute(
+            f"CREATE TABLE transacoes_{mes:%Y_%m} PARTITION OF transacoes "
+            f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{seguinte.isoformat()}')"
+        )
+        mes = seguinte
+
+    # 5. Cópia (cada linha vai para a partição do seu mês) e índices depois dos dados
+    op.execute(f"INSERT INTO transacoes ({COLUNAS}) SELECT {COLUNAS} FROM transacoes_legado")
+    _criar_indices_metricas()
+    op.drop_table('transacoes_legado')
+    op.execute("ANALYZE transacoes")
+    op.execute("ANALYZE transacoes_chaves")
+
+
+def downgrade() -> None:
+    # Meses arquivados (schema de arquivo) não voltam: reanexe-os antes do downgrade
+    op.create_table('transacoes_plana',
+    *_colunas_transacoes(id_padrao=sa.text("nextval('transacoes_id_seq')")),
+    sa.PrimaryKeyConstraint('id', name='transacoes_plana_pkey')
+    )
+    op.execute(f"INSERT INTO transacoes_plana ({COLUNAS}) SELECT {COLUNAS} FROM transacoes")
+    op.drop_table('transacoes')
+    op.rename_table('transacoes_plana', 'transacoes')
+    op.execute("ALTER TABLE transacoes RENAME CONSTRAINT transacoes_plana_pkey TO transacoes_pkey")
+    op.execute("ALTER SEQUENCE transacoes_id_seq OWNED BY transacoes.id")
+    op.create_index('uq_transacoes_origem_produto', 'transacoes', ['id_transacao_origem', 'produto_nome'],
+                    unique=True, postgresql_nulls_not_distinct=True)
+    _criar_indices_metricas()
+
+    op.drop_constraint('payloads_transacoes_transacao_id_fkey', 'payloads_transacoes', type_='foreignkey')
+    op.create_foreign_key('payloads_transacoes_transacao_id_fkey', 'payloads_transacoes', 'transacoes',
+                          ['transacao_id'], ['id'], ondelete='CASCADE')
+    op.execute("ALTER TABLE transacoes_chaves ALTER COLUMN transacao_id DROP DEFAULT")
+    op.drop_index('uq_transacoes_chaves_origem_produto', table_name='transacoes_chaves')
+    op.drop_table('transacoes_chaves')
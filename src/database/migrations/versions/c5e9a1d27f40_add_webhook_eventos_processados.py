@@ -0,0 +1,36 @@
+"""add webhook_eventos_processados
+
+Revision ID: c5e9a1d27f40
+Revises: 8c41e07b5a2d
+Create Date: 2026-10-17 14:03:52.671845
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e9a1d27f40'
+down_revision: Union[str, None] = '8c41e07b5a2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('webhook_eventos_processados',
+    sa.Column('fingerprint', sa.String(length=64), nullable=False),
+    sa.Column('plataforma', sa.String(length=50), nullable=False),
+    sa.Column('resultado_status', sa.String(length=50), nullable=True),
+    sa.Column('processado_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('expira_em', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('fingerprint')
+    )
+    # Usado pela limpeza por TTL
+    op.create_index('ix_webhook_eventos_processados_expira_em', 'webhook_eventos_processados', ['expira_em'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_eventos_processados_expira_em', table_name='webhook_eventos_processados')
+    op.drop_table('webhook_eventos_processados')
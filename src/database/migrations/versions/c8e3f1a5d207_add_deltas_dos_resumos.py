@@ -0,0 +1,284 @@
+"""add deltas dos resumos diários (triggers sem linha quente)
+
+Revision ID: c8e3f1a5d207
+Revises: a4d1e8b7c362
+Create Date: 2026-10-18 14:22:08.361447
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from alembic.script import ScriptDirectory
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e3f1a5d207'
+down_revision: Union[str, None] = 'a4d1e8b7c362'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATUS_APROVADOS = "('approved', 'paid', 'authorized')"
+
+# Chave do advisory lock que separa consolidação e reconstrução ("resm" em ASCII,
+# a mesma de services/resumos.py)
+CHAVE_LOCK = 0x7265736D
+
+COLUNAS_TRANSACOES = "dia, plataforma, produto_nome, tipo_plano, classe_status"
+VALORES_TRANSACOES = "quantidade, vendas, valor_bruto, valor_liquido, taxa_reembolso"
+
+# Os triggers só inserem deltas (sem chave única: webhooks do mesmo dia/produto não
+# disputam a mesma linha); resumos_consolidar soma os deltas nos resumos periodicamente
+FUNCOES = [
+    """
+    CREATE OR REPLACE FUNCTION resumo_transacao_aplicar(
+        p_data timestamp, p_plataforma varchar, p_produto_nome varchar, p_tipo_plano varchar,
+        p_status varchar, p_valor_bruto numeric, p_valor_liquido numeric, p_taxa_reembolso numeric,
+        sinal integer
+    ) RETURNS void
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO resumo_transacoes_delta
+            (dia, plataforma, produto_nome, tipo_plano, classe_status,
+             quantidade, vendas, valor_bruto, valor_liquido, taxa_reembolso)
+        VALUES (
+            p_data::date, p_plataforma, p_produto_nome, p_tipo_plano, resumo_classe_status(p_status),
+            sinal,
+            CASE WHEN p_valor_bruto > 0 THEN sinal ELSE 0 END,
+            CASE WHEN p_valor_bruto > 0 THEN sinal * p_valor_bruto ELSE 0 END,
+            CASE WHEN p_valor_liquido > 0 THEN sinal * p_valor_liquido ELSE 0 END,
+            sinal * coalesce(p_taxa_reembolso, 0)
+        );
+    END
+    $$
+    """,
+    # resumo_alunos_contados continua por assinatura (sem disputa entre assinaturas);
+    # a contagem do dia vira delta
+    f"""
+    CREATE OR REPLACE FUNCTION resumo_aluno_recalcular(p_assinatura_id integer) RETURNS void
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        v_dia date;
+        v_plataforma varchar;
+        v_tipo varchar;
+        v_conta boolean;
+        v_antes resumo_alunos_contados%ROWTYPE;
+        v_contada boolean;
+    BEGIN
+        -- Serializa o recálculo por assinatura (eventos concorrentes da mesma assinatura)
+        SELECT data_inicio::date, plataforma, tipo_plano,
+               data_inicio IS NOT NULL AND status NOT IN ('refunded', 'chargeback')
+        INTO v_dia, v_plataforma, v_tipo, v_conta
+        FROM assinaturas WHERE id = p_assinatura_id FOR NO KEY UPDATE;
+
+        v_conta := coalesce(v_conta, false) AND EXISTS (
+            SELECT 1 FROM transacoes
+            WHERE assinatura_id = p_assinatura_id
+            AND status IN {STATUS_APROVADOS}
+            AND valor_bruto > 0
+        );
+
+        SELECT * INTO v_antes FROM resumo_alunos_contados WHERE assinatura_id = p_assinatura_id;
+        v_contada := FOUND;
+        IF v_contada AND v_conta
+           AND v_antes.dia = v_dia AND v_antes.plataforma = v_plataforma AND v_antes.tipo_plano = v_tipo THEN
+            RETURN;
+        END IF;
+
+        IF v_contada THEN
+            DELETE FROM resumo_alunos_contados WHERE assinatura_id = p_assinatura_id;
+            INSERT INTO resumo_alunos_delta (dia, plataforma, tipo_plano, alunos)
+            VALUES (v_antes.dia, v_antes.plataforma, v_antes.tipo_plano, -1);
+        END IF;
+        IF v_conta THEN
+            INSERT INTO resumo_alunos_contados (assinatura_id, dia, plataforma, tipo_plano)
+            VALUES (p_assinatura_id, v_dia, v_plataforma, v_tipo);
+            INSERT INTO resumo_alunos_delta (dia, plataforma, tipo_plano, alunos)
+            VALUES (v_dia, v_plataforma, v_tipo, 1);
+        END IF;
+    END
+    $$
+    """,
+    # Soma os deltas já confirmados nos resumos e os apaga, no mesmo comando (snapshot
+    # único: um delta de transação ainda aberta fica para a próxima consolidação).
+    # Com uma reconstrução em andamento não faz nada.
+    f"""
+    CREATE OR REPLACE FUNCTION resumos_consolidar() RETURNS integer
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        v_transacoes integer;
+        v_alunos integer;
+    BEGIN
+        IF NOT pg_try_advisory_xact_lock({CHAVE_LOCK}) THEN
+            RETURN 0;
+        END IF;
+
+        WITH movidos AS (
+            DELETE FROM resumo_transacoes_delta
+            RETURNING {COLUNAS_TRANSACOES}, {VALORES_TRANSACOES}
+        ),
+        somados AS (
+            INSERT INTO resumo_diario_transacoes AS r ({COLUNAS_TRANSACOES}, {VALORES_TRANSACOES})
+            SELECT {COLUNAS_TRANSACOES},
+                   sum(quantidade), sum(vendas), sum(valor_bruto), sum(valor_liquido), sum(taxa_reembolso)
+            FROM movidos
+            GROUP BY 1, 2, 3, 4, 5
+            ON CONFLICT ({COLUNAS_TRANSACOES}) DO UPDATE SET
+                quantidade = r.quantidade + excluded.quantidade,
+                vendas = r.vendas + excluded.vendas,
+                valor_bruto = r.valor_bruto + excluded.valor_bruto,
+                valor_liquido = r.valor_liquido + excluded.valor_liquido,
+                taxa_reembolso = r.taxa_reembolso + excluded.taxa_reembolso
+        )
+        SELECT count(*) INTO v_transacoes FROM movidos;
+
+        WITH movidos AS (
+            DELETE FROM resumo_alunos_delta
+            RETURNING dia, plataforma, tipo_plano, alunos
+        ),
+        somados AS (
+            INSERT INTO resumo_diario_alunos AS r (dia, plataforma, tipo_plano, alunos)
+            SELECT dia, plataforma, tipo_plano, sum(alunos)
+            FROM movidos
+            GROUP BY 1, 2, 3
+            ON CONFLICT (dia, plataforma, tipo_plano) DO UPDATE SET alunos = r.alunos + excluded.alunos
+        )
+        SELECT count(*) INTO v_alunos FROM movidos;
+
+        RETURN v_transacoes + v_alunos;
+    END
+    $$
+    """,
+    # Reconstrução sem LOCK TABLE: os webhooks continuam gravando deltas. Roda em
+    # REPEATABLE READ (snapshot único) com a consolidação parada (services/resumos.py):
+    # deltas confirmados antes do snapshot são apagados junto com os resumos do
+    # intervalo e recalculados das tabelas de origem; os confirmados depois não são
+    # vistos nem pela contagem nem pelo DELETE e são consolidados normalmente.
+    f"""
+    CREATE OR REPLACE FUNCTION resumos_reconstruir(p_primeiro date, p_ultimo date) RETURNS void
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        v_dias_fora date[];
+    BEGIN
+        IF current_setting('transaction_isolation') <> 'repeatable read' THEN
+            RAISE EXCEPTION 'resumos_reconstruir deve rodar em REPEATABLE READ (services/resumos.py)';
+        END IF;
+
+        DELETE FROM resumo_transacoes_delta WHERE dia BETWEEN p_primeiro AND p_ultimo;
+        DELETE FROM resumo_diario_transacoes WHERE dia BETWEEN p_primeiro AND p_ultimo;
+        INSERT INTO resumo_diario_transacoes ({COLUNAS_TRANSACOES}, {VALORES_TRANSACOES})
+        SELECT t.data_transacao::date, t.plataforma, t.produto_nome, t.tipo_plano,
+               resumo_classe_status(t.status),
+               count(*),
+               count(*) FILTER (WHERE t.valor_bruto > 0),
+               coalesce(sum(t.valor_bruto) FILTER (WHERE t.valor_bruto > 0), 0),
+               coalesce(sum(t.valor_liquido) FILTER (WHERE t.valor_liquido > 0), 0),
+               coalesce(sum(t.taxa_reembolso), 0)
+        FROM transacoes t
+        WHERE t.data_transacao >= p_primeiro AND t.data_transacao < p_ultimo + 1
+        GROUP BY 1, 2, 3, 4, 5;
+
+        -- Assinaturas do intervalo contadas em outro dia também são recontadas
+        WITH removidas AS (
+            DELETE FROM resumo_alunos_contados c
+            WHERE c.dia BETWEEN p_primeiro AND p_ultimo
+            OR c.assinatura_id IN (
+                SELECT id FROM assinaturas WHERE data_inicio >= p_primeiro AND data_inicio < p_ultimo + 1
+            )
+            RETURNING c.dia
+        )
+        SELECT array_agg(DISTINCT dia) INTO v_dias_fora
+        FROM removidas WHERE dia NOT BETWEEN p_primeiro AND p_ultimo;
+
+        INSERT INTO resumo_alunos_contados (assinatura_id, dia, plataforma, tipo_plano)
+        SELECT a.id, a.data_inicio::date, a.plataforma, a.tipo_plano
+        FROM assinaturas a
+        WHERE a.data_inicio >= p_primeiro AND a.data_inicio < p_ultimo + 1
+        AND a.status NOT IN ('refunded', 'chargeback')
+        AND EXISTS (
+            SELECT 1 FROM transacoes t
+            WHERE t.assinatura_id = a.id
+            AND t.status IN {STATUS_APROVADOS}
+            AND t.valor_bruto > 0
+        );
+
+        DELETE FROM resumo_alunos_delta
+        WHERE dia BETWEEN p_primeiro AND p_ultimo OR dia = ANY(coalesce(v_dias_fora, '{{}}'));
+        DELETE FROM resumo_diario_alunos
+        WHERE dia BETWEEN p_primeiro AND p_ultimo OR dia = ANY(coalesce(v_dias_fora, '{{}}'));
+        INSERT INTO resumo_diario_alunos (dia, plataforma, tipo_plano, alunos)
+        SELECT dia, plataforma, tipo_plano, count(*)
+        FROM resumo_alunos_contados
+        WHERE dia BETWEEN p_primeiro AND p_ultimo OR dia = ANY(coalesce(v_dias_fora, '{{}}'))
+        GROUP BY 1, 2, 3;
+    END
+    $$
+    """,
+]
+
+# Leitura dos resumos: linhas consolidadas + deltas pendentes (as consultas somam as colunas)
+VIEWS = [
+    f"""
+    CREATE VIEW resumo_diario_transacoes_atual AS
+    SELECT {COLUNAS_TRANSACOES}, {VALORES_TRANSACOES} FROM resumo_diario_transacoes
+    UNION ALL
+    SELECT {COLUNAS_TRANSACOES}, {VALORES_TRANSACOES} FROM resumo_transacoes_delta
+    """,
+    """
+    CREATE VIEW resumo_diario_alunos_atual AS
+    SELECT dia, plataforma, tipo_plano, alunos FROM resumo_diario_alunos
+    UNION ALL
+    SELECT dia, plataforma, tipo_plano, alunos FROM resumo_alunos_delta
+    """,
+]
+
+
+def upgrade() -> None:
+    op.create_table('resumo_transacoes_delta',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('plataforma', sa.String(length=50), nullable=False),
+    sa.Column('produto_nome', sa.String(length=255), nullable=True),
+    sa.Column('tipo_plano', sa.String(length=20), nullable=False),
+    sa.Column('classe_status', sa.String(length=20), nullable=False),
+    sa.Column('quantidade', sa.Integer(), nullable=False),
+    sa.Column('vendas', sa.Integer(), nullable=False),
+    sa.Column('valor_bruto', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('valor_liquido', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('taxa_reembolso', sa.Numeric(precision=14, scale=2), nullable=False)
+    )
+    op.create_index('ix_resumo_transacoes_delta_dia', 'resumo_transacoes_delta', ['dia'], unique=False)
+    op.create_table('resumo_alunos_delta',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('plataforma', sa.String(length=50), nullable=False),
+    sa.Column('tipo_plano', sa.String(length=20), nullable=False),
+    sa.Column('alunos', sa.Integer(), nullable=False)
+    )
+    op.create_index('ix_resumo_alunos_delta_dia', 'resumo_alunos_delta', ['dia'], unique=False)
+
+    for funcao in FUNCOES:
+        op.execute(funcao)
+    for view in VIEWS:
+        op.execute(view)
+
+
+def downgrade() -> None:
+    # Deltas pendentes vão para os resumos antes de as tabelas saírem
+    op.execute("SELECT resumos_consolidar()")
+    for view in ('resumo_diario_alunos_atual', 'resumo_diario_transacoes_atual'):
+        op.execute(f"DROP VIEW {view}")
+    op.execute("DROP FUNCTION resumos_consolidar()")
+
+    # Funções das migrações anteriores (upsert direto nos resumos, LOCK TABLE na reconstrução)
+    scripts = ScriptDirectory.from_config(op.get_context().config)
+    resumos = scripts.get_revision('e9b4d7c2a615').module
+    tipo_plano = scripts.get_revision('f2a6c8d4b931').module
+    aplicar = next(funcao for funcao in resumos.FUNCOES if 'FUNCTION resumo_transacao_aplicar(' in funcao)
+    op.execute(aplicar.replace("CREATE FUNCTION", "CREATE OR REPLACE FUNCTION", 1))
+    for funcao in tipo_plano.FUNCOES:
+        if 'FUNCTION resumo_aluno_recalcular(' in funcao or 'FUNCTION resumos_reconstruir(' in funcao:
+            op.execute(funcao)
+
+    op.drop_index('ix_resumo_alunos_delta_dia', table_name='resumo_alunos_delta')
+    op.drop_table('resumo_alunos_delta')
+    op.drop_index('ix_resumo_transacoes_delta_dia', table_name='resumo_transacoes_delta')
+    op.drop_table('resumo_transacoes_delta')
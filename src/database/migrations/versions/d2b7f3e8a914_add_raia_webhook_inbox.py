@@ -0,0 +1,32 @@
+"""add raia em webhook_inbox
+
+Revision ID: d2b7f3e8a914
+Revises: c5e9a1d27f40
+Create Date: 2026-10-17 16:21:09.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b7f3e8a914'
+down_revision: Union[str, None] = 'c5e9a1d27f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Eventos já enfileirados ficam com raia NULL (processados sem ordenação)
+    op.add_column('webhook_inbox', sa.Column('raia', sa.Integer(), nullable=True))
+    op.create_index(
+        'ix_webhook_inbox_raia_ativos', 'webhook_inbox', ['raia', 'id'], unique=False,
+        postgresql_where=sa.text("status IN ('pendente', 'processando')")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_inbox_raia_ativos', table_name='webhook_inbox')
+    op.drop_column('webhook_inbox', 'raia')
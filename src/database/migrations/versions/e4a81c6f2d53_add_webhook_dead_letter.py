@@ -0,0 +1,45 @@
+"""add webhook_dead_letter
+
+Revision ID: e4a81c6f2d53
+Revises: d2b7f3e8a914
+Create Date: 2026-10-17 17:48:33.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a81c6f2d53'
+down_revision: Union[str, None] = 'd2b7f3e8a914'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('webhook_dead_letter',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('plataforma', sa.String(length=50), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False, server_default='pendente'),
+    sa.Column('tentativas', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('erro', sa.Text(), nullable=True),
+    sa.Column('evento_id', sa.String(length=64), nullable=True),
+    sa.Column('resultado_status', sa.String(length=50), nullable=True),
+    sa.Column('criado_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('atualizado_em', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('proxima_tentativa_em', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Eventos com nova tentativa vencida (consulta do retrier)
+    op.create_index('ix_webhook_dead_letter_vencidos', 'webhook_dead_letter', ['proxima_tentativa_em'], unique=False,
+                    postgresql_where=sa.text("status = 'pendente'"))
+    op.create_index('ix_webhook_dead_letter_status', 'webhook_dead_letter', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_dead_letter_status', table_name='webhook_dead_letter')
+    op.drop_index('ix_webhook_dead_letter_vencidos', table_name='webhook_dead_letter')
+    op.drop_table('webhook_dead_letter')
@@ -0,0 +1,376 @@
+"""add resumos diários de transações e alunos (mantidos por triggers)
+
+Revision ID: e9b4d7c2a615
+Revises: c3f8a1e6d924
+Create Date: 2026-10-18 02:17:36.804512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9b4d7c2a615'
+down_revision: Union[str, None] = 'c3f8a1e6d924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Status de venda confirmada usados pelas métricas de receita e de alunos
+STATUS_APROVADOS = "('approved', 'paid', 'authorized')"
+
+FUNCOES = [
+    # Classe de status das transações (dimensão do resumo)
+    f"""
+    CREATE FUNCTION resumo_classe_status(status varchar) RETURNS varchar
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT CASE
+            WHEN status IN {STATUS_APROVADOS} THEN 'aprovada'
+            WHEN status IN ('refunded', 'chargeback') THEN 'reembolsada'
+            WHEN status IN ('refused', 'canceled', 'pix_expired') THEN 'recusada'
+            WHEN status IN ('waiting_payment', 'pix_created') THEN 'pendente'
+            ELSE 'outra'
+        END
+    $$
+    """,
+    # Tipo de plano pelos valores da assinatura (mesma regra do MRR)
+    """
+    CREATE FUNCTION resumo_tipo_plano(valor_mensal numeric, valor_anual numeric) RETURNS varchar
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT CASE
+            WHEN valor_anual IS NOT NULL THEN 'anual'
+            WHEN valor_mensal IS NOT NULL THEN 'mensal'
+            ELSE 'desconhecido'
+        END
+    $$
+    """,
+    # Tipo de plano de uma transação; trava a assinatura para que uma troca de
+    # plano concorrente (resumo_assinaturas_trigger) veja esta transação
+    """
+    CREATE FUNCTION resumo_tipo_plano_transacao(p_assinatura_id integer) RETURNS varchar
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        v_tipo varchar;
+    BEGIN
+        IF p_assinatura_id IS NULL THEN
+            RETURN 'desconhecido';
+        END IF;
+        SELECT resumo_tipo_plano(valor_mensal, valor_anual) INTO v_tipo
+        FROM assinaturas WHERE id = p_assinatura_id FOR NO KEY UPDATE;
+        RETURN coalesce(v_tipo, 'desconhecido');
+    END
+    $$
+    """,
+    # Soma (sinal = 1) ou subtrai (sinal = -1) uma transação do resumo do seu dia
+    """
+    CREATE FUNCTION resumo_transacao_aplicar(
+        p_data timestamp, p_plataforma varchar, p_produto_nome varchar, p_tipo_plano varchar,
+        p_status varchar, p_valor_bruto numeric, p_valor_liquido numeric, p_taxa_reembolso numeric,
+        sinal integer
+    ) RETURNS void
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO resumo_diario_transacoes AS r
+            (dia, plataforma, produto_nome, tipo_plano, classe_status,
+             quantidade, vendas, valor_bruto, valor_liquido, taxa_reembolso)
+        VALUES (
+            p_data::date, p_plataforma, p_produto_nome, p_tipo_plano, resumo_classe_status(p_status),
+            sinal,
+            CASE WHEN p_valor_bruto > 0 THEN sinal ELSE 0 END,
+            CASE WHEN p_valor_bruto > 0 THEN sinal * p_valor_bruto ELSE 0 END,
+            CASE WHEN p_valor_liquido > 0 THEN sinal * p_valor_liquido ELSE 0 END,
+            sinal * coalesce(p_taxa_reembolso, 0)
+        )
+        ON CONFLICT (dia, plataforma, produto_nome, tipo_plano, classe_status) DO UPDATE SET
+            quantidade = r.quantidade + excluded.quantidade,
+            vendas = r.vendas + excluded.vendas,
+            valor_bruto = r.valor_bruto + excluded.valor_bruto,
+            valor_liquido = r.valor_liquido + excluded.valor_liquido,
+            taxa_reembolso = r.taxa_reembolso + excluded.taxa_reembolso;
+    END
+    $$
+    """,
+    # Aluno = assinatura válida com ao menos uma transação aprovada com valor_bruto > 0,
+    # contada no dia de data_inicio. resumo_alunos_contados guarda onde cada uma foi contada.
+    f"""
+    CREATE FUNCTION resumo_aluno_recalcular(p_assinatura_id integer) RETURNS void
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        v_dia date;
+        v_plataforma varchar;
+        v_tipo varchar;
+        v_conta boolean;
+        v_antes resumo_alunos_contados%ROWTYPE;
+        v_contada boolean;
+    BEGIN
+        -- Serializa o recálculo por assinatura (eventos concorrentes da mesma assinatura)
+        SELECT data_inicio::date, plataforma, resumo_tipo_plano(valor_mensal, valor_anual),
+               data_inicio IS NOT NULL AND status NOT IN ('refunded', 'chargeback')
+        INTO v_dia, v_plataforma, v_tipo, v_conta
+        FROM assinaturas WHERE id = p_assinatura_id FOR NO KEY UPDATE;
+
+        v_conta := coalesce(v_conta, false) AND EXISTS (
+            SELECT 1 FROM transacoes
+            WHERE assinatura_id = p_assinatura_id
+            AND status IN {STATUS_APROVADOS}
+            AND valor_bruto > 0
+        );
+
+        SELECT * INTO v_antes FROM resumo_alunos_contados WHERE assinatura_id = p_assinatura_id;
+        v_contada := FOUND;
+        IF v_contada AND v_conta
+           AND v_antes.dia = v_dia AND v_antes.plataforma = v_plataforma AND v_antes.tipo_plano = v_tipo THEN
+            RETURN;
+        END IF;
+
+        IF v_contada THEN
+            DELETE FROM resumo_alunos_contados WHERE assinatura_id = p_assinatura_id;
+            UPDATE resumo_diario_alunos SET alunos = alunos - 1
+            WHERE dia = v_antes.dia AND plataforma = v_antes.plataforma AND tipo_plano = v_antes.tipo_plano;
+        END IF;
+        IF v_conta THEN
+            INSERT INTO resumo_alunos_contados (assinatura_id, dia, plataforma, tipo_plano)
+            VALUES (p_assinatura_id, v_dia, v_plataforma, v_tipo);
+            INSERT INTO resumo_diario_alunos AS r (dia, plataforma, tipo_plano, alunos)
+            VALUES (v_dia, v_plataforma, v_tipo, 1)
+            ON CONFLICT (dia, plataforma, tipo_plano) DO UPDATE SET alunos = r.alunos + 1;
+        END IF;
+    END
+    $$
+    """,
+    # Trigger de transacoes: desfaz a linha antiga e soma a nova. UPDATE que muda
+    # a linha de partição chega como DELETE + INSERT. services/particoes.py liga
+    # resumos.ignorar ao mover linhas da partição padrão (o total não muda).
+    f"""
+    CREATE FUNCTION resumo_transacoes_trigger() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        v_aluno_antes boolean := false;
+        v_aluno_depois boolean := false;
+    BEGIN
+        IF current_setting('resumos.ignorar', true) = 'on' THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'UPDATE'
+           AND NEW.data_transacao::date = OLD.data_transacao::date
+           AND NEW.plataforma = OLD.plataforma
+           AND NEW.produto_nome IS NOT DISTINCT FROM OLD.produto_nome
+           AND NEW.assinatura_id IS NOT DISTINCT FROM OLD.assinatura_id
+           AND NEW.status = OLD.status
+           AND NEW.valor_bruto IS NOT DISTINCT FROM OLD.valor_bruto
+           AND NEW.valor_liquido IS NOT DISTINCT FROM OLD.valor_liquido
+           AND NEW.taxa_reembolso IS NOT DISTINCT FROM OLD.taxa_reembolso THEN
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM resumo_transacao_aplicar(
+                OLD.data_transacao, OLD.plataforma, OLD.produto_nome, resumo_tipo_plano_transacao(OLD.assinatura_id),
+                OLD.status, OLD.valor_bruto, OLD.valor_liquido, OLD.taxa_reembolso, -1);
+            v_aluno_antes := OLD.assinatura_id IS NOT NULL
+                AND OLD.status IN {STATUS_APROVADOS} AND coalesce(OLD.valor_bruto > 0, false);
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            PERFORM resumo_transacao_aplicar(
+                NEW.data_transacao, NEW.plataforma, NEW.produto_nome, resumo_tipo_plano_transacao(NEW.assinatura_id),
+                NEW.status, NEW.valor_bruto, NEW.valor_liquido, NEW.taxa_reembolso, 1);
+            v_aluno_depois := NEW.assinatura_id IS NOT NULL
+                AND NEW.status IN {STATUS_APROVADOS} AND coalesce(NEW.valor_bruto > 0, false);
+        END IF;
+
+        -- Alunos só mudam quando a transação passa a contar ou deixa de contar para a assinatura
+        IF v_aluno_antes AND v_aluno_depois AND OLD.assinatura_id = NEW.assinatura_id THEN
+            RETURN NULL;
+        END IF;
+        IF v_aluno_antes THEN
+            PERFORM resumo_aluno_recalcular(OLD.assinatura_id);
+        END IF;
+        IF v_aluno_depois AND NOT (v_aluno_antes AND OLD.assinatura_id = NEW.assinatura_id) THEN
+            PERFORM resumo_aluno_recalcular(NEW.assinatura_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    # Trigger de assinaturas: troca de plano move as transações da assinatura
+    # entre tipos de plano; status, data_inicio e plataforma afetam os alunos
+    """
+    CREATE FUNCTION resumo_assinaturas_trigger() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        v_tipo_antes varchar := resumo_tipo_plano(OLD.valor_mensal, OLD.valor_anual);
+        v_tipo_depois varchar := resumo_tipo_plano(NEW.valor_mensal, NEW.valor_anual);
+        t record;
+    BEGIN
+        IF v_tipo_antes <> v_tipo_depois THEN
+            FOR t IN
+                SELECT data_transacao, plataforma, produto_nome, status, valor_bruto, valor_liquido, taxa_reembolso
+                FROM transacoes WHERE assinatura_id = NEW.id
+            LOOP
+                PERFORM resumo_transacao_aplicar(t.data_transacao, t.plataforma, t.produto_nome, v_tipo_antes,
+                    t.status, t.valor_bruto, t.valor_liquido, t.taxa_reembolso, -1);
+                PERFORM resumo_transacao_aplicar(t.data_transacao, t.plataforma, t.produto_nome, v_tipo_depois,
+                    t.status, t.valor_bruto, t.valor_liquido, t.taxa_reembolso, 1);
+            END LOOP;
+        END IF;
+        IF v_tipo_antes <> v_tipo_depois
+           OR OLD.status IS DISTINCT FROM NEW.status
+           OR OLD.data_inicio IS DISTINCT FROM NEW.data_inicio
+           OR OLD.plataforma IS DISTINCT FROM NEW.plataforma THEN
+            PERFORM resumo_aluno_recalcular(NEW.id);
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    # Reconstrução de um intervalo de dias a partir das tabelas de origem
+    # (scripts/reconstruir_resumos.py). O LOCK faz os webhooks que gravam
+    # transações esperarem; com ele, nenhum delta é perdido nem contado duas vezes.
+    f"""
+    CREATE FUNCTION resumos_reconstruir(p_primeiro date, p_ultimo date) RETURNS void
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        v_dias_fora date[];
+    BEGIN
+        LOCK TABLE resumo_diario_transacoes, resumo_diario_alunos, resumo_alunos_contados
+            IN SHARE ROW EXCLUSIVE MODE;
+
+        DELETE FROM resumo_diario_transacoes WHERE dia BETWEEN p_primeiro AND p_ultimo;
+        INSERT INTO resumo_diario_transacoes
+            (dia, plataforma, produto_nome, tipo_plano, classe_status,
+             quantidade, vendas, valor_bruto, valor_liquido, taxa_reembolso)
+        SELECT t.data_transacao::date, t.plataforma, t.produto_nome,
+               coalesce(resumo_tipo_plano(a.valor_mensal, a.valor_anual), 'desconhecido'),
+               resumo_classe_status(t.status),
+               count(*),
+               count(*) FILTER (WHERE t.valor_bruto > 0),
+               coalesce(sum(t.valor_bruto) FILTER (WHERE t.valor_bruto > 0), 0),
+               coalesce(sum(t.valor_liquido) FILTER (WHERE t.valor_liquido > 0), 0),
+               coalesce(sum(t.taxa_reembolso), 0)
+        FROM transacoes t
+        LEFT JOIN assinaturas a ON a.id = t.assinatura_id
+        WHERE t.data_transacao >= p_primeiro AND t.data_transacao < p_ultimo + 1
+        GROUP BY 1, 2, 3, 4, 5;
+
+        -- Assinaturas do intervalo contadas em outro dia também são recontadas
+        WITH removidas AS (
+            DELETE FROM resumo_alunos_contados c
+            WHERE c.dia BETWEEN p_primeiro AND p_ultimo
+            OR c.assinatura_id IN (
+                SELECT id FROM assinaturas WHERE data_inicio >= p_primeiro AND data_inicio < p_ultimo + 1
+            )
+            RETURNING c.dia
+        )
+        SELECT array_agg(DISTINCT dia) INTO v_dias_fora
+        FROM removidas WHERE dia NOT BETWEEN p_primeiro AND p_ultimo;
+
+        INSERT INTO resumo_alunos_contados (assinatura_id, dia, plataforma, tipo_plano)
+        SELECT a.id, a.data_inicio::date, a.plataforma, resumo_tipo_plano(a.valor_mensal, a.valor_anual)
+        FROM assinaturas a
+        WHERE a.data_inicio >= p_primeiro AND a.data_inicio < p_ultimo + 1
+        AND a.status NOT IN ('refunded', 'chargeback')
+        AND EXISTS (
+            SELECT 1 FROM transacoes t
+            WHERE t.assinatura_id = a.id
+            AND t.status IN {STATUS_APROVADOS}
+            AND t.valor_bruto > 0
+        );
+
+        DELETE FROM resumo_diario_alunos
+        WHERE dia BETWEEN p_primeiro AND p_ultimo OR dia = ANY(coalesce(v_dias_fora, '{{}}'));
+        INSERT INTO resumo_diario_alunos (dia, plataforma, tipo_plano, alunos)
+        SELECT dia, plataforma, tipo_plano, count(*)
+        FROM resumo_alunos_contados
+        WHERE dia BETWEEN p_primeiro AND p_ultimo OR dia = ANY(coalesce(v_dias_fora, '{{}}'))
+        GROUP BY 1, 2, 3;
+    END
+    $$
+    """,
+]
+
+NOMES_FUNCOES = [
+    'resumos_reconstruir(date, date)',
+    'resumo_assinaturas_trigger()',
+    'resumo_transacoes_trigger()',
+    'resumo_aluno_recalcular(integer)',
+    'resumo_transacao_aplicar(timestamp, varchar, varchar, varchar, varchar, numeric, numeric, numeric, integer)',
+    'resumo_tipo_plano_transacao(integer)',
+    'resumo_tipo_plano(numeric, numeric)',
+    'resumo_classe_status(varchar)',
+]
+
+
+def upgrade() -> None:
+    op.create_table('resumo_diario_transacoes',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('plataforma', sa.String(length=50), nullable=False),
+    sa.Column('produto_nome', sa.String(length=255), nullable=True),
+    sa.Column('tipo_plano', sa.String(length=20), nullable=False),
+    sa.Column('classe_status', sa.String(length=20), nullable=False),
+    sa.Column('quantidade', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('vendas', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('valor_bruto', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+    sa.Column('valor_liquido', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+    sa.Column('taxa_reembolso', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_resumo_diario_transacoes_chave', 'resumo_diario_transacoes',
+                    ['dia', 'plataforma', 'produto_nome', 'tipo_plano', 'classe_status'],
+                    unique=True, postgresql_nulls_not_distinct=True)
+    op.create_table('resumo_diario_alunos',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('plataforma', sa.String(length=50), nullable=False),
+    sa.Column('tipo_plano', sa.String(length=20), nullable=False),
+    sa.Column('alunos', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('dia', 'plataforma', 'tipo_plano')
+    )
+    op.create_table('resumo_alunos_contados',
+    sa.Column('assinatura_id', sa.Integer(), nullable=False),
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('plataforma', sa.String(length=50), nullable=False),
+    sa.Column('tipo_plano', sa.String(length=20), nullable=False),
+    sa.ForeignKeyConstraint(['assinatura_id'], ['assinaturas.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('assinatura_id')
+    )
+    op.create_index('ix_resumo_alunos_contados_dia', 'resumo_alunos_contados', ['dia'], unique=False)
+
+    for funcao in FUNCOES:
+        op.execute(funcao)
+    # Em transacoes (particionada) o trigger vale para todas as partições, inclusive as criadas depois
+    op.execute("""
+        CREATE TRIGGER resumo_transacoes
+        AFTER INSERT OR UPDATE OR DELETE ON transacoes
+        FOR EACH ROW EXECUTE FUNCTION resumo_transacoes_trigger()
+    """)
+    op.execute("""
+        CREATE TRIGGER resumo_assinaturas
+        AFTER UPDATE ON assinaturas
+        FOR EACH ROW EXECUTE FUNCTION resumo_assinaturas_trigger()
+    """)
+
+    # Histórico: um statement por tabela de origem, com os triggers já ativos
+    op.execute("""
+        SELECT resumos_reconstruir(
+            coalesce(least((SELECT min(data_transacao) FROM transacoes),
+                           (SELECT min(data_inicio) FROM assinaturas))::date, current_date),
+            greatest(current_date,
+                     (SELECT max(data_transacao) FROM transacoes)::date,
+                     (SELECT max(data_inicio) FROM assinaturas)::date)
+        )
+    """)
+    op.execute("ANALYZE resumo_diario_transacoes")
+    op.execute("ANALYZE resumo_diario_alunos")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER resumo_assinaturas ON assinaturas")
+    op.execute("DROP TRIGGER resumo_transacoes ON transacoes")
+    for nome in NOMES_FUNCOES:
+        op.execute(f"DROP FUNCTION {nome}")
+    op.drop_index('ix_resumo_alunos_contados_dia', table_name='resumo_alunos_contados')
+    op.drop_table('resumo_alunos_contados')
+    op.drop_table('resumo_diario_alunos')
+    op.drop_index('uq_resumo_diario_transacoes_chave', table_name='resumo_diario_transacoes')
+    op.drop_table('resumo_diario_transacoes')
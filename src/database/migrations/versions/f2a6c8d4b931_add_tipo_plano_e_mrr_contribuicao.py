@@ -0,0 +1,335 @@
+"""add tipo_plano e mrr_contribuicao em assinaturas e transacoes
+
+Revision ID: f2a6c8d4b931
+Revises: e9b4d7c2a615
+Create Date: 2026-10-18 04:06:52.118093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from alembic.script import ScriptDirectory
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a6c8d4b931'
+down_revision: Union[str, None] = 'e9b4d7c2a615'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATUS_APROVADOS = "('approved', 'paid', 'authorized')"
+
+# Cópia dos dicionários de utils/helpers.py (PRODUTOS_GURU, PRODUTOS_TICTO e
+# OFFERS_TICTO) na data da migração: (plataforma, product_id ou offer_code, tipo)
+PLANOS = [
+    ('guru', '1741887379', 'anual'),
+    ('guru', '1741871695', 'mensal'),
+    ('ticto', '41146', 'anual'),
+    ('ticto', '41145', 'mensal'),
+    ('ticto', 'O8578C9AB', 'anual'),
+    ('ticto', 'O84ABA07F', 'mensal'),
+]
+
+TIPO_PLANO_ASSINATURA = (
+    "CASE WHEN valor_anual IS NOT NULL THEN 'anual' "
+    "WHEN valor_mensal IS NOT NULL THEN 'mensal' ELSE 'desconhecido' END"
+)
+MRR_ASSINATURA = "CASE WHEN valor_anual IS NOT NULL THEN valor_anual / 12 ELSE valor_mensal END"
+MRR_TRANSACAO = "CASE tipo_plano WHEN 'anual' THEN valor_liquido / 12 WHEN 'mensal' THEN valor_liquido ELSE 0 END"
+
+# Resumo de transações agrupado pelo tipo de plano gravado na própria transação
+RESUMO_TRANSACOES = """
+    INSERT INTO resumo_diario_transacoes
+        (dia, plataforma, produto_nome, tipo_plano, classe_status,
+         quantidade, vendas, valor_bruto, valor_liquido, taxa_reembolso)
+    SELECT t.data_transacao::date, t.plataforma, t.produto_nome, t.tipo_plano,
+           resumo_classe_status(t.status),
+           count(*),
+           count(*) FILTER (WHERE t.valor_bruto > 0),
+           coalesce(sum(t.valor_bruto) FILTER (WHERE t.valor_bruto > 0), 0),
+           coalesce(sum(t.valor_liquido) FILTER (WHERE t.valor_liquido > 0), 0),
+           coalesce(sum(t.taxa_reembolso), 0)
+    FROM transacoes t
+"""
+
+# Funções dos resumos diários (migração e9b4d7c2a615) que passam a ler o
+# tipo_plano gravado em vez de deduzi-lo dos valores da assinatura
+FUNCOES = [
+    f"""
+    CREATE OR REPLACE FUNCTION resumo_aluno_recalcular(p_assinatura_id integer) RETURNS void
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        v_dia date;
+        v_plataforma varchar;
+        v_tipo varchar;
+        v_conta boolean;
+        v_antes resumo_alunos_contados%ROWTYPE;
+        v_contada boolean;
+    BEGIN
+        -- Serializa o recálculo por assinatura (eventos concorrentes da mesma assinatura)
+        SELECT data_inicio::date, plataforma, tipo_plano,
+               data_inicio IS NOT NULL AND status NOT IN ('refunded', 'chargeback')
+        INTO v_dia, v_plataforma, v_tipo, v_conta
+        FROM assinaturas WHERE id = p_assinatura_id FOR NO KEY UPDATE;
+
+        v_conta := coalesce(v_conta, false) AND EXISTS (
+            SELECT 1 FROM transacoes
+            WHERE assinatura_id = p_assinatura_id
+            AND status IN {STATUS_APROVADOS}
+            AND valor_bruto > 0
+        );
+
+        SELECT * INTO v_antes FROM resumo_alunos_contados WHERE assinatura_id = p_assinatura_id;
+        v_contada := FOUND;
+        IF v_contada AND v_conta
+           AND v_antes.dia = v_dia AND v_antes.plataforma = v_plataforma AND v_antes.tipo_plano = v_tipo THEN
+            RETURN;
+        END IF;
+
+        IF v_contada THEN
+            DELETE FROM resumo_alunos_contados WHERE assinatura_id = p_assinatura_id;
+            UPDATE resumo_diario_alunos SET alunos = alunos - 1
+            WHERE dia = v_antes.dia AND plataforma = v_antes.plataforma AND tipo_plano = v_antes.tipo_plano;
+        END IF;
+        IF v_conta THEN
+            INSERT INTO resumo_alunos_contados (assinatura_id, dia, plataforma, tipo_plano)
+            VALUES (p_assinatura_id, v_dia, v_plataforma, v_tipo);
+            INSERT INTO resumo_diario_alunos AS r (dia, plataforma, tipo_plano, alunos)
+            VALUES (v_dia, v_plataforma, v_tipo, 1)
+            ON CONFLICT (dia, plataforma, tipo_plano) DO UPDATE SET alunos = r.alunos + 1;
+        END IF;
+    END
+    $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION resumo_transacoes_trigger() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        v_aluno_antes boolean := false;
+        v_aluno_depois boolean := false;
+    BEGIN
+        IF current_setting('resumos.ignorar', true) = 'on' THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'UPDATE'
+           AND NEW.data_transacao::date = OLD.data_transacao::date
+           AND NEW.plataforma = OLD.plataforma
+           AND NEW.produto_nome IS NOT DISTINCT FROM OLD.produto_nome
+           AND NEW.tipo_plano = OLD.tipo_plano
+           AND NEW.assinatura_id IS NOT DISTINCT FROM OLD.assinatura_id
+           AND NEW.status = OLD.status
+           AND NEW.valor_bruto IS NOT DISTINCT FROM OLD.valor_bruto
+           AND NEW.valor_liquido IS NOT DISTINCT FROM OLD.valor_liquido
+           AND NEW.taxa_reembolso IS NOT DISTINCT FROM OLD.taxa_reembolso THEN
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM resumo_transacao_aplicar(
+                OLD.data_transacao, OLD.plataforma, OLD.produto_nome, OLD.tipo_plano,
+                OLD.status, OLD.valor_bruto, OLD.valor_liquido, OLD.taxa_reembolso, -1);
+            v_aluno_antes := OLD.assinatura_id IS NOT NULL
+                AND OLD.status IN {STATUS_APROVADOS} AND coalesce(OLD.valor_bruto > 0, false);
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            PERFORM resumo_transacao_aplicar(
+                NEW.data_transacao, NEW.plataforma, NEW.produto_nome, NEW.tipo_plano,
+                NEW.status, NEW.valor_bruto, NEW.valor_liquido, NEW.taxa_reembolso, 1);
+            v_aluno_depois := NEW.assinatura_id IS NOT NULL
+                AND NEW.status IN {STATUS_APROVADOS} AND coalesce(NEW.valor_bruto > 0, false);
+        END IF;
+
+        -- Alunos só mudam quando a transação passa a contar ou deixa de contar para a assinatura
+        IF v_aluno_antes AND v_aluno_depois AND OLD.assinatura_id = NEW.assinatura_id THEN
+            RETURN NULL;
+        END IF;
+        IF v_aluno_antes THEN
+            PERFORM resumo_aluno_recalcular(OLD.assinatura_id);
+        END IF;
+        IF v_aluno_depois AND NOT (v_aluno_antes AND OLD.assinatura_id = NEW.assinatura_id) THEN
+            PERFORM resumo_aluno_recalcular(NEW.assinatura_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    # O tipo de plano das transações não depende mais da assinatura: só os alunos mudam
+    """
+    CREATE OR REPLACE FUNCTION resumo_assinaturas_trigger() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF OLD.tipo_plano IS DISTINCT FROM NEW.tipo_plano
+           OR OLD.status IS DISTINCT FROM NEW.status
+           OR OLD.data_inicio IS DISTINCT FROM NEW.data_inicio
+           OR OLD.plataforma IS DISTINCT FROM NEW.plataforma THEN
+            PERFORM resumo_aluno_recalcular(NEW.id);
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION resumos_reconstruir(p_primeiro date, p_ultimo date) RETURNS void
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        v_dias_fora date[];
+    BEGIN
+        LOCK TABLE resumo_diario_transacoes, resumo_diario_alunos, resumo_alunos_contados
+            IN SHARE ROW EXCLUSIVE MODE;
+
+        DELETE FROM resumo_diario_transacoes WHERE dia BETWEEN p_primeiro AND p_ultimo;
+        {RESUMO_TRANSACOES}
+        WHERE t.data_transacao >= p_primeiro AND t.data_transacao < p_ultimo + 1
+        GROUP BY 1, 2, 3, 4, 5;
+
+        -- Assinaturas do intervalo contadas em outro dia também são recontadas
+        WITH removidas AS (
+            DELETE FROM resumo_alunos_contados c
+            WHERE c.dia BETWEEN p_primeiro AND p_ultimo
+            OR c.assinatura_id IN (
+                SELECT id FROM assinaturas WHERE data_inicio >= p_primeiro AND data_inicio < p_ultimo + 1
+            )
+            RETURNING c.dia
+        )
+        SELECT array_agg(DISTINCT dia) INTO v_dias_fora
+        FROM removidas WHERE dia NOT BETWEEN p_primeiro AND p_ultimo;
+
+        INSERT INTO resumo_alunos_contados (assinatura_id, dia, plataforma, tipo_plano)
+        SELECT a.id, a.data_inicio::date, a.plataforma, a.tipo_plano
+        FROM assinaturas a
+        WHERE a.data_inicio >= p_primeiro AND a.data_inicio < p_ultimo + 1
+        AND a.status NOT IN ('refunded', 'chargeback')
+        AND EXISTS (
+            SELECT 1 FROM transacoes t
+            WHERE t.assinatura_id = a.id
+            AND t.status IN {STATUS_APROVADOS}
+            AND t.valor_bruto > 0
+        );
+
+        DELETE FROM resumo_diario_alunos
+        WHERE dia BETWEEN p_primeiro AND p_ultimo OR dia = ANY(coalesce(v_dias_fora, '{{}}'));
+        INSERT INTO resumo_diario_alunos (dia, plataforma, tipo_plano, alunos)
+        SELECT dia, plataforma, tipo_plano, count(*)
+        FROM resumo_alunos_contados
+        WHERE dia BETWEEN p_primeiro AND p_ultimo OR dia = ANY(coalesce(v_dias_fora, '{{}}'))
+        GROUP BY 1, 2, 3;
+    END
+    $$
+    """,
+]
+
+NOMES_FUNCOES_REMOVIDAS = [
+    'resumo_tipo_plano_transacao(integer)',
+    'resumo_tipo_plano(numeric, numeric)',
+]
+
+
+def _particoes_arquivadas():
+    """Meses destacados de transacoes (services/particoes.py), em qualquer schema"""
+    return op.get_bind().execute(sa.text("""
+        SELECT format('%I.%I', n.nspname, c.relname)
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind = 'r' AND NOT c.relispartition
+        AND c.relname ~ '^transacoes_[0-9]{4}_[0-9]{2}$'
+    """)).scalars().all()
+
+
+def _preencher_tipo_plano(tabela):
+    # Tipo pelo produto/oferta do último payload arquivado de cada transação
+    # (Guru: product.id; Ticto: item.product_id e depois item.offer_code;
+    # backfill da Ticto: mapeamento.produto.id e mapeamento.oferta.codigo)
+    planos = ", ".join(f"('{plataforma}', '{chave}', '{tipo}')" for plataforma, chave, tipo in PLANOS)
+    op.execute(f"""
+        WITH planos (plataforma, chave, tipo) AS (VALUES {planos}),
+        ultimos AS (
+            SELECT DISTINCT ON (transacao_id) transacao_id, plataforma,
+                   coalesce(payload #>> '{{product,id}}', payload #>> '{{item,product_id}}',
+                            payload #>> '{{mapeamento,produto,id}}') AS produto,
+                   coalesce(payload #>> '{{item,offer_code}}', payload #>> '{{mapeamento,oferta,codigo}}') AS oferta
+            FROM payloads_transacoes
+            ORDER BY transacao_id, id DESC
+        ),
+        tipos AS (
+            SELECT u.transacao_id,
+                   coalesce(produto.tipo, oferta.tipo) AS tipo
+            FROM ultimos u
+            LEFT JOIN planos produto ON produto.plataforma = u.plataforma AND produto.chave = u.produto
+            LEFT JOIN planos oferta ON oferta.plataforma = u.plataforma AND oferta.chave = u.oferta
+        )
+        UPDATE {tabela} t SET tipo_plano = tipos.tipo
+        FROM tipos
+        WHERE tipos.transacao_id = t.id AND tipos.tipo IS NOT NULL
+    """)
+
+
+def _colunas_transacoes(tabela):
+    op.execute(f"ALTER TABLE {tabela} ADD COLUMN tipo_plano varchar(20) DEFAULT 'desconhecido' NOT NULL")
+    op.execute(f"ALTER TABLE {tabela} ADD COLUMN mrr_contribuicao numeric(12, 4) GENERATED ALWAYS AS ({MRR_TRANSACAO}) STORED")
+
+
+def upgrade() -> None:
+    op.add_column('assinaturas', sa.Column('tipo_plano', sa.String(length=20), sa.Computed(TIPO_PLANO_ASSINATURA, persisted=True), nullable=False))
+    op.add_column('assinaturas', sa.Column('mrr_contribuicao', sa.Numeric(precision=12, scale=4), sa.Computed(MRR_ASSINATURA, persisted=True), nullable=True))
+    op.create_index('ix_assinaturas_validas_tipo_plano', 'assinaturas', ['tipo_plano', 'data_expiracao_acesso'], unique=False,
+                    postgresql_include=['plataforma', 'mrr_contribuicao'],
+                    postgresql_where=sa.text("status NOT IN ('refunded', 'chargeback')"))
+
+    # Em transacoes (particionada) as colunas valem para todas as partições; os meses
+    # arquivados recebem as mesmas colunas para que possam ser reanexados
+    arquivadas = _particoes_arquivadas()
+    # O tipo_plano é preenchido com os triggers dos resumos ignorando as linhas:
+    # o resumo de transações é refeito abaixo com o tipo novo
+    op.execute("SET LOCAL resumos.ignorar = 'on'")
+    for tabela in ['transacoes', *arquivadas]:
+        _colunas_transacoes(tabela)
+        _preencher_tipo_plano(tabela)
+    op.execute("SET LOCAL resumos.ignorar = 'off'")
+
+    for funcao in FUNCOES:
+        op.execute(funcao)
+    for nome in NOMES_FUNCOES_REMOVIDAS:
+        op.execute(f"DROP FUNCTION {nome}")
+
+    # Dias com transações: o tipo de plano do resumo passa a ser o da transação.
+    # Os resumos de meses arquivados (sem linhas em transacoes) ficam como estão;
+    # resumo_diario_alunos não muda (assinaturas.tipo_plano segue a regra anterior).
+    op.execute("DELETE FROM resumo_diario_transacoes WHERE dia IN (SELECT DISTINCT data_transacao::date FROM transacoes)")
+    op.execute(RESUMO_TRANSACOES + " GROUP BY 1, 2, 3, 4, 5")
+    op.execute("ANALYZE assinaturas")
+    op.execute("ANALYZE transacoes")
+    op.execute("ANALYZE resumo_diario_transacoes")
+
+
+def downgrade() -> None:
+    # Funções da migração anterior, com o tipo de plano deduzido da assinatura
+    anterior = ScriptDirectory.from_config(op.get_context().config).get_revision(down_revision).module
+    for funcao in anterior.FUNCOES:
+        op.execute(funcao.replace("CREATE FUNCTION", "CREATE OR REPLACE FUNCTION", 1))
+
+    op.execute("DELETE FROM resumo_diario_transacoes WHERE dia IN (SELECT DISTINCT data_transacao::date FROM transacoes)")
+    op.execute("""
+        INSERT INTO resumo_diario_transacoes
+            (dia, plataforma, produto_nome, tipo_plano, classe_status,
+             quantidade, vendas, valor_bruto, valor_liquido, taxa_reembolso)
+        SELECT t.data_transacao::date, t.plataforma, t.produto_nome,
+               coalesce(resumo_tipo_plano(a.valor_mensal, a.valor_anual), 'desconhecido'),
+               resumo_classe_status(t.status),
+               count(*),
+               count(*) FILTER (WHERE t.valor_bruto > 0),
+               coalesce(sum(t.valor_bruto) FILTER (WHERE t.valor_bruto > 0), 0),
+               coalesce(sum(t.valor_liquido) FILTER (WHERE t.valor_liquido > 0), 0),
+               coalesce(sum(t.taxa_reembolso), 0)
+        FROM transacoes t
+        LEFT JOIN assinaturas a ON a.id = t.assinatura_id
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+
+    for tabela in ['transacoes', *_particoes_arquivadas()]:
+        op.execute(f"ALTER TABLE {tabela} DROP COLUMN mrr_contribuicao")
+        op.execute(f"ALTER TABLE {tabela} DROP COLUMN tipo_plano")
+    op.drop_index('ix_assinaturas_validas_tipo_plano', table_name='assinaturas',
+                  postgresql_where=sa.text("status NOT IN ('refunded', 'chargeback')"))
+    op.drop_column('assinaturas', 'mrr_contribuicao')
+    op.drop_column('assinaturas', 'tipo_plano')
@@ -1,7 +1,8 @@
 # Database models 
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, ForeignKey, Text
+from sqlalchemy import Column, Computed, Integer, BigInteger, SmallInteger, String, Date, DateTime, Numeric, ForeignKey, Table, Text, Index, Sequence, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.sql import func
 
 Base = declarative_base()
 
@@ -16,6 +17,48 @@ class Cliente(Base):
     assinaturas = relationship('Assinatura', back_populates='cliente')
     transacoes = relationship('Transacao', back_populates='cliente')
 
+    __table_args__ = (
+        Index('ix_clientes_email_lower', func.lower(email)),
+    )
+
+class Produto(Base):
+    """
+    Produtos das plataformas (migração a4d1e8b7c362). id_origem é o product_id
+    da plataforma; tipo classifica o produto (anual, mensal, orderbump_ebook,
+    ebook_vitalicio) e fica NULL nos produtos registrados automaticamente pela
+    ingestão até serem classificados. Lido pelo catálogo em memória
+    (services/catalogo.py).
+    """
+    __tablename__ = 'produtos'
+    id = Column(SmallInteger, primary_key=True)
+    plataforma = Column(String(50), nullable=False)
+    id_origem = Column(String(50), nullable=False)
+    nome = Column(String(255), nullable=True)
+    tipo = Column(String(30), nullable=True)
+    atualizado_em = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('uq_produtos_plataforma_origem', 'plataforma', 'id_origem', unique=True),
+    )
+
+class Oferta(Base):
+    """
+    Ofertas dos produtos. chave é o offer_code na Ticto e o nome da oferta na
+    Guru (os webhooks da Guru não trazem o id da oferta).
+    """
+    __tablename__ = 'ofertas'
+    id = Column(SmallInteger, primary_key=True)
+    plataforma = Column(String(50), nullable=False)
+    chave = Column(String(255), nullable=False)
+    nome = Column(String(255), nullable=True)
+    produto_id = Column(SmallInteger, ForeignKey('produtos.id'), nullable=True)
+    tipo = Column(String(30), nullable=True)
+    atualizado_em = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('uq_ofertas_plataforma_chave', 'plataforma', 'chave', unique=True),
+    )
+
 class Assinatura(Base):
     __tablename__ = 'assinaturas'
     id = Column(Integer, primary_key=True)
@@ -24,6 +67,8 @@ class Assinatura(Base):
     cliente_id = Column(Integer, ForeignKey('clientes.id'), nullable=False)
     produto_nome = Column(String(255))
     nome_oferta = Column(String(255), nullable=True)
+    produto_id = Column(SmallInteger, ForeignKey('produtos.id'), nullable=True)
+    oferta_id = Column(SmallInteger, ForeignKey('ofertas.id'), nullable=True)
     status = Column(String(50), nullable=False)
     data_inicio = Column(DateTime)
     data_proxima_cobranca = Column(DateTime)
@@ -32,13 +77,66 @@ class Assinatura(Base):
     valor_mensal = Column(Numeric(10, 2))
     valor_anual = Column(Numeric(10, 2))
     ultima_atualizacao = Column(DateTime)
+    # Calculados pelo banco a cada escrita (migração f2a6c8d4b931): os handlers já
+    # gravam só valor_anual ou só valor_mensal conforme identificar_tipo_plano_*
+    tipo_plano = Column(String(20), Computed(
+        "CASE WHEN valor_anual IS NOT NULL THEN 'anual' "
+        "WHEN valor_mensal IS NOT NULL THEN 'mensal' ELSE 'desconhecido' END", persisted=True
+    ), nullable=False)
+    mrr_contribuicao = Column(Numeric(12, 4), Computed(
+        "CASE WHEN valor_anual IS NOT NULL THEN valor_anual / 12 ELSE valor_mensal END", persisted=True
+    ))
 
     cliente = relationship('Cliente', back_populates='assinaturas')
     transacoes = relationship('Transacao', back_populates='assinatura')
 
+    __table_args__ = (
+        # Índices das consultas de métricas (migração b7d4e2a9c315)
+        Index('ix_assinaturas_data_inicio', 'data_inicio'),
+        Index('ix_assinaturas_validas_expiracao', 'data_expiracao_acesso',
+              postgresql_include=['plataforma', 'data_inicio', 'valor_mensal', 'valor_anual'],
+              postgresql_where=text("status NOT IN ('refunded', 'chargeback')")),
+        Index('ix_assinaturas_canceladas_atualizacao', 'ultima_atualizacao',
+              postgresql_include=['plataforma', 'data_inicio'],
+              postgresql_where=text("status IN ('canceled', 'subscription_canceled')")),
+        Index('ix_assinaturas_data_cancelamento', 'data_cancelamento',
+              postgresql_where=text('data_cancelamento IS NOT NULL')),
+        # MRR/ARR por tipo de plano (migração f2a6c8d4b931)
+        Index('ix_assinaturas_validas_tipo_plano', 'tipo_plano', 'data_expiracao_acesso',
+              postgresql_include=['plataforma', 'mrr_contribuicao'],
+              postgresql_where=text("status NOT IN ('refunded', 'chargeback')")),
+    )
+
+# Ids de transação: alocados em transacoes_chaves e reaproveitados na linha de transacoes
+SEQUENCIA_TRANSACOES = Sequence('transacoes_id_seq')
+
+class ChaveTransacao(Base):
+    """
+    Chave natural (id_transacao_origem, produto_nome) -> id de cada transação.
+    transacoes é particionada por data_transacao, que muda entre eventos da
+    mesma transação (PIX gerado -> pago, reembolso); a unicidade da chave e a
+    alocação do id ficam nesta tabela não particionada, onde os upserts fazem
+    o ON CONFLICT e travam a chave.
+    """
+    __tablename__ = 'transacoes_chaves'
+    transacao_id = Column(Integer, SEQUENCIA_TRANSACOES, primary_key=True, server_default=SEQUENCIA_TRANSACOES.next_value())
+    id_transacao_origem = Column(String(255), nullable=False)
+    produto_nome = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        # Chave natural dos upserts (order bumps/upsells compartilham o id_transacao_origem)
+        Index('uq_transacoes_chaves_origem_produto', 'id_transacao_origem', 'produto_nome',
+              unique=True, postgresql_nulls_not_distinct=True),
+    )
+
 class Transacao(Base):
+    """
+    Particionada por mês de data_transacao (RANGE): consultas por período leem
+    só as partições do intervalo. Partições futuras são criadas por
+    services/particoes.py; datas fora delas caem em transacoes_padrao.
+    """
     __tablename__ = 'transacoes'
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=False)
     id_transacao_origem = Column(String(255), unique=False, nullable=False)
     assinatura_id = Column(Integer, ForeignKey('assinaturas.id'), nullable=True)
     cliente_id = Column(Integer, ForeignKey('clientes.id'), nullable=False)
@@ -49,12 +147,191 @@ class Transacao(Base):
     valor_bruto = Column(Numeric(10, 2))
     taxa_reembolso = Column(Numeric(10, 2))
     metodo_pagamento = Column(String(50))
-    data_transacao = Column(DateTime, nullable=False)
+    # Chave de partição: faz parte da chave primária
+    data_transacao = Column(DateTime, primary_key=True, nullable=False)
     motivo_recusa = Column(Text)
-    json_completo = Column(JSONB)
     tipo_recusa = Column(String(50), nullable=True)  # Novo campo para classificar recusas
     produto_nome = Column(String(255), nullable=True)  # Novo campo para identificar o produto (product_id)
     nome_oferta = Column(String(255), nullable=True)  # Novo campo para identificar a oferta específica
+    produto_id = Column(SmallInteger, ForeignKey('produtos.id'), nullable=True)
+    oferta_id = Column(SmallInteger, ForeignKey('ofertas.id'), nullable=True)
+    # Gravado pelos handlers (services.catalogo.tipo_plano_transacao); mrr_contribuicao é calculado pelo banco
+    tipo_plano = Column(String(20), nullable=False, server_default='desconhecido')
+    mrr_contribuicao = Column(Numeric(12, 4), Computed(
+        "CASE tipo_plano WHEN 'anual' THEN valor_liquido / 12 WHEN 'mensal' THEN valor_liquido ELSE 0 END", persisted=True
+    ))
 
     assinatura = relationship('Assinatura', back_populates='transacoes')
-    cliente = relationship('Cliente', back_populates='transacoes') 
\ No newline at end of file
+    cliente = relationship('Cliente', back_populates='transacoes')
+    payloads = relationship(
+        'PayloadTransacao',
+        primaryjoin='Transacao.id == foreign(PayloadTransacao.transacao_id)',
+        order_by='PayloadTransacao.id',
+        viewonly=True,
+    )
+
+    __table_args__ = (
+        # Índices das consultas de métricas (migração b7d4e2a9c315), criados em cada partição
+        Index('ix_transacoes_aprovadas_data', 'data_transacao',
+              postgresql_include=['plataforma', 'status', 'valor', 'valor_liquido', 'valor_bruto'],
+              postgresql_where=text("status IN ('approved', 'paid', 'authorized')")),
+        Index('ix_transacoes_data', 'data_transacao'),
+        Index('ix_transacoes_assinatura', 'assinatura_id'),
+        {'postgresql_partition_by': 'RANGE (data_transacao)'},
+    )
+
+class PayloadTransacao(Base):
+    """
+    Arquivo append-only dos payloads brutos que originaram ou alteraram cada transação.
+    Fica fora de transacoes para que as consultas de métricas leiam uma tabela estreita;
+    a coluna payload é comprimida pelo TOAST (lz4) e linhas nunca são atualizadas.
+    """
+    __tablename__ = 'payloads_transacoes'
+    id = Column(BigInteger, primary_key=True)
+    # FK para a chave (transacoes particionada não tem id único sozinho)
+    transacao_id = Column(Integer, ForeignKey('transacoes_chaves.transacao_id', ondelete='CASCADE'), nullable=False)
+    plataforma = Column(String(50), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    recebido_em = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    transacao = relationship(
+        'Transacao',
+        primaryjoin='foreign(PayloadTransacao.transacao_id) == Transacao.id',
+        viewonly=True,
+    )
+
+    __table_args__ = (
+        Index('ix_payloads_transacoes_transacao', 'transacao_id', 'id'),
+    )
+
+class ResumoDiarioTransacoes(Base):
+    """
+    Totais diários de transacoes por (dia, plataforma, produto_nome, tipo_plano,
+    classe_status). O trigger resumo_transacoes grava deltas na mesma transação
+    da escrita, consolidados aqui periodicamente (migrações e9b4d7c2a615 e
+    c8e3f1a5d207); as métricas por período leem O(dias) linhas em vez de
+    O(transações), pela view resumo_diario_transacoes_atual.
+    """
+    __tablename__ = 'resumo_diario_transacoes'
+    id = Column(BigInteger, primary_key=True)
+    dia = Column(Date, nullable=False)
+    plataforma = Column(String(50), nullable=False)
+    produto_nome = Column(String(255), nullable=True)
+    tipo_plano = Column(String(20), nullable=False)  # mensal, anual, desconhecido (pela assinatura)
+    classe_status = Column(String(20), nullable=False)  # aprovada, reembolsada, recusada, pendente, outra
+    quantidade = Column(Integer, nullable=False, server_default='0')  # Todas as transações
+    vendas = Column(Integer, nullable=False, server_default='0')  # Transações com valor_bruto > 0
+    valor_bruto = Column(Numeric(14, 2), nullable=False, server_default='0')  # Soma dos valor_bruto > 0
+    valor_liquido = Column(Numeric(14, 2), nullable=False, server_default='0')  # Soma dos valor_liquido > 0
+    taxa_reembolso = Column(Numeric(14, 2), nullable=False, server_default='0')
+
+    __table_args__ = (
+        Index('uq_resumo_diario_transacoes_chave', 'dia', 'plataforma', 'produto_nome', 'tipo_plano', 'classe_status',
+              unique=True, postgresql_nulls_not_distinct=True),
+    )
+
+class ResumoDiarioAlunos(Base):
+    """
+    Alunos (assinaturas válidas com ao menos uma transação aprovada com
+    valor_bruto > 0) por dia de data_inicio, plataforma e tipo_plano.
+    """
+    __tablename__ = 'resumo_diario_alunos'
+    dia = Column(Date, primary_key=True)
+    plataforma = Column(String(50), primary_key=True)
+    tipo_plano = Column(String(20), primary_key=True)
+    alunos = Column(Integer, nullable=False, server_default='0')
+
+# Deltas gravados pelos triggers dos resumos (migração c8e3f1a5d207): só INSERT, sem
+# chave única, para que webhooks do mesmo dia/produto não disputem uma linha.
+# services/resumos.consolidar_resumos os soma nos resumos; as views
+# resumo_diario_*_atual somam resumos + deltas pendentes para as leituras.
+resumo_transacoes_delta = Table(
+    'resumo_transacoes_delta', Base.metadata,
+    Column('dia', Date, nullable=False),
+    Column('plataforma', String(50), nullable=False),
+    Column('produto_nome', String(255), nullable=True),
+    Column('tipo_plano', String(20), nullable=False),
+    Column('classe_status', String(20), nullable=False),
+    Column('quantidade', Integer, nullable=False),
+    Column('vendas', Integer, nullable=False),
+    Column('valor_bruto', Numeric(14, 2), nullable=False),
+    Column('valor_liquido', Numeric(14, 2), nullable=False),
+    Column('taxa_reembolso', Numeric(14, 2), nullable=False),
+    Index('ix_resumo_transacoes_delta_dia', 'dia'),
+)
+
+resumo_alunos_delta = Table(
+    'resumo_alunos_delta', Base.metadata,
+    Column('dia', Date, nullable=False),
+    Column('plataforma', String(50), nullable=False),
+    Column('tipo_plano', String(20), nullable=False),
+    Column('alunos', Integer, nullable=False),
+    Index('ix_resumo_alunos_delta_dia', 'dia'),
+)
+
+class AlunoContado(Base):
+    """Onde cada assinatura está contada em resumo_diario_alunos (para descontá-la depois)"""
+    __tablename__ = 'resumo_alunos_contados'
+    assinatura_id = Column(Integer, ForeignKey('assinaturas.id', ondelete='CASCADE'), primary_key=True)
+    dia = Column(Date, nullable=False)
+    plataforma = Column(String(50), nullable=False)
+    tipo_plano = Column(String(20), nullable=False)
+
+    __table_args__ = (
+        Index('ix_resumo_alunos_contados_dia', 'dia'),
+    )
+
+class WebhookInbox(Base):
+    """Inbox durável de webhooks recebidos, drenada pelos workers de ingestão"""
+    __tablename__ = 'webhook_inbox'
+    id = Column(BigInteger, primary_key=True)
+    plataforma = Column(String(50), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    status = Column(String(20), nullable=False, default='pendente')  # pendente, processando, processado, erro
+    tentativas = Column(Integer, nullable=False, default=0)
+    resultado_status = Column(String(50), nullable=True)  # Status retornado pelo handler
+    erro = Column(Text, nullable=True)
+    recebido_em = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    iniciado_em = Column(DateTime(timezone=True), nullable=True)
+    processado_em = Column(DateTime(timezone=True), nullable=True)
+    raia = Column(Integer, nullable=True)  # Raia de ordenação da entidade (NULL = sem ordenação)
+
+    __table_args__ = (
+        Index('ix_webhook_inbox_pendentes', 'id', postgresql_where=(status == 'pendente')),
+        Index('ix_webhook_inbox_status', 'status'),
+        # Cabeça de cada raia (evento ativo mais antigo) na reserva ordenada
+        Index('ix_webhook_inbox_raia_ativos', 'raia', 'id', postgresql_where=status.in_(['pendente', 'processando'])),
+    )
+
+class WebhookDeadLetter(Base):
+    """Webhooks cujo processamento falhou, reprocessados com backoff exponencial"""
+    __tablename__ = 'webhook_dead_letter'
+    id = Column(BigInteger, primary_key=True)
+    plataforma = Column(String(50), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    status = Column(String(20), nullable=False, default='pendente')  # pendente, reprocessando, resolvido, esgotado
+    tentativas = Column(Integer, nullable=False, default=0)
+    erro = Column(Text, nullable=True)  # Erro da última tentativa
+    evento_id = Column(String(64), nullable=True)  # evento_id dos logs da falha original
+    resultado_status = Column(String(50), nullable=True)
+    criado_em = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    atualizado_em = Column(DateTime(timezone=True), nullable=True)
+    proxima_tentativa_em = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index('ix_webhook_dead_letter_vencidos', 'proxima_tentativa_em', postgresql_where=(status == 'pendente')),
+        Index('ix_webhook_dead_letter_status', 'status'),
+    )
+
+class WebhookEventoProcessado(Base):
+    """Fingerprints de webhooks já processados (idempotência de reentregas)"""
+    __tablename__ = 'webhook_eventos_processados'
+    fingerprint = Column(String(64), primary_key=True)  # sha256 hex
+    plataforma = Column(String(50), nullable=False)
+    resultado_status = Column(String(50), nullable=True)
+    processado_em = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    expira_em = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index('ix_webhook_eventos_processados_expira_em', 'expira_em'),
+    )
@@ -0,0 +1,404 @@
+"""
+Upserts (INSERT ... ON CONFLICT) das entidades canônicas
+Cada função executa um único statement na sessão recebida e NÃO faz commit:
+o commit é responsabilidade da unidade de trabalho do evento (unit_of_work).
+
+O payload bruto de uma transação (chave "json_completo" dos dicts de valores)
+não é gravado em transacoes: ele é anexado ao arquivo payloads_transacoes,
+na mesma transação do upsert, quando a linha é criada ou alterada.
+
+transacoes é particionada por data_transacao, que muda entre eventos da mesma
+transação: o ON CONFLICT das transações é feito em transacoes_chaves (chave
+natural -> id) e a linha é gravada com INSERT (chave nova) ou UPDATE pelo id
+(chave existente; o UPDATE move a linha de partição se o mês mudar).
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, case, cast, column, func, literal_column, or_, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+
+from database.models import Cliente, Assinatura, Transacao, ChaveTransacao, PayloadTransacao
+
+# Chave natural das transações (índice único uq_transacoes_chaves_origem_produto)
+CHAVE_TRANSACAO = [ChaveTransacao.id_transacao_origem, ChaveTransacao.produto_nome]
+
+# Colunas de transacoes gravadas pelos upserts (o id vem de transacoes_chaves;
+# colunas calculadas, como mrr_contribuicao, são preenchidas pelo banco)
+COLUNAS_TRANSACAO = [
+    coluna.name for coluna in Transacao.__table__.columns
+    if coluna.name != "id" and coluna.computed is None
+]
+
+# Valores das colunas NOT NULL que nem todo evento informa
+_PADROES_TRANSACAO = {"tipo_plano": "desconhecido"}
+
+# xmax = 0 identifica linha recém-inserida no RETURNING de um upsert
+_INSERIDO = literal_column("(xmax = 0)").label("inserido")
+
+# Chave em session.info: quando presente, assinaturas existentes não são
+# alteradas (re-projeção: o arquivo só guarda payloads de transações, então
+# os eventos de assinatura posteriores a elas não seriam reaplicados)
+CHAVE_ASSINATURAS_SOMENTE_LEITURA = "assinaturas_somente_leitura"
+
+
+def upsert_cliente(session, nome, email, documento, data_criacao) -> int:
+    """
+    Insere o cliente se o email ainda não existe e retorna o id.
+    Clientes existentes não são alterados (mesmo comportamento do get_or_create).
+    """
+    stmt = (
+        insert(Cliente)
+        .values(nome=nome, email=email, documento=documento, data_criacao=data_criacao)
+        .on_conflict_do_nothing(index_elements=[Cliente.email])
+        .returning(Cliente.id)
+    )
+    cliente_id = session.execute(stmt).scalar()
+    if cliente_id is None:
+        cliente_id = session.execute(select(Cliente.id).where(Cliente.email == email)).scalar_one()
+    return cliente_id
+
+
+def upsert_assinatura(session, **valores) -> Tuple[int, str]:
+    """
+    Insere ou atualiza a assinatura pela chave id_assinatura_origem.
+    Webhooks com ultima_atualizacao anterior à gravada não sobrescrevem a linha.
+    Retorna (assinatura_id, acao) com acao em "criada", "atualizada", "ignorada"
+    ou "mantida" (sessão com CHAVE_ASSINATURAS_SOMENTE_LEITURA).
+    """
+    if session.info.get(CHAVE_ASSINATURAS_SOMENTE_LEITURA):
+        assinatura_id = session.execute(
+            select(Assinatura.id).where(Assinatura.id_assinatura_origem == valores["id_assinatura_origem"])
+        ).scalar()
+        if assinatura_id is not None:
+            return assinatura_id, "mantida"
+    stmt = insert(Assinatura).values(**valores)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Assinatura.id_assinatura_origem],
+        set_={
+            "plataforma": excluded.plataforma,
+            "cliente_id": excluded.cliente_id,
+            "produto_nome": excluded.produto_nome,
+            "nome_oferta": excluded.nome_oferta,
+            # Eventos sem produto/oferta identificados mantêm os ids gravados
+            "produto_id": func.coalesce(excluded.produto_id, Assinatura.produto_id),
+            "oferta_id": func.coalesce(excluded.oferta_id, Assinatura.oferta_id),
+            "status": excluded.status,
+            # data_inicio NÃO é atualizada em updates
+            "data_proxima_cobranca": excluded.data_proxima_cobranca,
+            # Voltou a ficar ativa: limpa; ficou inativa sem data: preenche; caso contrário mantém
+            "data_cancelamento": case(
+                (excluded.status.in_(["active", "uncanceled"]), None),
+                (Assinatura.data_cancelamento.is_(None),
+                 func.coalesce(excluded.data_cancelamento, excluded.ultima_atualizacao)),
+                else_=Assinatura.data_cancelamento,
+            ),
+            "data_expiracao_acesso": excluded.data_expiracao_acesso,
+            "valor_mensal": excluded.valor_mensal,
+            "valor_anual": excluded.valor_anual,
+            "ultima_atualizacao": excluded.ultima_atualizacao,
+        },
+        where=or_(
+            Assinatura.ultima_atualizacao.is_(None),
+            excluded.ultima_atualizacao.is_(None),
+            excluded.ultima_atualizacao >= Assinatura.ultima_atualizacao,
+        ),
+    ).returning(Assinatura.id, _INSERIDO)
+
+    linha = session.execute(stmt).first()
+    if linha is not None:
+        return linha.id, "criada" if linha.inserido else "atualizada"
+
+    # Conflito filtrado pelo WHERE: webhook mais antigo que os dados gravados
+    assinatura_id = session.execute(
+        select(Assinatura.id).where(Assinatura.id_assinatura_origem == valores["id_assinatura_origem"])
+    ).scalar_one()
+    return assinatura_id, "ignorada"
+
+
+def guarda_data_transacao(excluded):
+    """
+    Condição do upsert de transações: só atualiza se o evento não for
+    anterior à data já gravada.
+    """
+    return or_(
+        Transacao.data_transacao.is_(None),
+        excluded.data_transacao.is_(None),
+        excluded.data_transacao >= Transacao.data_transacao,
+    )
+
+
+# Perfis de atualização de transações: (SET do ON CONFLICT, condição WHERE).
+# Nomeados para que upserts de eventos diferentes possam ser agrupados em um
+# único INSERT multi-linha pelo escritor em lote (services/bulk_writer.py).
+
+def _set_vincular(excluded):
+    # Apenas vincula a assinatura quando a linha existente ainda não tem uma
+    return {"assinatura_id": func.coalesce(Transacao.assinatura_id, excluded.assinatura_id)}
+
+
+def _set_guru(excluded):
+    status_mudou = Transacao.status.is_distinct_from(excluded.status)
+    return {
+        "status": excluded.status,
+        "taxa_reembolso": func.coalesce(excluded.taxa_reembolso, Transacao.taxa_reembolso),
+        # Atualiza motivo_recusa se status mudou para refunded ou se ainda não havia motivo
+        "motivo_recusa": case(
+            (status_mudou & (excluded.status == "refunded"), excluded.motivo_recusa),
+            (excluded.motivo_recusa.is_not(None) & Transacao.motivo_recusa.is_(None), excluded.motivo_recusa),
+            else_=Transacao.motivo_recusa
+        ),
+        "valor_liquido": excluded.valor_liquido,
+        "valor_bruto": excluded.valor_bruto,
+        "data_transacao": excluded.data_transacao,
+    }
+
+
+def _condicao_guru(excluded):
+    # Atualiza se o status mudou OU se há taxa de reembolso,
+    # e somente se o webhook não for anterior aos dados existentes
+    return guarda_data_transacao(excluded) & (
+        Transacao.status.is_distinct_from(excluded.status) | excluded.taxa_reembolso.is_not(None)
+    )
+
+
+def _set_ticto(excluded):
+    # Atualiza status e campos relevantes (o payload é anexado ao arquivo)
+    return {
+        "status": excluded.status,
+        "valor": excluded.valor,
+        "valor_bruto": excluded.valor_bruto,
+        "valor_liquido": excluded.valor_liquido,
+        "metodo_pagamento": excluded.metodo_pagamento,
+        "data_transacao": excluded.data_transacao,
+        "tipo_recusa": excluded.tipo_recusa,
+        # Atualiza nome_oferta se disponível
+        "nome_oferta": func.coalesce(excluded.nome_oferta, Transacao.nome_oferta),
+        "oferta_id": func.coalesce(excluded.oferta_id, Transacao.oferta_id),
+    }
+
+
+def _set_especial_ticto(excluded):
+    return {
+        "status": excluded.status,
+        "valor": excluded.valor,
+        "valor_bruto": excluded.valor_bruto,
+        "valor_liquido": excluded.valor_liquido,
+        "metodo_pagamento": excluded.metodo_pagamento,
+        "data_transacao": excluded.data_transacao,
+    }
+
+
+def _set_pagamento_ticto(excluded):
+    # PIX/boleto: atualiza apenas status e data
+    return {"status": excluded.status, "data_transacao": excluded.data_transacao}
+
+
+PERFIS_TRANSACAO: Dict[str, Tuple[Callable, Optional[Callable]]] = {
+    "vincular": (_set_vincular, None),
+    "guru": (_set_guru, _condicao_guru),
+    "ticto": (_set_ticto, guarda_data_transacao),
+    "especial_ticto": (_set_especial_ticto, None),
+    "pagamento_ticto": (_set_pagamento_ticto, guarda_data_transacao),
+}
+
+# Chave em session.info: quando presente, upsert_transacao adia a gravação
+# para o escritor em lote em vez de executá-la na sessão
+CHAVE_ADIADAS = "transacoes_adiadas"
+
+# Chave em session.info: quando presente, os payloads não são anexados ao
+# arquivo (re-projeção, que relê o próprio arquivo)
+CHAVE_SEM_ARQUIVO = "sem_arquivo_payloads"
+
+# Campo dos dicts de valores com o payload bruto da transação
+CAMPO_PAYLOAD = "json_completo"
+
+
+def _arquiva_payload(perfil: str, acao: str) -> bool:
+    # "vincular" em linha existente só liga a assinatura: o payload já foi arquivado
+    return acao == "criada" or (acao == "atualizada" and perfil != "vincular")
+
+
+def arquivar_payloads(session, payloads: List[Tuple[int, str, Any]]):
+    """
+    Anexa (transacao_id, plataforma, payload) ao arquivo de payloads brutos.
+    O arquivo é append-only: cada evento que cria ou altera uma transação vira uma linha.
+    """
+    if not payloads or session.info.get(CHAVE_SEM_ARQUIVO):
+        return
+    session.execute(
+        insert(PayloadTransacao),
+        [
+            {"transacao_id": transacao_id, "plataforma": plataforma, "payload": payload}
+            for transacao_id, plataforma, payload in payloads
+        ],
+    )
+
+
+def _valor_transacao(linha: Dict[str, Any], nome: str):
+    valor = linha.get(nome)
+    return _PADROES_TRANSACAO.get(nome) if valor is None else valor
+
+
+class _Propostos:
+    """
+    Valores propostos por evento no UPDATE ... FROM (VALUES ...) AS excluded:
+    expõe cada coluna como excluded.<coluna> com o tipo de transacoes, como o
+    "excluded" de um ON CONFLICT (os perfis de atualização servem aos dois).
+    """
+
+    def __init__(self, linhas: List[Dict[str, Any]]):
+        tabela = Transacao.__table__.c
+        self._valores = values(
+            column("transacao_id", Integer),
+            *[column(nome, tabela[nome].type) for nome in COLUNAS_TRANSACAO],
+            name="excluded",
+        ).data([
+            (linha["transacao_id"], *[_valor_transacao(linha, nome) for nome in COLUNAS_TRANSACAO])
+            for linha in linhas
+        ])
+        self.transacao_id = self._valores.c.transacao_id
+        self._tipos = {nome: tabela[nome].type for nome in COLUNAS_TRANSACAO}
+
+    def __getattr__(self, nome):
+        # Colunas só com NULL chegariam como text: o CAST mantém o tipo da coluna
+        return cast(self._valores.c[nome], self._tipos[nome])
+
+
+def _stmt_reservar_chaves(chaves: List[Dict[str, Any]]):
+    """
+    Insere as chaves novas e devolve o id de todas (novas e existentes).
+    O DO UPDATE sem alteração trava a chave: eventos concorrentes da mesma
+    transação esperam o commit deste, como no ON CONFLICT da tabela única.
+    """
+    stmt = insert(ChaveTransacao).values(chaves)
+    return stmt.on_conflict_do_update(
+        index_elements=CHAVE_TRANSACAO,
+        set_={"id_transacao_origem": stmt.excluded.id_transacao_origem},
+    ).returning(ChaveTransacao.transacao_id, ChaveTransacao.id_transacao_origem, ChaveTransacao.produto_nome, _INSERIDO)
+
+
+def _stmt_atualizar_transacoes(linhas: List[Dict[str, Any]], perfil: str):
+    atualizar, condicao = PERFIS_TRANSACAO[perfil]
+    excluded = _Propostos(linhas)
+    stmt = update(Transacao).where(Transacao.id == excluded.transacao_id).values(atualizar(excluded))
+    if condicao is not None:
+        stmt = stmt.where(condicao(excluded))
+    return stmt.returning(Transacao.id)
+
+
+def _gravar_grupo(session, linhas: List[Dict[str, Any]], perfil: str) -> Dict[tuple, Tuple[int, bool]]:
+    """
+    Grava linhas do mesmo perfil (chaves distintas) com até três statements:
+    reserva das chaves, INSERT das transações novas e UPDATE das existentes.
+    Retorna {(id_transacao_origem, produto_nome): (transacao_id, inserida)}
+    apenas para as linhas criadas ou alteradas.
+    """
+    chaves = {
+        (chave.id_transacao_origem, chave.produto_nome): chave
+        for chave in session.execute(_stmt_reservar_chaves([
+            {"id_transacao_origem": linha["id_transacao_origem"], "produto_nome": linha.get("produto_nome")}
+            for linha in linhas
+        ]))
+    }
+    novas, existentes = [], []
+    for linha in linhas:
+        chave = chaves[(linha["id_transacao_origem"], linha.get("produto_nome"))]
+        (novas if chave.inserido else existentes).append(dict(linha, transacao_id=chave.transacao_id))
+
+    gravadas = set()
+    if novas:
+        session.execute(insert(Transacao), [
+            {"id": linha["transacao_id"], **{nome: _valor_transacao(linha, nome) for nome in COLUNAS_TRANSACAO}}
+            for linha in novas
+        ])
+        gravadas.update(linha["transacao_id"] for linha in novas)
+    if existentes:
+        gravadas.update(session.execute(_stmt_atualizar_transacoes(existentes, perfil)).scalars())
+
+    return {
+        chave: (linha_chave.transacao_id, linha_chave.inserido)
+        for chave, linha_chave in chaves.items()
+        if linha_chave.transacao_id in gravadas
+    }
+
+
+def upsert_transacao(session, valores: Dict[str, Any], perfil: str = "vincular") -> Tuple[Optional[int], str]:
+    """
+    Insere ou atualiza a transação pela chave (id_transacao_origem, produto_nome)
+    usando o perfil de atualização `perfil` (ver PERFIS_TRANSACAO).
+
+    Retorna (transacao_id, acao) com acao em "criada", "atualizada" ou
+    "sem_alteracao" (conflito filtrado pela condição; transacao_id é None).
+    Se a sessão estiver em modo lote, retorna (None, "adiada").
+    """
+    adiadas = session.info.get(CHAVE_ADIADAS)
+    if adiadas is not None:
+        adiadas.append((valores, perfil))
+        return None, "adiada"
+    payload = valores.get(CAMPO_PAYLOAD)
+    gravada = _gravar_grupo(session, [valores], perfil).get((valores["id_transacao_origem"], valores.get("produto_nome")))
+    if gravada is None:
+        return None, "sem_alteracao"
+    transacao_id, inserida = gravada
+    acao = "criada" if inserida else "atualizada"
+    if payload is not None and _arquiva_payload(perfil, acao):
+        arquivar_payloads(session, [(transacao_id, valores["plataforma"], payload)])
+    return transacao_id, acao
+
+
+def upsert_transacoes_em_lote(session, itens: List[Tuple[Dict[str, Any], str]]) -> List[Tuple[Optional[int], str]]:
+    """
+    Grava vários upserts de transação com o menor número de INSERTs multi-linha.
+
+    Itens do mesmo perfil são agrupados nos mesmos statements. Como um ON CONFLICT
+    não pode afetar a mesma linha duas vezes, uma chave repetida vai para um
+    grupo posterior, preservando a ordem de envio por chave.
+    Retorna (transacao_id, acao) na mesma ordem de `itens`.
+    """
+    grupos: List[Tuple[str, list]] = []  # (perfil, [(posicao, valores)])
+    ultimo_grupo_da_chave: Dict[tuple, int] = {}
+    for posicao, (valores, perfil) in enumerate(itens):
+        chave = (valores["id_transacao_origem"], valores.get("produto_nome"))
+        inicio = ultimo_grupo_da_chave.get(chave, -1) + 1
+        destino = next(
+            (g for g in range(inicio, len(grupos)) if grupos[g][0] == perfil),
+            None,
+        )
+        if destino is None:
+            grupos.append((perfil, []))
+            destino = len(grupos) - 1
+        grupos[destino][1].append((posicao, valores))
+        ultimo_grupo_da_chave[chave] = destino
+
+    resultados: List[Tuple[Optional[int], str]] = [(None, "sem_alteracao")] * len(itens)
+    payloads = []
+    for perfil, membros in grupos:
+        gravadas = _gravar_grupo(session, [valores for _, valores in membros], perfil)
+        for posicao, valores in membros:
+            gravada = gravadas.get((valores["id_transacao_origem"], valores.get("produto_nome")))
+            if gravada is not None:
+                transacao_id, inserida = gravada
+                acao = "criada" if inserida else "atualizada"
+                resultados[posicao] = (transacao_id, acao)
+                if valores.get(CAMPO_PAYLOAD) is not None and _arquiva_payload(perfil, acao):
+                    payloads.append((posicao, transacao_id, valores["plataforma"], valores[CAMPO_PAYLOAD]))
+    # Anexados na ordem de envio (a mesma dos eventos)
+    arquivar_payloads(session, [payload[1:] for payload in sorted(payloads, key=lambda payload: payload[0])])
+    return resultados
+
+
+def buscar_transacao(session, id_transacao_origem, produto_nome):
+    """
+    Retorna (id, data_transacao) da transação pela chave natural, ou None.
+    Usado apenas para classificar upserts que não alteraram a linha.
+    """
+    return session.execute(
+        select(Transacao.id, Transacao.data_transacao)
+        .join(ChaveTransacao, ChaveTransacao.transacao_id == Transacao.id)
+        .where(
+            ChaveTransacao.id_transacao_origem == id_transacao_origem,
+            ChaveTransacao.produto_nome.is_not_distinct_from(produto_nome),
+        )
+    ).first()
@@ -4,18 +4,32 @@ Aplicação Principal - Dashboard Comu
 ===================================
 
 Servidor principal que executa tanto a API FastAPI quanto o Dashboard Dash.
+
+Modos:
+    python -m src.main             # API + dashboard no mesmo processo (desenvolvimento)
+    python -m src.main api         # API sob uvicorn com API_WORKERS workers
+    python -m src.main dashboard   # dashboard sob gunicorn (dashboard/gunicorn_conf.py)
+
+Em produção API e dashboard rodam em processos separados: uma consulta lenta
+do dashboard não atrasa a resposta aos webhooks.
 """
 
+import argparse
 import asyncio
+import os
 import threading
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
 # Importa a API de webhooks
-from Api.webhooks import app as webhook_app
+from Api.webhooks import app as webhook_app, iniciar_servicos_ingestao, parar_servicos_ingestao
 from Api.auth_routes import auth_router
+from utils.metricas_prometheus import resposta_metricas
+from utils.servidor_config import servidor_config
+from database.connection import verificar_banco
 
 # Setup de logging
 logging.basicConfig(level=logging.INFO)
@@ -44,9 +58,34 @@ def create_main_app():
     # Monta a API de webhooks
     main_app.mount("/api", webhook_app)
     
+    # Sub-aplicações montadas não recebem eventos de ciclo de vida:
+    # os workers de ingestão são controlados pela aplicação principal
+    main_app.add_event_handler("startup", iniciar_servicos_ingestao)
+    main_app.add_event_handler("shutdown", parar_servicos_ingestao)
+    
     # Inclui rotas de autenticação
     main_app.include_router(auth_router)
     
+    # Métricas Prometheus do processo (webhooks, SQL por handler, filas, caches)
+    @main_app.get("/metrics", include_in_schema=False)
+    def metrics():
+        corpo, content_type = resposta_metricas()
+        return Response(content=corpo, headers={"Content-Type": content_type})
+    
+    # Liveness: o worker está respondendo (não toca o banco)
+    @main_app.get("/health", include_in_schema=False)
+    def health():
+        return {"status": "ok", "processo": "api", "pid": os.getpid()}
+    
+    # Readiness: o banco responde; fora do ar, o balanceador tira o worker de rotação
+    @main_app.get("/health/ready", include_in_schema=False)
+    def health_ready():
+        banco = verificar_banco()
+        return JSONResponse(
+            status_code=200 if banco else 503,
+            content={"status": "ok" if banco else "indisponivel", "processo": "api", "banco": banco},
+        )
+    
     # Endpoint de saúde principal
     @main_app.get("/")
     def root():
@@ -56,6 +95,7 @@ def create_main_app():
             "endpoints": {
                 "api": "/api",
                 "health": "/api/health",
+                "metrics": "/metrics",
                 "dashboard": "http://localhost:8052"
             }
         }
@@ -101,9 +141,42 @@ def start_api_server():
         log_level="info"
     )
 
-def main():
+def start_api_workers():
     """
-    Função principal que inicia tanto API quanto Dashboard.
+    Inicia a API sob uvicorn com vários workers (modo "api").
+    Cada worker cria a aplicação pela factory; no SIGTERM as requisições em
+    andamento têm GRACEFUL_TIMEOUT segundos para terminar e o shutdown de cada
+    worker esvazia o bulk writer e o executor de ingestão.
+    """
+    servidor_config.preparar_metricas("api")
+    logger.info(
+        f"🚀 Iniciando API FastAPI com {servidor_config.API_WORKERS} workers "
+        f"em {servidor_config.API_HOST}:{servidor_config.API_PORT}"
+    )
+    uvicorn.run(
+        "main:create_main_app",
+        factory=True,
+        host=servidor_config.API_HOST,
+        port=servidor_config.API_PORT,
+        workers=servidor_config.API_WORKERS,
+        timeout_graceful_shutdown=servidor_config.GRACEFUL_TIMEOUT,
+        log_level="info"
+    )
+
+def start_dashboard_workers():
+    """
+    Substitui o processo atual pelo gunicorn do dashboard (modo "dashboard").
+    """
+    configuracao = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard", "gunicorn_conf.py")
+    logger.info(
+        f"🚀 Iniciando Dashboard com {servidor_config.DASHBOARD_WORKERS} workers "
+        f"em {servidor_config.DASHBOARD_HOST}:{servidor_config.DASHBOARD_PORT}"
+    )
+    os.execvp("gunicorn", ["gunicorn", "-c", configuracao])
+
+def start_tudo():
+    """
+    Inicia API e Dashboard no mesmo processo (desenvolvimento).
     """
     logger.info("🚀 Iniciando Dashboard Comu - Sistema Completo")
     logger.info("=" * 60)
@@ -119,5 +192,23 @@ def main():
     # Inicia API no thread principal
     start_api_server()
 
+def main():
+    """
+    Função principal: escolhe o modo de execução.
+    """
+    parser = argparse.ArgumentParser(description="Dashboard Comu - API e Dashboard")
+    parser.add_argument(
+        "modo", nargs="?", default="tudo", choices=["tudo", "api", "dashboard"],
+        help="tudo: API e dashboard no mesmo processo; api/dashboard: processo separado com workers"
+    )
+    args = parser.parse_args()
+    
+    if args.modo == "api":
+        start_api_workers()
+    elif args.modo == "dashboard":
+        start_dashboard_workers()
+    else:
+        start_tudo()
+
 if __name__ == "__main__":
     main()
@@ -114,21 +114,19 @@ class GuruBackfill:
                 
                 if result.get("status") == "processado_guru_assinatura_hibrido":
                     self.stats["subscriptions_created"] += 1
-                    print(f"✅ Assinatura {subscription_id} processada com sucesso")
+                    self.logger.info(f"✅ Assinatura {subscription_id} processada com sucesso")
                 else:
                     self.stats["subscriptions_updated"] += 1
-                    print(f"🔄 Assinatura {subscription_id} atualizada")
+                    self.logger.info(f"🔄 Assinatura {subscription_id} atualizada")
                 
                 self.stats["subscriptions_processed"] += 1
             else:
-                print(f"⚠️ Assinatura {subscription_id} sem dados enriquecidos")
+                self.logger.warning(f"⚠️ Assinatura {subscription_id} sem dados enriquecidos")
                 
         except Exception as e:
             self.stats["errors"] += 1
-            print(f"❌ Erro ao processar assinatura {subscription_id}: {e}")
-            # Log detalhado do erro mas não para o backfill
-            import traceback
-            traceback.print_exc()
+            # Log detalhado do erro (com traceback) mas não para o backfill
+            self.logger.exception(f"❌ Erro ao processar assinatura {subscription_id}: {e}")
             # Continua processando outras assinaturas
     
     def enrich_subscription_with_transactions(self, subscription_data: Dict[str, Any], start_date: str, end_date: str) -> Optional[Dict[str, Any]]:
@@ -145,30 +143,27 @@ class GuruBackfill:
             subscription_id = subscription_data.get("id")
             
             if not contact_id or not subscription_id:
-                print(f"❌ Dados insuficientes para assinatura {subscription_data.get('id', 'unknown')}")
-                print(f"   - Contact ID: {contact_id}")
-                print(f"   - Subscription ID: {subscription_id}")
+                self.logger.error(f"❌ Dados insuficientes para assinatura {subscription_data.get('id', 'unknown')} (contact_id: {contact_id}, subscription_id: {subscription_id})")
                 return None
             
-            print(f"🔍 Enriquecendo assinatura {subscription_id} (status: {subscription_data.get('status', 'unknown')})")
-            print(f"   - Contato: {contact_id}")
+            self.logger.info(f"🔍 Enriquecendo assinatura {subscription_id} (status: {subscription_data.get('status', 'unknown')}, contato: {contact_id})")
             
             # CORREÇÃO 2: Busca transações específicas da assinatura usando subscription_id
             # Isso garante que pegamos apenas transações relacionadas à assinatura específica
-            print(f"🔄 Buscando transações específicas da assinatura {subscription_id}")
+            self.logger.info(f"🔄 Buscando transações específicas da assinatura {subscription_id}")
             transactions = self.api_client.get_all_transactions_by_subscription(subscription_id)
             
             if not transactions:
-                print(f"⚠️ Nenhuma transação encontrada para assinatura {subscription_id}")
+                self.logger.warning(f"⚠️ Nenhuma transação encontrada para assinatura {subscription_id}")
                 # CORREÇÃO 1: Mesmo sem transações, continua o enriquecimento
                 # para assinaturas com status diferentes de "active"
                 return self._enrich_without_transactions(subscription_data)
             
-            print(f"💰 Total de transações da assinatura {subscription_id}: {len(transactions)} registros")
+            self.logger.info(f"💰 Total de transações da assinatura {subscription_id}: {len(transactions)} registros")
             
             # CORREÇÃO 1: Aceita todos os status de assinatura para enriquecimento
             subscription_status = subscription_data.get("status", "unknown")
-            print(f"📊 Status da assinatura: {subscription_status}")
+            self.logger.debug(f"📊 Status da assinatura: {subscription_status}")
             
             # Filtra transações válidas e analisa valores
             valid_transactions = []
@@ -178,7 +173,7 @@ class GuruBackfill:
             data_cancelamento = None
             nome_oferta = None
             
-            print(f"🔍 Analisando transações da assinatura:")
+            self.logger.debug("🔍 Analisando transações da assinatura")
             
             for transaction in transactions:
                 transaction_id = transaction.get('id', 'unknown')
@@ -191,7 +186,7 @@ class GuruBackfill:
                         offer = items[0].get('offer', {})
                         nome_oferta = offer.get('name')
                         if nome_oferta:
-                            print(f"   🏷️ Nome da oferta encontrado: {nome_oferta}")
+                            self.logger.debug(f"   🏷️ Nome da oferta encontrado: {nome_oferta}")
                 
                 # Busca data_cancelamento em transações com diferentes status
                 if not data_cancelamento:
@@ -200,7 +195,7 @@ class GuruBackfill:
                     canceled_at = dates.get('canceled_at') or dates.get('cancelled_at') or dates.get('refunded_at')
                     if canceled_at:
                         data_cancelamento = canceled_at
-                        print(f"   📅 Data de cancelamento encontrada na transação {transaction_id}: {canceled_at}")
+                        self.logger.debug(f"   📅 Data de cancelamento encontrada na transação {transaction_id}: {canceled_at}")
                 
                 # CORREÇÃO 1: Aceita transações com diferentes status para enriquecimento
                 # Diferentes status podem ter informações valiosas
@@ -216,13 +211,13 @@ class GuruBackfill:
                             total_value += unit_value
                             transaction_count += 1
                             
-                            print(f"   ✅ Transação {transaction_id}: Status = '{transaction_status}', Valor = R$ {unit_value}")
+                            self.logger.debug(f"   ✅ Transação {transaction_id}: Status = '{transaction_status}', Valor = R$ {unit_value}")
                         else:
-                            print(f"   ⚠️ Transação {transaction_id} sem items")
+                            self.logger.warning(f"   ⚠️ Transação {transaction_id} sem items")
                     else:
-                        print(f"   ℹ️ Transação {transaction_id}: Status = '{transaction_status}' (usada para dados, não para cálculo)")
+                        self.logger.debug(f"   ℹ️ Transação {transaction_id}: Status = '{transaction_status}' (usada para dados, não para cálculo)")
                 else:
-                    print(f"   ❌ Transação {transaction_id} ignorada (status não reconhecido: {transaction_status})")
+                    self.logger.warning(f"   ❌ Transação {transaction_id} ignorada (status não reconhecido: {transaction_status})")
             
             # 3. Se ainda não encontrou data_cancelamento e o status indica cancelamento, usa fallback
             if not data_cancelamento and subscription_status in ["canceled", "expired", "inactive"]:
@@ -230,24 +225,18 @@ class GuruBackfill:
                 last_updated = subscription_data.get("updated_at") or subscription_data.get("last_status_at")
                 if last_updated:
                     data_cancelamento = last_updated
-                    print(f"   📅 Data de cancelamento definida como fallback (última atualização): {data_cancelamento}")
+                    self.logger.debug(f"   📅 Data de cancelamento definida como fallback (última atualização): {data_cancelamento}")
                 else:
                     # Último recurso: usa data atual
                     data_cancelamento = datetime.now().isoformat()
-                    print(f"   📅 Data de cancelamento definida como data atual (fallback): {data_cancelamento}")
-            
-            print(f"🔍 Analisando transações da assinatura:")
+                    self.logger.debug(f"   📅 Data de cancelamento definida como data atual (fallback): {data_cancelamento}")
             
             # Calcula valor médio por transação para determinar valores da assinatura
             unit_value = total_value / transaction_count if transaction_count > 0 else 0
             
-            print(f"📊 Resumo das transações válidas:")
-            print(f"   - Total de transações para cálculo: {transaction_count}")
-            print(f"   - Valor médio por transação: R$ {unit_value}")
-            
             # Determina tipo de plano baseado no intervalo
             charged_every_days = subscription_data.get("charged_every_days", 30)
-            print(f"   - Intervalo de cobrança: {charged_every_days} dias")
+            self.logger.info(f"📊 Transações válidas para cálculo: {transaction_count}, valor médio R$ {unit_value}, intervalo de cobrança {charged_every_days} dias")
             
             # NOVA LÓGICA: Salva apenas o valor correspondente ao tipo de assinatura
             valor_mensal = None
@@ -259,23 +248,20 @@ class GuruBackfill:
                     # Plano anual: salva APENAS valor_anual
                     valor_anual = unit_value
                     valor_mensal = None  # Não salva valor mensal para planos anuais
-                    print(f"✅ Assinatura ANUAL detectada - salvando apenas valor_anual:")
-                    print(f"   - Valor anual: R$ {valor_anual:.2f}")
+                    self.logger.info(f"✅ Assinatura ANUAL detectada - salvando apenas valor_anual: R$ {valor_anual:.2f}")
                 elif charged_every_days == 30:
                     # Plano mensal: salva APENAS valor_mensal
                     valor_mensal = unit_value
                     valor_anual = None  # Não salva valor anual para planos mensais
-                    print(f"✅ Assinatura MENSAL detectada - salvando apenas valor_mensal:")
-                    print(f"   - Valor mensal: R$ {valor_mensal:.2f}")
+                    self.logger.info(f"✅ Assinatura MENSAL detectada - salvando apenas valor_mensal: R$ {valor_mensal:.2f}")
                 else:
                     # Outros intervalos: usa valor unitário como base mensal
                     valor_mensal = unit_value
                     valor_anual = None
-                    print(f"✅ Assinatura com intervalo personalizado ({charged_every_days} dias) - salvando como valor_mensal:")
-                    print(f"   - Valor mensal: R$ {valor_mensal:.2f}")
+                    self.logger.info(f"✅ Assinatura com intervalo personalizado ({charged_every_days} dias) - salvando como valor_mensal: R$ {valor_mensal:.2f}")
             else:
                 # Se não há transações válidas, tenta extrair valores do payment.installments
-                print(f"⚠️ Nenhuma transação válida para cálculo, tentando extrair valores de installments...")
+                self.logger.warning("⚠️ Nenhuma transação válida para cálculo, tentando extrair valores de installments...")
                 
                 # Busca valores em payment.installments se disponível
                 for transaction in transactions:
@@ -291,33 +277,26 @@ class GuruBackfill:
                             # Plano anual: salva APENAS valor_anual
                             valor_anual = total_installment_value
                             valor_mensal = None
-                            print(f"✅ Valores extraídos de installments (ANUAL):")
-                            print(f"   - Valor da parcela: R$ {installment_value}")
-                            print(f"   - Quantidade de parcelas: {installment_qty}")
-                            print(f"   - Valor anual: R$ {valor_anual:.2f}")
+                            self.logger.info(f"✅ Valores extraídos de installments (ANUAL): {installment_qty}x R$ {installment_value}, valor anual R$ {valor_anual:.2f}")
                         elif charged_every_days == 30:
                             # Plano mensal: salva APENAS valor_mensal
                             valor_mensal = installment_value  # Valor da parcela mensal
                             valor_anual = None
-                            print(f"✅ Valores extraídos de installments (MENSAL):")
-                            print(f"   - Valor da parcela: R$ {installment_value}")
-                            print(f"   - Valor mensal: R$ {valor_mensal:.2f}")
+                            self.logger.info(f"✅ Valores extraídos de installments (MENSAL): parcela R$ {installment_value}, valor mensal R$ {valor_mensal:.2f}")
                         else:
                             # Outros intervalos: usa como valor mensal
                             valor_mensal = installment_value
                             valor_anual = None
-                            print(f"✅ Valores extraídos de installments (PERSONALIZADO):")
-                            print(f"   - Valor da parcela: R$ {installment_value}")
-                            print(f"   - Valor mensal: R$ {valor_mensal:.2f}")
+                            self.logger.info(f"✅ Valores extraídos de installments (PERSONALIZADO): parcela R$ {installment_value}, valor mensal R$ {valor_mensal:.2f}")
                         break
                 
                 if not valor_mensal and not valor_anual:
-                    print(f"⚠️ Não foi possível determinar valores para a assinatura")
+                    self.logger.warning("⚠️ Não foi possível determinar valores para a assinatura")
                     # CORREÇÃO 1: Continua mesmo sem valores para assinaturas com status diferentes
                     if subscription_status in ["canceled", "expired", "inactive"]:
-                        print(f"   ℹ️ Assinatura com status '{subscription_status}' - continuando sem valores")
+                        self.logger.debug(f"   ℹ️ Assinatura com status '{subscription_status}' - continuando sem valores")
                     else:
-                        print(f"   ❌ Assinatura ativa sem valores - retornando None")
+                        self.logger.error("   ❌ Assinatura ativa sem valores - retornando None")
                         return None
             
             # CORREÇÃO 4: Garante que nome_oferta seja extraído
@@ -326,7 +305,7 @@ class GuruBackfill:
                 product = subscription_data.get("product", {})
                 nome_oferta = product.get("name")
                 if nome_oferta:
-                    print(f"   🏷️ Nome da oferta extraído do subscription: {nome_oferta}")
+                    self.logger.debug(f"   🏷️ Nome da oferta extraído do subscription: {nome_oferta}")
             
             # Retorna payload no formato esperado pela função processar_assinatura_guru
             return {
@@ -344,7 +323,7 @@ class GuruBackfill:
             }
             
         except Exception as e:
-            print(f"❌ Erro ao enriquecer assinatura {subscription_data.get('id', 'unknown')}: {e}")
+            self.logger.error(f"❌ Erro ao enriquecer assinatura {subscription_data.get('id', 'unknown')}: {e}")
             return None
     
     def _enrich_without_transactions(self, subscription_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -355,14 +334,13 @@ class GuruBackfill:
         """
         try:
             subscription_status = subscription_data.get("status", "unknown")
-            print(f"🔄 Enriquecendo assinatura {subscription_data.get('id', 'unknown')} sem transações")
-            print(f"   - Status: {subscription_status}")
+            self.logger.info(f"🔄 Enriquecendo assinatura {subscription_data.get('id', 'unknown')} sem transações (status: {subscription_status})")
             
             # CORREÇÃO 4: Extrai nome_oferta do subscription_data
             product = subscription_data.get("product", {})
             nome_oferta = product.get("name")
             if nome_oferta:
-                print(f"   🏷️ Nome da oferta: {nome_oferta}")
+                self.logger.debug(f"   🏷️ Nome da oferta: {nome_oferta}")
             
             # CORREÇÃO 3: Extrai data_cancelamento do subscription_data
             data_cancelamento = None
@@ -376,11 +354,11 @@ class GuruBackfill:
                 )
                 
                 if data_cancelamento:
-                    print(f"   📅 Data de cancelamento extraída: {data_cancelamento}")
+                    self.logger.debug(f"   📅 Data de cancelamento extraída: {data_cancelamento}")
                 else:
                     # Fallback: usa data atual
                     data_cancelamento = datetime.now().isoformat()
-                    print(f"   📅 Data de cancelamento definida como data atual (fallback): {data_cancelamento}")
+                    self.logger.debug(f"   📅 Data de cancelamento definida como data atual (fallback): {data_cancelamento}")
             
             # Para assinaturas sem transações, retorna dados básicos
             return {
@@ -398,7 +376,7 @@ class GuruBackfill:
             }
             
         except Exception as e:
-            print(f"❌ Erro ao enriquecer assinatura sem transações: {e}")
+            self.logger.error(f"❌ Erro ao enriquecer assinatura sem transações: {e}")
             return None
     
     def convert_transaction_to_webhook(self, mapeado: Dict[str, Any]) -> Dict[str, Any]:
@@ -502,34 +480,34 @@ class GuruBackfill:
         try:
             # CORREÇÃO: Fluxo correto implementado
             # 1. Processa assinaturas PRIMEIRO (enriquecendo cada uma com suas transações)
-            print("\n📋 Processando assinaturas com enriquecimento...")
+            self.logger.info("📋 Processando assinaturas com enriquecimento...")
             all_subscriptions = self.process_subscriptions_with_rate_limit(start_date, end_date)
             
             if all_subscriptions:
-                print(f"📋 Total de assinaturas encontradas: {len(all_subscriptions)}")
+                self.logger.info(f"📋 Total de assinaturas encontradas: {len(all_subscriptions)}")
                 for i, subscription in enumerate(all_subscriptions, 1):
                     # CORREÇÃO: Enriquece DURANTE o processamento de cada assinatura
                     self.process_subscription(subscription, start_date, end_date)
                     if i % 10 == 0:
-                        print(f"   {i}/{len(all_subscriptions)} assinaturas processadas")
+                        self.logger.info(format_progress(i, len(all_subscriptions), "Assinaturas processadas"))
             else:
-                print("⚠️ Nenhuma assinatura encontrada")
+                self.logger.warning("⚠️ Nenhuma assinatura encontrada")
             
             # 2. Processa transações SEPARADAMENTE (para completar o banco)
             if start_date and end_date:
-                print("\n💰 Processando transações em lotes de 180 dias...")
+                self.logger.info("💰 Processando transações em lotes de 180 dias...")
                 all_transactions = self.process_transactions_in_batches(start_date, end_date)
                 
                 if all_transactions:
-                    print(f"📦 Total de transações encontradas: {len(all_transactions)}")
+                    self.logger.info(f"📦 Total de transações encontradas: {len(all_transactions)}")
                     for i, transaction in enumerate(all_transactions, 1):
                         self.process_transaction(transaction)
                         if i % 10 == 0:
-                            print(f"   {i}/{len(all_transactions)} transações processadas")
+                            self.logger.info(format_progress(i, len(all_transactions), "Transações processadas"))
                 else:
-                    print("⚠️ Nenhuma transação encontrada no período")
+                    self.logger.warning("⚠️ Nenhuma transação encontrada no período")
             else:
-                print("⚠️ Sem filtro de data - transações não serão processadas (evita contagem incorreta)")
+                self.logger.warning("⚠️ Sem filtro de data - transações não serão processadas (evita contagem incorreta)")
                 all_transactions = []
             
             # 3. Cria backup dos dados processados
@@ -542,14 +520,13 @@ class GuruBackfill:
                 "timestamp": datetime.now().isoformat()
             }
             
-            create_backup_log(backup_data, "guru_backfill_complete")
+            create_backup_log(backup_data, "guru_backfill_complete", self.logger)
             
-            print("\n✅ Backfill concluído!")
+            self.logger.info("✅ Backfill concluído!")
             self.print_final_report()
             
         except Exception as e:
             self.logger.error(f"❌ Erro durante backfill: {e}")
-            print(f"❌ Erro durante backfill: {e}")
     
     def process_transactions_in_batches(self, start_date: str, end_date: str) -> List[Dict[str, Any]]:
         """
@@ -570,7 +547,7 @@ class GuruBackfill:
             batch_start_str = current_start.strftime("%Y-%m-%d")
             batch_end_str = batch_end.strftime("%Y-%m-%d")
             
-            print(f"📦 Lote {batch_number}: {batch_start_str} até {batch_end_str}")
+            self.logger.info(f"📦 Lote {batch_number}: {batch_start_str} até {batch_end_str}")
             
             try:
                 # CORREÇÃO: Usa filtros de data corretos para transactions
@@ -582,22 +559,21 @@ class GuruBackfill:
                 
                 if batch_transactions:
                     all_transactions.extend(batch_transactions)
-                    print(f"   ✅ Lote {batch_number}: {len(batch_transactions)} transações encontradas")
+                    self.logger.info(f"   ✅ Lote {batch_number}: {len(batch_transactions)} transações encontradas")
                 else:
-                    print(f"   ⚠️ Lote {batch_number}: Nenhuma transação encontrada")
+                    self.logger.warning(f"   ⚠️ Lote {batch_number}: Nenhuma transação encontrada")
                 
                 # Rate limiting: espera 1 segundo entre lotes (360 req/min = 6 req/seg)
                 time.sleep(1)
                 
             except Exception as e:
                 self.logger.error(f"❌ Erro no lote {batch_number}: {e}")
-                print(f"   ❌ Erro no lote {batch_number}: {e}")
             
             # Avança para o próximo lote
             current_start = batch_end + timedelta(days=1)
             batch_number += 1
         
-        print(f"📊 Total de transações coletadas: {len(all_transactions)}")
+        self.logger.info(f"📊 Total de transações coletadas: {len(all_transactions)}")
         return all_transactions
     
     def process_subscriptions_with_rate_limit(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
@@ -607,23 +583,23 @@ class GuruBackfill:
         """
         all_subscriptions = []
         
-        print("🔄 Buscando assinaturas com cursor-based pagination...")
+        self.logger.info("🔄 Buscando assinaturas com cursor-based pagination...")
         
         try:
             # CORREÇÃO: Usa filtros de data corretos para subscriptions
             # Para subscriptions: last_status_at_ini e last_status_at_end
             if start_date and end_date:
-                print(f"📅 Filtrando assinaturas por período: {start_date} até {end_date}")
+                self.logger.info(f"📅 Filtrando assinaturas por período: {start_date} até {end_date}")
                 all_subscriptions = self.api_client.get_all_subscriptions_with_dates(
                     start_date=start_date,
                     end_date=end_date
                 )
             else:
-                print("⚠️ Sem filtro de data - buscando todas as assinaturas")
+                self.logger.warning("⚠️ Sem filtro de data - buscando todas as assinaturas")
                 all_subscriptions = self.api_client.get_all_subscriptions()
             
             if all_subscriptions:
-                print(f"📊 Total de assinaturas coletadas: {len(all_subscriptions)}")
+                self.logger.info(f"📊 Total de assinaturas coletadas: {len(all_subscriptions)}")
                 
                 # Valida dados mínimos necessários
                 valid_subscriptions = []
@@ -631,35 +607,34 @@ class GuruBackfill:
                     if subscription.get("id") and subscription.get("contact"):
                         valid_subscriptions.append(subscription)
                     else:
-                        print(f"⚠️ Assinatura sem dados mínimos, ignorando: {subscription.get('id')}")
+                        self.logger.warning(f"⚠️ Assinatura sem dados mínimos, ignorando: {subscription.get('id')}")
                 
                 all_subscriptions = valid_subscriptions
-                print(f"📋 Assinaturas válidas para processamento: {len(all_subscriptions)}")
+                self.logger.info(f"📋 Assinaturas válidas para processamento: {len(all_subscriptions)}")
             else:
-                print("⚠️ Nenhuma assinatura encontrada")
+                self.logger.warning("⚠️ Nenhuma assinatura encontrada")
             
         except Exception as e:
             self.logger.error(f"❌ Erro ao buscar assinaturas: {e}")
-            print(f"❌ Erro ao buscar assinaturas: {e}")
         
-        print(f"📊 Total de assinaturas para processamento: {len(all_subscriptions)}")
+        self.logger.info(f"📊 Total de assinaturas para processamento: {len(all_subscriptions)}")
         return all_subscriptions
     
     def print_final_report(self):
         """
-        Imprime relatório final do backfill
+        Registra o relatório final do backfill
         """
-        print("\n" + "="*50)
-        print("📊 RELATÓRIO FINAL - BACKFILL GURU")
-        print("="*50)
-        print(f"💰 Transações processadas: {self.stats['transactions_processed']}")
-        print(f"   ├─ Criadas: {self.stats['transactions_created']}")
-        print(f"   └─ Atualizadas: {self.stats['transactions_updated']}")
-        print(f"📋 Assinaturas processadas: {self.stats['subscriptions_processed']}")
-        print(f"   ├─ Criadas: {self.stats['subscriptions_created']}")
-        print(f"   └─ Atualizadas: {self.stats['subscriptions_updated']}")
-        print(f"❌ Erros: {self.stats['errors']}")
-        print("="*50)
+        self.logger.info("=" * 50)
+        self.logger.info("📊 RELATÓRIO FINAL - BACKFILL GURU")
+        self.logger.info("=" * 50)
+        self.logger.info(f"💰 Transações processadas: {self.stats['transactions_processed']}")
+        self.logger.info(f"   ├─ Criadas: {self.stats['transactions_created']}")
+        self.logger.info(f"   └─ Atualizadas: {self.stats['transactions_updated']}")
+        self.logger.info(f"📋 Assinaturas processadas: {self.stats['subscriptions_processed']}")
+        self.logger.info(f"   ├─ Criadas: {self.stats['subscriptions_created']}")
+        self.logger.info(f"   └─ Atualizadas: {self.stats['subscriptions_updated']}")
+        self.logger.info(f"❌ Erros: {self.stats['errors']}")
+        self.logger.info("=" * 50)
 
 def main():
     """
@@ -671,9 +646,8 @@ def main():
     
     args = parser.parse_args()
     
-    print("🚀 Iniciando backfill histórico da Guru")
-    
     backfill = GuruBackfill(args.start_date, args.end_date)
+    backfill.logger.info("🚀 Iniciando backfill histórico da Guru")
     backfill.run_backfill(args.start_date, args.end_date)
 
 if __name__ == "__main__":
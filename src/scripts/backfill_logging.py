@@ -8,6 +8,7 @@ from typing import Dict, Any, Optional
 import os
 import json
 from dotenv import load_dotenv
+from utils.logging_ingestao import configurar_logging_ingestao, criar_handler_console
 
 # Carrega variáveis de ambiente
 load_dotenv()
@@ -90,15 +91,11 @@ def setup_logging(script_name: str, log_level: str = "INFO") -> logging.Logger:
         '%(asctime)s | %(name)s | %(levelname)s | %(funcName)s:%(lineno)d | %(message)s'
     )
     
-    # Formato simplificado para console
-    console_formatter = logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s'
-    )
-    
-    # Handler para console
-    console_handler = logging.StreamHandler()
+    # Handler para console: mesmo subsistema de logging da ingestão
+    # (JSON de uma linha, escrita em thread separada, limite por nível)
+    configurar_logging_ingestao()
+    console_handler = criar_handler_console()
     console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(console_formatter)
     logger.addHandler(console_handler)
     
     # Handler para arquivo detalhado
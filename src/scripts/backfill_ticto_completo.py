@@ -6,13 +6,18 @@ Processa todas as orders e subscriptions disponíveis na API
 
 import asyncio
 import logging
+import os
+import sys
 import time
 from datetime import datetime
 from typing import Dict, Any, List
 
-from src.scripts.ticto_api_client import TictoAPIClient
-from src.services.data_processor import HistoricalDataProcessor
-from src.scripts.backfill_utils import setup_logging, create_backup_log
+# Adiciona o diretório src ao path (imports sem prefixo "src.", como na API)
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from scripts.ticto_api_client import TictoAPIClient
+from services.data_processor import HistoricalDataProcessor
+from scripts.backfill_utils import setup_logging, create_backup_log
 
 class TictoBackfillCompleto:
     """
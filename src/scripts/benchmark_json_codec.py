@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark dos codecs JSON da ingestão
+Compara parse, serialização e o caminho de gravação (json_completo) de cada
+codec disponível usando os payloads de exemplo em "Jsons (exemplos)/".
+
+Uso:
+    python src/scripts/benchmark_json_codec.py [--iteracoes 2000]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.json_codec import CODECS, PayloadBruto
+
+PASTA_EXEMPLOS = os.path.join(os.path.dirname(__file__), '..', '..', 'Jsons (exemplos)')
+
+
+def carregar_exemplos(pasta: str):
+    """Corpos (bytes) dos arquivos .json de exemplo que são JSON válido"""
+    corpos = []
+    for caminho in sorted(glob.glob(os.path.join(pasta, "**", "*.json"), recursive=True)):
+        with open(caminho, "rb") as arquivo:
+            corpo = arquivo.read()
+        try:
+            CODECS["json"]().loads(corpo)
+        except ValueError:
+            print(f"⚠️ Ignorado (JSON inválido): {os.path.relpath(caminho, pasta)}")
+            continue
+        corpos.append(corpo)
+    return corpos
+
+
+def medir(funcao, itens, iteracoes: int) -> float:
+    """Tempo médio por item, em microssegundos"""
+    inicio = time.perf_counter()
+    for _ in range(iteracoes):
+        for item in itens:
+            funcao(item)
+    return (time.perf_counter() - inicio) / (iteracoes * len(itens)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos codecs JSON da ingestão")
+    parser.add_argument("--iteracoes", type=int, default=2000, help="Repetições sobre o conjunto de exemplos")
+    parser.add_argument("--pasta", default=PASTA_EXEMPLOS, help="Pasta com os payloads de exemplo")
+    args = parser.parse_args()
+
+    corpos = carregar_exemplos(args.pasta)
+    if not corpos:
+        print("❌ Nenhum payload de exemplo encontrado")
+        return
+    tamanho_medio = sum(len(corpo) for corpo in corpos) / len(corpos)
+    print(f"📦 {len(corpos)} payloads, {tamanho_medio / 1024:.1f} KiB em média, {args.iteracoes} iterações\n")
+
+    print(f"{'codec':<8} {'parse (µs)':>12} {'dumps (µs)':>12} {'gravação (µs)':>14} {'total (µs)':>12}")
+    for nome, classe in CODECS.items():
+        try:
+            codec = classe()
+        except ImportError:
+            print(f"{nome:<8} indisponível (não instalado)")
+            continue
+        objetos = [codec.loads(corpo) for corpo in corpos]
+        # Objetos guardam os bytes recebidos; listas (respostas de API) são serializadas
+        brutos = [
+            PayloadBruto(objeto, corpo) if isinstance(objeto, dict) else objeto
+            for objeto, corpo in zip(objetos, corpos)
+        ]
+        parse = medir(codec.loads, corpos, args.iteracoes)
+        dumps = medir(codec.dumps, objetos, args.iteracoes)
+        # Gravação reaproveitando os bytes recebidos (payload não alterado)
+        gravacao = medir(
+            lambda payload: payload.bruto.decode("utf-8") if isinstance(payload, PayloadBruto) else codec.dumps(payload),
+            brutos, args.iteracoes,
+        )
+        print(f"{nome:<8} {parse:>12.1f} {dumps:>12.1f} {gravacao:>14.1f} {parse + gravacao:>12.1f}")
+
+    print("\n💡 total = parse + gravação: custo por webhook no caminho parse-once do codec")
+
+
+if __name__ == "__main__":
+    main()
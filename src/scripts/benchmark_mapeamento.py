@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark do mapeamento de transações
+Compara, por payload, a interpretação dos caminhos de MAPEAMENTO_TRANSACOES a
+cada chamada (implementação anterior de utils/helpers.py) com os extratores
+compilados de utils/extratores.py, usando os payloads de "Jsons (exemplos)/".
+
+Uso:
+    python src/scripts/benchmark_mapeamento.py [--iteracoes 5000]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.mapeamento import MAPEAMENTO_TRANSACOES
+from utils.helpers import mapear_transacao_guru, mapear_transacao_ticto
+
+PASTA_EXEMPLOS = os.path.join(os.path.dirname(__file__), '..', '..', 'Jsons (exemplos)')
+
+
+def mapear_interpretado(payload: dict, plataforma: str) -> dict:
+    """Referência: percorre os caminhos do mapeamento a cada payload"""
+    if plataforma == "guru" and "payload" in payload:
+        payload = payload["payload"]
+    transacao = {}
+    for campo_db, info in MAPEAMENTO_TRANSACOES.items():
+        valor = payload
+        try:
+            for parte in info[plataforma].split("."):
+                if parte.endswith("]"):
+                    nome_lista, idx = parte[:-1].split("[")
+                    valor = valor[nome_lista][int(idx)]
+                else:
+                    valor = valor[parte]
+        except (KeyError, IndexError, TypeError):
+            valor = None
+        if campo_db == "valor_total" and valor is not None and info.get("transformacao") == f"{plataforma}: dividir por 100":
+            valor = valor / 100
+        transacao[campo_db] = valor
+    return transacao
+
+
+def carregar_exemplos(pasta: str, plataforma: str):
+    """Payloads de webhook válidos da plataforma (arrays de respostas de API são ignorados)"""
+    payloads = []
+    subpasta = os.path.join(pasta, "Guru" if plataforma == "guru" else "Ticto")
+    for caminho in sorted(glob.glob(os.path.join(subpasta, "*.json"))):
+        try:
+            with open(caminho, "r", encoding="utf-8") as arquivo:
+                payload = json.load(arquivo)
+        except ValueError:
+            continue
+        if isinstance(payload, dict):
+            payloads.append(payload)
+    return payloads
+
+
+def medir(funcao, itens, iteracoes: int) -> float:
+    """Tempo médio por item, em microssegundos"""
+    inicio = time.perf_counter()
+    for _ in range(iteracoes):
+        for item in itens:
+            funcao(item)
+    return (time.perf_counter() - inicio) / (iteracoes * len(itens)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do mapeamento de transações")
+    parser.add_argument("--iteracoes", type=int, default=5000, help="Repetições sobre o conjunto de exemplos")
+    parser.add_argument("--pasta", default=PASTA_EXEMPLOS, help="Pasta com os payloads de exemplo")
+    args = parser.parse_args()
+
+    compilados = {"guru": mapear_transacao_guru, "ticto": mapear_transacao_ticto}
+    print(f"{'plataforma':<12} {'payloads':>9} {'interpretado (µs)':>18} {'compilado (µs)':>15} {'ganho':>7}")
+    for plataforma, compilado in compilados.items():
+        payloads = carregar_exemplos(args.pasta, plataforma)
+        if not payloads:
+            print(f"{plataforma:<12} nenhum payload de exemplo encontrado")
+            continue
+        interpretado = medir(lambda payload: mapear_interpretado(payload, plataforma), payloads, args.iteracoes)
+        tempo_compilado = medir(compilado, payloads, args.iteracoes)
+        print(
+            f"{plataforma:<12} {len(payloads):>9} {interpretado:>18.2f} {tempo_compilado:>15.2f} "
+            f"{interpretado / tempo_compilado:>6.1f}x"
+        )
+
+    print("\n💡 compilado = mapear_transacao_* completo (inclui os ramos especiais da Ticto)")
+
+
+if __name__ == "__main__":
+    main()
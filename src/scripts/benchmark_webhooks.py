@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Benchmark de vazão e latência dos webhooks
+Sintetiza fluxos de eventos únicos a partir dos payloads de "Jsons (exemplos)/"
+(ids, emails e datas aleatórios, sequências de status realistas) e os envia
+para a API de webhooks em uma taxa alvo, contra um Postgres local.
+
+- "inprocess" (padrão): chama o app ASGI de Api/webhooks.py no mesmo processo
+  (sem rede); conta os statements SQL executados por evento
+- "http": envia para uma API em execução (--url)
+
+- "resumos": mede só a escrita dos resumos diários sob concorrência, sem a API:
+  --concorrencia threads gravam --eventos transações curtas no mesmo dia e
+  produto, com a linha quente de antes (INSERT ... ON CONFLICT DO UPDATE em
+  resumo_diario_transacoes) e com os deltas só-INSERT (resumo_transacao_aplicar);
+  cada transação segura a escrita por --trabalho-ms (o resto do handler) e é
+  desfeita no fim (nada fica gravado)
+
+Relatório: latência p50/p95/p99, vazão, statements por evento e taxa de erro.
+Com --baseline o resultado é comparado com uma execução anterior e o script
+termina com código 1 se houver regressão acima da tolerância (gate de CI).
+
+As latências são medidas a partir do instante planejado de cada envio
+(carga em malha aberta): se a API atrasa, a fila de espera entra na medida.
+
+Uso:
+    python -m src.scripts.benchmark_webhooks --eventos 2000 --rps 200
+    python -m src.scripts.benchmark_webhooks --modo http --url http://localhost:8000/api --rps 100
+    python -m src.scripts.benchmark_webhooks --salvar-baseline logs/benchmark_baseline.json
+    python -m src.scripts.benchmark_webhooks --baseline logs/benchmark_baseline.json --tolerancia 0.15
+    python -m src.scripts.benchmark_webhooks --modo resumos --eventos 500 --concorrencia 16 --trabalho-ms 5
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# Adiciona o diretório src (e a raiz, usada por imports "src.") ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from utils.security_config import security_config
+
+PASTA_EXEMPLOS = os.path.join(os.path.dirname(__file__), '..', '..', 'Jsons (exemplos)')
+
+# Sequências de status por entidade (arquivos de exemplo, na ordem de envio)
+SEQUENCIAS_TICTO = [
+    ["Venda Realizada) (Anual)", "Cobrança Recusada) (Anual)", "Assinatura Atrasada) (Anual)", "Assinatura Cancelada v3) (Anual)"],
+    ["Venda Realizada v3) (Anual)", "Reembolso v3) (Anual)"],
+    ["Pix Gerado)", "Pix Venda Realizada)"],
+    ["Boleto Impresso) (Anual)", "Boleto Pago) (Anual)"],
+    ["Venda Autorizada) (G)", "Venda Autorizada - Order Bump) (G)"],
+    ["Venda Realizada) (U)", "Assinatura Cancelada) (U)", "Assinatura Retomada) (U)"],
+    ["Venda Recusada) (G)"],
+    ["Carrinho Abandonado)"],
+]
+SEQUENCIAS_GURU = [
+    ["Transação - Guru (Aguardando Pagamento - PIX)", "Transação - Guru (Venda Realizada)"],
+    ["Transação - Guru (Venda Realizada v2)", "Venda Reembolsada (Inicio_evento) v2)", "Venda Reembolsada (Confirmação reembolso) v2)"],
+    ["Assinatura - Guru (Aguardando Pagamento)", "Assinatura - Guru (Pagamento Realizado)", "Assinatura - Guru (Assinatura Cancelada)"],
+    ["Transação - Guru (Venda Abandonada)"],
+    ["Transação - Guru (Venda Cancelada)"],
+    ["Webhook - Order bump Guru"],
+]
+
+
+def carregar_modelos(pasta: str, plataforma: str) -> Dict[str, dict]:
+    """Payloads de exemplo da plataforma, indexados pelo nome do arquivo"""
+    modelos = {}
+    subpasta = os.path.join(pasta, "Guru" if plataforma == "guru" else "Ticto")
+    for nome in sorted(os.listdir(subpasta)):
+        if nome.endswith(".json"):
+            with open(os.path.join(subpasta, nome), "r", encoding="utf-8") as arquivo:
+                modelos[nome] = json.load(arquivo)
+    return modelos
+
+
+def _modelo(modelos: Dict[str, dict], trecho: str) -> dict:
+    for nome, modelo in modelos.items():
+        if trecho in nome:
+            return modelo
+    raise KeyError(f"Payload de exemplo não encontrado: {trecho}")
+
+
+def _formatar_como(original: Any, data: datetime) -> Any:
+    """Nova data no mesmo formato da data original do exemplo"""
+    if not isinstance(original, str) or not original:
+        return original
+    if "T" in original:
+        return data.strftime("%Y-%m-%dT%H:%M:%SZ")
+    if "/" in original:
+        return data.strftime("%d/%m/%Y %H:%M:%S")
+    if len(original) == 10:
+        return data.strftime("%Y-%m-%d")
+    return data.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Entidade:
+    """Identidade sintética de um fluxo de eventos (cliente + assinatura/pedido)"""
+
+    def __init__(self, indice: int, inicio: datetime):
+        sufixo = uuid.uuid4().hex[:12].upper()
+        self.email = f"bench-{indice}-{sufixo.lower()}@exemplo.com"
+        self.documento = "".join(random.choice("0123456789") for _ in range(11))
+        self.id_pedido = random.randint(10_000_000, 99_999_999)
+        self.hash_pedido = f"TOBENCH{sufixo}"
+        self.hash_transacao = f"TPBENCH{sufixo}"
+        self.id_assinatura_ticto = random.randint(10_000_000, 99_999_999)
+        self.id_transacao_guru = str(uuid.uuid4())
+        self.codigo_assinatura_guru = f"sub_bench{sufixo}"
+        self.inicio = inicio
+
+
+def sintetizar_ticto(modelo: dict, entidade: Entidade, passo: int, token: str) -> dict:
+    evento = copy.deepcopy(modelo)
+    data = entidade.inicio + timedelta(minutes=passo)
+    evento["token"] = token
+    if evento.get("status") == "abandoned_cart":
+        evento["email"] = entidade.email
+        evento["created_at"] = _formatar_como(evento.get("created_at"), data)
+        return evento
+    evento["status_date"] = _formatar_como(evento.get("status_date"), data)
+    order = evento.get("order") or {}
+    order.update({"id": entidade.id_pedido, "hash": entidade.hash_pedido, "transaction_hash": entidade.hash_transacao})
+    order["order_date"] = _formatar_como(order.get("order_date"), entidade.inicio)
+    if isinstance(evento.get("transaction"), dict):
+        evento["transaction"]["hash"] = entidade.hash_transacao
+    if evento.get("subscriptions"):
+        evento["subscriptions"][0]["id"] = entidade.id_assinatura_ticto
+    if isinstance(evento.get("customer"), dict):
+        evento["customer"].update({"email": entidade.email, "cpf": entidade.documento})
+    return evento
+
+
+def sintetizar_guru(modelo: dict, entidade: Entidade, passo: int, token: str) -> dict:
+    evento = copy.deepcopy(modelo)
+    payload = evento.get("payload", evento)
+    data = entidade.inicio + timedelta(minutes=passo)
+    payload["api_token"] = token
+    if payload.get("webhook_type") == "subscription":
+        payload["id"] = payload["subscription_code"] = entidade.codigo_assinatura_guru
+        contato = payload.get("subscriber")
+    else:
+        payload["id"] = entidade.id_transacao_guru
+        if isinstance(payload.get("subscription"), dict):
+            payload["subscription"]["id"] = payload["subscription"]["subscription_code"] = entidade.codigo_assinatura_guru
+        contato = payload.get("contact")
+    if isinstance(contato, dict):
+        contato.update({"email": entidade.email, "doc": entidade.documento})
+    for campo, valor in (payload.get("dates") or {}).items():
+        if valor:
+            payload["dates"][campo] = _formatar_como(valor, entidade.inicio if campo in ("created_at", "ordered_at", "started_at") else data)
+    return evento if "payload" in evento else {"payload": payload}
+
+
+def gerar_eventos(total: int, plataformas: List[str], pasta: str, semente: Optional[int] = None) -> List[Tuple[str, dict]]:
+    """
+    Gera `total` eventos únicos. Os fluxos são intercalados: eventos da mesma
+    entidade ficam espaçados no stream, na ordem da sequência de status.
+    """
+    random.seed(semente)
+    tokens = {
+        "guru": security_config.GURU_ACCOUNT_TOKEN or "benchmark-guru-token",
+        "ticto": (security_config.get_ticto_tokens() or ["benchmark-ticto-token"])[0],
+    }
+    sequencias = []
+    for plataforma in plataformas:
+        modelos = carregar_modelos(pasta, plataforma)
+        for sequencia in (SEQUENCIAS_GURU if plataforma == "guru" else SEQUENCIAS_TICTO):
+            sequencias.append((plataforma, [_modelo(modelos, trecho) for trecho in sequencia]))
+
+    fluxos = []
+    gerados = 0
+    inicio = datetime.utcnow() - timedelta(days=1)
+    while gerados < total:
+        plataforma, modelos = random.choice(sequencias)
+        entidade = Entidade(len(fluxos), inicio + timedelta(seconds=len(fluxos)))
+        sintetizar = sintetizar_guru if plataforma == "guru" else sintetizar_ticto
+        fluxo = [(plataforma, sintetizar(modelo, entidade, passo, tokens[plataforma])) for passo, modelo in enumerate(modelos)]
+        fluxo = fluxo[:total - gerados]
+        fluxos.append(fluxo)
+        gerados += len(fluxo)
+
+    # Intercala: primeiro evento de cada fluxo, depois o segundo, ...
+    eventos = []
+    for passo in range(max(len(fluxo) for fluxo in fluxos)):
+        eventos.extend(fluxo[passo] for fluxo in fluxos if passo < len(fluxo))
+    return eventos
+
+
+class ContadorStatements:
+    """Conta statements SQL executados pelo engine (modo inprocess)"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.total = 0
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, *args, **kwargs):
+        self.total += 1
+
+
+def percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(int(round(p / 100 * (len(ordenados) - 1))), len(ordenados) - 1)
+    return ordenados[indice]
+
+
+async def disparar(cliente, eventos: List[Tuple[str, dict]], rps: float, concorrencia: int) -> Dict[str, Any]:
+    """Envia os eventos em malha aberta na taxa alvo (rps=0: o mais rápido possível)"""
+    limite = asyncio.Semaphore(concorrencia)
+    latencias, erros, status_http = [], 0, {}
+    loop = asyncio.get_running_loop()
+    inicio = loop.time()
+
+    async def enviar(plataforma: str, corpo: dict, planejado: float):
+        nonlocal erros
+        async with limite:
+            try:
+                resposta = await cliente.post(f"/webhook/{plataforma}", json=corpo)
+                codigo = resposta.status_code
+                falhou = codigo >= 400 or (resposta.json().get("result") or {}).get("status") == "erro"
+            except Exception:
+                codigo, falhou = "exception", True
+        latencias.append((loop.time() - planejado) * 1000)
+        status_http[codigo] = status_http.get(codigo, 0) + 1
+        if falhou:
+            erros += 1
+
+    tarefas = []
+    for indice, (plataforma, corpo) in enumerate(eventos):
+        planejado = inicio + indice / rps if rps else loop.time()
+        espera = planejado - loop.time()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        tarefas.append(asyncio.create_task(enviar(plataforma, corpo, planejado)))
+    await asyncio.gather(*tarefas)
+    duracao = loop.time() - inicio
+
+    return {
+        "eventos": len(eventos),
+        "duracao_s": round(duracao, 3),
+        "vazao_eventos_s": round(len(eventos) / duracao, 2) if duracao else 0.0,
+        "latencia_p50_ms": round(percentil(latencias, 50), 2),
+        "latencia_p95_ms": round(percentil(latencias, 95), 2),
+        "latencia_p99_ms": round(percentil(latencias, 99), 2),
+        "taxa_erro": round(erros / len(eventos), 4) if eventos else 0.0,
+        "status_http": {str(codigo): total for codigo, total in status_http.items()},
+    }
+
+
+async def executar(args) -> Dict[str, Any]:
+    import httpx
+
+    plataformas = ["guru", "ticto"] if args.plataforma == "todas" else [args.plataforma]
+    eventos = gerar_eventos(args.eventos, plataformas, args.pasta, args.semente)
+
+    if args.modo == "http":
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as cliente:
+            resultado = await disparar(cliente, eventos, args.rps, args.concorrencia)
+        resultado["statements_por_evento"] = None
+    else:
+        from database.connection import engine
+        from Api.webhooks import app, iniciar_servicos_ingestao, parar_servicos_ingestao
+
+        contador = ContadorStatements(engine)
+        iniciar_servicos_ingestao()
+        try:
+            transporte = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark", timeout=60) as cliente:
+                resultado = await disparar(cliente, eventos, args.rps, args.concorrencia)
+        finally:
+            parar_servicos_ingestao()
+        resultado["statements_por_evento"] = round(contador.total / len(eventos), 2) if eventos else 0.0
+
+    resultado.update({"modo": args.modo, "rps_alvo": args.rps, "concorrencia": args.concorrencia})
+    return resultado
+
+
+# Escrita do resumo antes dos deltas (migração e9b4d7c2a615): todos os webhooks do
+# mesmo dia/produto/status atualizam a mesma linha e esperam uns pelos outros até o commit
+SQL_LINHA_QUENTE = """
+    INSERT INTO resumo_diario_transacoes AS r
+        (dia, plataforma, produto_nome, tipo_plano, classe_status,
+         quantidade, vendas, valor_bruto, valor_liquido, taxa_reembolso)
+    VALUES (CAST(:dia AS date), 'benchmark', 'Produto benchmark', 'mensal', 'aprovada', 1, 1, :valor, :valor, 0)
+    ON CONFLICT (dia, plataforma, produto_nome, tipo_plano, classe_status) DO UPDATE SET
+        quantidade = r.quantidade + excluded.quantidade,
+        vendas = r.vendas + excluded.vendas,
+        valor_bruto = r.valor_bruto + excluded.valor_bruto,
+        valor_liquido = r.valor_liquido + excluded.valor_liquido,
+        taxa_reembolso = r.taxa_reembolso + excluded.taxa_reembolso
+"""
+# Escrita atual: o trigger só insere um delta (migração c8e3f1a5d207)
+SQL_DELTA = """
+    SELECT resumo_transacao_aplicar(:dia, 'benchmark', 'Produto benchmark', 'mensal', 'approved', :valor, :valor, 0, 1)
+"""
+VARIANTES_RESUMOS = [("linha_quente", SQL_LINHA_QUENTE), ("delta", SQL_DELTA)]
+
+
+def medir_resumos(args) -> Dict[str, Any]:
+    """Vazão e latência da escrita dos resumos em cada variante, com a mesma carga"""
+    from sqlalchemy import create_engine, text
+    from utils.database_config import database_config
+
+    motor = create_engine(database_config.DATABASE_URL, pool_size=args.concorrencia, max_overflow=0)
+    dia = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    trabalho = text("SELECT pg_sleep(:segundos)")
+
+    def transacao(sql) -> float:
+        inicio = time.perf_counter()
+        with motor.connect() as conexao:
+            # Mesma ordem do handler: a escrita que dispara o trigger e, depois, o resto do evento
+            conexao.execute(text(sql), {"dia": dia, "valor": 97})
+            if args.trabalho_ms:
+                conexao.execute(trabalho, {"segundos": args.trabalho_ms / 1000})
+            conexao.rollback()
+        return (time.perf_counter() - inicio) * 1000
+
+    variantes = {}
+    try:
+        for nome, sql in VARIANTES_RESUMOS:
+            transacao(sql)  # aquece o pool e o plano
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+                latencias = list(executor.map(lambda _: transacao(sql), range(args.eventos)))
+            duracao = time.perf_counter() - inicio
+            variantes[nome] = {
+                "duracao_s": round(duracao, 3),
+                "vazao_eventos_s": round(args.eventos / duracao, 2) if duracao else 0.0,
+                "latencia_p50_ms": round(percentil(latencias, 50), 2),
+                "latencia_p95_ms": round(percentil(latencias, 95), 2),
+                "latencia_p99_ms": round(percentil(latencias, 99), 2),
+            }
+    finally:
+        motor.dispose()
+
+    antes, depois = variantes["linha_quente"]["vazao_eventos_s"], variantes["delta"]["vazao_eventos_s"]
+    return {
+        "modo": "resumos",
+        "eventos": args.eventos,
+        "concorrencia": args.concorrencia,
+        "trabalho_ms": args.trabalho_ms,
+        "variantes": variantes,
+        "ganho_vazao": round(depois / antes, 2) if antes else None,
+    }
+
+
+# Métricas do gate: (nome, maior é melhor)
+METRICAS_GATE = [
+    ("vazao_eventos_s", True),
+    ("latencia_p95_ms", False),
+    ("latencia_p99_ms", False),
+    ("statements_por_evento", False),
+]
+
+
+def comparar_baseline(resultado: Dict[str, Any], baseline: Dict[str, Any], tolerancia: float, max_erro: float) -> List[str]:
+    """Regressões acima da tolerância relativa (lista vazia = aprovado)"""
+    regressoes = []
+    for metrica, maior_melhor in METRICAS_GATE:
+        atual, anterior = resultado.get(metrica), baseline.get(metrica)
+        if atual is None or not anterior:
+            continue
+        variacao = (atual - anterior) / anterior
+        if (maior_melhor and variacao < -tolerancia) or (not maior_melhor and variacao > tolerancia):
+            regressoes.append(f"{metrica}: {anterior} -> {atual} ({variacao:+.1%})")
+    if resultado["taxa_erro"] > max_erro:
+        regressoes.append(f"taxa_erro: {resultado['taxa_erro']:.2%} (máximo {max_erro:.2%})")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de vazão e latência dos webhooks")
+    parser.add_argument("--modo", choices=["inprocess", "http", "resumos"], default="inprocess")
+    parser.add_argument("--url", default="http://localhost:8000/api", help="Base da API no modo http")
+    parser.add_argument("--plataforma", choices=["guru", "ticto", "todas"], default="todas")
+    parser.add_argument("--eventos", type=int, default=1000, help="Total de eventos sintetizados")
+    parser.add_argument("--rps", type=float, default=0, help="Taxa alvo (0 = o mais rápido possível)")
+    parser.add_argument("--concorrencia", type=int, default=32, help="Requisições simultâneas no máximo")
+    parser.add_argument("--semente", type=int, help="Semente aleatória (fluxos reproduzíveis)")
+    parser.add_argument("--pasta", default=PASTA_EXEMPLOS, help="Pasta com os payloads de exemplo")
+    parser.add_argument("--salvar-baseline", help="Grava o resultado como baseline neste arquivo")
+    parser.add_argument("--baseline", help="Compara com a baseline e falha se houver regressão")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="Variação relativa aceita no gate")
+    parser.add_argument("--max-erro", type=float, default=0.0, help="Taxa de erro máxima aceita no gate")
+    parser.add_argument("--trabalho-ms", type=float, default=5, help="Modo resumos: duração de cada transação após a escrita")
+    args = parser.parse_args()
+
+    if args.modo == "resumos":
+        if args.baseline or args.salvar_baseline:
+            parser.error("--baseline/--salvar-baseline não se aplicam ao modo resumos")
+        print(json.dumps(medir_resumos(args), indent=2, ensure_ascii=False))
+        return
+
+    resultado = asyncio.run(executar(args))
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+    if args.salvar_baseline:
+        os.makedirs(os.path.dirname(args.salvar_baseline) or ".", exist_ok=True)
+        with open(args.salvar_baseline, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f"💾 Baseline gravada em {args.salvar_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as arquivo:
+            baseline = json.load(arquivo)
+        regressoes = comparar_baseline(resultado, baseline, args.tolerancia, args.max_erro)
+        if regressoes:
+            print("❌ Regressão em relação à baseline:")
+            for regressao in regressoes:
+                print(f"   {regressao}")
+            sys.exit(1)
+        print("✅ Sem regressão em relação à baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Catálogo de produtos e ofertas (tabelas produtos e ofertas)
+Produtos e ofertas novos são registrados sem tipo pela ingestão
+(services/catalogo.py); este script lista o catálogo e classifica entradas.
+A API relê o catálogo em até WEBHOOK_CATALOG_RELOAD_INTERVAL segundos, sem
+deploy. Transações já gravadas mantêm o tipo_plano anterior: o histórico é
+refeito com scripts/reprojetar_transacoes.py.
+
+- listar: produtos e ofertas com id, chave de origem, nome e tipo
+- classificar: define o tipo de um produto (product_id) ou oferta (offer_code
+  na Ticto, nome da oferta na Guru)
+
+Uso:
+    python -m src.scripts.catalogo_produtos listar [--sem-tipo]
+    python -m src.scripts.catalogo_produtos classificar produto guru 1741887379 anual
+    python -m src.scripts.catalogo_produtos classificar oferta ticto O8578C9AB anual
+"""
+
+import argparse
+import os
+import sys
+
+# Adiciona o diretório src (e a raiz, usada por imports "src.") ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from sqlalchemy import text
+
+from database.connection import engine
+from services.catalogo import TIPOS_ESPECIAIS, TIPOS_PLANO
+
+# entidade -> (tabela, coluna da chave de origem)
+TABELAS = {
+    "produto": ("produtos", "id_origem"),
+    "oferta": ("ofertas", "chave"),
+}
+
+
+def listar(sem_tipo: bool):
+    filtro = "WHERE tipo IS NULL" if sem_tipo else ""
+    with engine.connect() as conexao:
+        for entidade, (tabela, coluna) in TABELAS.items():
+            linhas = conexao.execute(text(
+                f"SELECT id, plataforma, {coluna}, nome, tipo FROM {tabela} {filtro} ORDER BY plataforma, id"
+            )).all()
+            print(f"📦 {tabela} ({len(linhas)})")
+            for id_, plataforma, chave, nome, tipo in linhas:
+                print(f"   {id_:>5}  {plataforma:<6} {chave:<24} {(tipo or '-'):<16} {nome or ''}")
+
+
+def classificar(entidade: str, plataforma: str, chave: str, tipo: str) -> bool:
+    tabela, coluna = TABELAS[entidade]
+    with engine.begin() as conexao:
+        resultado = conexao.execute(
+            text(f"UPDATE {tabela} SET tipo = :tipo WHERE plataforma = :plataforma AND {coluna} = :chave"),
+            {"tipo": tipo, "plataforma": plataforma, "chave": chave},
+        )
+    return resultado.rowcount > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catálogo de produtos e ofertas")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    lista = comandos.add_parser("listar", help="Lista produtos e ofertas")
+    lista.add_argument("--sem-tipo", action="store_true", help="Só entradas ainda não classificadas")
+
+    classifica = comandos.add_parser("classificar", help="Define o tipo de um produto ou oferta")
+    classifica.add_argument("entidade", choices=sorted(TABELAS))
+    classifica.add_argument("plataforma", choices=["guru", "ticto"])
+    classifica.add_argument("chave", help="product_id, offer_code (Ticto) ou nome da oferta (Guru)")
+    classifica.add_argument("tipo", choices=[*TIPOS_PLANO, *TIPOS_ESPECIAIS])
+    args = parser.parse_args()
+
+    if args.comando == "listar":
+        listar(args.sem_tipo)
+
+    elif args.comando == "classificar":
+        if not classificar(args.entidade, args.plataforma, args.chave, args.tipo):
+            print(f"❌ {args.entidade} não encontrado: {args.plataforma} {args.chave}")
+            sys.exit(1)
+        print(f"✅ {args.entidade} {args.plataforma} {args.chave} classificado como {args.tipo}")
+
+
+if __name__ == "__main__":
+    main()
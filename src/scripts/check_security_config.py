@@ -50,7 +50,7 @@ def check_security_config():
         # Verifica configurações de rate limiting
         rate_limit_min = security_config.RATE_LIMIT_PER_MINUTE
         rate_limit_hour = security_config.RATE_LIMIT_PER_HOUR
-        print(f"✅ Rate Limiting: {rate_limit_min}/min, {rate_limit_hour}/hora")
+        print(f"✅ Rate Limiting: {rate_limit_min}/min, {rate_limit_hour}/hora (backend: {security_config.RATE_LIMIT_BACKEND})")
         
         # Verifica hosts permitidos
         allowed_hosts = security_config.ALLOWED_HOSTS
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Manutenção das partições mensais de transacoes
+A API cria sozinha os meses futuros (services/particoes.py); este script é
+para operação manual e verificação:
+
+- criar: cria o mês atual e os N seguintes
+- listar: partições anexadas, limites e linhas estimadas
+- arquivar / reanexar: destaca um mês para o schema de arquivo e o devolve
+- verificar-poda: executa as consultas _calculate_*_for_period do
+  MetricsCalculator, roda EXPLAIN sobre os statements que elas emitiram e
+  mostra quantas partições cada uma lê; falha se uma consulta filtrada por
+  data_transacao ler todas
+
+Uso:
+    python -m src.scripts.manter_particoes criar [--meses 3]
+    python -m src.scripts.manter_particoes listar
+    python -m src.scripts.manter_particoes arquivar 2023-01 [--schema arquivo]
+    python -m src.scripts.manter_particoes reanexar 2023-01 [--schema arquivo]
+    python -m src.scripts.manter_particoes verificar-poda [--inicio 2025-01-01 --fim 2025-01-31]
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Set, Tuple
+
+# Adiciona o diretório src (e a raiz, usada por imports "src.") ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from sqlalchemy import event
+
+from database.connection import engine, read_engine, get_read_session
+from services.metrics_calculator import MetricsCalculator
+from services.particoes import (
+    arquivar_particao, garantir_particoes, listar_particoes, reanexar_particao,
+)
+
+# Consultas por período: (método, filtra por transacoes.data_transacao). Os
+# limites usados aqui não são dias inteiros, então os métodos leem transacoes
+# (com dias inteiros eles leem os resumos diários, fora da tabela particionada)
+# _calculate_alunos_for_period filtra assinaturas.data_inicio e junta transacoes
+# por assinatura_id, então lê todas as partições (pelo índice de assinatura)
+CONSULTAS_PERIODO = [
+    ("_calculate_faturamento_for_period", True),
+    ("_calculate_receita_bruta_for_period", True),
+    ("_calculate_vendas_for_period", True),
+    ("_calculate_alunos_for_period", False),
+]
+
+
+def _mes(valor: str) -> date:
+    return datetime.strptime(valor, "%Y-%m").date()
+
+
+def _data(valor: str) -> datetime:
+    return datetime.strptime(valor, "%Y-%m-%d")
+
+
+def _particoes_lidas(plano: Dict[str, Any], particoes: Set[str]) -> Tuple[Set[str], int]:
+    """Partições varridas pelo plano e total de subplanos removidos na execução"""
+    lidas, removidos = set(), plano.get("Subplans Removed", 0)
+    if plano.get("Relation Name") in particoes:
+        lidas.add(plano["Relation Name"])
+    for filho in plano.get("Plans", []):
+        filhas, removidos_filho = _particoes_lidas(filho, particoes)
+        lidas |= filhas
+        removidos += removidos_filho
+    return lidas, removidos
+
+
+def verificar_poda(inicio: datetime, fim: datetime) -> List[Dict[str, Any]]:
+    """
+    Executa cada consulta por período, captura os statements enviados ao banco
+    (com os parâmetros já ligados pelo driver) e roda EXPLAIN sobre eles.
+    """
+    statements: List[Tuple[str, Any]] = []
+
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("EXPLAIN"):
+            statements.append((statement, parameters))
+
+    sessao = get_read_session()
+    resultados = []
+    event.listen(read_engine, "after_cursor_execute", capturar)
+    try:
+        calculator = MetricsCalculator(sessao)
+        conexao = sessao.connection()
+        particoes = {particao["nome"] for particao in listar_particoes(conexao)}
+        for metodo, filtra_data in CONSULTAS_PERIODO:
+            statements.clear()
+            getattr(calculator, metodo)(inicio, fim)
+            for statement, parametros in list(statements):
+                plano = conexao.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parametros).scalar()
+                if isinstance(plano, str):
+                    plano = json.loads(plano)
+                lidas, removidos = _particoes_lidas(plano[0]["Plan"], particoes)
+                resultados.append({
+                    "metodo": metodo,
+                    "filtra_data": filtra_data,
+                    "lidas": sorted(lidas),
+                    "removidos_execucao": removidos,
+                    "total": len(particoes),
+                })
+    finally:
+        event.remove(read_engine, "after_cursor_execute", capturar)
+        sessao.close()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção das partições mensais de transacoes")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    criar = comandos.add_parser("criar", help="Cria o mês atual e os seguintes")
+    criar.add_argument("--meses", type=int, help="Meses futuros (padrão: TRANSACOES_PARTITION_MONTHS_AHEAD)")
+
+    comandos.add_parser("listar", help="Lista as partições anexadas")
+
+    for nome, ajuda in (("arquivar", "Destaca um mês para o schema de arquivo"),
+                        ("reanexar", "Devolve um mês arquivado a transacoes")):
+        sub = comandos.add_parser(nome, help=ajuda)
+        sub.add_argument("mes", type=_mes, help="Mês no formato AAAA-MM")
+        sub.add_argument("--schema", help="Schema de arquivo (padrão: TRANSACOES_PARTITION_ARCHIVE_SCHEMA)")
+
+    poda = comandos.add_parser("verificar-poda", help="Confere a poda de partições das consultas por período")
+    poda.add_argument("--inicio", type=_data, help="Data inicial (YYYY-MM-DD, padrão: 30 dias atrás)")
+    poda.add_argument("--fim", type=_data, help="Data final (YYYY-MM-DD, padrão: hoje)")
+    args = parser.parse_args()
+
+    if args.comando == "criar":
+        criadas = garantir_particoes(args.meses)
+        print(f"✅ Partições criadas: {', '.join(criadas)}" if criadas else "✅ Nenhuma partição a criar")
+
+    elif args.comando == "listar":
+        with engine.connect() as conexao:
+            for particao in listar_particoes(conexao):
+                print(f"   {particao['nome']:<22} {particao['linhas_estimadas']:>12} linhas  {particao['limites']}")
+
+    elif args.comando == "arquivar":
+        print(f"📦 Arquivada: {arquivar_particao(args.mes, args.schema)}")
+
+    elif args.comando == "reanexar":
+        print(f"🔗 Reanexada: {reanexar_particao(args.mes, args.schema)}")
+
+    elif args.comando == "verificar-poda":
+        fim = args.fim or datetime.now()
+        inicio = args.inicio or fim - timedelta(days=30)
+        print(f"🔍 Poda de partições de {inicio:%Y-%m-%d} a {fim:%Y-%m-%d}")
+        falhas = []
+        for resultado in verificar_poda(inicio, fim):
+            lidas = len(resultado["lidas"])
+            print(f"   {resultado['metodo']:<38} {lidas}/{resultado['total']} partições lidas"
+                  + (f", {resultado['removidos_execucao']} removidas na execução" if resultado["removidos_execucao"] else "")
+                  + (f" ({', '.join(resultado['lidas'])})" if lidas <= 4 else ""))
+            if resultado["filtra_data"] and resultado["total"] > 1 and lidas >= resultado["total"]:
+                falhas.append(resultado["metodo"])
+        if falhas:
+            print(f"❌ Sem poda de partições: {', '.join(falhas)}")
+            sys.exit(1)
+        print("✅ Consultas filtradas por data_transacao leem só os meses do período")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Reconstrução dos resumos diários (resumo_diario_transacoes / resumo_diario_alunos)
+Os triggers mantêm os resumos a cada escrita; este script os refaz a partir
+de transacoes e assinaturas — depois de cargas feitas com os triggers
+desligados, de correções manuais no banco ou para conferir divergências.
+
+Cada mês é reconstruído em uma transação REPEATABLE READ, sem travar as
+tabelas: webhooks seguem gravando deltas e a consolidação dos deltas espera
+o fim do script. Meses arquivados (services/particoes.py) não estão
+em transacoes: reconstruí-los zera os seus totais.
+
+Uso:
+    python -m src.scripts.reconstruir_resumos [--inicio 2024-01-01] [--fim 2024-12-31]
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# Adiciona o diretório src (e a raiz, usada por imports "src.") ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from services.resumos import limites_historico, reconstruir_resumos
+
+
+def _data(valor: str):
+    return datetime.strptime(valor, "%Y-%m-%d").date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstrução dos resumos diários de transações e alunos")
+    parser.add_argument("--inicio", type=_data, help="Primeiro dia (YYYY-MM-DD, padrão: início do histórico)")
+    parser.add_argument("--fim", type=_data, help="Último dia (YYYY-MM-DD, padrão: fim do histórico ou hoje)")
+    args = parser.parse_args()
+
+    primeiro, ultimo = limites_historico()
+    primeiro = args.inicio or primeiro
+    ultimo = args.fim or ultimo
+    if primeiro > ultimo:
+        print(f"❌ Intervalo inválido: {primeiro} > {ultimo}")
+        sys.exit(1)
+
+    print(f"🔄 Reconstruindo resumos de {primeiro} a {ultimo}")
+    intervalos = reconstruir_resumos(primeiro, ultimo, progresso=lambda inicio, fim: print(f"   ✔ {inicio} a {fim}"))
+    print(f"✅ {intervalos} meses reconstruídos")
+
+
+if __name__ == "__main__":
+    main()
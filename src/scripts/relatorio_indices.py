@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Relatório EXPLAIN ANALYZE dos índices de métricas (antes/depois)
+Cria um schema descartável com clientes, assinaturas e transacoes (mesma
+definição de database/models.py), popula com dados sintéticos via
+generate_series e roda as consultas do dashboard e da ingestão duas vezes:
+sem os índices da migração b7d4e2a9c315 e com eles.
+
+Para cada consulta o relatório traz o tempo de execução medido pelo
+PostgreSQL, os buffers lidos e os nós de varredura do plano (Seq Scan,
+Index Scan, Index Only Scan, Bitmap Heap Scan) por tabela. Nada é estimado:
+os números são os da execução no banco apontado por DATABASE_URL.
+
+Uso:
+    python -m src.scripts.relatorio_indices [--linhas 200000] [--semente 0.42]
+        [--schema relatorio_indices] [--saida logs/relatorio_indices.md] [--manter]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+# Adiciona o diretório src (e a raiz, usada por imports "src.") ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from database.models import Base, Cliente, Assinatura, Transacao, ChaveTransacao
+from services.particoes import criar_particao, inicio_mes, somar_meses, PARTICAO_PADRAO
+from utils.database_config import database_config
+
+TABELAS = [Cliente.__table__, Assinatura.__table__, ChaveTransacao.__table__, Transacao.__table__]
+
+# Meses cobertos pelos dados sintéticos (os dois anos até hoje)
+MESES_DADOS = 25
+
+# Nomes de partições e dos índices delas (transacoes_2025_03_...) agrupados no relatório
+_PARTICAO = re.compile(r"transacoes_\d{4}_\d{2}")
+
+# Índices criados pelas migrações b7d4e2a9c315 e f2a6c8d4b931 (definições em database/models.py)
+INDICES_METRICAS = [
+    "ix_transacoes_aprovadas_data",
+    "ix_transacoes_data",
+    "ix_transacoes_assinatura",
+    "ix_assinaturas_data_inicio",
+    "ix_assinaturas_validas_expiracao",
+    "ix_assinaturas_canceladas_atualizacao",
+    "ix_assinaturas_data_cancelamento",
+    "ix_assinaturas_validas_tipo_plano",
+    "ix_clientes_email_lower",
+]
+
+PRODUTOS = "ARRAY['Comunidade Mensal', 'Comunidade Anual', 'Order Bump']"
+
+# Distribuições aproximadas da base real: maioria aprovada, cauda de recusas/reembolsos
+SQL_CLIENTES = """
+    INSERT INTO clientes (nome, email, data_criacao)
+    SELECT 'Cliente ' || g, 'Cliente' || g || '@Exemplo.com', now() - random() * interval '730 days'
+    FROM generate_series(1, :clientes) g
+"""
+SQL_ASSINATURAS = """
+    INSERT INTO assinaturas (id_assinatura_origem, plataforma, cliente_id, produto_nome, status,
+                             data_inicio, data_cancelamento, data_expiracao_acesso,
+                             valor_mensal, valor_anual, ultima_atualizacao)
+    SELECT 'sub_' || g,
+           CASE WHEN g % 2 = 0 THEN 'guru' ELSE 'ticto' END,
+           1 + g % :clientes,
+           (""" + PRODUTOS + """)[1 + g % 2],
+           s.status,
+           s.inicio,
+           CASE WHEN s.status IN ('canceled', 'subscription_canceled') THEN s.inicio + random() * interval '300 days' END,
+           s.inicio + (1 + floor(random() * 12)) * interval '1 month',
+           CASE WHEN g % 2 = 0 THEN 49.90 END,
+           CASE WHEN g % 2 = 1 THEN 478.80 END,
+           s.inicio + random() * interval '300 days'
+    FROM (
+        SELECT g,
+               (ARRAY['active', 'active', 'active', 'active', 'canceled', 'subscription_canceled',
+                      'expired', 'pending', 'refunded', 'chargeback'])[1 + floor(random() * 10)::int] AS status,
+               now() - random() * interval '730 days' AS inicio
+        FROM generate_series(1, :assinaturas) g
+    ) s
+"""
+SQL_TRANSACOES = """
+    INSERT INTO transacoes (id, id_transacao_origem, assinatura_id, cliente_id, plataforma, status,
+                            valor, valor_liquido, valor_bruto, metodo_pagamento, data_transacao, produto_nome,
+                            tipo_plano)
+    SELECT g, 'tx_' || g,
+           CASE WHEN g % 5 <> 0 THEN 1 + g % :assinaturas END,
+           1 + g % :clientes,
+           CASE WHEN g % 2 = 0 THEN 'guru' ELSE 'ticto' END,
+           t.status,
+           t.valor, round(t.valor * 0.9, 2), t.valor,
+           (ARRAY['credit_card', 'pix', 'boleto'])[1 + g % 3],
+           now() - random() * interval '730 days',
+           (""" + PRODUTOS + """)[1 + g % 3],
+           (ARRAY['mensal', 'anual', 'desconhecido'])[1 + g % 3]
+    FROM (
+        SELECT g,
+               (ARRAY['approved', 'approved', 'approved', 'approved', 'paid', 'authorized',
+                      'refused', 'refunded', 'waiting_payment', 'chargeback'])[1 + floor(random() * 10)::int] AS status,
+               round((20 + random() * 480)::numeric, 2) AS valor
+        FROM generate_series(1, :transacoes) g
+    ) t
+"""
+SQL_CHAVES = """
+    INSERT INTO transacoes_chaves (transacao_id, id_transacao_origem, produto_nome)
+    SELECT id, id_transacao_origem, produto_nome FROM transacoes
+"""
+
+# (nome, SQL) com os predicados das consultas de services/metrics_calculator.py,
+# dashboard/callbacks e da ingestão
+CONSULTAS: List[Tuple[str, str]] = [
+    ("receita_periodo", """
+        SELECT plataforma, SUM(valor_liquido) FROM transacoes
+        WHERE data_transacao BETWEEN :inicio AND :fim
+          AND status IN ('approved', 'paid', 'authorized') AND valor_liquido > 0
+        GROUP BY plataforma
+    """),
+    ("vendas_aprovadas_ate_ref", """
+        SELECT plataforma, COUNT(*) FROM transacoes
+        WHERE status = 'approved' AND data_transacao <= :fim
+        GROUP BY plataforma
+    """),
+    ("transacoes_periodo", """
+        SELECT COUNT(*) FROM transacoes WHERE data_transacao BETWEEN :inicio AND :fim
+    """),
+    ("novas_assinaturas_com_venda", """
+        SELECT a.plataforma, COUNT(DISTINCT a.id), SUM(t.valor_bruto)
+        FROM assinaturas a
+        INNER JOIN transacoes t ON a.id = t.assinatura_id
+        WHERE a.data_inicio BETWEEN :inicio AND :fim
+          AND a.status NOT IN ('refunded', 'chargeback')
+          AND t.status IN ('approved', 'paid', 'authorized') AND t.valor_bruto > 0
+        GROUP BY a.plataforma
+    """),
+    ("mrr_ativas", """
+        SELECT plataforma, COUNT(*), SUM(mrr_contribuicao) FROM assinaturas
+        WHERE data_expiracao_acesso >= :fim
+          AND status NOT IN ('refunded', 'chargeback')
+          AND tipo_plano IN ('mensal', 'anual')
+        GROUP BY plataforma
+    """),
+    ("mrr_por_tipo_plano", """
+        SELECT plataforma, COUNT(*), SUM(mrr_contribuicao) FROM assinaturas
+        WHERE tipo_plano = 'anual'
+          AND data_expiracao_acesso >= :fim
+          AND status NOT IN ('refunded', 'chargeback')
+        GROUP BY plataforma
+    """),
+    ("cancelamentos_periodo", """
+        SELECT plataforma, COUNT(*) FROM assinaturas
+        WHERE status IN ('canceled', 'subscription_canceled')
+          AND ultima_atualizacao BETWEEN :inicio AND :fim
+          AND EXTRACT(EPOCH FROM (ultima_atualizacao - data_inicio)) / 3600 > 72
+        GROUP BY plataforma
+    """),
+    ("cancelamentos_data_cancelamento", """
+        SELECT COUNT(*) FROM assinaturas a
+        WHERE a.data_cancelamento IS NOT NULL AND a.data_cancelamento BETWEEN :inicio AND :fim
+    """),
+    ("webhook_transacao_origem", """
+        SELECT t.id, t.data_transacao FROM transacoes_chaves c
+        JOIN transacoes t ON t.id = c.transacao_id
+        WHERE c.id_transacao_origem = :origem AND c.produto_nome = :produto
+    """),
+    ("cliente_email", """
+        SELECT id FROM clientes WHERE lower(email) = lower(:email)
+    """),
+]
+
+NOS_VARREDURA = ("Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan", "Bitmap Index Scan")
+
+
+def _varreduras(plano: Dict[str, Any]) -> List[str]:
+    """
+    Nós de varredura do plano, como "Seq Scan clientes" / "Index Scan ix_...";
+    partições de transacoes aparecem agrupadas ("... transacoes_AAAA_MM (×3)").
+    """
+    contagem: Counter = Counter()
+
+    def visitar(no: Dict[str, Any]):
+        if no.get("Node Type") in NOS_VARREDURA:
+            alvo = no.get("Index Name") or no.get("Relation Name")
+            contagem[f"{no['Node Type']} {_PARTICAO.sub('transacoes_AAAA_MM', alvo)}"] += 1
+        for filho in no.get("Plans", []):
+            visitar(filho)
+
+    visitar(plano)
+    return [f"{no} (×{vezes})" if vezes > 1 else no for no, vezes in contagem.items()]
+
+
+def _buffers(plano: Dict[str, Any]) -> int:
+    return plano.get("Shared Hit Blocks", 0) + plano.get("Shared Read Blocks", 0)
+
+
+def medir(conexao, parametros: Dict[str, Any], repeticoes: int) -> Dict[str, Dict[str, Any]]:
+    """Roda EXPLAIN ANALYZE de cada consulta; guarda a última execução (cache aquecido)"""
+    resultados = {}
+    for nome, sql in CONSULTAS:
+        for _ in range(repeticoes):
+            saida = conexao.execute(text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql), parametros).scalar()
+        explicacao = (json.loads(saida) if isinstance(saida, str) else saida)[0]
+        resultados[nome] = {
+            "tempo_ms": explicacao["Execution Time"],
+            "buffers": _buffers(explicacao["Plan"]),
+            "varreduras": _varreduras(explicacao["Plan"]),
+        }
+    return resultados
+
+
+def preparar(conexao, schema: str, linhas: int, semente: float):
+    conexao.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
+    conexao.execute(text(f'CREATE SCHEMA "{schema}"'))
+    conexao.execute(text(f'SET search_path TO "{schema}"'))
+    # Tabelas com a definição atual dos modelos, sem os índices de métricas
+    Base.metadata.create_all(conexao, tables=TABELAS)
+    for nome in INDICES_METRICAS:
+        conexao.execute(text(f'DROP INDEX "{nome}"'))
+    # transacoes é particionada: um mês por partição, como em produção
+    conexao.execute(text(f"CREATE TABLE {PARTICAO_PADRAO} PARTITION OF transacoes DEFAULT"))
+    primeiro = somar_meses(inicio_mes(datetime.now()), 1 - MESES_DADOS)
+    for meses in range(MESES_DADOS + 1):
+        criar_particao(conexao, somar_meses(primeiro, meses))
+
+    clientes = max(linhas // 4, 1)
+    assinaturas = max(linhas // 3, 1)
+    conexao.execute(text("SELECT setseed(:semente)"), {"semente": semente})
+    print(f"📥 Gerando {clientes} clientes, {assinaturas} assinaturas e {linhas} transações...")
+    conexao.execute(text(SQL_CLIENTES), {"clientes": clientes})
+    conexao.execute(text(SQL_ASSINATURAS), {"clientes": clientes, "assinaturas": assinaturas})
+    conexao.execute(text(SQL_TRANSACOES), {"clientes": clientes, "assinaturas": assinaturas, "transacoes": linhas})
+    conexao.execute(text(SQL_CHAVES))
+    # VACUUM marca as páginas no visibility map (Index Only Scan sem ir ao heap)
+    conexao.execute(text("VACUUM ANALYZE clientes, assinaturas, transacoes_chaves, transacoes"))
+
+
+def criar_indices(conexao):
+    for tabela in TABELAS:
+        for indice in tabela.indexes:
+            if indice.name in INDICES_METRICAS:
+                indice.create(conexao)
+    conexao.execute(text("VACUUM ANALYZE clientes, assinaturas, transacoes_chaves, transacoes"))
+
+
+def relatorio_markdown(antes: Dict, depois: Dict, linhas: int) -> str:
+    texto = [
+        f"# Relatório de índices de métricas ({datetime.now():%Y-%m-%d %H:%M})",
+        "",
+        f"Dados sintéticos: {linhas} transações, {max(linhas // 3, 1)} assinaturas, {max(linhas // 4, 1)} clientes.",
+        "Tempos de EXPLAIN ANALYZE (última de várias execuções) e buffers compartilhados lidos.",
+        "",
+        "| Consulta | Antes (ms) | Depois (ms) | Buffers antes | Buffers depois | Varreduras antes | Varreduras depois |",
+        "|----------|-----------:|------------:|--------------:|---------------:|------------------|-------------------|",
+    ]
+    for nome, _ in CONSULTAS:
+        a, d = antes[nome], depois[nome]
+        texto.append(
+            f"| {nome} | {a['tempo_ms']:.2f} | {d['tempo_ms']:.2f} | {a['buffers']} | {d['buffers']} "
+            f"| {'<br>'.join(a['varreduras'])} | {'<br>'.join(d['varreduras'])} |"
+        )
+    seq = [nome for nome, _ in CONSULTAS if any(v.startswith("Seq Scan") for v in depois[nome]["varreduras"])]
+    texto.append("")
+    texto.append("Seq Scan restantes: " + (", ".join(seq) if seq else "nenhum"))
+    return "\n".join(texto) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE antes/depois dos índices de métricas")
+    parser.add_argument("--linhas", type=int, default=200000, help="Transações sintéticas")
+    parser.add_argument("--semente", type=float, default=0.42, help="Semente do random() do PostgreSQL (-1 a 1)")
+    parser.add_argument("--schema", default="relatorio_indices", help="Schema descartável usado no relatório")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Execuções por consulta (vale a última)")
+    parser.add_argument("--saida", help="Grava o relatório em Markdown neste arquivo")
+    parser.add_argument("--manter", action="store_true", help="Não remove o schema ao final")
+    args = parser.parse_args()
+
+    # Engine próprio, sem pool: search_path e statement_timeout não vazam para outras conexões
+    engine = create_engine(database_config.DATABASE_URL, poolclass=NullPool)
+    parametros = {
+        "inicio": datetime.now() - timedelta(days=30),
+        "fim": datetime.now(),
+        "origem": f"tx_{args.linhas // 2}",
+        "produto": ["Comunidade Mensal", "Comunidade Anual", "Order Bump"][(args.linhas // 2) % 3],
+        "email": f"cliente{max(args.linhas // 8, 1)}@exemplo.com",
+    }
+
+    # AUTOCOMMIT: VACUUM não roda dentro de transação
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexao:
+        conexao.execute(text("SET statement_timeout = 0"))
+        try:
+            preparar(conexao, args.schema, args.linhas, args.semente)
+            print("🔍 Medindo sem os índices...")
+            antes = medir(conexao, parametros, args.repeticoes)
+            print("🏗️  Criando índices...")
+            criar_indices(conexao)
+            print("🔍 Medindo com os índices...")
+            depois = medir(conexao, parametros, args.repeticoes)
+        finally:
+            if not args.manter:
+                conexao.execute(text(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE'))
+
+    relatorio = relatorio_markdown(antes, depois, args.linhas)
+    print(relatorio)
+    if args.saida:
+        os.makedirs(os.path.dirname(args.saida) or ".", exist_ok=True)
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(relatorio)
+        print(f"💾 Relatório gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
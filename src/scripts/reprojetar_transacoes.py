@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Re-projeção de transações a partir do arquivo de payloads brutos
+Reaplica os payloads gravados em payloads_transacoes com as regras de
+mapeamento atuais (utils/helpers.py, catálogo de produtos, valores), sem
+chamar as APIs da Guru/Ticto.
+
+- Lê o arquivo em ordem de id (ordem de chegada) com cursor do lado do servidor;
+  cada transação recebe de novo todos os eventos que a criaram ou alteraram
+- Distribui os payloads em partições pela entidade de origem (mesma raia de
+  services/ordenacao.py): eventos do mesmo pedido/transação ficam na mesma
+  partição e são reaplicados em ordem; partições rodam em paralelo em um pool
+  de processos
+- Cada lote é gravado em uma única transação (erros de um payload desfazem
+  apenas o savepoint daquele payload); a re-projeção não anexa novas linhas
+  ao arquivo nem altera assinaturas
+- O checkpoint guarda o maior id até o qual tudo foi confirmado; a execução
+  seguinte continua dali (--reiniciar começa do zero)
+
+Assinaturas não são re-projetadas: o arquivo só guarda payloads de transações
+(os webhooks de assinatura da Guru e o uncanceled da Ticto não são arquivados),
+e reaplicar apenas esses eventos voltaria as assinaturas a estados antigos.
+Assinaturas existentes ficam como estão; só as que não existem são criadas.
+
+Uso:
+    python -m src.scripts.reprojetar_transacoes [--processos 4] [--lote 500]
+        [--plataforma guru|ticto] [--checkpoint logs/reprojecao_checkpoint.json] [--reiniciar]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+# Adiciona o diretório src (e a raiz, usada por imports "src.") ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from database.connection import engine, get_session, unit_of_work
+from database.models import PayloadTransacao
+from database.upserts import CHAVE_ASSINATURAS_SOMENTE_LEITURA, CHAVE_SEM_ARQUIVO
+from services.ordenacao import chave_entidade
+from scripts.backfill_utils import setup_logging
+
+CHECKPOINT_PADRAO = os.path.join("logs", "reprojecao_payloads_checkpoint.json")
+
+# (id do payload, plataforma, payload)
+Linha = Tuple[int, str, Any]
+
+# Tentativas por lote em caso de deadlock/serialização entre partições
+MAX_TENTATIVAS_LOTE = 3
+
+_processador_historico = None
+
+
+def _iniciar_worker():
+    # Conexões herdadas do processo pai (fork) não podem ser reutilizadas
+    engine.dispose(close=False)
+
+
+def _reprojetar_linha(uow, plataforma: str, payload: Any) -> str:
+    """Reaplica um payload na sessão do lote e retorna o status do resultado"""
+    global _processador_historico
+    from services.webhook_handler import _rotear_webhook
+    from services.idempotencia import status_resultado
+
+    if isinstance(payload, dict) and payload.get("processed_by") == "historical_data_processor":
+        # Linhas do backfill histórico da Ticto guardam a order da API
+        if _processador_historico is None:
+            from services.data_processor import HistoricalDataProcessor
+            _processador_historico = HistoricalDataProcessor()
+        resultado = _processador_historico.process_ticto_order(payload["order_data"], session=uow)
+    else:
+        resultado = _rotear_webhook(plataforma, payload, session=uow)
+    return status_resultado(resultado) or "processado"
+
+
+def reprojetar_lote(linhas: List[Linha]) -> Dict[str, Any]:
+    """
+    Reaplica um lote de payloads em uma única transação (executado nos workers).
+    """
+    for tentativa in range(1, MAX_TENTATIVAS_LOTE + 1):
+        contagem = {"processadas": 0, "erros": 0, "amostra_erros": []}
+        try:
+            with unit_of_work() as uow:
+                # Os payloads reaplicados já estão no arquivo
+                uow.info[CHAVE_SEM_ARQUIVO] = True
+                # O arquivo não tem os eventos de assinatura: o estado gravado é mantido
+                uow.info[CHAVE_ASSINATURAS_SOMENTE_LEITURA] = True
+                for payload_id, plataforma, payload in linhas:
+                    try:
+                        with uow.begin_nested():
+                            status = _reprojetar_linha(uow, plataforma, payload)
+                        if status == "erro":
+                            contagem["erros"] += 1
+                        else:
+                            contagem["processadas"] += 1
+                    except OperationalError:
+                        raise
+                    except Exception as e:
+                        contagem["erros"] += 1
+                        if len(contagem["amostra_erros"]) < 5:
+                            contagem["amostra_erros"].append(f"payload {payload_id}: {e}")
+            return contagem
+        except OperationalError:
+            # Deadlock com outra partição (ex.: mesmo cliente): refaz o lote inteiro
+            if tentativa == MAX_TENTATIVAS_LOTE:
+                raise
+            time.sleep(0.5 * tentativa)
+
+
+def particao(plataforma: str, payload: Any, num_particoes: int) -> int:
+    """Partição estável pela entidade de origem (ordem preservada por entidade)"""
+    if isinstance(payload, dict) and payload.get("processed_by") == "historical_data_processor":
+        # Order da API: mesmos ids de origem usados nos webhooks
+        order_data = payload.get("order_data") or {}
+        payload = {"order": order_data.get("order") or {}}
+    chave = chave_entidade(plataforma, payload) if isinstance(payload, dict) else None
+    if chave is None:
+        return 0
+    return zlib.crc32(chave.encode("utf-8")) % num_particoes
+
+
+def ler_checkpoint(caminho: str) -> int:
+    try:
+        with open(caminho, "r", encoding="utf-8") as arquivo:
+            return int(json.load(arquivo).get("ultimo_id", 0))
+    except FileNotFoundError:
+        return 0
+
+
+def gravar_checkpoint(caminho: str, ultimo_id: int, totais: Dict[str, int]):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump({"ultimo_id": ultimo_id, **totais}, arquivo)
+    os.replace(temporario, caminho)
+
+
+class Reprojecao:
+    """
+    Lê o arquivo de payloads em streaming e coordena os lotes por partição.
+    Cada partição tem no máximo um lote em execução, o que mantém a ordem
+    dos payloads de uma mesma entidade.
+    """
+
+    def __init__(self, processos: int, tamanho_lote: int, checkpoint: str, plataforma: Optional[str], logger):
+        self.processos = processos
+        self.tamanho_lote = tamanho_lote
+        self.checkpoint = checkpoint
+        self.plataforma = plataforma
+        self.logger = logger
+        self.buffers: List[List[Linha]] = [[] for _ in range(processos)]
+        # Lote em execução por partição: (future, menor id do lote)
+        self.em_execucao: List[Optional[tuple]] = [None] * processos
+        self.totais = {"processadas": 0, "erros": 0, "lotes": 0}
+        self.ultimo_lido = 0
+
+    def _aguardar(self, indice: int):
+        em_execucao = self.em_execucao[indice]
+        if em_execucao is None:
+            return
+        contagem = em_execucao[0].result()
+        self.em_execucao[indice] = None
+        self.totais["processadas"] += contagem["processadas"]
+        self.totais["erros"] += contagem["erros"]
+        self.totais["lotes"] += 1
+        for erro in contagem["amostra_erros"]:
+            self.logger.warning(f"⚠️ {erro}")
+        gravar_checkpoint(self.checkpoint, self._id_confirmado(), self.totais)
+
+    def _id_confirmado(self) -> int:
+        """Maior id tal que todas as linhas com id menor ou igual já foram confirmadas"""
+        pendentes = [execucao[1] for execucao in self.em_execucao if execucao is not None]
+        pendentes += [buffer[0][0] for buffer in self.buffers if buffer]
+        if pendentes:
+            return min(pendentes) - 1
+        return self.ultimo_lido
+
+    def _enviar(self, pool: ProcessPoolExecutor, indice: int):
+        linhas = self.buffers[indice]
+        if not linhas:
+            return
+        self._aguardar(indice)
+        self.buffers[indice] = []
+        self.em_execucao[indice] = (pool.submit(reprojetar_lote, linhas), linhas[0][0])
+
+    def _colher_concluidos(self):
+        for indice, execucao in enumerate(self.em_execucao):
+            if execucao is not None and execucao[0].done():
+                self._aguardar(indice)
+
+    def executar(self, desde_id: int) -> Dict[str, int]:
+        self.ultimo_lido = desde_id
+        session = get_session()
+        stmt = (
+            select(PayloadTransacao.id, PayloadTransacao.plataforma, PayloadTransacao.payload)
+            .where(PayloadTransacao.id > desde_id)
+            .order_by(PayloadTransacao.id)
+            # yield_per usa cursor do lado do servidor (stream_results)
+            .execution_options(yield_per=self.tamanho_lote)
+        )
+        if self.plataforma:
+            stmt = stmt.where(PayloadTransacao.plataforma == self.plataforma)
+        inicio = time.time()
+        try:
+            with ProcessPoolExecutor(max_workers=self.processos, initializer=_iniciar_worker) as pool:
+                for payload_id, plataforma, payload in session.execute(stmt):
+                    indice = particao(plataforma, payload, self.processos)
+                    self.buffers[indice].append((payload_id, plataforma, payload))
+                    self.ultimo_lido = payload_id
+                    if len(self.buffers[indice]) >= self.tamanho_lote:
+                        self._enviar(pool, indice)
+                        self._colher_concluidos()
+                        self.logger.info(
+                            f"📊 Lidas até id {payload_id}: {self.totais['processadas']} re-projetadas, "
+                            f"{self.totais['erros']} erros ({time.time() - inicio:.1f}s)"
+                        )
+                for indice in range(self.processos):
+                    self._enviar(pool, indice)
+                for indice in range(self.processos):
+                    self._aguardar(indice)
+        finally:
+            session.close()
+        gravar_checkpoint(self.checkpoint, self.ultimo_lido, self.totais)
+        return self.totais
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-projeção das transações a partir do arquivo de payloads")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 2, help="Processos do pool")
+    parser.add_argument("--lote", type=int, default=500, help="Payloads por transação")
+    parser.add_argument("--plataforma", choices=["guru", "ticto"], help="Re-projeta apenas uma plataforma")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PADRAO, help="Arquivo de checkpoint")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignora o checkpoint e começa do primeiro id")
+    args = parser.parse_args()
+
+    logger = setup_logging("reprojecao_transacoes")
+    desde_id = 0 if args.reiniciar else ler_checkpoint(args.checkpoint)
+    logger.info(f"🚀 Re-projeção a partir do id {desde_id} ({args.processos} processos, lotes de {args.lote})")
+
+    inicio = time.time()
+    totais = Reprojecao(args.processos, args.lote, args.checkpoint, args.plataforma, logger).executar(desde_id)
+
+    logger.info(
+        f"✅ Re-projeção concluída em {time.time() - inicio:.1f}s: {totais['processadas']} re-projetadas, "
+        f"{totais['erros']} erros, {totais['lotes']} lotes"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Escritor em lote de transações
+Acumula os upserts de transação de vários webhooks concorrentes por alguns
+milissegundos (ou até N linhas) e grava tudo com INSERTs multi-linha em uma
+única transação. Cada requisição de origem é confirmada quando o seu lote faz commit.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.connection import unit_of_work
+from database.upserts import upsert_transacoes_em_lote
+from services.idempotencia import registrar_eventos_processados
+from utils.ingestion_config import ingestion_config
+from utils.logging_ingestao import obter_logger
+from utils.metricas_prometheus import handler_metricas, registrar_profundidade
+
+log = obter_logger("bulk_writer")
+
+
+class _Envio:
+    """Transações adiadas de um evento, com o fingerprint a registrar no mesmo commit"""
+
+    __slots__ = ("itens", "evento", "futuro")
+
+    def __init__(self, itens: List[Tuple[Dict[str, Any], str]], evento: Optional[tuple]):
+        self.itens = itens
+        self.evento = evento
+        self.futuro: Future = Future()
+
+
+class BulkWriter:
+    """
+    Thread única que drena a fila de envios em lotes de até `max_linhas`
+    transações, esperando no máximo `janela_ms` após o primeiro envio do lote.
+    """
+
+    def __init__(self, max_linhas: int = None, janela_ms: float = None):
+        self.max_linhas = max_linhas or ingestion_config.BULK_MAX_ROWS
+        self.janela_ms = janela_ms if janela_ms is not None else ingestion_config.BULK_WINDOW_MS
+        self._fila: "queue.Queue[_Envio]" = queue.Queue()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.total_lotes = 0
+        self.total_linhas = 0
+        self.total_fallbacks = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self):
+        with self._lock:
+            if self.ativo:
+                return
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._loop, name="bulk-writer", daemon=True)
+            self._thread.start()
+        log.info("[BULK] Escritor em lote iniciado (max_linhas=%s, janela_ms=%s)", self.max_linhas, self.janela_ms)
+
+    def parar(self, timeout: float = 10.0):
+        """
+        Sinaliza parada; os envios já enfileirados são gravados antes de a thread sair.
+        """
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def enviar(self, itens: List[Tuple[Dict[str, Any], str]], evento: Optional[tuple] = None) -> Future:
+        """
+        Enfileira as transações de um evento. O Future resolve com a lista de
+        (transacao_id, acao) na ordem de `itens` depois do commit do lote.
+        `evento` = (fingerprint, plataforma, resultado) registrado no mesmo commit.
+        """
+        if not self.ativo:
+            self.iniciar()
+        envio = _Envio(itens, evento)
+        self._fila.put(envio)
+        return envio.futuro
+
+    def _coletar_lote(self) -> List[_Envio]:
+        try:
+            primeiro = self._fila.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        lote = [primeiro]
+        linhas = len(primeiro.itens)
+        prazo = time.monotonic() + self.janela_ms / 1000
+        while linhas < self.max_linhas:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                envio = self._fila.get(timeout=restante)
+            except queue.Empty:
+                break
+            lote.append(envio)
+            linhas += len(envio.itens)
+        return lote
+
+    def _loop(self):
+        while not (self._parar.is_set() and self._fila.empty()):
+            lote = self._coletar_lote()
+            if lote:
+                self._gravar(lote)
+
+    def _gravar(self, lote: List[_Envio]):
+        try:
+            resultados = self._gravar_envios(lote)
+        except Exception as e:
+            # Uma linha inválida não deve derrubar o lote inteiro: regrava evento a evento
+            log.warning("[BULK] Falha no lote de %s eventos, gravando individualmente: %s", len(lote), e)
+            self.total_fallbacks += 1
+            for envio in lote:
+                try:
+                    envio.futuro.set_result(self._gravar_envios([envio])[0])
+                except Exception as erro:
+                    envio.futuro.set_exception(erro)
+            return
+        for envio, resultado in zip(lote, resultados):
+            envio.futuro.set_result(resultado)
+
+    def _gravar_envios(self, lote: List[_Envio]) -> List[List[Tuple[Optional[int], str]]]:
+        itens = [item for envio in lote for item in envio.itens]
+        with handler_metricas("bulk_writer"), unit_of_work() as uow:
+            resultados = upsert_transacoes_em_lote(uow, itens)
+            registrar_eventos_processados(uow, [envio.evento for envio in lote if envio.evento is not None])
+        self.total_lotes += 1
+        self.total_linhas += len(itens)
+        # Redistribui os resultados por envio
+        por_envio, inicio = [], 0
+        for envio in lote:
+            por_envio.append(resultados[inicio:inicio + len(envio.itens)])
+            inicio += len(envio.itens)
+        return por_envio
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "habilitado": ingestion_config.BULK_ENABLED,
+            "ativo": self.ativo,
+            "max_linhas": self.max_linhas,
+            "janela_ms": self.janela_ms,
+            "pendentes": self._fila.qsize(),
+            "total_lotes": self.total_lotes,
+            "total_linhas": self.total_linhas,
+            "linhas_por_lote": round(self.total_linhas / self.total_lotes, 2) if self.total_lotes else 0.0,
+            "total_fallbacks": self.total_fallbacks,
+        }
+
+
+# Instância global do escritor
+bulk_writer = BulkWriter()
+registrar_profundidade("bulk_writer", lambda: bulk_writer._fila.qsize())
@@ -0,0 +1,82 @@
+"""
+Cache de ids de entidades para o caminho de ingestão
+Clientes e assinaturas se repetem entre renovações, order bumps e mudanças de
+status; o cache evita o SELECT por email / id_assinatura_origem a cada webhook.
+
+Ids gravados dentro de uma transação só entram no cache depois do commit da
+sessão, para que um rollback nunca deixe um id inexistente em cache.
+"""
+
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+
+from database.connection import SessionLocal
+from utils.cache import TTLCache
+from utils.ingestion_config import ingestion_config
+from utils.metricas_prometheus import registrar_cache
+
+# email -> cliente_id
+_clientes = TTLCache(
+    max_itens=ingestion_config.ID_CACHE_SIZE,
+    ttl_segundos=ingestion_config.ID_CACHE_TTL_SECONDS,
+)
+# id_assinatura_origem -> assinatura_id
+_assinaturas = TTLCache(
+    max_itens=ingestion_config.ID_CACHE_SIZE,
+    ttl_segundos=ingestion_config.ID_CACHE_TTL_SECONDS,
+)
+
+registrar_cache("clientes", _clientes)
+registrar_cache("assinaturas", _assinaturas)
+
+# Chave em session.info com os ids aguardando o commit
+_CHAVE_PENDENTES = "cache_entidades_pendentes"
+
+
+def buscar_cliente_id(email: Optional[str]) -> Optional[int]:
+    if not email or not ingestion_config.ID_CACHE_ENABLED:
+        return None
+    return _clientes.get(email)
+
+
+def buscar_assinatura_id(id_assinatura_origem: Optional[str]) -> Optional[int]:
+    if not id_assinatura_origem or not ingestion_config.ID_CACHE_ENABLED:
+        return None
+    return _assinaturas.get(str(id_assinatura_origem))
+
+
+def lembrar_cliente(session, email: Optional[str], cliente_id: Optional[int]):
+    """Registra email -> cliente_id para entrar no cache após o commit da sessão"""
+    if email and cliente_id is not None and ingestion_config.ID_CACHE_ENABLED:
+        session.info.setdefault(_CHAVE_PENDENTES, []).append((_clientes, email, cliente_id))
+
+
+def lembrar_assinatura(session, id_assinatura_origem: Optional[str], assinatura_id: Optional[int]):
+    """Registra id_assinatura_origem -> assinatura_id para entrar no cache após o commit da sessão"""
+    if id_assinatura_origem and assinatura_id is not None and ingestion_config.ID_CACHE_ENABLED:
+        session.info.setdefault(_CHAVE_PENDENTES, []).append((_assinaturas, str(id_assinatura_origem), assinatura_id))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _aplicar_pendentes(session):
+    for cache, chave, valor in session.info.pop(_CHAVE_PENDENTES, []):
+        cache.set(chave, valor)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_pendentes(session):
+    session.info.pop(_CHAVE_PENDENTES, None)
+
+
+def limpar_cache_entidades():
+    _clientes.limpar()
+    _assinaturas.limpar()
+
+
+def obter_estatisticas_cache_entidades() -> Dict[str, Any]:
+    return {
+        "habilitado": ingestion_config.ID_CACHE_ENABLED,
+        "clientes": _clientes.estatisticas(),
+        "assinaturas": _assinaturas.estatisticas(),
+    }
@@ -0,0 +1,337 @@
+"""
+Catálogo de produtos e ofertas
+As tabelas produtos e ofertas (migração a4d1e8b7c362) substituem os
+dicionários de product_id/offer_code que ficavam em utils/helpers.py. O
+catálogo fica em memória no processo:
+
+- é carregado no startup (Api/webhooks.py) ou na primeira consulta
+- a cada CATALOG_RELOAD_INTERVAL segundos compara a versão das tabelas
+  (quantidade de linhas e maior atualizado_em) e só relê quando mudou: um
+  produto classificado no banco (scripts/catalogo_produtos.py) passa a valer
+  sem deploy
+- produtos e ofertas desconhecidos são registrados (tipo NULL) na primeira
+  vez que aparecem, na transação do evento (savepoint com ON CONFLICT DO
+  NOTHING), para que transacoes/assinaturas sempre recebam produto_id/oferta_id
+  existentes; o catálogo em memória só os recebe após o commit
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, text
+
+from database.connection import SessionLocal, engine
+from utils.ingestion_config import ingestion_config
+from utils.logging_ingestao import obter_logger
+
+log = obter_logger("catalogo")
+
+# Tipos de produto/oferta que classificam o plano da assinatura
+TIPOS_PLANO = ("anual", "mensal")
+# Tipos especiais (não são assinatura)
+TIPOS_ESPECIAIS = ("orderbump_ebook", "ebook_vitalicio")
+
+# (plataforma, id_origem ou chave) -> (id, tipo)
+_Entradas = Dict[Tuple[str, str], Tuple[int, Optional[str]]]
+
+# Chave em session.info com os produtos/ofertas aguardando o commit
+_CHAVE_PENDENTES = "catalogo_pendentes"
+
+_SQL_VERSAO = text("""
+    SELECT (SELECT count(*) FROM produtos), (SELECT max(atualizado_em) FROM produtos),
+           (SELECT count(*) FROM ofertas), (SELECT max(atualizado_em) FROM ofertas)
+""")
+
+_SQL_REGISTRAR_PRODUTO = text("""
+    WITH novo AS (
+        INSERT INTO produtos (plataforma, id_origem, nome) VALUES (:plataforma, :chave, :nome)
+        ON CONFLICT (plataforma, id_origem) DO NOTHING
+        RETURNING id, tipo
+    )
+    SELECT id, tipo FROM novo
+    UNION ALL
+    SELECT id, tipo FROM produtos WHERE plataforma = :plataforma AND id_origem = :chave
+    LIMIT 1
+""")
+
+_SQL_REGISTRAR_OFERTA = text("""
+    WITH novo AS (
+        INSERT INTO ofertas (plataforma, chave, nome, produto_id) VALUES (:plataforma, :chave, :nome, :produto_id)
+        ON CONFLICT (plataforma, chave) DO NOTHING
+        RETURNING id, tipo
+    )
+    SELECT id, tipo FROM novo
+    UNION ALL
+    SELECT id, tipo FROM ofertas WHERE plataforma = :plataforma AND chave = :chave
+    LIMIT 1
+""")
+
+
+def _registrar_linha(conexao, sql, parametros) -> Tuple[int, Optional[str]]:
+    linha = conexao.execute(sql, parametros).first()
+    if linha is None:
+        # Inserida por outro processo depois do snapshot do comando: o próximo comando a vê
+        linha = conexao.execute(sql, parametros).one()
+    return tuple(linha)
+
+
+def _chave(valor) -> Optional[str]:
+    # product_id chega como int (Ticto) ou str (Guru); o catálogo guarda texto
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+class CatalogoProdutos:
+    """Produtos e ofertas em memória, recarregados quando as tabelas mudam"""
+
+    def __init__(self):
+        self._produtos: _Entradas = {}
+        self._ofertas: _Entradas = {}
+        self._versao = None
+        self._proxima_verificacao = 0.0
+        self._lock_recarga = threading.Lock()
+        self._lock_registro = threading.Lock()
+
+    def carregar(self, forcar: bool = False) -> bool:
+        """
+        Lê produtos e ofertas se a versão das tabelas mudou desde a última
+        carga (ou se forcar). Retorna True quando o catálogo foi relido.
+        """
+        with engine.connect() as conexao:
+            versao = tuple(conexao.execute(_SQL_VERSAO).one())
+            if not forcar and versao == self._versao:
+                return False
+            produtos = {
+                (plataforma, id_origem): (id_, tipo)
+                for id_, plataforma, id_origem, tipo in conexao.execute(
+                    text("SELECT id, plataforma, id_origem, tipo FROM produtos"))
+            }
+            ofertas = {
+                (plataforma, chave): (id_, tipo)
+                for id_, plataforma, chave, tipo in conexao.execute(
+                    text("SELECT id, plataforma, chave, tipo FROM ofertas"))
+            }
+        # Troca as referências de uma vez: leitores concorrentes veem o catálogo antigo ou o novo
+        self._produtos, self._ofertas, self._versao = produtos, ofertas, versao
+        log.info("[CATALOGO] Catálogo carregado: %s produtos, %s ofertas", len(produtos), len(ofertas))
+        return True
+
+    def recarregar_se_necessario(self):
+        """
+        Executa carregar no máximo uma vez a cada CATALOG_RELOAD_INTERVAL
+        segundos. A primeira carga bloqueia as demais threads até terminar.
+        """
+        agora = time.monotonic()
+        primeira = self._proxima_verificacao == 0.0
+        if not primeira and agora < self._proxima_verificacao:
+            return
+        if not self._lock_recarga.acquire(blocking=primeira):
+            return
+        try:
+            if primeira and self._proxima_verificacao != 0.0:
+                return  # Outra thread fez a primeira carga enquanto esta esperava
+            self._proxima_verificacao = agora + ingestion_config.CATALOG_RELOAD_INTERVAL
+            self.carregar()
+        except Exception as e:
+            # Mantém o catálogo atual; nova tentativa no próximo intervalo
+            log.error("[CATALOGO] Erro ao carregar o catálogo de produtos: %s", e)
+        finally:
+            self._lock_recarga.release()
+
+    def produto(self, plataforma: str, id_origem) -> Optional[Tuple[int, Optional[str]]]:
+        """(id, tipo) do produto ou None se não estiver no catálogo"""
+        self.recarregar_se_necessario()
+        return self._produtos.get((plataforma, _chave(id_origem)))
+
+    def oferta(self, plataforma: str, chave) -> Optional[Tuple[int, Optional[str]]]:
+        """(id, tipo) da oferta ou None se não estiver no catálogo"""
+        self.recarregar_se_necessario()
+        return self._ofertas.get((plataforma, _chave(chave)))
+
+    def tipo_produto(self, plataforma: str, id_origem) -> Optional[str]:
+        entrada = self.produto(plataforma, id_origem)
+        return entrada[1] if entrada else None
+
+    def tipo_oferta(self, plataforma: str, chave) -> Optional[str]:
+        entrada = self.oferta(plataforma, chave)
+        return entrada[1] if entrada else None
+
+    def registrar(self, session, plataforma: str, id_origem, nome: Optional[str] = None,
+                  chave_oferta=None, nome_oferta: Optional[str] = None) -> Dict[str, Optional[int]]:
+        """
+        produto_id e oferta_id para gravar em transacoes/assinaturas.
+        Produto ou oferta fora do catálogo é inserido sem tipo na transação de
+        `session` e passa a constar no catálogo deste processo após o commit.
+        """
+        produto = self.produto(plataforma, id_origem) if _chave(id_origem) else None
+        oferta = self.oferta(plataforma, chave_oferta) if _chave(chave_oferta) else None
+        if (produto is None and _chave(id_origem)) or (oferta is None and _chave(chave_oferta)):
+            produto, oferta = self._inserir(session, plataforma, _chave(id_origem), nome, _chave(chave_oferta),
+                                            nome_oferta, produto, oferta)
+        return {
+            "produto_id": produto[0] if produto else None,
+            "oferta_id": oferta[0] if oferta else None,
+        }
+
+    def _inserir(self, session, plataforma, id_origem, nome, chave_oferta, nome_oferta, produto, oferta):
+        # Savepoint: uma falha aqui não invalida o que o evento já gravou na transação
+        novos = []
+        with session.begin_nested():
+            if produto is None and id_origem:
+                produto = _registrar_linha(session, _SQL_REGISTRAR_PRODUTO, {
+                    "plataforma": plataforma, "chave": id_origem, "nome": nome,
+                })
+                novos.append(("produto", (plataforma, id_origem), produto, nome))
+            if oferta is None and chave_oferta:
+                oferta = _registrar_linha(session, _SQL_REGISTRAR_OFERTA, {
+                    "plataforma": plataforma, "chave": chave_oferta, "nome": nome_oferta,
+                    "produto_id": produto[0] if produto else None,
+                })
+                novos.append(("oferta", (plataforma, chave_oferta), oferta, nome_oferta))
+        # Só após o commit: um rollback não deixa no catálogo ids que não existem no banco
+        transacao = session.get_nested_transaction() or session.get_transaction()
+        session.info.setdefault(_CHAVE_PENDENTES, []).extend((transacao, *novo) for novo in novos)
+        return produto, oferta
+
+    def _publicar(self, novos):
+        """Inclui no catálogo as linhas registradas por uma transação já confirmada"""
+        with self._lock_registro:
+            for tipo, chave, entrada, nome in novos:
+                if tipo == "produto":
+                    self._produtos = {**self._produtos, chave: entrada}
+                else:
+                    self._ofertas = {**self._ofertas, chave: entrada}
+                log.info("[CATALOGO] %s registrado: %s %s (%s), id %s", tipo.capitalize(), chave[0], chave[1], nome, entrada[0])
+
+    def estatisticas(self) -> Dict[str, int]:
+        return {"produtos": len(self._produtos), "ofertas": len(self._ofertas)}
+
+
+# Instância global do catálogo
+catalogo = CatalogoProdutos()
+
+
+def _dentro_de(transacao, desfeita) -> bool:
+    while transacao is not None:
+        if transacao is desfeita:
+            return True
+        transacao = transacao.parent
+    return False
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publicar_pendentes(session):
+    novos = [pendente[1:] for pendente in session.info.pop(_CHAVE_PENDENTES, [])]
+    if novos:
+        catalogo._publicar(novos)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _descartar_pendentes(session, transacao_desfeita):
+    # Também em savepoints (ex.: evento com erro dentro de um lote): descarta só o que foi
+    # registrado dentro do savepoint desfeito
+    pendentes = session.info.get(_CHAVE_PENDENTES)
+    if pendentes:
+        session.info[_CHAVE_PENDENTES] = [p for p in pendentes if not _dentro_de(p[0], transacao_desfeita)]
+
+
+# ===== Classificação pelo catálogo =====
+# Usadas pelos handlers de webhook e pelo backfill; utils/helpers.py fica sem acesso ao banco
+
+def identificar_tipo_plano_guru(product_id: str) -> str:
+    """
+    Identifica se o produto Guru é plano mensal ou anual pelo tipo do produto no catálogo.
+    Retorna: 'anual', 'mensal', o tipo especial do produto ou 'desconhecido'
+    """
+    return catalogo.tipo_produto("guru", product_id) or "desconhecido"
+
+
+def identificar_tipo_plano_ticto(product_id: int, offer_code: str = None) -> str:
+    """
+    Identifica se o produto Ticto é plano mensal ou anual pelo produto ou pela oferta no catálogo.
+    Retorna: 'anual', 'mensal' ou 'desconhecido'
+    """
+    # Primeiro tenta pelo product_id
+    tipo = catalogo.tipo_produto("ticto", product_id)
+    if tipo in TIPOS_PLANO:
+        return tipo
+    # Se não encontrou, tenta pelo offer_code
+    if offer_code:
+        tipo = catalogo.tipo_oferta("ticto", offer_code)
+        return tipo if tipo in TIPOS_PLANO else "desconhecido"
+    return "desconhecido"
+
+
+def tipo_plano_transacao(plataforma: str, product_id, offer_code: str = None) -> str:
+    """
+    Tipo de plano gravado em transacoes.tipo_plano, pelo catálogo de produtos.
+    Retorna: 'anual', 'mensal' ou 'desconhecido' (order bumps, ebooks e
+    produtos sem tipo no catálogo)
+    """
+    if plataforma == "guru":
+        tipo = identificar_tipo_plano_guru(product_id)
+    else:  # ticto
+        tipo = identificar_tipo_plano_ticto(product_id, offer_code)
+    return tipo if tipo in ("anual", "mensal") else "desconhecido"
+
+
+def identificar_tipo_produto_ticto(offer_code: str) -> str:
+    """
+    Retorna o tipo especial do produto baseado no offer_code.
+    """
+    tipo = catalogo.tipo_oferta("ticto", offer_code) if offer_code else None
+    return tipo if tipo in TIPOS_ESPECIAIS else "assinatura"
+
+
+def identificar_tipo_produto_guru(product_id: str, is_order_bump: int = 0) -> str:
+    """
+    Identifica o tipo especial do produto Guru baseado no product_id.
+    Retorna: 'assinatura', 'orderbump_ebook', 'ebook_vitalicio'
+    """
+    # Verifica se é um produto especial
+    tipo_especial = catalogo.tipo_produto("guru", product_id)
+    if tipo_especial in ("orderbump_ebook", "ebook_vitalicio"):
+        return tipo_especial
+    
+    # Se não for especial, verifica se é order bump
+    if is_order_bump == 1:
+        return "orderbump_ebook"
+    
+    return "assinatura"
+
+
+def calcular_valores_assinatura_por_tipo(valor_webhook, product_id, plataforma):
+    """
+    Calcula os valores de assinatura baseado no tipo de plano.
+    Retorna: (valor_mensal, valor_anual)
+    
+    Args:
+        valor_webhook: Valor recebido no webhook
+        product_id: ID do produto para identificar o tipo de plano
+        plataforma: 'guru' ou 'ticto'
+    
+    Returns:
+        tuple: (valor_mensal, valor_anual) - apenas um será preenchido
+    """
+    # Identifica tipo de plano
+    if plataforma == "guru":
+        tipo_plano = identificar_tipo_plano_guru(product_id)
+    else:  # ticto
+        tipo_plano = identificar_tipo_plano_ticto(product_id)
+    
+    # Retorna apenas o campo correto baseado no tipo de plano
+    if tipo_plano == "anual":
+        # Plano anual: preenche apenas valor_anual
+        log.debug("[CATALOGO] ✅ Plano anual detectado para %s - product_id: %s, valor: R$ %s", plataforma, product_id, valor_webhook)
+        return None, valor_webhook
+    elif tipo_plano == "mensal":
+        # Plano mensal: preenche apenas valor_mensal
+        log.debug("[CATALOGO] ✅ Plano mensal detectado para %s - product_id: %s, valor: R$ %s", plataforma, product_id, valor_webhook)
+        return valor_webhook, None
+    else:
+        # Produto desconhecido: assume mensal como fallback
+        log.warning("[CATALOGO] ⚠️ Tipo de plano não identificado para %s - product_id: %s, assumindo mensal", plataforma, product_id)
+        return valor_webhook, None
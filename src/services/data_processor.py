@@ -4,10 +4,11 @@ Separa a lógica de backfill da lógica de webhooks em tempo real
 """
 
 from typing import Dict, Any, Optional
-from src.database.connection import get_session
-from src.database.models import Transacao, Cliente, Assinatura
-from src.services.webhook_handler import get_or_create_cliente, get_or_create_assinatura, salvar_transacao
-from src.utils.mapeamento_backfill import MapeamentoBackfillTicto, MapeamentoBackfillGuru, converter_data_backfill
+from database.connection import get_session
+from database.models import Transacao, ChaveTransacao, Cliente, Assinatura
+from services.webhook_handler import get_or_create_cliente, get_or_create_assinatura, salvar_transacao
+from utils.mapeamento_backfill import MapeamentoBackfillTicto, MapeamentoBackfillGuru, converter_data_backfill
+from services.catalogo import catalogo, tipo_plano_transacao
 from datetime import datetime, timedelta
 import logging
 
@@ -22,18 +23,22 @@ class HistoricalDataProcessor:
     def __init__(self):
         self.session = get_session()
     
-    def process_ticto_order(self, order_data: Dict[str, Any]) -> Dict[str, Any]:
+    def process_ticto_order(self, order_data: Dict[str, Any], session=None) -> Dict[str, Any]:
         """
         Processa dados históricos de order da Ticto usando o novo mapeamento
         APENAS para transações - não cria assinaturas
+        Se `session` for fornecida, grava nela sem commit e propaga erros
+        (usado pela re-projeção, que confirma um lote inteiro de uma vez).
         """
+        externa = session is not None
+        session = session if externa else self.session
         try:
             # Usa o novo mapeamento
             mapeamento = MapeamentoBackfillTicto.mapear_order_ticto(order_data)
             
             # 1. Cliente
-            cliente = get_or_create_cliente(
-                self.session,
+            cliente_id = get_or_create_cliente(
+                session,
                 nome=mapeamento["cliente"]["nome"],
                 email=mapeamento["cliente"]["email"],
                 documento=mapeamento["cliente"]["documento"],
@@ -45,9 +50,12 @@ class HistoricalDataProcessor:
             product_name = mapeamento["produto"]["nome"]
             
             # Verifica se já existe
-            transacao_existente = self.session.query(Transacao).filter_by(
-                id_transacao_origem=id_transacao_origem, 
-                produto_nome=product_name
+            # (chave natural em transacoes_chaves; transacoes é particionada por data)
+            transacao_existente = session.query(Transacao).join(
+                ChaveTransacao, ChaveTransacao.transacao_id == Transacao.id
+            ).filter(
+                ChaveTransacao.id_transacao_origem == id_transacao_origem,
+                ChaveTransacao.produto_nome == product_name
             ).first()
             
             if transacao_existente:
@@ -61,14 +69,15 @@ class HistoricalDataProcessor:
                 transacao_existente.motivo_recusa = mapeamento["motivo_recusa"]
                 transacao_existente.data_transacao = converter_data_backfill(mapeamento["data_transacao"])
                 
-                self.session.commit()
+                if not externa:
+                    session.commit()
                 return {"status": "transacao_atualizada", "transacao_id": transacao_existente.id}
             else:
                 # Cria nova transação (SEM assinatura_id)
                 nome_oferta = mapeamento.get("oferta", {}).get("nome")
                 transacao_dict = {
                     "id_transacao_origem": id_transacao_origem,
-                    "cliente_id": cliente.id,
+                    "cliente_id": cliente_id,
                     "assinatura_id": None,  # Orders não criam assinaturas no backfill
                     "plataforma": "ticto",
                     "status": mapeamento["status"],
@@ -81,6 +90,13 @@ class HistoricalDataProcessor:
                     "tipo_recusa": mapeamento["tipo_recusa"],
                     "produto_nome": product_name,
                     "nome_oferta": nome_oferta,
+                    "tipo_plano": tipo_plano_transacao(
+                        "ticto", mapeamento["produto"]["id"], mapeamento.get("oferta", {}).get("codigo")
+                    ),
+                    **catalogo.registrar(
+                        session, "ticto", mapeamento["produto"]["id"], product_name,
+                        mapeamento.get("oferta", {}).get("codigo"), nome_oferta
+                    ),
                     "json_completo": {
                         "order_data": order_data,
                         "mapeamento": mapeamento,
@@ -88,10 +104,15 @@ class HistoricalDataProcessor:
                     }
                 }
                 
-                transacao_id = salvar_transacao(transacao_dict)
-                return {"status": "transacao_criada", "transacao_id": transacao_id}
+                sucesso = salvar_transacao(transacao_dict, session=session)
+                if not externa:
+                    session.commit()
+                return {"status": "transacao_criada", "transacao_id": sucesso}
                 
         except Exception as e:
+            if externa:
+                raise
+            session.rollback()
             logger.error(f"Erro ao processar order Ticto {order_data.get('id')}: {e}")
             return {"status": "erro", "motivo": str(e)}
     
@@ -105,7 +126,7 @@ class HistoricalDataProcessor:
             mapeamento = MapeamentoBackfillTicto.mapear_subscription_ticto(subscription_data)
             
             # 1. Cliente
-            cliente = get_or_create_cliente(
+            cliente_id = get_or_create_cliente(
                 self.session,
                 nome=mapeamento["cliente"]["nome"],
                 email=mapeamento["cliente"]["email"],
@@ -136,11 +157,11 @@ class HistoricalDataProcessor:
             else:
                 # Cria nova assinatura (SEM transação associada)
                 nome_oferta = subscription_data.get("offer", {}).get("name")
-                assinatura = get_or_create_assinatura(
+                assinatura_id = get_or_create_assinatura(
                     self.session,
                     id_assinatura_origem=id_assinatura_origem,
                     plataforma="ticto",
-                    cliente_id=cliente.id,
+                    cliente_id=cliente_id,
                     produto_nome=product_name,
                     nome_oferta=nome_oferta,
                     status=mapeamento["status"],
@@ -150,12 +171,15 @@ class HistoricalDataProcessor:
                     data_expiracao_acesso=self._calcular_data_expiracao_ticto(subscription_data) or datetime.now() + timedelta(days=365),
                     valor_mensal=mapeamento["valor_mensal"],
                     valor_anual=mapeamento["valor_anual"],
-                    ultima_atualizacao=datetime.now()
+                    ultima_atualizacao=datetime.now(),
+                    **catalogo.registrar(self.session, "ticto", mapeamento["produto"]["id"], product_name)
                 )
+                self.session.commit()
                 
-                return {"status": "assinatura_criada", "assinatura_id": assinatura.id}
+                return {"status": "assinatura_criada", "assinatura_id": assinatura_id}
                 
         except Exception as e:
+            self.session.rollback()
             logger.error(f"Erro ao processar subscription Ticto {subscription_data.get('id')}: {e}")
             return {"status": "erro", "motivo": str(e)}
     
@@ -0,0 +1,336 @@
+"""
+Dead-letter de webhooks
+Eventos cujo processamento levantou exceção (falha de banco, bug de mapeamento)
+são gravados com o erro, o número de tentativas e a próxima tentativa, em vez
+de serem perdidos. Um pool de threads reprocessa os eventos vencidos com
+backoff exponencial; os endpoints de administração listam e reenfileiram.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+
+from database.connection import get_session
+from database.models import WebhookDeadLetter
+from utils.ingestion_config import ingestion_config
+from utils.logging_ingestao import obter_logger, contexto_evento
+
+log = obter_logger("dead_letter")
+
+# Sinaliza ao retrier que há evento reenfileirado
+_novo_evento = threading.Event()
+
+_lock_recuperacao = threading.Lock()
+_proxima_recuperacao = 0.0
+
+
+def calcular_backoff(tentativas: int) -> float:
+    """
+    Segundos até a próxima tentativa: base * 2^(tentativas-1), limitado ao
+    máximo configurado, com jitter de até 10% para espalhar os reprocessamentos.
+    """
+    atraso = min(
+        ingestion_config.DLQ_BACKOFF_BASE_SECONDS * (2 ** max(tentativas - 1, 0)),
+        ingestion_config.DLQ_BACKOFF_MAX_SECONDS,
+    )
+    return atraso * (1 + random.random() * 0.1)
+
+
+def registrar_falha(plataforma: str, payload: dict, erro: str, evento_id: Optional[str] = None) -> int:
+    """
+    Grava o evento que falhou e agenda a primeira nova tentativa.
+    Levanta exceção se o próprio registro falhar (o chamador deve sinalizar
+    a falha à plataforma para que ela reenvie).
+    """
+    session = get_session()
+    try:
+        agora = datetime.now(timezone.utc)
+        evento = WebhookDeadLetter(
+            plataforma=plataforma,
+            payload=payload,
+            erro=erro,
+            evento_id=evento_id,
+            status="pendente",
+            tentativas=1,
+            proxima_tentativa_em=agora + timedelta(seconds=calcular_backoff(1)),
+        )
+        session.add(evento)
+        session.commit()
+        dead_letter_id = evento.id
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    log.warning("[DLQ] Evento %s gravado na dead-letter (id %s): %s", plataforma, dead_letter_id, erro)
+    return dead_letter_id
+
+
+def reservar_vencidos(limite: int) -> List[Dict[str, Any]]:
+    """
+    Reserva até `limite` eventos com nova tentativa vencida (FOR UPDATE SKIP LOCKED).
+    """
+    session = get_session()
+    try:
+        eventos = (
+            session.query(WebhookDeadLetter)
+            .filter(
+                WebhookDeadLetter.status == "pendente",
+                WebhookDeadLetter.proxima_tentativa_em <= datetime.now(timezone.utc),
+            )
+            .order_by(WebhookDeadLetter.proxima_tentativa_em)
+            .limit(limite)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        agora = datetime.now(timezone.utc)
+        reservados = []
+        for evento in eventos:
+            evento.status = "reprocessando"
+            evento.atualizado_em = agora
+            reservados.append({
+                "id": evento.id,
+                "plataforma": evento.plataforma,
+                "payload": evento.payload,
+                "tentativas": evento.tentativas,
+            })
+        session.commit()
+        return reservados
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def finalizar_tentativa(dead_letter_id: int, tentativas: int, resultado: Optional[dict] = None, erro: Optional[str] = None):
+    """
+    Marca o evento como resolvido ou agenda a próxima tentativa com backoff.
+    Após DLQ_MAX_ATTEMPTS tentativas o evento fica "esgotado" até ser reenfileirado.
+    """
+    session = get_session()
+    try:
+        evento = session.get(WebhookDeadLetter, dead_letter_id)
+        if evento is None:
+            return
+        agora = datetime.now(timezone.utc)
+        evento.atualizado_em = agora
+        if erro is None:
+            evento.status = "resolvido"
+            evento.resultado_status = (resultado or {}).get("status")
+            evento.proxima_tentativa_em = None
+        else:
+            evento.erro = erro
+            evento.tentativas = tentativas + 1
+            if evento.tentativas >= ingestion_config.DLQ_MAX_ATTEMPTS:
+                evento.status = "esgotado"
+                evento.proxima_tentativa_em = None
+            else:
+                evento.status = "pendente"
+                evento.proxima_tentativa_em = agora + timedelta(seconds=calcular_backoff(evento.tentativas))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def listar_eventos(status: Optional[str] = None, plataforma: Optional[str] = None,
+                   limite: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+    session = get_session()
+    try:
+        query = session.query(WebhookDeadLetter)
+        if status:
+            query = query.filter(WebhookDeadLetter.status == status)
+        if plataforma:
+            query = query.filter(WebhookDeadLetter.plataforma == plataforma)
+        eventos = query.order_by(WebhookDeadLetter.id.desc()).offset(offset).limit(limite).all()
+        return [
+            {
+                "id": evento.id,
+                "plataforma": evento.plataforma,
+                "status": evento.status,
+                "tentativas": evento.tentativas,
+                "erro": evento.erro,
+                "evento_id": evento.evento_id,
+                "resultado_status": evento.resultado_status,
+                "criado_em": evento.criado_em.isoformat() if evento.criado_em else None,
+                "atualizado_em": evento.atualizado_em.isoformat() if evento.atualizado_em else None,
+                "proxima_tentativa_em": evento.proxima_tentativa_em.isoformat() if evento.proxima_tentativa_em else None,
+            }
+            for evento in eventos
+        ]
+    finally:
+        session.close()
+
+
+def reenfileirar(ids: Optional[List[int]] = None, status: Optional[str] = None,
+                 plataforma: Optional[str] = None) -> int:
+    """
+    Reenfileira para tentativa imediata os eventos informados (ou todos os que
+    casam com os filtros), zerando o contador de tentativas.
+    Eventos resolvidos ou em reprocessamento não são afetados.
+    """
+    session = get_session()
+    try:
+        query = session.query(WebhookDeadLetter).filter(WebhookDeadLetter.status.in_(["pendente", "esgotado"]))
+        if ids:
+            query = query.filter(WebhookDeadLetter.id.in_(ids))
+        if status:
+            query = query.filter(WebhookDeadLetter.status == status)
+        if plataforma:
+            query = query.filter(WebhookDeadLetter.plataforma == plataforma)
+        agora = datetime.now(timezone.utc)
+        total = query.update({
+            WebhookDeadLetter.status: "pendente",
+            WebhookDeadLetter.tentativas: 0,
+            WebhookDeadLetter.proxima_tentativa_em: agora,
+            WebhookDeadLetter.atualizado_em: agora,
+        }, synchronize_session=False)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    if total:
+        _novo_evento.set()
+    return total
+
+
+def recuperar_travados() -> int:
+    """
+    Devolve para "pendente" eventos presos em "reprocessando" (retrier interrompido).
+    """
+    limite = datetime.now(timezone.utc) - timedelta(seconds=ingestion_config.INBOX_STALE_SECONDS)
+    session = get_session()
+    try:
+        total = (
+            session.query(WebhookDeadLetter)
+            .filter(WebhookDeadLetter.status == "reprocessando", WebhookDeadLetter.atualizado_em < limite)
+            .update({WebhookDeadLetter.status: "pendente"}, synchronize_session=False)
+        )
+        session.commit()
+        return total
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def recuperar_travados_se_necessario():
+    """
+    Executa `recuperar_travados` no máximo uma vez a cada
+    INBOX_RECOVERY_INTERVAL segundos (chamado pelo retrier a cada ciclo).
+    """
+    global _proxima_recuperacao
+    agora = time.monotonic()
+    if agora < _proxima_recuperacao or not _lock_recuperacao.acquire(blocking=False):
+        return
+    try:
+        _proxima_recuperacao = agora + ingestion_config.INBOX_RECOVERY_INTERVAL
+        recuperados = recuperar_travados()
+        if recuperados:
+            log.info("[DLQ] %s eventos travados devolvidos para a fila", recuperados)
+    except Exception as e:
+        log.error("[DLQ] Erro ao recuperar eventos travados: %s", e)
+    finally:
+        _lock_recuperacao.release()
+
+
+def obter_estatisticas_dead_letter() -> Dict[str, Any]:
+    session = get_session()
+    try:
+        contagens = dict(
+            session.query(WebhookDeadLetter.status, func.count(WebhookDeadLetter.id))
+            .filter(WebhookDeadLetter.status.in_(["pendente", "reprocessando", "esgotado"]))
+            .group_by(WebhookDeadLetter.status)
+            .all()
+        )
+    finally:
+        session.close()
+    return {
+        "habilitada": ingestion_config.DLQ_ENABLED,
+        "pendentes": contagens.get("pendente", 0),
+        "reprocessando": contagens.get("reprocessando", 0),
+        "esgotados": contagens.get("esgotado", 0),
+    }
+
+
+class DeadLetterRetrier:
+    """
+    Threads que reprocessam os eventos vencidos da dead-letter.
+    O número de threads é o limite de reprocessamentos simultâneos.
+    """
+
+    def __init__(self, num_workers: int = None, intervalo_polling: float = None):
+        self.num_workers = num_workers or ingestion_config.DLQ_WORKERS
+        self.intervalo_polling = intervalo_polling or ingestion_config.DLQ_POLL_INTERVAL
+        self._parar = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def ativo(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def iniciar(self):
+        if self.ativo:
+            return
+        self._parar.clear()
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"dlq-retrier-{i}", daemon=True)
+            for i in range(self.num_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        log.info("[DLQ] %s workers de reprocessamento iniciados", self.num_workers)
+
+    def parar(self, timeout: float = 10.0):
+        self._parar.set()
+        _novo_evento.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def _loop(self):
+        while not self._parar.is_set():
+            recuperar_travados_se_necessario()
+            try:
+                eventos = reservar_vencidos(1)
+            except Exception as e:
+                log.error("[DLQ] Erro ao reservar eventos: %s", e)
+                eventos = []
+            if not eventos:
+                _novo_evento.wait(self.intervalo_polling)
+                _novo_evento.clear()
+                continue
+            try:
+                self._reprocessar(eventos[0])
+            except Exception as e:
+                # Falha ao finalizar: o evento fica em "reprocessando" e volta à fila na
+                # varredura periódica, após INBOX_STALE_SECONDS
+                log.error("[DLQ] Erro ao finalizar evento %s: %s", eventos[0]['id'], e)
+
+    def _reprocessar(self, evento: Dict[str, Any]):
+        from services.webhook_handler import processar_webhook
+        from services.idempotencia import status_resultado
+
+        with contexto_evento(f"dlq-{evento['id']}"):
+            resultado = processar_webhook(evento["plataforma"], evento["payload"], dead_letter=False)
+            if status_resultado(resultado) == "erro":
+                erro = (resultado or {}).get("motivo") or "erro"
+                log.warning("[DLQ] Tentativa %s do evento %s falhou: %s", evento["tentativas"] + 1, evento["id"], erro)
+                finalizar_tentativa(evento["id"], evento["tentativas"], erro=erro)
+            else:
+                log.info("[DLQ] Evento %s reprocessado com sucesso", evento["id"])
+                finalizar_tentativa(evento["id"], evento["tentativas"], resultado=resultado)
+
+
+# Instância global do retrier
+dead_letter_retrier = DeadLetterRetrier()
@@ -0,0 +1,236 @@
+"""
+Idempotência de webhooks
+Guru e Ticto reenviam o mesmo evento em caso de timeout. Cada evento recebe um
+fingerprint estável; eventos já processados são respondidos a partir de um LRU
+em memória ou da tabela webhook_eventos_processados, sem tocar nas tabelas principais.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from database.connection import get_session
+from database.models import WebhookEventoProcessado
+from utils.cache import TTLCache
+from utils.ingestion_config import ingestion_config
+from utils.logging_ingestao import obter_logger
+from utils.metricas_prometheus import registrar_cache
+
+log = obter_logger("idempotencia")
+
+# Fingerprint -> status do resultado original
+_processados = TTLCache(
+    max_itens=ingestion_config.IDEMPOTENCY_CACHE_SIZE,
+    ttl_segundos=ingestion_config.IDEMPOTENCY_TTL_HOURS * 3600,
+)
+registrar_cache("idempotencia", _processados)
+
+_lock_limpeza = threading.Lock()
+_proxima_limpeza = 0.0
+
+
+def _campos_chave(plataforma: str, payload: dict) -> Optional[list]:
+    """
+    Campos que identificam um evento: id da transação/assinatura, status e data do status.
+    Retorna None quando algum deles não está presente no payload.
+    """
+    if plataforma == "guru":
+        datas = payload.get("dates") or {}
+        if payload.get("webhook_type") == "subscription":
+            campos = ["subscription", payload.get("id") or payload.get("subscription_code"),
+                      payload.get("last_status"), datas.get("last_status_at")]
+        else:
+            campos = ["transaction", payload.get("id"), payload.get("status"),
+                      datas.get("updated_at") or datas.get("confirmed_at")]
+    elif plataforma == "ticto":
+        order = payload.get("order") or {}
+        assinaturas = payload.get("subscriptions") or [{}]
+        id_evento = order.get("transaction_hash") or order.get("hash") or (assinaturas[0] or {}).get("id")
+        campos = [id_evento, payload.get("status"), payload.get("status_date")]
+    else:
+        return None
+    if any(campo in (None, "") for campo in campos):
+        return None
+    if plataforma == "ticto":
+        # Order bumps compartilham o hash da transação principal
+        campos.append((payload.get("item") or {}).get("product_name"))
+    elif payload.get("webhook_type") == "subscription":
+        # Cancelamento agendado e fatura pendente chegam com o mesmo last_status e
+        # last_status_at; processar_guru_assinatura usa estes campos para o status
+        # e a data_cancelamento da assinatura
+        datas = payload.get("dates") or {}
+        cancelado_por = payload.get("cancelled_by") or {}
+        campos.extend([
+            payload.get("cancel_at_cycle_end"), payload.get("cancel_reason"),
+            cancelado_por.get("date") if isinstance(cancelado_por, dict) else cancelado_por,
+            datas.get("canceled_at"), (payload.get("current_invoice") or {}).get("status"),
+        ])
+    return campos
+
+
+def calcular_fingerprint(plataforma: str, payload: dict) -> str:
+    """
+    Fingerprint (sha256) do evento. Usa os campos chave quando disponíveis;
+    caso contrário, o hash do corpo serializado de forma canônica.
+    """
+    campos = _campos_chave(plataforma, payload)
+    if campos is not None:
+        base = "|".join([plataforma] + [str(campo) for campo in campos])
+    else:
+        base = plataforma + "|" + json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+def status_resultado(resultado: Optional[dict]) -> Optional[str]:
+    """Extrai um status curto do resultado do handler para auditoria"""
+    if not isinstance(resultado, dict):
+        return None
+    if "status" in resultado:
+        return str(resultado["status"])[:50]
+    # processar_ticto("authorized") retorna {"assinatura": ..., "transacao": ...}
+    transacao = resultado.get("transacao")
+    if isinstance(transacao, dict) and "status" in transacao:
+        return str(transacao["status"])[:50]
+    return None
+
+
+def buscar_evento_processado(fingerprint: str) -> Optional[str]:
+    """
+    Retorna o status do resultado original se o evento já foi processado, ou None.
+    Consulta primeiro o LRU em memória e depois a tabela.
+    """
+    em_cache = _processados.get(fingerprint)
+    if em_cache is not None:
+        return em_cache
+    session = get_session()
+    try:
+        linha = session.execute(
+            select(WebhookEventoProcessado.resultado_status).where(
+                WebhookEventoProcessado.fingerprint == fingerprint,
+                WebhookEventoProcessado.expira_em > datetime.now(timezone.utc),
+            )
+        ).first()
+    finally:
+        session.close()
+    if linha is None:
+        return None
+    resultado = linha.resultado_status or "processado"
+    _processados.set(fingerprint, resultado)
+    return resultado
+
+
+def buscar_eventos_processados(fingerprints: List[str]) -> Dict[str, str]:
+    """
+    Versão em lote de `buscar_evento_processado`: um único SELECT para os
+    fingerprints que não estão no LRU. Retorna {fingerprint: status original}.
+    """
+    encontrados = {}
+    faltantes = []
+    for fingerprint in fingerprints:
+        em_cache = _processados.get(fingerprint)
+        if em_cache is not None:
+            encontrados[fingerprint] = em_cache
+        else:
+            faltantes.append(fingerprint)
+    if not faltantes:
+        return encontrados
+    session = get_session()
+    try:
+        linhas = session.execute(
+            select(WebhookEventoProcessado.fingerprint, WebhookEventoProcessado.resultado_status).where(
+                WebhookEventoProcessado.fingerprint.in_(faltantes),
+                WebhookEventoProcessado.expira_em > datetime.now(timezone.utc),
+            )
+        ).all()
+    finally:
+        session.close()
+    for linha in linhas:
+        resultado = linha.resultado_status or "processado"
+        _processados.set(linha.fingerprint, resultado)
+        encontrados[linha.fingerprint] = resultado
+    return encontrados
+
+
+def registrar_evento_processado(session, fingerprint: str, plataforma: str, resultado: Optional[dict]):
+    """
+    Grava o fingerprint na mesma transação do evento (não faz commit).
+    Após o commit, chame `lembrar_evento_processado` para popular o LRU.
+    """
+    registrar_eventos_processados(session, [(fingerprint, plataforma, resultado)])
+
+
+def registrar_eventos_processados(session, eventos: List[Tuple[str, str, Optional[dict]]]):
+    """
+    Versão multi-linha de `registrar_evento_processado` (usada pelo escritor em lote).
+    """
+    if not eventos:
+        return
+    expira_em = datetime.now(timezone.utc) + timedelta(hours=ingestion_config.IDEMPOTENCY_TTL_HOURS)
+    session.execute(
+        insert(WebhookEventoProcessado)
+        .values([
+            {
+                "fingerprint": fingerprint,
+                "plataforma": plataforma,
+                "resultado_status": status_resultado(resultado),
+                "expira_em": expira_em,
+            }
+            for fingerprint, plataforma, resultado in eventos
+        ])
+        .on_conflict_do_nothing(index_elements=[WebhookEventoProcessado.fingerprint])
+    )
+
+
+def lembrar_evento_processado(fingerprint: str, resultado: Optional[dict]):
+    _processados.set(fingerprint, status_resultado(resultado) or "processado")
+
+
+def limpar_eventos_expirados() -> int:
+    """
+    Remove fingerprints com TTL vencido.
+    """
+    session = get_session()
+    try:
+        total = session.execute(
+            delete(WebhookEventoProcessado).where(WebhookEventoProcessado.expira_em <= datetime.now(timezone.utc))
+        ).rowcount
+        session.commit()
+        return total
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def limpar_se_necessario():
+    """
+    Executa a limpeza por TTL no máximo uma vez a cada
+    IDEMPOTENCY_CLEANUP_INTERVAL segundos (chamado no caminho de ingestão).
+    """
+    global _proxima_limpeza
+    agora = time.monotonic()
+    if agora < _proxima_limpeza or not _lock_limpeza.acquire(blocking=False):
+        return
+    try:
+        _proxima_limpeza = agora + ingestion_config.IDEMPOTENCY_CLEANUP_INTERVAL
+        removidos = limpar_eventos_expirados()
+        if removidos:
+            log.info("[IDEMPOTENCIA] %s fingerprints expirados removidos", removidos)
+    except Exception as e:
+        log.error("[IDEMPOTENCIA] Erro na limpeza de fingerprints: %s", e)
+    finally:
+        _lock_limpeza.release()
+
+
+def obter_estatisticas_idempotencia() -> Dict[str, Any]:
+    return {
+        "habilitada": ingestion_config.IDEMPOTENCY_ENABLED,
+        "cache": _processados.estatisticas(),
+    }
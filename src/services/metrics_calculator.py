@@ -10,15 +10,19 @@ Data: 2024
 """
 
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 from typing import Dict, Any, Optional, List, Tuple
 from sqlalchemy import text, func, and_, or_, extract
 from sqlalchemy.orm import Session
 
+from services.resumos import periodo_em_dias
+from utils.metricas_prometheus import instrumentar_metodos
+
 # Configuração de logging
 logger = logging.getLogger(__name__)
 
+@instrumentar_metodos()
 class MetricsCalculator:
     """
     Calculador centralizado de métricas de negócio para assinaturas.
@@ -46,8 +50,9 @@ class MetricsCalculator:
         Calcula MRR (Monthly Recurring Revenue) baseado na nova lógica correta.
         
         A lógica implementada:
-        - Para planos anuais: usa valor_anual / 12 (campo valor_anual preenchido)
-        - Para planos mensais: usa valor_mensal (campo valor_mensal preenchido)
+        - Soma mrr_contribuicao (valor_anual / 12 nos planos anuais, valor_mensal
+          nos mensais), calculado pelo banco na gravação da assinatura
+        - Separa mensais e anuais pela coluna tipo_plano
         - Considera apenas assinaturas ativas na data de referência
         
         Args:
@@ -68,16 +73,16 @@ class MetricsCalculator:
                     plataforma,
                     COUNT(*) as total_assinaturas,
                     
-                    -- MRR de planos mensais (valor_mensal preenchido)
-                    COUNT(CASE WHEN valor_mensal IS NOT NULL THEN 1 END) as assinaturas_mensais,
-                    COALESCE(SUM(valor_mensal), 0) as mrr_mensal,
+                    -- MRR de planos mensais
+                    COUNT(CASE WHEN tipo_plano = 'mensal' THEN 1 END) as assinaturas_mensais,
+                    COALESCE(SUM(CASE WHEN tipo_plano = 'mensal' THEN mrr_contribuicao END), 0) as mrr_mensal,
                     
-                    -- MRR de planos anuais (valor_anual preenchido, dividido por 12)
-                    COUNT(CASE WHEN valor_anual IS NOT NULL THEN 1 END) as assinaturas_anuais,
-                    COALESCE(SUM(valor_anual / 12.0), 0) as mrr_anual,
+                    -- MRR de planos anuais (valor_anual / 12)
+                    COUNT(CASE WHEN tipo_plano = 'anual' THEN 1 END) as assinaturas_anuais,
+                    COALESCE(SUM(CASE WHEN tipo_plano = 'anual' THEN mrr_contribuicao END), 0) as mrr_anual,
                     
                     -- MRR total
-                    COALESCE(SUM(valor_mensal), 0) + COALESCE(SUM(valor_anual / 12.0), 0) as mrr_total
+                    COALESCE(SUM(mrr_contribuicao), 0) as mrr_total
                     
                 FROM assinaturas 
                 WHERE 
@@ -88,7 +93,7 @@ class MetricsCalculator:
                     AND status NOT IN ('refunded', 'chargeback')
                     
                     -- Assinaturas que têm valor (mensal OU anual)
-                    AND (valor_mensal IS NOT NULL OR valor_anual IS NOT NULL)
+                    AND tipo_plano IN ('mensal', 'anual')
                     
                 GROUP BY plataforma
                 ORDER BY plataforma
@@ -363,21 +368,15 @@ class MetricsCalculator:
                     plataforma,
                     COUNT(*) as total_assinaturas,
                     
-                    -- Ticket médio anual (para planos anuais, usa valor_anual; para mensais, usa valor_mensal * 12)
-                    AVG(
-                        CASE 
-                            WHEN valor_anual IS NOT NULL THEN valor_anual
-                            WHEN valor_mensal IS NOT NULL THEN valor_mensal * 12
-                            ELSE 0
-                        END
-                    ) as ticket_medio_anual
+                    -- Ticket médio anual (valor_anual nos planos anuais, valor_mensal * 12 nos mensais)
+                    AVG(mrr_contribuicao * 12) as ticket_medio_anual
                     
                 FROM assinaturas 
                 WHERE 
                     -- Assinaturas ativas na data de referência
                     data_expiracao_acesso >= :data_ref
                     AND status NOT IN ('refunded', 'chargeback')
-                    AND (valor_mensal IS NOT NULL OR valor_anual IS NOT NULL)
+                    AND tipo_plano IN ('mensal', 'anual')
                     
                 GROUP BY plataforma
                 ORDER BY plataforma
@@ -584,7 +583,7 @@ class MetricsCalculator:
                     WHERE 
                         data_expiracao_acesso >= :data_ref
                         AND status NOT IN ('refunded', 'chargeback')
-                        AND (valor_mensal IS NOT NULL OR valor_anual IS NOT NULL)
+                        AND tipo_plano IN ('mensal', 'anual')
                     GROUP BY plataforma
                     ORDER BY plataforma
                 """)
@@ -845,38 +844,22 @@ class MetricsCalculator:
         self.logger.info(f"Calculando MRR para plano {tipo_plano} na data: {data_referencia}")
         
         try:
-            if tipo_plano == 'mensal':
-                # Para planos mensais, usa valor_mensal diretamente
-                query = text("""
-                    SELECT 
-                        plataforma,
-                        COUNT(*) as total_assinaturas,
-                        SUM(valor_mensal) as mrr_total
-                    FROM assinaturas 
-                    WHERE 
-                        data_expiracao_acesso >= :data_ref
-                        AND status NOT IN ('refunded', 'chargeback')
-                        AND valor_mensal IS NOT NULL
-                    GROUP BY plataforma
-                    ORDER BY plataforma
-                """)
-            else:
-                # Para planos anuais, divide valor_anual por 12
-                query = text("""
-                    SELECT 
-                        plataforma,
-                        COUNT(*) as total_assinaturas,
-                        SUM(valor_anual / 12) as mrr_total
-                    FROM assinaturas 
-                    WHERE 
-                        data_expiracao_acesso >= :data_ref
-                        AND status NOT IN ('refunded', 'chargeback')
-                        AND valor_anual IS NOT NULL
-                    GROUP BY plataforma
-                    ORDER BY plataforma
-                """)
+            # mrr_contribuicao: valor_mensal nos planos mensais, valor_anual / 12 nos anuais
+            query = text("""
+                SELECT 
+                    plataforma,
+                    COUNT(*) as total_assinaturas,
+                    SUM(mrr_contribuicao) as mrr_total
+                FROM assinaturas 
+                WHERE 
+                    tipo_plano = :tipo_plano
+                    AND data_expiracao_acesso >= :data_ref
+                    AND status NOT IN ('refunded', 'chargeback')
+                GROUP BY plataforma
+                ORDER BY plataforma
+            """)
             
-            result = self.db.execute(query, {"data_ref": data_referencia}).fetchall()
+            result = self.db.execute(query, {"tipo_plano": tipo_plano, "data_ref": data_referencia}).fetchall()
             
             mrr_total = sum(Decimal(str(row.mrr_total)) for row in result if row.mrr_total)
             
@@ -1672,28 +1655,16 @@ class MetricsCalculator:
                      COUNT(*) as total_assinaturas,
                      
                      -- MRA baseado em valores mensais e anuais
-                     AVG(
-                         CASE 
-                             WHEN valor_mensal IS NOT NULL THEN valor_mensal
-                             WHEN valor_anual IS NOT NULL THEN valor_anual / 12.0
-                             ELSE 0
-                         END
-                     ) as mra_medio,
+                     AVG(mrr_contribuicao) as mra_medio,
                      
                      -- Soma total de receita recorrente
-                     SUM(
-                         CASE 
-                             WHEN valor_mensal IS NOT NULL THEN valor_mensal
-                             WHEN valor_anual IS NOT NULL THEN valor_anual / 12.0
-                             ELSE 0
-                         END
-                     ) as receita_recorrente_total
+                     SUM(mrr_contribuicao) as receita_recorrente_total
                      
                  FROM assinaturas 
                  WHERE 
                      data_inicio <= :data_ref
                      AND status NOT IN ('refunded', 'chargeback')
-                     AND (valor_mensal IS NOT NULL OR valor_anual IS NOT NULL)
+                     AND tipo_plano IN ('mensal', 'anual')
                  GROUP BY plataforma
                  ORDER BY plataforma
              """)
@@ -1865,7 +1836,7 @@ class MetricsCalculator:
                          WHEN data_inicio <= :data_ref - INTERVAL '6 months'
                          AND data_expiracao_acesso >= :data_ref + INTERVAL '3 months'
                          AND status NOT IN ('canceled', 'subscription_canceled', 'refunded', 'chargeback')
-                         AND (valor_anual IS NOT NULL OR valor_mensal IS NOT NULL)
+                         AND tipo_plano IN ('mensal', 'anual')
                          THEN 1 
                      END) as alta_saude,
                      
@@ -2286,8 +2257,8 @@ class MetricsCalculator:
                     COUNT(*) as total_assinaturas,
                     COUNT(CASE WHEN plataforma = 'guru' THEN 1 END) as guru,
                     COUNT(CASE WHEN plataforma = 'ticto' THEN 1 END) as ticto,
-                    COUNT(CASE WHEN valor_mensal IS NOT NULL THEN 1 END) as planos_mensais,
-                    COUNT(CASE WHEN valor_anual IS NOT NULL THEN 1 END) as planos_anuais,
+                    COUNT(CASE WHEN tipo_plano = 'mensal' THEN 1 END) as planos_mensais,
+                    COUNT(CASE WHEN tipo_plano = 'anual' THEN 1 END) as planos_anuais,
                     COUNT(CASE WHEN status NOT IN ('canceled', 'subscription_canceled', 'refunded', 'chargeback') THEN 1 END) as ativas,
                     COUNT(CASE WHEN status IN ('canceled', 'subscription_canceled') THEN 1 END) as canceladas
                 FROM assinaturas 
@@ -2360,8 +2331,8 @@ class MetricsCalculator:
                     COUNT(*) as total_assinaturas,
                     COUNT(CASE WHEN plataforma = 'guru' THEN 1 END) as guru,
                     COUNT(CASE WHEN plataforma = 'ticto' THEN 1 END) as ticto,
-                    COUNT(CASE WHEN valor_mensal IS NOT NULL THEN 1 END) as planos_mensais,
-                    COUNT(CASE WHEN valor_anual IS NOT NULL THEN 1 END) as planos_anuais,
+                    COUNT(CASE WHEN tipo_plano = 'mensal' THEN 1 END) as planos_mensais,
+                    COUNT(CASE WHEN tipo_plano = 'anual' THEN 1 END) as planos_anuais,
                     COUNT(CASE WHEN status NOT IN ('canceled', 'subscription_canceled', 'refunded', 'chargeback') THEN 1 END) as ativas,
                     COUNT(CASE WHEN status IN ('canceled', 'subscription_canceled') THEN 1 END) as canceladas
                 FROM assinaturas 
@@ -2424,76 +2395,46 @@ class MetricsCalculator:
         self.logger.info(f"Calculando métricas do dashboard para período: {start_date} a {end_date}")
         
         try:
-            # 1. FATURAMENTO TOTAL - Soma valor_liquido de transações aprovadas
-            query_faturamento = text("""
-                SELECT COALESCE(SUM(valor_liquido), 0) as faturamento_total
-                FROM transacoes 
-                WHERE data_transacao BETWEEN :start_date AND :end_date
-                AND status IN ('approved', 'paid', 'authorized')
-                AND valor_liquido > 0
-            """)
-            
-            self.logger.info(f"🔍 Executando query faturamento: {start_date} a {end_date}")
-            result_faturamento = self.db.execute(query_faturamento, {
-                "start_date": start_date,
-                "end_date": end_date
-            }).fetchone()
-            
-            faturamento_total = float(result_faturamento.faturamento_total) if result_faturamento.faturamento_total else 0
-            self.logger.info(f"🔍 Resultado faturamento: {result_faturamento.faturamento_total} -> {faturamento_total}")
-            
-            # 2. QUANTIDADE DE VENDAS - Conta transações aprovadas
-            query_vendas = text("""
-                SELECT COUNT(*) as total_vendas
-                FROM transacoes 
-                WHERE data_transacao BETWEEN :start_date AND :end_date
-                AND status IN ('approved', 'paid', 'authorized')
-                AND valor_bruto > 0
-            """)
-            
-            self.logger.info(f"🔍 Executando query vendas: {start_date} a {end_date}")
-            result_vendas = self.db.execute(query_vendas, {
-                "start_date": start_date,
-                "end_date": end_date
-            }).fetchone()
-            
-            total_vendas = int(result_vendas.total_vendas) if result_vendas.total_vendas else 0
-            self.logger.info(f"🔍 Resultado vendas: {result_vendas.total_vendas} -> {total_vendas}")
-            
-            # 3. QUANTIDADE DE ALUNOS - Conta apenas assinaturas com transações aprovadas
-            query_alunos = text("""
-                SELECT COUNT(DISTINCT a.id) as total_alunos
-                FROM assinaturas a
-                INNER JOIN transacoes t ON a.id = t.assinatura_id
-                WHERE a.data_inicio BETWEEN :start_date AND :end_date
-                AND a.status NOT IN ('refunded', 'chargeback')
-                AND t.status IN ('approved', 'paid', 'authorized')
-                AND t.valor_bruto > 0
-            """)
-            
-            self.logger.info(f"🔍 Executando query alunos: {start_date} a {end_date}")
-            result_alunos = self.db.execute(query_alunos, {
-                "start_date": start_date,
-                "end_date": end_date
-            }).fetchone()
-            
-            total_alunos = int(result_alunos.total_alunos) if result_alunos.total_alunos else 0
-            self.logger.info(f"🔍 Resultado alunos: {result_alunos.total_alunos} -> {total_alunos}")
+            dias = periodo_em_dias(start_date, end_date)
+            if dias:
+                # Dias inteiros: 1-3 e 5 lidos dos resumos diários (O(dias) linhas)
+                totais = self._totais_resumo(*dias)
+                faturamento_total = float(totais.faturamento_total)
+                total_vendas = int(totais.total_vendas)
+                receita_bruta = float(totais.receita_bruta)
+                total_alunos = self._alunos_resumo(*dias)
+                self.logger.info(f"🔍 Resumos diários de {dias[0]} a {dias[1]}")
+            else:
+                # 1. FATURAMENTO TOTAL - Soma valor_liquido de transações aprovadas
+                faturamento_total = self._calculate_faturamento_for_period(start_date, end_date)
+                # 2. QUANTIDADE DE VENDAS - Conta transações aprovadas
+                total_vendas = self._calculate_vendas_for_period(start_date, end_date)
+                # 3. QUANTIDADE DE ALUNOS - Conta apenas assinaturas com transações aprovadas
+                total_alunos = self._calculate_alunos_for_period(start_date, end_date)
+                # 5. RECEITA BRUTA - Soma valor_bruto de transações aprovadas
+                receita_bruta = self._calculate_receita_bruta_for_period(start_date, end_date)
+            self.logger.info(f"🔍 Resultado: faturamento={faturamento_total}, vendas={total_vendas}, alunos={total_alunos}")
             
             # DEBUG: Vamos verificar se há dados no banco para este período
             self.logger.info("🔍 VERIFICANDO DADOS NO BANCO:")
             
             # Verifica transações no período
-            query_debug_transacoes = text("""
-                SELECT COUNT(*) as total, MIN(data_transacao) as min_data, MAX(data_transacao) as max_data
-                FROM transacoes 
-                WHERE data_transacao BETWEEN :start_date AND :end_date
-            """)
+            if dias:
+                query_debug_transacoes = text("""
+                    SELECT COALESCE(SUM(quantidade), 0) as total, MIN(dia) as min_data, MAX(dia) as max_data
+                    FROM resumo_diario_transacoes_atual
+                    WHERE dia BETWEEN :start_date AND :end_date
+                """)
+                periodo_debug = {"start_date": dias[0], "end_date": dias[1]}
+            else:
+                query_debug_transacoes = text("""
+                    SELECT COUNT(*) as total, MIN(data_transacao) as min_data, MAX(data_transacao) as max_data
+                    FROM transacoes 
+                    WHERE data_transacao BETWEEN :start_date AND :end_date
+                """)
+                periodo_debug = {"start_date": start_date, "end_date": end_date}
             
-            result_debug_transacoes = self.db.execute(query_debug_transacoes, {
-                "start_date": start_date,
-                "end_date": end_date
-            }).fetchone()
+            result_debug_transacoes = self.db.execute(query_debug_transacoes, periodo_debug).fetchone()
             
             self.logger.info(f"🔍 Transações no período: {result_debug_transacoes.total} (min: {result_debug_transacoes.min_data}, max: {result_debug_transacoes.max_data})")
             
@@ -2547,9 +2488,6 @@ class MetricsCalculator:
             ltv_data = self.calculate_ltv_for_period(start_date, end_date)
             ltv_geral = ltv_data.get('ltv_total', 0)
             
-            # 5. RECEITA BRUTA - Soma valor_bruto de transações aprovadas
-            receita_bruta = self._calculate_receita_bruta_for_period(start_date, end_date)
-            
             resultado = {
                 "faturamento_total": faturamento_total,
                 "receita_bruta": receita_bruta,
@@ -2609,19 +2547,13 @@ class MetricsCalculator:
                 SELECT 
                     plataforma,
                     COUNT(*) as total_assinaturas,
-                    AVG(
-                        CASE 
-                            WHEN valor_anual IS NOT NULL THEN valor_anual
-                            WHEN valor_mensal IS NOT NULL THEN valor_mensal * 12
-                            ELSE 0
-                        END
-                    ) as ticket_medio_anual
+                    AVG(mrr_contribuicao * 12) as ticket_medio_anual
                     
                 FROM assinaturas 
                 WHERE 
                     data_inicio BETWEEN :start_date AND :end_date
                     AND status NOT IN ('refunded', 'chargeback')
-                    AND (valor_mensal IS NOT NULL OR valor_anual IS NOT NULL)
+                    AND tipo_plano IN ('mensal', 'anual')
                     
                 GROUP BY plataforma
                 ORDER BY plataforma
@@ -2886,8 +2818,33 @@ class MetricsCalculator:
             self.logger.error(f"Erro no diagnóstico: {str(e)}")
             raise
 
+    def _totais_resumo(self, primeiro: date, ultimo: date):
+        """Totais das transações aprovadas de primeiro a ultimo (inclusive) em resumo_diario_transacoes_atual (consolidado + deltas)."""
+        query = text("""
+            SELECT
+                COALESCE(SUM(valor_liquido), 0) as faturamento_total,
+                COALESCE(SUM(valor_bruto), 0) as receita_bruta,
+                COALESCE(SUM(vendas), 0) as total_vendas
+            FROM resumo_diario_transacoes_atual
+            WHERE dia BETWEEN :primeiro AND :ultimo
+            AND classe_status = 'aprovada'
+        """)
+        return self.db.execute(query, {"primeiro": primeiro, "ultimo": ultimo}).fetchone()
+
+    def _alunos_resumo(self, primeiro: date, ultimo: date) -> int:
+        """Alunos com data_inicio de primeiro a ultimo (inclusive) em resumo_diario_alunos_atual (consolidado + deltas)."""
+        query = text("""
+            SELECT COALESCE(SUM(alunos), 0) as total_alunos
+            FROM resumo_diario_alunos_atual
+            WHERE dia BETWEEN :primeiro AND :ultimo
+        """)
+        return int(self.db.execute(query, {"primeiro": primeiro, "ultimo": ultimo}).scalar())
+
     def _calculate_faturamento_for_period(self, start_date: datetime, end_date: datetime) -> float:
         """Calcula faturamento para um período específico usando valor_liquido."""
+        dias = periodo_em_dias(start_date, end_date)
+        if dias:
+            return float(self._totais_resumo(*dias).faturamento_total)
         query = text("""
             SELECT COALESCE(SUM(valor_liquido), 0) as faturamento_total
             FROM transacoes 
@@ -2905,6 +2862,9 @@ class MetricsCalculator:
 
     def _calculate_receita_bruta_for_period(self, start_date: datetime, end_date: datetime) -> float:
         """Calcula receita bruta para um período específico usando valor_bruto."""
+        dias = periodo_em_dias(start_date, end_date)
+        if dias:
+            return float(self._totais_resumo(*dias).receita_bruta)
         query = text("""
             SELECT COALESCE(SUM(valor_bruto), 0) as receita_bruta
             FROM transacoes 
@@ -2922,6 +2882,9 @@ class MetricsCalculator:
 
     def _calculate_vendas_for_period(self, start_date: datetime, end_date: datetime) -> int:
         """Calcula total de vendas para um período específico."""
+        dias = periodo_em_dias(start_date, end_date)
+        if dias:
+            return int(self._totais_resumo(*dias).total_vendas)
         query = text("""
             SELECT COUNT(*) as total_vendas
             FROM transacoes 
@@ -2943,6 +2906,9 @@ class MetricsCalculator:
         CORREÇÃO: Conta apenas assinaturas que têm transações aprovadas,
         excluindo assinaturas criadas apenas por geração de PIX sem compra aprovada.
         """
+        dias = periodo_em_dias(start_date, end_date)
+        if dias:
+            return self._alunos_resumo(*dias)
         query = text("""
             SELECT COUNT(DISTINCT a.id) as total_alunos
             FROM assinaturas a
@@ -0,0 +1,67 @@
+"""
+Ordenação por entidade no processamento de webhooks
+Eventos do mesmo pedido/transação de origem chegam em rajadas
+(ex.: authorized -> subscription_delayed -> subscription_canceled) e precisam
+ser aplicados em ordem; eventos de entidades diferentes podem rodar em paralelo.
+
+Cada evento é associado a uma de N raias pelo hash do id de origem da entidade:
+- inbox: cada raia tem no máximo um evento em processamento, sempre o mais
+  antigo pendente (ver webhook_inbox.reservar_eventos)
+- inline: o processamento segura um advisory lock da raia até o commit, o que
+  serializa a mesma entidade entre threads e processos
+"""
+
+import zlib
+from typing import Optional
+
+from sqlalchemy import func, select
+
+from utils.ingestion_config import ingestion_config
+
+# Namespace dos advisory locks de raia (primeiro argumento de pg_advisory_xact_lock)
+_NAMESPACE_LOCK = 0x57484B  # "WHK"
+
+
+def chave_entidade(plataforma: str, payload: dict) -> Optional[str]:
+    """
+    Id de origem da entidade afetada pelo evento, ou None quando o evento não
+    tem entidade a ordenar (ex.: carrinho abandonado).
+    A chave é um id que todos os eventos da entidade carregam (pedido da Ticto,
+    transação da Guru): a assinatura só aparece em parte dos eventos de um mesmo
+    pedido e não pode decidir a raia. Webhooks de assinatura da Guru, que não
+    têm transação, são ordenados à parte pelo id da assinatura.
+    """
+    if plataforma == "guru":
+        if "payload" in payload:
+            payload = payload["payload"]
+        if payload.get("webhook_type") == "subscription":
+            id_origem = payload.get("id") or payload.get("subscription_code")
+            return f"guru:assinatura:{id_origem}" if id_origem else None
+        return f"guru:transacao:{payload['id']}" if payload.get("id") else None
+    if plataforma == "ticto":
+        order = payload.get("order") or {}
+        id_origem = order.get("hash") or order.get("transaction_hash")
+        return f"ticto:pedido:{id_origem}" if id_origem else None
+    return None
+
+
+def raia_do_evento(plataforma: str, payload: dict) -> Optional[int]:
+    """
+    Raia (0..WEBHOOK_ORDERING_LANES-1) do evento. O hash é estável entre
+    processos (crc32), ao contrário de hash() do Python.
+    """
+    if not ingestion_config.ORDERING_ENABLED:
+        return None
+    chave = chave_entidade(plataforma, payload)
+    if chave is None:
+        return None
+    return zlib.crc32(chave.encode("utf-8")) % ingestion_config.ORDERING_LANES
+
+
+def bloquear_raia(session, raia: Optional[int]):
+    """
+    Serializa o processamento da raia até o fim da transação da sessão.
+    """
+    if raia is None:
+        return
+    session.execute(select(func.pg_advisory_xact_lock(_NAMESPACE_LOCK, raia)))
@@ -0,0 +1,190 @@
+"""
+Partições mensais de transacoes
+transacoes é particionada por RANGE(data_transacao), uma partição por mês
+(transacoes_AAAA_MM) e a partição padrão transacoes_padrao para datas sem
+partição. Este módulo:
+
+- cria as partições do mês atual e dos PARTITION_MONTHS_AHEAD seguintes
+  (no startup da API e no caminho de ingestão, no máximo uma vez a cada
+  PARTITION_CHECK_INTERVAL segundos; entre workers, só um faz o DDL)
+- ao criar um mês, move para ele as linhas que tinham caído na partição padrão
+- destaca meses antigos (DETACH, só catálogo) e os move para o schema de
+  arquivo; reanexar devolve o mês às consultas
+
+O DDL roda com lock_timeout: se uma consulta longa segura a tabela, a
+operação desiste e é tentada de novo depois, em vez de enfileirar os
+INSERTs dos webhooks atrás do lock. O statement_timeout do pool de escrita
+não vale para a manutenção (SET LOCAL statement_timeout = 0).
+"""
+
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from database.connection import engine
+from database.models import Transacao
+from utils.database_config import database_config
+from utils.logging_ingestao import obter_logger
+
+log = obter_logger("particoes")
+
+TABELA = "transacoes"
+PARTICAO_PADRAO = "transacoes_padrao"
+
+# Colunas copiadas ao mover linhas da partição padrão (as calculadas, como
+# mrr_contribuicao, são recalculadas pelo banco na nova partição)
+_COLUNAS = ", ".join(coluna.name for coluna in Transacao.__table__.columns if coluna.computed is None)
+
+# Chave do pg_try_advisory_xact_lock da manutenção ("part" em ASCII)
+_CHAVE_LOCK = 0x70617274
+
+_lock_verificacao = threading.Lock()
+_proxima_verificacao = 0.0
+
+
+def inicio_mes(data) -> date:
+    return date(data.year, data.month, 1)
+
+
+def somar_meses(inicio: date, meses: int) -> date:
+    indice = inicio.year * 12 + inicio.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nome_particao(inicio: date) -> str:
+    return f"{TABELA}_{inicio:%Y_%m}"
+
+
+def listar_particoes(conexao) -> List[Dict[str, Any]]:
+    """Partições anexadas a transacoes: nome, limites e linhas estimadas"""
+    return [
+        dict(linha._mapping)
+        for linha in conexao.execute(text("""
+            SELECT c.relname AS nome,
+                   pg_get_expr(c.relpartbound, c.oid) AS limites,
+                   c.reltuples::bigint AS linhas_estimadas
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:tabela AS regclass)
+            ORDER BY c.relname
+        """), {"tabela": TABELA})
+    ]
+
+
+def criar_particao(conexao, inicio: date) -> bool:
+    """
+    Cria e anexa a partição do mês `inicio`; retorna False se ela já existe.
+    Linhas desse mês que estavam na partição padrão são movidas para a nova
+    antes do ATTACH (com elas na padrão o ATTACH falharia).
+    """
+    nome = nome_particao(inicio)
+    fim = somar_meses(inicio, 1)
+    if any(particao["nome"] == nome for particao in listar_particoes(conexao)):
+        return False
+    conexao.execute(text(
+        f"CREATE TABLE {nome} (LIKE {TABELA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)"
+    ))
+    # As linhas só trocam de partição: o trigger dos resumos diários não as desconta
+    conexao.execute(text("SET LOCAL resumos.ignorar = 'on'"))
+    movidas = conexao.execute(text(f"""
+        WITH movidas AS (
+            DELETE FROM {PARTICAO_PADRAO}
+            WHERE data_transacao >= :inicio AND data_transacao < :fim
+            RETURNING {_COLUNAS}
+        )
+        INSERT INTO {nome} ({_COLUNAS}) SELECT {_COLUNAS} FROM movidas
+    """), {"inicio": inicio, "fim": fim}).rowcount
+    conexao.execute(text("SET LOCAL resumos.ignorar = 'off'"))
+    # ATTACH cria na partição a chave primária, os índices e as FKs de transacoes
+    conexao.execute(text(
+        f"ALTER TABLE {TABELA} ATTACH PARTITION {nome} FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fim.isoformat()}')"
+    ))
+    if movidas:
+        log.info("[PARTICOES] %s linhas movidas de %s para %s", movidas, PARTICAO_PADRAO, nome)
+    return True
+
+
+def garantir_particoes(meses_futuros: Optional[int] = None, referencia: Optional[datetime] = None) -> List[str]:
+    """
+    Cria as partições do mês de `referencia` (hoje) até `meses_futuros` meses à frente.
+    Retorna os nomes criados; com outro processo já fazendo a manutenção, não faz nada.
+    """
+    if meses_futuros is None:
+        meses_futuros = database_config.PARTITION_MONTHS_AHEAD
+    atual = inicio_mes(referencia or datetime.now())
+    criadas = []
+    with engine.begin() as conexao:
+        if not conexao.execute(text("SELECT pg_try_advisory_xact_lock(:chave)"), {"chave": _CHAVE_LOCK}).scalar():
+            return criadas
+        conexao.execute(text(f"SET LOCAL lock_timeout = '{database_config.PARTITION_LOCK_TIMEOUT}'"))
+        # Manutenção não segue o statement_timeout do pool de escrita (mover meses inteiros
+        # passa dele); a espera por locks continua limitada pelo lock_timeout
+        conexao.execute(text("SET LOCAL statement_timeout = 0"))
+        for meses in range(meses_futuros + 1):
+            inicio = somar_meses(atual, meses)
+            if criar_particao(conexao, inicio):
+                criadas.append(nome_particao(inicio))
+    if criadas:
+        log.info("[PARTICOES] Partições criadas: %s", ", ".join(criadas))
+    return criadas
+
+
+def garantir_particoes_se_necessario():
+    """
+    Executa garantir_particoes no máximo uma vez a cada
+    PARTITION_CHECK_INTERVAL segundos (startup e caminho de ingestão).
+    """
+    global _proxima_verificacao
+    agora = time.monotonic()
+    if agora < _proxima_verificacao or not _lock_verificacao.acquire(blocking=False):
+        return
+    try:
+        _proxima_verificacao = agora + database_config.PARTITION_CHECK_INTERVAL
+        garantir_particoes()
+    except Exception as e:
+        # Próxima tentativa no próximo intervalo; meses sem partição caem na padrão
+        log.error("[PARTICOES] Erro ao criar partições de transacoes: %s", e)
+    finally:
+        _lock_verificacao.release()
+
+
+def arquivar_particao(inicio: date, schema: Optional[str] = None) -> str:
+    """
+    Destaca o mês `inicio` de transacoes e o move para o schema de arquivo.
+    O DETACH só altera o catálogo (sem reescrever dados); as linhas deixam de
+    entrar nas métricas e podem ser exportadas/removidas do schema de arquivo.
+    """
+    schema = schema or database_config.PARTITION_ARCHIVE_SCHEMA
+    nome = nome_particao(inicio)
+    with engine.begin() as conexao:
+        conexao.execute(text(f"SET LOCAL lock_timeout = '{database_config.PARTITION_LOCK_TIMEOUT}'"))
+        # Manutenção não segue o statement_timeout do pool de escrita (mover meses inteiros
+        # passa dele); a espera por locks continua limitada pelo lock_timeout
+        conexao.execute(text("SET LOCAL statement_timeout = 0"))
+        # DETACH ... CONCURRENTLY não é permitido com partição padrão
+        conexao.execute(text(f"ALTER TABLE {TABELA} DETACH PARTITION {nome}"))
+        conexao.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+        conexao.execute(text(f"ALTER TABLE {nome} SET SCHEMA {schema}"))
+    log.info("[PARTICOES] %s arquivada em %s", nome, schema)
+    return f"{schema}.{nome}"
+
+
+def reanexar_particao(inicio: date, schema: Optional[str] = None) -> str:
+    """Devolve um mês arquivado a transacoes"""
+    schema = schema or database_config.PARTITION_ARCHIVE_SCHEMA
+    nome = nome_particao(inicio)
+    fim = somar_meses(inicio, 1)
+    with engine.begin() as conexao:
+        conexao.execute(text(f"SET LOCAL lock_timeout = '{database_config.PARTITION_LOCK_TIMEOUT}'"))
+        # Manutenção não segue o statement_timeout do pool de escrita (mover meses inteiros
+        # passa dele); a espera por locks continua limitada pelo lock_timeout
+        conexao.execute(text("SET LOCAL statement_timeout = 0"))
+        conexao.execute(text(f"ALTER TABLE {schema}.{nome} SET SCHEMA public"))
+        conexao.execute(text(
+            f"ALTER TABLE {TABELA} ATTACH PARTITION {nome} FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fim.isoformat()}')"
+        ))
+    log.info("[PARTICOES] %s reanexada a %s", nome, TABELA)
+    return nome
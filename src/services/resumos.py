@@ -0,0 +1,156 @@
+"""
+Resumos diários de transações e alunos
+Os triggers do banco (migrações e9b4d7c2a615 e c8e3f1a5d207) gravam, na mesma
+transação em que os handlers de webhook gravam transacoes e assinaturas, uma
+linha de delta em resumo_transacoes_delta / resumo_alunos_delta — só INSERT,
+sem chave única, para que webhooks do mesmo dia e produto não disputem a
+mesma linha. As leituras usam as views resumo_diario_*_atual (resumos
+consolidados + deltas pendentes). Este módulo:
+
+- decide se um período pode ser lido dos resumos (dias inteiros)
+- consolida os deltas nos resumos (no caminho de ingestão, no máximo uma vez
+  a cada RESUMOS_CONSOLIDATION_INTERVAL segundos; entre workers, só um roda)
+- reconstrói os resumos de um intervalo a partir das tabelas de origem, um
+  mês por transação, sem travar as tabelas: os webhooks seguem gravando
+  deltas e a consolidação espera a reconstrução terminar
+"""
+
+import threading
+import time as relogio
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from database.connection import engine
+from services.particoes import inicio_mes, somar_meses
+from utils.database_config import database_config
+from utils.logging_ingestao import obter_logger
+
+log = obter_logger("resumos")
+
+# Chave do advisory lock que separa consolidação e reconstrução ("resm" em ASCII,
+# a mesma da migração c8e3f1a5d207)
+_CHAVE_LOCK = 0x7265736D
+
+# Conflitos com webhooks concorrentes que fazem a reconstrução de um mês ser
+# repetida: serialização, deadlock e violação de unicidade em alunos_contados
+_ERROS_REPETIVEIS = ("40001", "40P01", "23505")
+_TENTATIVAS_RECONSTRUCAO = 3
+
+_lock_consolidacao = threading.Lock()
+_proxima_consolidacao = 0.0
+
+# Classe de status das vendas confirmadas (status IN ('approved', 'paid', 'authorized'))
+CLASSE_APROVADA = "aprovada"
+
+_FIM_DO_DIA = time(23, 59, 59)
+
+
+def periodo_em_dias(inicio: datetime, fim: datetime) -> Optional[Tuple[date, date]]:
+    """
+    (primeiro dia, último dia) quando o período cobre dias inteiros — começa à
+    meia-noite e termina em 23:59:59 ou depois, como os filtros do dashboard.
+    None quando começa ou termina no meio de um dia (o resumo não tem horas).
+    """
+    if not isinstance(inicio, datetime) or not isinstance(fim, datetime):
+        return None
+    if inicio.time() != time(0) or fim.time() < _FIM_DO_DIA:
+        return None
+    return inicio.date(), fim.date()
+
+
+def limites_historico() -> Tuple[date, date]:
+    """Primeiro e último dia com transações ou início de assinatura (hoje, se vazio)"""
+    with engine.connect() as conexao:
+        primeiro, ultimo = conexao.execute(text("""
+            SELECT least((SELECT min(data_transacao) FROM transacoes), (SELECT min(data_inicio) FROM assinaturas))::date,
+                   greatest((SELECT max(data_transacao) FROM transacoes), (SELECT max(data_inicio) FROM assinaturas))::date
+        """)).one()
+    hoje = date.today()
+    return primeiro or hoje, max(ultimo or hoje, hoje)
+
+
+def consolidar_resumos() -> int:
+    """
+    Soma os deltas pendentes nos resumos e os apaga (resumos_consolidar).
+    Retorna o número de deltas consolidados; 0 quando outro worker ou uma
+    reconstrução está com o lock.
+    """
+    with engine.begin() as conexao:
+        # Um acúmulo grande de deltas (ex.: após uma carga) passa do statement_timeout do pool de escrita
+        conexao.execute(text("SET LOCAL statement_timeout = 0"))
+        return conexao.execute(text("SELECT resumos_consolidar()")).scalar() or 0
+
+
+def consolidar_resumos_se_necessario():
+    """
+    Executa consolidar_resumos no máximo uma vez a cada
+    RESUMOS_CONSOLIDATION_INTERVAL segundos (caminho de ingestão).
+    """
+    global _proxima_consolidacao
+    agora = relogio.monotonic()
+    if agora < _proxima_consolidacao or not _lock_consolidacao.acquire(blocking=False):
+        return
+    try:
+        _proxima_consolidacao = agora + database_config.RESUMOS_CONSOLIDATION_INTERVAL
+        consolidados = consolidar_resumos()
+        if consolidados:
+            log.debug("[RESUMOS] %s deltas consolidados", consolidados)
+    except Exception as e:
+        # Os deltas continuam nas views; a próxima consolidação os soma
+        log.error("[RESUMOS] Erro ao consolidar os resumos: %s", e)
+    finally:
+        _lock_consolidacao.release()
+
+
+def _reconstruir_intervalo(primeiro: date, ultimo: date):
+    """
+    Um intervalo em REPEATABLE READ: resumos_reconstruir apaga os deltas e as
+    linhas consolidadas vistos no snapshot e os recalcula das tabelas de
+    origem; deltas gravados depois do snapshot ficam para a consolidação.
+    """
+    for tentativa in range(1, _TENTATIVAS_RECONSTRUCAO + 1):
+        try:
+            with engine.connect() as conexao:
+                conexao = conexao.execution_options(isolation_level="REPEATABLE READ")
+                with conexao.begin():
+                    # Um mês de histórico passa do statement_timeout do pool de escrita
+                    conexao.execute(text("SET LOCAL statement_timeout = 0"))
+                    conexao.execute(text("SELECT resumos_reconstruir(:primeiro, :ultimo)"),
+                                    {"primeiro": primeiro, "ultimo": ultimo})
+            return
+        except DBAPIError as e:
+            if getattr(e.orig, "pgcode", None) not in _ERROS_REPETIVEIS or tentativa == _TENTATIVAS_RECONSTRUCAO:
+                raise
+            log.warning("[RESUMOS] Conflito ao reconstruir %s a %s (tentativa %s): %s", primeiro, ultimo, tentativa, e.orig)
+
+
+def reconstruir_resumos(primeiro: date, ultimo: date,
+                        progresso: Optional[Callable[[date, date], None]] = None) -> int:
+    """
+    Reconstrói os resumos de primeiro a ultimo (inclusive), um mês por transação.
+    Retorna o número de intervalos reconstruídos.
+    """
+    intervalos = 0
+    with engine.connect() as conexao_lock:
+        # Lock de sessão, obtido antes do snapshot de cada mês: enquanto a
+        # reconstrução roda, resumos_consolidar desiste (try lock) em vez de
+        # alterar linhas que a reconstrução vai apagar
+        conexao_lock.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": _CHAVE_LOCK})
+        conexao_lock.commit()
+        try:
+            inicio = primeiro
+            while inicio <= ultimo:
+                fim = min(somar_meses(inicio_mes(inicio), 1) - timedelta(days=1), ultimo)
+                _reconstruir_intervalo(inicio, fim)
+                if progresso:
+                    progresso(inicio, fim)
+                intervalos += 1
+                inicio = fim + timedelta(days=1)
+        finally:
+            conexao_lock.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": _CHAVE_LOCK})
+            conexao_lock.commit()
+    log.info("[RESUMOS] Resumos reconstruídos de %s a %s (%s intervalos)", primeiro, ultimo, intervalos)
+    return intervalos
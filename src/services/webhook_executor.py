@@ -0,0 +1,100 @@
+"""
+Executor limitado para os handlers síncronos de webhook
+Roda o código SQLAlchemy síncrono fora do event loop do uvicorn, com limite de
+concorrência, fila limitada (backpressure) e medição de tempo por requisição.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+
+from utils.ingestion_config import ingestion_config
+from utils.metricas_prometheus import registrar_profundidade
+
+
+class ExecutorSaturado(Exception):
+    """Levantada quando todos os workers e a fila de espera estão ocupados"""
+
+
+class BoundedExecutor:
+    """
+    ThreadPoolExecutor com capacidade total limitada (workers + fila).
+    Quando a capacidade se esgota, a submissão falha imediatamente em vez de
+    acumular requisições em memória.
+    """
+
+    def __init__(self, max_workers: int = None, max_fila: int = None, timeout: float = None):
+        self.max_workers = max_workers or ingestion_config.EXECUTOR_MAX_WORKERS
+        self.max_fila = max_fila if max_fila is not None else ingestion_config.EXECUTOR_MAX_QUEUE
+        self.timeout = timeout or ingestion_config.EXECUTOR_TIMEOUT
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="webhook-executor")
+        self._lock = threading.Lock()
+        self._em_uso = 0
+        self.total_executados = 0
+        self.total_rejeitados = 0
+        self.total_timeouts = 0
+
+    @property
+    def capacidade(self) -> int:
+        return self.max_workers + self.max_fila
+
+    @property
+    def profundidade(self) -> int:
+        """Tarefas em execução + aguardando na fila"""
+        return self._em_uso
+
+    def _reservar(self):
+        with self._lock:
+            if self._em_uso >= self.capacidade:
+                self.total_rejeitados += 1
+                raise ExecutorSaturado(f"Executor saturado ({self._em_uso}/{self.capacidade})")
+            self._em_uso += 1
+
+    def _liberar(self, _futuro=None):
+        with self._lock:
+            self._em_uso -= 1
+            self.total_executados += 1
+
+    async def executar(self, fn: Callable, *args, **kwargs) -> Tuple[Any, float]:
+        """
+        Executa `fn` em uma thread do pool e retorna (resultado, duracao_ms).
+        Levanta ExecutorSaturado se não houver capacidade e asyncio.TimeoutError
+        se a execução exceder o timeout configurado.
+        """
+        self._reservar()
+        inicio = time.perf_counter()
+        try:
+            futuro = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._liberar()
+            raise
+        # A vaga só é liberada quando a thread termina, mesmo após timeout:
+        # assim o limite reflete o trabalho realmente em andamento
+        futuro.add_done_callback(self._liberar)
+        try:
+            resultado = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(futuro)), self.timeout)
+        except asyncio.TimeoutError:
+            self.total_timeouts += 1
+            raise
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        return resultado, duracao_ms
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_fila": self.max_fila,
+            "profundidade": self.profundidade,
+            "total_executados": self.total_executados,
+            "total_rejeitados": self.total_rejeitados,
+            "total_timeouts": self.total_timeouts,
+        }
+
+    def encerrar(self, aguardar: bool = True):
+        self._pool.shutdown(wait=aguardar)
+
+
+# Instância global do executor
+webhook_executor = BoundedExecutor()
+registrar_profundidade("executor", lambda: webhook_executor.profundidade)
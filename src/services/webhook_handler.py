@@ -1,25 +1,49 @@
 # Webhook handler service 
 
-from utils.validators import validar_payload_guru, validar_payload_ticto
-from utils.helpers import mapear_transacao_ticto, mapear_transacao_guru, identificar_tipo_plano_guru, identificar_tipo_plano_ticto, identificar_tipo_produto_ticto, identificar_tipo_produto_guru, tipo_venda_recusada_ticto
-from database.models import Transacao, Cliente, Assinatura
-from database.connection import get_session
-from sqlalchemy.exc import NoResultFound
+from utils.validators import obter_evento
+from utils.modelos_payload import STATUS_TICTO, converter_data, TransacaoGuru, AssinaturaGuru, EventoTicto, CarrinhoAbandonadoTicto, EventoEspecialTicto
+from utils.helpers import mapear_transacao_ticto, mapear_transacao_guru, tipo_venda_recusada_ticto
+from database.models import Cliente, Assinatura
+from database.connection import unit_of_work
+from database.upserts import upsert_cliente, upsert_assinatura, upsert_transacao, upsert_transacoes_em_lote, buscar_transacao, CHAVE_ADIADAS, CHAVE_ASSINATURAS_SOMENTE_LEITURA
+from services.particoes import garantir_particoes_se_necessario
+from services.resumos import consolidar_resumos_se_necessario
+from services.idempotencia import calcular_fingerprint, buscar_evento_processado, buscar_eventos_processados, registrar_evento_processado, registrar_eventos_processados, lembrar_evento_processado, limpar_se_necessario, status_resultado
+from services.bulk_writer import bulk_writer
+from services.ordenacao import raia_do_evento, bloquear_raia
+from services.dead_letter import registrar_falha
+from services.catalogo import catalogo, identificar_tipo_plano_guru, identificar_tipo_plano_ticto, identificar_tipo_produto_ticto, identificar_tipo_produto_guru, tipo_plano_transacao, calcular_valores_assinatura_por_tipo
+from services.cache_entidades import buscar_cliente_id, buscar_assinatura_id, lembrar_cliente, lembrar_assinatura
+from utils.ingestion_config import ingestion_config
+from utils.logging_ingestao import obter_logger, log_payload, contexto_evento, evento_atual
+from utils.metricas_prometheus import medir_webhook, contar_webhook
+from sqlalchemy import select, update
 from datetime import datetime, timedelta
 
+log = obter_logger("webhook")
+
+# Retorno dos handlers quando a transação foi adiada para o escritor em lote;
+# processar_webhook substitui pelo resultado do lote após o commit
+RESULTADO_EM_LOTE = {"status": "em_lote"}
+
 def get_or_create_cliente(session, nome, email, documento, data_criacao):
-    cliente = session.query(Cliente).filter_by(email=email).first()
-    if cliente:
-        return cliente
-    cliente = Cliente(
+    """
+    Retorna o id do cliente pelo email, inserindo-o se necessário (upsert).
+    Clientes já vistos vêm do cache de ids, sem consultar o banco.
+    Não faz commit: participa da unidade de trabalho do evento.
+    """
+    cliente_id = buscar_cliente_id(email)
+    if cliente_id is not None:
+        return cliente_id
+    cliente_id = upsert_cliente(
+        session,
         nome=nome,
         email=email,
         documento=documento,
         data_criacao=converter_data(data_criacao)
     )
-    session.add(cliente)
-    session.commit()
-    return cliente
+    lembrar_cliente(session, email, cliente_id)
+    return cliente_id
 
 def calcular_valor_mensal_guru(payload):
     """
@@ -35,15 +59,15 @@ def calcular_valor_mensal_guru(payload):
     
     if tipo_plano == "anual":
         valor_mensal = valor_total / 12
-        print(f"[GURU] Plano anual detectado (ID: {product_id}), valor total: R$ {valor_total}, valor mensal: R$ {valor_mensal:.2f}")
+        log.debug("[GURU] Plano anual detectado (ID: %s), valor total: R$ %s, valor mensal: R$ %.2f", product_id, valor_total, valor_mensal)
         return valor_mensal
     elif tipo_plano == "mensal":
         valor_mensal = valor_total
-        print(f"[GURU] Plano mensal detectado (ID: {product_id}), valor mensal: R$ {valor_mensal}")
+        log.debug("[GURU] Plano mensal detectado (ID: %s), valor mensal: R$ %s", product_id, valor_mensal)
         return valor_mensal
     else:
         # Fallback: assume mensal se não conseguir identificar
-        print(f"[GURU] Plano não identificado (ID: {product_id}), usando valor total como mensal: R$ {valor_total}")
+        log.debug("[GURU] Plano não identificado (ID: %s), usando valor total como mensal: R$ %s", product_id, valor_total)
         return valor_total
 
 def calcular_data_expiracao_guru(payload):
@@ -65,13 +89,13 @@ def calcular_data_expiracao_guru(payload):
     if data_confirmacao:
         if tipo_plano == "anual":
             dias = 365
-            print(f"[GURU] Plano anual detectado (ID: {product_id}), confirmed_at, usando {dias} dias")
+            log.debug("[GURU] Plano anual detectado (ID: %s), confirmed_at, usando %s dias", product_id, dias)
         elif tipo_plano == "mensal":
             dias = 30
-            print(f"[GURU] Plano mensal detectado (ID: {product_id}), confirmed_at, usando {dias} dias")
+            log.debug("[GURU] Plano mensal detectado (ID: %s), confirmed_at, usando %s dias", product_id, dias)
         else:
             dias = subscription.get("charged_every_days", 30) if subscription else 30
-            print(f"[GURU] Plano não identificado (ID: {product_id}), confirmed_at, usando {dias} dias")
+            log.debug("[GURU] Plano não identificado (ID: %s), confirmed_at, usando %s dias", product_id, dias)
         return data_confirmacao + timedelta(days=dias)
 
     # 2. Fallback: usa started_at
@@ -88,66 +112,23 @@ def calcular_data_expiracao_guru(payload):
     # 3. Último fallback: data atual + 30 dias
     return datetime.now() + timedelta(days=30)
 
-def get_or_create_assinatura(session, id_assinatura_origem, plataforma, cliente_id, produto_nome, nome_oferta, status, data_inicio, data_proxima_cobranca, data_cancelamento, data_expiracao_acesso, valor_mensal, valor_anual, ultima_atualizacao):
+def get_or_create_assinatura(session, id_assinatura_origem, plataforma, cliente_id, produto_nome, nome_oferta, status, data_inicio, data_proxima_cobranca, data_cancelamento, data_expiracao_acesso, valor_mensal, valor_anual, ultima_atualizacao, produto_id=None, oferta_id=None):
+    """
+    Insere ou atualiza a assinatura (upsert por id_assinatura_origem) e retorna o id.
+    Webhooks com data anterior aos dados gravados não sobrescrevem a assinatura.
+    Não faz commit: participa da unidade de trabalho do evento.
+    """
     # Garante que o id_assinatura_origem é string
     id_assinatura_origem = str(id_assinatura_origem) if id_assinatura_origem is not None else None
-    assinatura = session.query(Assinatura).filter_by(id_assinatura_origem=id_assinatura_origem).first()
-    if assinatura:
-        # Validação de integridade: verifica se dados do webhook são mais recentes
-        webhook_data_atualizacao = converter_data(ultima_atualizacao)
-
-        # CORREÇÃO: Garante que ambas as datas tenham timezone antes da comparação
-        if webhook_data_atualizacao and assinatura.ultima_atualizacao:
-            from datetime import timezone
-            
-            # Garante que webhook_data_atualizacao tenha timezone
-            if webhook_data_atualizacao.tzinfo is None:
-                webhook_data_atualizacao = webhook_data_atualizacao.replace(tzinfo=timezone.utc)
-            
-            # Garante que assinatura.ultima_atualizacao tenha timezone
-            if assinatura.ultima_atualizacao.tzinfo is None:
-                assinatura_data_with_tz = assinatura.ultima_atualizacao.replace(tzinfo=timezone.utc)
-            else:
-                assinatura_data_with_tz = assinatura.ultima_atualizacao
-
-            if webhook_data_atualizacao < assinatura_data_with_tz:
-                print(f"[SYNC] ⚠️ Webhook com data anterior ignorado: {webhook_data_atualizacao} < {assinatura_data_with_tz}")
-                return assinatura  # Retorna sem atualizar
-        
-        assinatura.plataforma = plataforma
-        assinatura.cliente_id = cliente_id
-        assinatura.produto_nome = produto_nome
-        assinatura.nome_oferta = nome_oferta
-        assinatura.status = status
-        # NÃO atualizar data_inicio em updates!
-        # assinatura.data_inicio = converter_data(data_inicio)
-        assinatura.data_proxima_cobranca = converter_data(data_proxima_cobranca)
-        
-        # Lógica para data_cancelamento
-        if status in ["active", "uncanceled"]:
-            # Se voltou a ficar ativa, limpa data_cancelamento
-            if assinatura.data_cancelamento:
-                assinatura.data_cancelamento = None
-                print(f"[DB] data_cancelamento limpo para assinatura ativa: {assinatura.id}")
-        elif status != "active" and not assinatura.data_cancelamento:
-            # Se ficou inativa e ainda não tem data_cancelamento, preenche
-            assinatura.data_cancelamento = converter_data(data_cancelamento) or converter_data(ultima_atualizacao)
-            print(f"[DB] data_cancelamento preenchido: {assinatura.data_cancelamento}")
-        
-        assinatura.data_expiracao_acesso = converter_data(data_expiracao_acesso)
-        assinatura.valor_mensal = valor_mensal
-        assinatura.valor_anual = valor_anual
-        assinatura.ultima_atualizacao = converter_data(ultima_atualizacao)
-        session.commit()
-        print(f"[DB] Assinatura atualizada: ID {assinatura.id}, valor mensal: {valor_mensal}, valor anual: {valor_anual}")
-        print(f"[SYNC] ✅ Webhook atualizou assinatura do backfill: {assinatura.id_assinatura_origem}")
-        return assinatura
-    assinatura = Assinatura(
+    assinatura_id, acao = upsert_assinatura(
+        session,
         id_assinatura_origem=id_assinatura_origem,
         plataforma=plataforma,
         cliente_id=cliente_id,
         produto_nome=produto_nome,
         nome_oferta=nome_oferta,
+        produto_id=produto_id,
+        oferta_id=oferta_id,
         status=status,
         data_inicio=converter_data(data_inicio),
         data_proxima_cobranca=converter_data(data_proxima_cobranca),
@@ -157,167 +138,119 @@ def get_or_create_assinatura(session, id_assinatura_origem, plataforma, cliente_
         valor_anual=valor_anual,
         ultima_atualizacao=converter_data(ultima_atualizacao)
     )
-    session.add(assinatura)
-    session.commit()
-    print(f"[DB] Nova assinatura criada: ID {assinatura.id}, valor mensal: {valor_mensal}, valor anual: {valor_anual}")
-    return assinatura
-
-def converter_data(valor):
-    if valor is None:
-        return None
-    if isinstance(valor, (int, float)):
-        # Timestamp (segundos) - converte para timezone-aware
-        from datetime import timezone
-        return datetime.fromtimestamp(valor, tz=timezone.utc)
-    if isinstance(valor, str):
-        try:
-            # Tenta converter string ISO - garante timezone-aware
-            if valor.endswith('Z'):
-                valor = valor.replace('Z', '+00:00')
-            elif '+' not in valor and '-' in valor and 'T' in valor:
-                # Assume UTC se não tem timezone
-                valor = valor + '+00:00'
-            return datetime.fromisoformat(valor)
-        except Exception:
-            pass
-        try:
-            # Tenta converter formato brasileiro: 'DD/MM/YYYY HH:MM:SS'
-            dt = datetime.strptime(valor, "%d/%m/%Y %H:%M:%S")
-            # Assume UTC para datas brasileiras
-            from datetime import timezone
-            return dt.replace(tzinfo=timezone.utc)
-        except Exception:
-            pass
-    return valor
-
-def salvar_transacao(transacao_dict: dict):
-    session = get_session()
+    lembrar_assinatura(session, id_assinatura_origem, assinatura_id)
+    if acao == "mantida":
+        log.debug("[DB] Assinatura %s mantida (somente leitura)", id_assinatura_origem)
+    elif acao == "ignorada":
+        log.warning("[SYNC] ⚠️ Webhook com data anterior ignorado para assinatura: %s", id_assinatura_origem)
+    elif acao == "atualizada":
+        log.info("[DB] Assinatura atualizada: ID %s, valor mensal: %s, valor anual: %s", assinatura_id, valor_mensal, valor_anual)
+        log.info("[SYNC] ✅ Webhook atualizou assinatura do backfill: %s", id_assinatura_origem)
+    else:
+        log.info("[DB] Nova assinatura criada: ID %s, valor mensal: %s, valor anual: %s", assinatura_id, valor_mensal, valor_anual)
+    return assinatura_id
+
+def ids_catalogo_ticto(session, evento):
+    """
+    produto_id e oferta_id do item de um evento Ticto; produto/oferta fora do
+    catálogo são registrados na transação da sessão (services/catalogo.py).
+    """
+    item = evento.item
+    return catalogo.registrar(session, "ticto", item.product_id, item.product_name, item.offer_code, item.offer_name)
+
+def _webhook_anterior(data_webhook, data_existente):
+    """
+    Indica se a data do webhook é anterior à data gravada no banco.
+    Datas sem timezone vindas do banco são tratadas como UTC.
+    """
+    if not data_webhook or not data_existente or not isinstance(data_webhook, datetime):
+        return False
+    from datetime import timezone
+    if data_webhook.tzinfo is None:
+        data_webhook = data_webhook.replace(tzinfo=timezone.utc)
+    if data_existente.tzinfo is None:
+        data_existente = data_existente.replace(tzinfo=timezone.utc)
+    return data_webhook < data_existente
+
+def salvar_transacao(transacao_dict: dict, session=None):
+    """
+    Grava a transação (upsert por id_transacao_origem + produto_nome).
+    Se a transação já existe, apenas vincula a assinatura quando ainda não houver.
+    """
     try:
-        transacao = Transacao(**transacao_dict)
-        session.add(transacao)
-        session.commit()
-        print("[DB] Transação salva com sucesso!")
+        with unit_of_work(session) as uow:
+            upsert_transacao(uow, transacao_dict)
+        log.info("[DB] Transação salva com sucesso!")
     except Exception as e:
-        session.rollback()
-        print("[DB] Erro ao salvar transação:", e)
+        if session is not None:
+            raise
+        log.error("[DB] Erro ao salvar transação: %s", e)
         return False
-    finally:
-        session.close()
     return True
 
-def processar_guru_transacao(payload: dict) -> dict:
+def processar_guru_transacao(payload: dict, session=None, evento: TransacaoGuru = None) -> dict:
     # Se o payload estiver aninhado, extrai o payload real
     if "payload" in payload:
         payload = payload["payload"]
         
-    if not validar_payload_guru(payload):
-        return {"status": "erro", "motivo": "Payload inválido"}
-    print("[GURU] Payload recebido:", payload)
+    if evento is None:
+        evento = obter_evento("guru", payload)
+        if not isinstance(evento, TransacaoGuru):
+            return {"status": "erro", "motivo": "Payload inválido"}
+    log_payload(log, "[GURU] Payload recebido", payload)
     transacao_map = mapear_transacao_guru(payload)
-    print("[GURU] Transação mapeada:", transacao_map)
-    session = get_session()
+    log_payload(log, "[GURU] Transação mapeada", transacao_map)
     try:
-        # 1. Cliente
-        cliente = get_or_create_cliente(
-            session,
-            nome=payload["contact"].get("name"),
-            email=payload["contact"].get("email"),
-            documento=payload["contact"].get("doc"),
-            data_criacao=payload["dates"].get("created_at")
-        )
-        # Identifica tipo especial de produto Guru
-        product_id = str(payload.get("product", {}).get("id"))
-        is_order_bump = payload.get("is_order_bump", 0)
-        tipo_produto = identificar_tipo_produto_guru(product_id, is_order_bump)
-        payload["tipo_produto_guru"] = tipo_produto
-        # Extrai valores bruto e líquido
-        valor_bruto = payload.get("payment", {}).get("total")
-        valor_liquido = payload.get("payment", {}).get("net")
-        # Extrai taxa de reembolso do marketplace_value
-        taxa_reembolso = payload.get("payment", {}).get("marketplace_value")
-        # Define o status primeiro
-        status = transacao_map["status"]
-        # Extrai motivo de recusa/refund se houver
-        # Para reembolsos, prioriza o refund_reason como motivo_recusa
-        if status == "refunded":
-            motivo_recusa = payload.get("payment", {}).get("refund_reason")
-        else:
-            motivo_recusa = (
-                payload.get("payment", {}).get("refuse_reason")
-                or payload.get("payment", {}).get("refund_reason")
-                or None
+        with unit_of_work(session) as uow:
+            # 1. Cliente
+            cliente_id = get_or_create_cliente(
+                uow,
+                nome=evento.contact.name,
+                email=evento.contact.email,
+                documento=evento.contact.doc,
+                data_criacao=evento.dates.created_at
             )
-        id_transacao = transacao_map["id_transacao_origem"]
-        confirmed_at = payload.get("dates", {}).get("confirmed_at")
-        # Busca transação existente com produto_nome (para order bumps/upsells)
-        transacao = session.query(Transacao).filter_by(id_transacao_origem=id_transacao, produto_nome=transacao_map.get("produto_nome")).first()
-        if transacao:
-            # Validação de integridade: verifica se dados do webhook são mais recentes
-            webhook_data_transacao = converter_data(transacao_map["data_evento"])
-            
-            # Garante que ambas as datas tenham timezone antes da comparação
-            if webhook_data_transacao and transacao.data_transacao:
-                # Se a data do banco não tem timezone, assume UTC
-                from datetime import timezone
-                if transacao.data_transacao.tzinfo is None:
-                    transacao_data_with_tz = transacao.data_transacao.replace(tzinfo=timezone.utc)
-                else:
-                    transacao_data_with_tz = transacao.data_transacao
-                
-                if webhook_data_transacao < transacao_data_with_tz:
-                    print(f"[SYNC] ⚠️ Webhook com data anterior ignorado: {webhook_data_transacao} < {transacao_data_with_tz}")
-                    return {"status": "ignorado", "motivo": "Webhook com data anterior aos dados existentes"}
-            
-            # Atualiza transação existente se o status mudou OU se há taxa de reembolso
-            status_mudou = transacao.status != status
-            taxa_disponivel = taxa_reembolso is not None
-            
-            if status_mudou or taxa_disponivel:
-                if status_mudou:
-                    transacao.status = status
-                if taxa_disponivel:
-                    transacao.taxa_reembolso = taxa_reembolso
-                # Atualiza motivo_recusa se status mudou para refunded ou se há motivo disponível
-                if status_mudou and status == "refunded":
-                    transacao.motivo_recusa = motivo_recusa
-                elif motivo_recusa and not transacao.motivo_recusa:
-                    transacao.motivo_recusa = motivo_recusa
-                transacao.valor_liquido = valor_liquido
-                transacao.valor_bruto = valor_bruto
-                transacao.data_transacao = converter_data(transacao_map["data_evento"])
-                session.commit()
-                
-                mudancas = []
-                if status_mudou:
-                    mudancas.append(f"status: {transacao.status} -> {status}")
-                if taxa_disponivel:
-                    mudancas.append(f"taxa_reembolso: {taxa_reembolso}")
-                if status_mudou and status == "refunded" and motivo_recusa:
-                    mudancas.append(f"motivo_recusa: {motivo_recusa}")
-                
-                print(f"[DB] Transação atualizada: {id_transacao}, mudanças: {', '.join(mudancas)}")
-                print(f"[SYNC] ✅ Webhook atualizou transação do backfill: {id_transacao} - {transacao_map.get('produto_nome')}")
-                return {"status": "atualizada", "transacao_id": transacao.id, "mudancas": mudancas}
+            # Identifica tipo especial de produto Guru
+            tipo_produto = identificar_tipo_produto_guru(evento.product.id, evento.is_order_bump or 0)
+            payload["tipo_produto_guru"] = tipo_produto
+            # Extrai valores bruto e líquido
+            pagamento = evento.payment
+            valor_bruto = pagamento.total
+            valor_liquido = pagamento.net
+            # Extrai taxa de reembolso do marketplace_value
+            taxa_reembolso = pagamento.marketplace_value
+            # Define o status primeiro
+            status = transacao_map["status"]
+            # Extrai motivo de recusa/refund se houver
+            # Para reembolsos, prioriza o refund_reason como motivo_recusa
+            if status == "refunded":
+                motivo_recusa = pagamento.refund_reason
             else:
-                print(f"[DB] Transação já existente, sem mudanças: {id_transacao}")
-                return {"status": "ja_existente", "transacao_id": transacao.id}
-        else:
+                motivo_recusa = pagamento.refuse_reason or pagamento.refund_reason or None
+            id_transacao = transacao_map["id_transacao_origem"]
+            produto_nome = transacao_map.get("produto_nome")
+            data_transacao = evento.dates.created_at
+
             # Busca assinatura relacionada se existir no payload
             assinatura_id = None
-            subscription_data = payload.get("subscription")
-            if subscription_data and isinstance(subscription_data, dict):
-                subscription_origem_id = subscription_data.get("id")
+            if evento.subscription is not None:
+                subscription_origem_id = evento.subscription.id
                 if subscription_origem_id:
-                    assinatura = session.query(Assinatura).filter_by(id_assinatura_origem=subscription_origem_id).first()
-                    if assinatura:
-                        assinatura_id = assinatura.id
-                        print(f"[DB] Transação relacionada à assinatura {assinatura_id} (origem: {subscription_origem_id})")
-            
-            # Cria nova transação (pode ser aguardando pagamento ou já confirmada)
+                    assinatura_id = buscar_assinatura_id(subscription_origem_id)
+                    if assinatura_id is None:
+                        assinatura_id = uow.execute(
+                            select(Assinatura.id).where(Assinatura.id_assinatura_origem == subscription_origem_id)
+                        ).scalar()
+                        lembrar_assinatura(uow, subscription_origem_id, assinatura_id)
+                    if assinatura_id:
+                        log.info("[DB] Transação relacionada à assinatura %s (origem: %s)", assinatura_id, subscription_origem_id)
+
+            # Cria a transação (aguardando pagamento ou já confirmada) ou atualiza a existente
+            # (busca com produto_nome para order bumps/upsells)
             transacao_dict = {
                 "id_transacao_origem": id_transacao,
-                "assinatura_id": assinatura_id,  # Agora relaciona com assinatura se existir
-                "cliente_id": cliente.id,
+                "assinatura_id": assinatura_id,  # Relaciona com assinatura se existir
+                "cliente_id": cliente_id,
                 "plataforma": "guru",
                 "status": status,
                 "valor": transacao_map["valor_total"],
@@ -325,208 +258,239 @@ def processar_guru_transacao(payload: dict) -> dict:
                 "valor_liquido": valor_liquido,
                 "taxa_reembolso": taxa_reembolso,
                 "metodo_pagamento": transacao_map["metodo_pagamento"],
-                "data_transacao": converter_data(transacao_map["data_evento"]),
+                "data_transacao": data_transacao,
                 "motivo_recusa": motivo_recusa,
-                "produto_nome": transacao_map.get("produto_nome"),
+                "produto_nome": produto_nome,
                 "nome_oferta": transacao_map.get("nome_oferta"),
+                "tipo_plano": tipo_plano_transacao("guru", evento.product.id),
+                **catalogo.registrar(uow, "guru", evento.product.id, evento.product.name,
+                                     transacao_map.get("nome_oferta"), transacao_map.get("nome_oferta")),
                 "json_completo": payload
             }
-            sucesso = salvar_transacao(transacao_dict)
-            if sucesso:
+
+            # Atualiza transação existente se o status mudou OU se há taxa de reembolso,
+            # e somente se o webhook não for anterior aos dados existentes (perfil "guru")
+            transacao_id, acao = upsert_transacao(uow, transacao_dict, perfil="guru")
+
+            if acao == "adiada":
+                return dict(RESULTADO_EM_LOTE)
+            if acao == "criada":
                 return {"status": "criada", "transacao": transacao_dict}
-            else:
-                return {"status": "erro", "motivo": "Falha ao salvar no banco"}
+            if acao == "atualizada":
+                mudancas = [f"status: {status}"]
+                if taxa_reembolso is not None:
+                    mudancas.append(f"taxa_reembolso: {taxa_reembolso}")
+                if status == "refunded" and motivo_recusa:
+                    mudancas.append(f"motivo_recusa: {motivo_recusa}")
+                log.info("[DB] Transação atualizada: %s, mudanças: %s", id_transacao, ', '.join(mudancas))
+                log.info("[SYNC] ✅ Webhook atualizou transação do backfill: %s - %s", id_transacao, produto_nome)
+                return {"status": "atualizada", "transacao_id": transacao_id, "mudancas": mudancas}
+
+            # Conflito sem atualização: webhook antigo ou sem mudanças
+            existente = buscar_transacao(uow, id_transacao, produto_nome)
+            if existente is None:
+                # Chave conhecida, linha em uma partição já arquivada (services/particoes.py)
+                log.warning("[SYNC] ⚠️ Transação em mês arquivado, webhook ignorado: %s", id_transacao)
+                return {"status": "ignorado", "motivo": "Transação em mês arquivado"}
+            if _webhook_anterior(data_transacao, existente.data_transacao):
+                log.warning("[SYNC] ⚠️ Webhook com data anterior ignorado: %s < %s", data_transacao, existente.data_transacao)
+                return {"status": "ignorado", "motivo": "Webhook com data anterior aos dados existentes"}
+            log.info("[DB] Transação já existente, sem mudanças: %s", id_transacao)
+            return {"status": "ja_existente", "transacao_id": existente.id}
     except Exception as e:
-        print("[GURU] Erro no processamento:", e)
+        if session is not None:
+            raise
+        log.error("[GURU] Erro no processamento: %s", e)
         return {"status": "erro", "motivo": str(e)}
-    finally:
-        session.close()
 
-def processar_guru_assinatura(payload: dict) -> dict:
-    session = get_session()
+def processar_guru_assinatura(payload: dict, session=None, evento: AssinaturaGuru = None) -> dict:
+    if evento is None:
+        evento = obter_evento("guru", payload)
+        if not isinstance(evento, AssinaturaGuru):
+            return {"status": "erro", "motivo": "Payload inválido"}
     try:
-        subscriber = payload.get("subscriber", {})
-        nome = subscriber.get("name")
-        email = subscriber.get("email")
-        documento = subscriber.get("doc")
-        
-        # Corrigido: busca data_criacao em campos que realmente existem
-        data_criacao = (
-            payload.get("dates", {}).get("started_at") or 
-            subscriber.get("created_at") or 
-            datetime.now()
-        )
-        
-        if not email:
-            return {"status": "erro", "motivo": "Assinante sem email"}
-        cliente = get_or_create_cliente(session, nome, email, documento, data_criacao)
-        id_assinatura_origem = payload.get("id") or payload.get("subscription_code")
-        plataforma = "guru"
-        produto_nome = payload.get("name") or payload.get("product", {}).get("name")
-        invoice_status = payload.get("current_invoice", {}).get("status")
-        cancel_at_cycle_end = payload.get("cancel_at_cycle_end", 0)
-        cancel_reason = payload.get("cancel_reason")
-        # Ajuste: força status canceled se cancelamento de renovação
-        if invoice_status == "waiting_payment":
-            status = "waiting_payment"
-        elif cancel_at_cycle_end == 1 or cancel_reason:
-            status = "canceled"
-        else:
-            status = payload.get("last_status")
-        data_inicio = payload.get("dates", {}).get("started_at")
-        data_proxima_cobranca = payload.get("dates", {}).get("next_cycle_at")
-        # Ajuste: preenche data_cancelamento mesmo se dates.canceled_at vier vazio
-        data_cancelamento = payload.get("dates", {}).get("canceled_at")
-        if (not data_cancelamento or data_cancelamento == "") and (cancel_at_cycle_end == 1 or cancel_reason):
-            # Usa a data do último status como data de cancelamento
-            data_cancelamento = payload.get("dates", {}).get("last_status_at")
-        data_expiracao_acesso = payload.get("dates", {}).get("cycle_end_date") or payload.get("dates", {}).get("next_cycle_at")
-        valor_total = payload.get("current_invoice", {}).get("value")
-        # CORREÇÃO: Pega o product_id do last_transaction em vez do nível raiz
-        last_transaction = payload.get("last_transaction", {})
-        product_id = last_transaction.get("product", {}).get("id") or payload.get("product", {}).get("id")
-        
-        # Usa a nova função para calcular valores corretamente
-        from utils.helpers import calcular_valores_assinatura_por_tipo
-        valor_mensal, valor_anual = calcular_valores_assinatura_por_tipo(
-            valor_total, product_id, "guru"
-        )
-        ultima_atualizacao = payload.get("dates", {}).get("last_status_at")
-        # Extrai nome_oferta do payload
-        nome_oferta = payload.get("product", {}).get("offer", {}).get("name")
-        assinatura = get_or_create_assinatura(
-            session,
-            id_assinatura_origem=id_assinatura_origem,
-            plataforma=plataforma,
-            cliente_id=cliente.id,
-            produto_nome=produto_nome,
-            nome_oferta=nome_oferta,
-            status=status,
-            data_inicio=data_inicio,
-            data_proxima_cobranca=data_proxima_cobranca,
-            data_cancelamento=data_cancelamento,
-            data_expiracao_acesso=data_expiracao_acesso,
-            valor_mensal=valor_mensal,
-            valor_anual=valor_anual,
-            ultima_atualizacao=ultima_atualizacao
-        )
-        return {"status": "processado_guru_assinatura", "assinatura_id": assinatura.id}
+        with unit_of_work(session) as uow:
+            subscriber = evento.subscriber
+            datas = evento.dates
+            nome = subscriber.name
+            email = subscriber.email
+            documento = subscriber.doc
+            
+            # Corrigido: busca data_criacao em campos que realmente existem
+            data_criacao = datas.started_at or subscriber.created_at or datetime.now()
+            
+            if not email:
+                return {"status": "erro", "motivo": "Assinante sem email"}
+            cliente_id = get_or_create_cliente(uow, nome, email, documento, data_criacao)
+            id_assinatura_origem = evento.id or evento.subscription_code
+            plataforma = "guru"
+            produto_nome = evento.name or evento.product.name
+            invoice_status = evento.current_invoice.status
+            cancel_at_cycle_end = evento.cancel_at_cycle_end
+            cancel_reason = evento.cancel_reason
+            # Ajuste: força status canceled se cancelamento de renovação
+            if invoice_status == "waiting_payment":
+                status = "waiting_payment"
+            elif cancel_at_cycle_end == 1 or cancel_reason:
+                status = "canceled"
+            else:
+                status = evento.last_status
+            data_inicio = datas.started_at
+            data_proxima_cobranca = datas.next_cycle_at
+            # Ajuste: preenche data_cancelamento mesmo se dates.canceled_at vier vazio
+            data_cancelamento = datas.canceled_at
+            if not data_cancelamento and (cancel_at_cycle_end == 1 or cancel_reason):
+                # Usa a data do último status como data de cancelamento
+                data_cancelamento = datas.last_status_at
+            data_expiracao_acesso = datas.cycle_end_date or datas.next_cycle_at
+            valor_total = evento.current_invoice.value
+            # CORREÇÃO: Pega o product_id do last_transaction em vez do nível raiz
+            product_id = evento.last_transaction.product.id or evento.product.id
+            
+            # Usa a nova função para calcular valores corretamente
+            valor_mensal, valor_anual = calcular_valores_assinatura_por_tipo(
+                valor_total, product_id, "guru"
+            )
+            ultima_atualizacao = datas.last_status_at
+            # Extrai nome_oferta do payload
+            nome_oferta = evento.product.nome_oferta
+            ids = catalogo.registrar(uow, "guru", product_id, evento.product.name, nome_oferta, nome_oferta)
+            assinatura_id = get_or_create_assinatura(
+                uow,
+                id_assinatura_origem=id_assinatura_origem,
+                plataforma=plataforma,
+                cliente_id=cliente_id,
+                produto_nome=produto_nome,
+                nome_oferta=nome_oferta,
+                status=status,
+                data_inicio=data_inicio,
+                data_proxima_cobranca=data_proxima_cobranca,
+                data_cancelamento=data_cancelamento,
+                data_expiracao_acesso=data_expiracao_acesso,
+                valor_mensal=valor_mensal,
+                valor_anual=valor_anual,
+                ultima_atualizacao=ultima_atualizacao,
+                **ids
+            )
+            return {"status": "processado_guru_assinatura", "assinatura_id": assinatura_id}
     except Exception as e:
-        print("[GURU] Erro no processamento de assinatura:", e)
+        if session is not None:
+            raise
+        log.error("[GURU] Erro no processamento de assinatura: %s", e)
         return {"status": "erro", "motivo": str(e)}
-    finally:
-        session.close()
 
-def processar_assinatura_guru(payload: dict) -> dict:
+def processar_assinatura_guru(payload: dict, session=None) -> dict:
     """
     Processa assinatura da Guru com dados enriquecidos de transações
     """
-    session = get_session()
     try:
-        # Extrai dados básicos
-        subscription = payload.get("subscription", {})
-        contact = payload.get("contact", {})
-        product = payload.get("product", {})
-        enriched_values = payload.get("enriched_values", {})
-        
-        # Dados do cliente
-        nome = contact.get("name")
-        email = contact.get("email")
-        documento = contact.get("doc")
-        
-        # Corrigido: busca data_criacao em campos que realmente existem
-        data_criacao = (
-            subscription.get("created_at") or 
-            subscription.get("started_at") or
-            contact.get("created_at") or 
-            datetime.now()
-        )
-        
-        # Garante que data_criacao seja sempre válida
-        if not data_criacao:
-            data_criacao = datetime.now()
-            print(f"⚠️ data_criacao não encontrada, usando data atual: {data_criacao}")
-        
-        print(f"📅 Data de criação do cliente: {data_criacao}")
-        
-        if not email:
-            return {"status": "erro", "motivo": "Assinante sem email"}
-        
-        # Cria ou busca cliente
-        cliente = get_or_create_cliente(session, nome, email, documento, data_criacao)
-        
-        # Dados da assinatura
-        id_assinatura_origem = subscription.get("subscription_code")
-        plataforma = "guru"
-        produto_nome = product.get("name")
-        status = subscription.get("last_status", "active")
-        
-        # Datas
-        data_inicio = subscription.get("started_at")
-        data_proxima_cobranca = subscription.get("next_cycle_at")
-        # CORREÇÃO: Usa data_cancelamento dos dados enriquecidos do backfill
-        data_cancelamento = enriched_values.get("data_cancelamento") or subscription.get("cancelled_at")
-        data_expiracao_acesso = subscription.get("cycle_end_date")
-        ultima_atualizacao = subscription.get("updated_at")
-        
-        # Valores enriquecidos
-        valor_mensal = enriched_values.get("valor_mensal")
-        valor_anual = enriched_values.get("valor_anual")
-        
-        # Se não houver valores enriquecidos, calcula baseado no tipo de plano
-        if valor_mensal is None and valor_anual is None:
-            product_id = product.get("id")
-            if product_id:
-                from utils.helpers import calcular_valores_assinatura_por_tipo
-                # Usa o valor total do produto como base
-                valor_produto = product.get("total_value") or product.get("unit_value")
-                if valor_produto:
-                    valor_mensal, valor_anual = calcular_valores_assinatura_por_tipo(
-                        valor_produto, product_id, "guru"
-                    )
-        
-        # Debug: verifica se os valores estão corretos
-        print(f"[GURU-HIBRIDO] Valores enriquecidos - Mensal: {valor_mensal}, Anual: {valor_anual}")
-        print(f"[GURU-HIBRIDO] Tipo dos valores - Mensal: {type(valor_mensal)}, Anual: {type(valor_anual)}")
-        
-        # Nome da oferta
-        # CORREÇÃO: Usa nome_oferta dos dados enriquecidos do backfill
-        nome_oferta = enriched_values.get("nome_oferta") or product.get("offer", {}).get("name")
-        
-        print(f"[GURU-HIBRIDO] Processando assinatura {id_assinatura_origem}")
-        print(f"[GURU-HIBRIDO] Cliente: {nome} ({email})")
-        print(f"[GURU-HIBRIDO] Produto: {produto_nome}")
-        print(f"[GURU-HIBRIDO] Status: {status}")
-        print(f"[GURU-HIBRIDO] Valores - Mensal: R$ {valor_mensal}, Anual: R$ {valor_anual}")
-        print(f"[GURU-HIBRIDO] Nome Oferta: {nome_oferta}")
-        
-        # Cria ou atualiza assinatura
-        assinatura = get_or_create_assinatura(
-            session,
-            id_assinatura_origem=id_assinatura_origem,
-            plataforma=plataforma,
-            cliente_id=cliente.id,
-            produto_nome=produto_nome,
-            nome_oferta=nome_oferta,
-            status=status,
-            data_inicio=data_inicio,
-            data_proxima_cobranca=data_proxima_cobranca,
-            data_cancelamento=data_cancelamento,
-            data_expiracao_acesso=data_expiracao_acesso,
-            valor_mensal=valor_mensal,
-            valor_anual=valor_anual,
-            ultima_atualizacao=ultima_atualizacao
-        )
-        
-        return {"status": "processado_guru_assinatura_hibrido", "assinatura_id": assinatura.id}
-        
+        with unit_of_work(session) as uow:
+            # Extrai dados básicos
+            subscription = payload.get("subscription", {})
+            contact = payload.get("contact", {})
+            product = payload.get("product", {})
+            enriched_values = payload.get("enriched_values", {})
+            
+            # Dados do cliente
+            nome = contact.get("name")
+            email = contact.get("email")
+            documento = contact.get("doc")
+            
+            # Corrigido: busca data_criacao em campos que realmente existem
+            data_criacao = (
+                subscription.get("created_at") or 
+                subscription.get("started_at") or
+                contact.get("created_at") or 
+                datetime.now()
+            )
+            
+            # Garante que data_criacao seja sempre válida
+            if not data_criacao:
+                data_criacao = datetime.now()
+                log.warning("⚠️ data_criacao não encontrada, usando data atual: %s", data_criacao)
+            
+            log.debug("📅 Data de criação do cliente: %s", data_criacao)
+            
+            if not email:
+                return {"status": "erro", "motivo": "Assinante sem email"}
+            
+            # Cria ou busca cliente
+            cliente_id = get_or_create_cliente(uow, nome, email, documento, data_criacao)
+            
+            # Dados da assinatura
+            id_assinatura_origem = subscription.get("subscription_code")
+            plataforma = "guru"
+            produto_nome = product.get("name")
+            status = subscription.get("last_status", "active")
+            
+            # Datas
+            data_inicio = subscription.get("started_at")
+            data_proxima_cobranca = subscription.get("next_cycle_at")
+            # CORREÇÃO: Usa data_cancelamento dos dados enriquecidos do backfill
+            data_cancelamento = enriched_values.get("data_cancelamento") or subscription.get("cancelled_at")
+            data_expiracao_acesso = subscription.get("cycle_end_date")
+            ultima_atualizacao = subscription.get("updated_at")
+            
+            # Valores enriquecidos
+            valor_mensal = enriched_values.get("valor_mensal")
+            valor_anual = enriched_values.get("valor_anual")
+            
+            # Se não houver valores enriquecidos, calcula baseado no tipo de plano
+            if valor_mensal is None and valor_anual is None:
+                product_id = product.get("id")
+                if product_id:
+                    # Usa o valor total do produto como base
+                    valor_produto = product.get("total_value") or product.get("unit_value")
+                    if valor_produto:
+                        valor_mensal, valor_anual = calcular_valores_assinatura_por_tipo(
+                            valor_produto, product_id, "guru"
+                        )
+            
+            # Debug: verifica se os valores estão corretos
+            log.debug("[GURU-HIBRIDO] Valores enriquecidos - Mensal: %s, Anual: %s", valor_mensal, valor_anual)
+            log.debug("[GURU-HIBRIDO] Tipo dos valores - Mensal: %s, Anual: %s", type(valor_mensal), type(valor_anual))
+            
+            # Nome da oferta
+            # CORREÇÃO: Usa nome_oferta dos dados enriquecidos do backfill
+            nome_oferta = enriched_values.get("nome_oferta") or product.get("offer", {}).get("name")
+            
+            ids = catalogo.registrar(uow, "guru", product.get("id"), produto_nome, nome_oferta, nome_oferta)
+
+            log.debug("[GURU-HIBRIDO] Processando assinatura %s", id_assinatura_origem)
+            log.debug("[GURU-HIBRIDO] Cliente: %s (%s)", nome, email)
+            log.debug("[GURU-HIBRIDO] Produto: %s", produto_nome)
+            log.debug("[GURU-HIBRIDO] Status: %s", status)
+            log.debug("[GURU-HIBRIDO] Valores - Mensal: R$ %s, Anual: R$ %s", valor_mensal, valor_anual)
+            log.debug("[GURU-HIBRIDO] Nome Oferta: %s", nome_oferta)
+            
+            # Cria ou atualiza assinatura
+            assinatura_id = get_or_create_assinatura(
+                uow,
+                id_assinatura_origem=id_assinatura_origem,
+                plataforma=plataforma,
+                cliente_id=cliente_id,
+                produto_nome=produto_nome,
+                nome_oferta=nome_oferta,
+                status=status,
+                data_inicio=data_inicio,
+                data_proxima_cobranca=data_proxima_cobranca,
+                data_cancelamento=data_cancelamento,
+                data_expiracao_acesso=data_expiracao_acesso,
+                valor_mensal=valor_mensal,
+                valor_anual=valor_anual,
+                ultima_atualizacao=ultima_atualizacao,
+                **ids
+            )
+            
+            return {"status": "processado_guru_assinatura_hibrido", "assinatura_id": assinatura_id}
+            
     except Exception as e:
-        print("[GURU-HIBRIDO] Erro no processamento de assinatura:", e)
+        if session is not None:
+            raise
+        log.error("[GURU-HIBRIDO] Erro no processamento de assinatura: %s", e)
         import traceback
         traceback.print_exc()
         return {"status": "erro", "motivo": str(e)}
-    finally:
-        session.close()
 
 def calcular_valor_mensal_ticto(payload):
     """
@@ -543,15 +507,15 @@ def calcular_valor_mensal_ticto(payload):
     
     if tipo_plano == "anual":
         valor_mensal = valor_total / 12
-        print(f"[TICTO] Plano anual detectado (ID: {product_id}, Offer: {offer_code}), valor total: R$ {valor_total}, valor mensal: R$ {valor_mensal:.2f}")
+        log.debug("[TICTO] Plano anual detectado (ID: %s, Offer: %s), valor total: R$ %s, valor mensal: R$ %.2f", product_id, offer_code, valor_total, valor_mensal)
         return valor_mensal
     elif tipo_plano == "mensal":
         valor_mensal = valor_total
-        print(f"[TICTO] Plano mensal detectado (ID: {product_id}, Offer: {offer_code}), valor mensal: R$ {valor_mensal}")
+        log.debug("[TICTO] Plano mensal detectado (ID: %s, Offer: %s), valor mensal: R$ %s", product_id, offer_code, valor_mensal)
         return valor_mensal
     else:
         # Fallback: assume mensal se não conseguir identificar
-        print(f"[TICTO] Plano não identificado (ID: {product_id}, Offer: {offer_code}), usando valor total como mensal: R$ {valor_total}")
+        log.debug("[TICTO] Plano não identificado (ID: %s, Offer: %s), usando valor total como mensal: R$ %s", product_id, offer_code, valor_total)
         return valor_total
 
 def calcular_valores_assinatura_ticto(payload):
@@ -563,13 +527,12 @@ def calcular_valores_assinatura_ticto(payload):
     product_id = payload.get("item", {}).get("product_id")
     offer_code = payload.get("item", {}).get("offer_code")
     
-    from utils.helpers import calcular_valores_assinatura_por_tipo
     return calcular_valores_assinatura_por_tipo(valor_total, product_id, "ticto")
 
-def calcular_data_expiracao_ticto(payload):
-    data_confirmacao = converter_data(payload["order"].get("order_date"))
-    product_id = payload.get("item", {}).get("product_id")
-    offer_code = payload.get("item", {}).get("offer_code")
+def calcular_data_expiracao_ticto(evento: EventoTicto):
+    data_confirmacao = evento.order.order_date
+    product_id = evento.item.product_id
+    offer_code = evento.item.offer_code
     tipo_plano  = identificar_tipo_plano_ticto(product_id, offer_code)
     tipo_produto = identificar_tipo_produto_ticto(offer_code)
 
@@ -584,456 +547,644 @@ def calcular_data_expiracao_ticto(payload):
     if data_confirmacao:
         if tipo_plano == "anual":
             dias = 365
-            print(f"[TICTO] Plano anual detectado (ID: {product_id}, Offer: {offer_code}), order_date, usando {dias} dias")
+            log.debug("[TICTO] Plano anual detectado (ID: %s, Offer: %s), order_date, usando %s dias", product_id, offer_code, dias)
         elif tipo_plano == "mensal":
             dias = 30
-            print(f"[TICTO] Plano mensal detectado (ID: {product_id}, Offer: {offer_code}), order_date, usando {dias} dias")
+            log.debug("[TICTO] Plano mensal detectado (ID: %s, Offer: %s), order_date, usando %s dias", product_id, offer_code, dias)
         else:
-            dias = payload.get("item", {}).get("days_of_access")
+            dias = evento.item.days_of_access
             if dias is None:
                 dias = 30
-            print(f"[TICTO] Plano não identificado (ID: {product_id}, Offer: {offer_code}), order_date, usando {dias} dias")
+            log.debug("[TICTO] Plano não identificado (ID: %s, Offer: %s), order_date, usando %s dias", product_id, offer_code, dias)
         return data_confirmacao + timedelta(days=dias)
     # Fallback: data atual + 30 dias
     return datetime.now() + timedelta(days=30)
 
-def atualizar_assinatura_chargeback_refund(payload, status_evento):
-    session = get_session()
+def atualizar_assinatura_chargeback_refund(evento: EventoTicto, status_evento, session=None):
+    if evento.assinatura is None or not evento.assinatura.id:
+        log.info("[DB] Evento %s sem assinatura para chargeback/refund", status_evento)
+        return False
     try:
-        assinatura_id = str(payload.get("subscriptions", [{}])[0].get("id"))
-        assinatura = session.query(Assinatura).filter_by(id_assinatura_origem=assinatura_id).first()
-        if assinatura:
-            assinatura.status = status_evento
+        with unit_of_work(session) as uow:
+            assinatura_id = evento.assinatura.id
+            if uow.info.get(CHAVE_ASSINATURAS_SOMENTE_LEITURA):
+                log.debug("[DB] Assinatura %s mantida (somente leitura)", assinatura_id)
+                return False
             # Ajusta a data de expiração para a data do evento
-            data_evento = payload.get("status_date") or payload.get("order", {}).get("order_date")
-            assinatura.data_expiracao_acesso = converter_data(data_evento)
-            session.commit()
-            print(f"[DB] Assinatura {assinatura_id} atualizada para {status_evento} e expirada em {assinatura.data_expiracao_acesso}")
-            return True
-        else:
-            print(f"[DB] Assinatura {assinatura_id} não encontrada para chargeback/refund")
-            return False
+            data_evento = evento.data_evento
+            atualizada = uow.execute(
+                update(Assinatura)
+                .where(Assinatura.id_assinatura_origem == assinatura_id)
+                .values(status=status_evento, data_expiracao_acesso=data_evento)
+                .returning(Assinatura.id)
+            ).scalar()
+            if atualizada:
+                log.info("[DB] Assinatura %s atualizada para %s e expirada em %s", assinatura_id, status_evento, data_evento)
+                return True
+            else:
+                log.info("[DB] Assinatura %s não encontrada para chargeback/refund", assinatura_id)
+                return False
     except Exception as e:
-        print("[TICTO] Erro ao atualizar assinatura para chargeback/refund:", e)
+        if session is not None:
+            raise
+        log.error("[TICTO] Erro ao atualizar assinatura para chargeback/refund: %s", e)
         return False
-    finally:
-        session.close()
 
-def processar_ticto(payload: dict) -> dict:
-    if not validar_payload_ticto(payload):
-        return {"status": "erro", "motivo": "Payload inválido"}
-    print("[TICTO] Payload recebido:", payload)
+def processar_ticto(payload: dict, session=None, evento=None) -> dict:
+    if evento is None:
+        evento = obter_evento("ticto", payload)
+        if evento is None:
+            return {"status": "erro", "motivo": "Payload inválido"}
+    log_payload(log, "[TICTO] Payload recebido", payload)
     
-    status = payload.get("status", "")
+    status = evento.status
     
-    if status in ["chargeback", "refunded"]:
-        atualizar_assinatura_chargeback_refund(payload, status)
-        return processar_transacao_ticto(payload)
-        
     # Define status de transações e assinaturas da Ticto
     status_transacoes = ["authorized", "refused", "waiting_payment", "pix_created", "pix_expired", 
                         "bank_slip_created", "bank_slip_delayed", "refunded", "chargeback", "claimed", "abandoned_cart"]
     status_assinaturas = ["authorized", "subscription_canceled", "subscription_delayed", "card_exchanged", "uncanceled"]
     
-    # Tratamento específico para eventos especiais
-    if status == "abandoned_cart":
-        return processar_carrinho_abandonado_ticto(payload)
-    elif status in ["card_exchanged", "claimed"]:
-        return processar_evento_especial_ticto(payload)
-    elif status in ["pix_created", "pix_expired", "bank_slip_created", "bank_slip_delayed"]:
-        return processar_evento_pagamento_ticto(payload)
-    
-    if status == "authorized":
-        # Só cria assinatura se for produto de assinatura (mensal/anual)
-        product_id = payload.get("item", {}).get("product_id")
-        offer_code = payload.get("item", {}).get("offer_code")
-        tipo_plano = identificar_tipo_plano_ticto(product_id, offer_code)
-        if tipo_plano in ("anual", "mensal"):
-            resultado_assinatura = processar_assinatura_ticto(payload)
-        else:
-            resultado_assinatura = {"status": "ignorado", "motivo": "Produto não é assinatura"}
-        resultado_transacao = processar_transacao_ticto(payload)
-        return {
-            "assinatura": resultado_assinatura,
-            "transacao": resultado_transacao
-        }
-
-    elif status in status_transacoes:
-        return processar_transacao_ticto(payload)
-    elif status in status_assinaturas:
-        return processar_assinatura_ticto(payload)
-    else:
-        return {"status": "erro", "motivo": f"Status não reconhecido: {status}"}
+    # Todo o evento (cliente, assinatura e transação) é gravado em uma única transação
+    try:
+        with unit_of_work(session) as uow:
+            if status in ["chargeback", "refunded"]:
+                atualizar_assinatura_chargeback_refund(evento, status, session=uow)
+                return processar_transacao_ticto(payload, session=uow, evento=evento)
+            
+            # Tratamento específico para eventos especiais
+            if status == "abandoned_cart":
+                return processar_carrinho_abandonado_ticto(payload, session=uow, evento=evento)
+            elif status in ["card_exchanged", "claimed"]:
+                return processar_evento_especial_ticto(payload, session=uow, evento=evento)
+            elif status in ["pix_created", "pix_expired", "bank_slip_created", "bank_slip_delayed"]:
+                return processar_evento_pagamento_ticto(payload, session=uow, evento=evento)
+            
+            if status == "authorized":
+                # Só cria assinatura se for produto de assinatura (mensal/anual)
+                tipo_plano = identificar_tipo_plano_ticto(evento.item.product_id, evento.item.offer_code)
+                if tipo_plano in ("anual", "mensal"):
+                    resultado_assinatura = processar_assinatura_ticto(payload, session=uow, evento=evento)
+                else:
+                    resultado_assinatura = {"status": "ignorado", "motivo": "Produto não é assinatura"}
+                resultado_transacao = processar_transacao_ticto(payload, session=uow, evento=evento)
+                return {
+                    "assinatura": resultado_assinatura,
+                    "transacao": resultado_transacao
+                }
+
+            elif status in status_transacoes:
+                return processar_transacao_ticto(payload, session=uow, evento=evento)
+            elif status in status_assinaturas:
+                return processar_assinatura_ticto(payload, session=uow, evento=evento)
+            else:
+                return {"status": "erro", "motivo": f"Status não reconhecido: {status}"}
+    except Exception as e:
+        if session is not None:
+            raise
+        log.error("[TICTO] Erro no processamento: %s", e)
+        return {"status": "erro", "motivo": str(e)}
     
 
 
-def processar_transacao_ticto(payload: dict) -> dict:
+def processar_transacao_ticto(payload: dict, session=None, evento: EventoTicto = None) -> dict:
     """
     Processa webhooks da Ticto que são apenas transações (não criam/atualizam assinaturas).
     """
-    print("[TICTO] Processando transação")
-    transacao_map = mapear_transacao_ticto(payload)
-    print("[TICTO] Transação mapeada:", transacao_map)
-    session = get_session()
+    if evento is None:
+        evento = obter_evento("ticto", payload)
+        if not isinstance(evento, EventoTicto):
+            return {"status": "erro", "motivo": "Payload inválido"}
+    log.debug("[TICTO] Processando transação")
+    transacao_map = mapear_transacao_ticto(payload, identificar_tipo_produto_ticto(evento.item.offer_code))
+    log_payload(log, "[TICTO] Transação mapeada", transacao_map)
     try:
-        # 1. Cliente
-        cliente = get_or_create_cliente(
-            session,
-            nome=payload["customer"].get("name"),
-            email=payload["customer"].get("email"),
-            documento=payload["customer"].get("cpf") or payload["customer"].get("cnpj"),
-            data_criacao=payload["order"].get("order_date")
-        )
-
-        # Extrai valores bruto e líquido
-        valor_bruto = transacao_map.get("valor_bruto")
-        if valor_bruto is None:
-            valor_bruto = payload.get("item", {}).get("amount", 0) / 100  # Converte de centavos para reais
-        valor_liquido = None
-        try:
-            valor_liquido = float(str(payload.get("producer", {}).get("cms", "0")).replace(",", "."))
-        except Exception:
-            valor_liquido = None
-
-        # Classificação de recusa (se aplicável)
-        tipo_recusa = payload.get("tipo_recusa")
-        motivo_recusa = payload.get("motivo_recusa")
-        if transacao_map.get("status") == "refused" and not tipo_recusa:
-            tipo_recusa = tipo_venda_recusada_ticto(payload)
-            print(f"[TICTO] Tipo de recusa classificado: {tipo_recusa}")
-
-        id_transacao = transacao_map["id_transacao_origem"]
-        product_id = payload.get("item", {}).get("product_id")
-        product_name = payload.get("item", {}).get("product_name")
-
-        # Busca por transação com mesmo id_transacao_origem E produto_nome (para order bumps/upsells)
-        transacao = session.query(Transacao).filter_by(id_transacao_origem=id_transacao, produto_nome=product_name).first()
-        if transacao:
-            # Validação de integridade: verifica se dados do webhook são mais recentes
-            webhook_data_transacao = converter_data(payload.get("status_date") or transacao_map["data_evento"])
-            if webhook_data_transacao and transacao.data_transacao and webhook_data_transacao < transacao.data_transacao:
-                print(f"[SYNC] ⚠️ Webhook com data anterior ignorado: {webhook_data_transacao} < {transacao.data_transacao}")
-                return {"status": "ignorado", "motivo": "Webhook com data anterior aos dados existentes"}
-            
-            # Atualiza status e campos relevantes
-            mudou = False
-            if transacao.status != transacao_map["status"]:
-                transacao.status = transacao_map["status"]
-                mudou = True
-            if transacao.valor != transacao_map["valor_total"]:
-                transacao.valor = transacao_map["valor_total"]
-                mudou = True
-            if transacao.valor_bruto != valor_bruto:
-                transacao.valor_bruto = valor_bruto
-                mudou = True
-            if transacao.valor_liquido != valor_liquido:
-                transacao.valor_liquido = valor_liquido
-                mudou = True
-            if transacao.metodo_pagamento != transacao_map["metodo_pagamento"]:
-                transacao.metodo_pagamento = transacao_map["metodo_pagamento"]
-                mudou = True
-            if transacao.data_transacao != converter_data(payload.get("status_date") or transacao_map["data_evento"]):
-                transacao.data_transacao = converter_data(payload.get("status_date") or transacao_map["data_evento"])
-                mudou = True
-            if transacao.tipo_recusa != tipo_recusa:
-                transacao.tipo_recusa = tipo_recusa
-                mudou = True
-            # Atualiza nome_oferta se disponível
-            nome_oferta = transacao_map.get("nome_oferta")
-            if nome_oferta and transacao.nome_oferta != nome_oferta:
-                transacao.nome_oferta = nome_oferta
-                mudou = True
-            # Atualiza o json_completo sempre
-            transacao.json_completo = {**payload, "tipo_recusa": tipo_recusa} if tipo_recusa else payload
-            session.commit()
-            print(f"[DB] Transação já existente, atualizada: {id_transacao} (product_name: {product_name})")
-            print(f"[SYNC] ✅ Webhook atualizou transação do backfill: {id_transacao} - {product_name}")
-            return {"status": "transacao_atualizada", "transacao_id": transacao.id}
-        else:
-            # Cria nova transação
+        with unit_of_work(session) as uow:
+            # 1. Cliente
+            cliente_id = get_or_create_cliente(
+                uow,
+                nome=evento.customer.name,
+                email=evento.customer.email,
+                documento=evento.customer.documento,
+                data_criacao=evento.order.order_date
+            )
+
+            # Extrai valores bruto e líquido
+            valor_bruto = transacao_map.get("valor_bruto")
+            if valor_bruto is None:
+                valor_bruto = evento.item.amount
+            valor_liquido = evento.valor_liquido
+
+            # Classificação de recusa (se aplicável)
+            tipo_recusa = evento.tipo_recusa
+            motivo_recusa = evento.motivo_recusa
+            if evento.status == "refused" and not tipo_recusa:
+                tipo_recusa = tipo_venda_recusada_ticto(payload)
+                log.debug("[TICTO] Tipo de recusa classificado: %s", tipo_recusa)
+
+            id_transacao = transacao_map["id_transacao_origem"]
+            product_name = evento.item.product_name
+            data_transacao = evento.data_evento
+
+            # Cria a transação ou atualiza a existente com mesmo id_transacao_origem
+            # E produto_nome (para order bumps/upsells)
             transacao_dict = {
                 "id_transacao_origem": id_transacao,
                 "assinatura_id": None,  # Transações não criam assinaturas
-                "cliente_id": cliente.id,
+                "cliente_id": cliente_id,
                 "plataforma": "ticto",
-                "status": transacao_map["status"],
+                "status": evento.status,
                 "valor": transacao_map["valor_total"],
                 "valor_bruto": valor_bruto,
                 "valor_liquido": valor_liquido,
-                "metodo_pagamento": transacao_map["metodo_pagamento"],
-                "data_transacao": converter_data(payload.get("status_date") or transacao_map["data_evento"]),
+                "metodo_pagamento": evento.payment_method,
+                "data_transacao": data_transacao,
                 "motivo_recusa": motivo_recusa,
                 "json_completo": {**payload, "tipo_recusa": tipo_recusa} if tipo_recusa else payload,
                 "tipo_recusa": tipo_recusa,
                 "produto_nome": product_name,  # Usar o nome do produto
-                "nome_oferta": transacao_map.get("nome_oferta")  # Adicionar nome da oferta
+                "nome_oferta": evento.item.offer_name,  # Adicionar nome da oferta
+                "tipo_plano": tipo_plano_transacao("ticto", evento.item.product_id, evento.item.offer_code),
+                **ids_catalogo_ticto(uow, evento)
             }
-            sucesso = salvar_transacao(transacao_dict)
-            if sucesso:
+
+            # Validação de integridade: só atualiza se os dados do webhook forem mais recentes
+            transacao_id, acao = upsert_transacao(uow, transacao_dict, perfil="ticto")
+            if acao == "adiada":
+                return dict(RESULTADO_EM_LOTE)
+            if acao == "criada":
                 return {"status": "transacao_criada", "transacao": transacao_dict}
-            else:
-                return {"status": "erro", "motivo": "Falha ao salvar transacao"}
+            if acao == "atualizada":
+                log.info("[DB] Transação já existente, atualizada: %s (product_name: %s)", id_transacao, product_name)
+                log.info("[SYNC] ✅ Webhook atualizou transação do backfill: %s - %s", id_transacao, product_name)
+                return {"status": "transacao_atualizada", "transacao_id": transacao_id}
+            log.warning("[SYNC] ⚠️ Webhook com data anterior ignorado: %s (%s)", id_transacao, data_transacao)
+            return {"status": "ignorado", "motivo": "Webhook com data anterior aos dados existentes"}
     except Exception as e:
-        print("[TICTO] Erro no processamento de transacao:", e)
+        if session is not None:
+            raise
+        log.error("[TICTO] Erro no processamento de transacao: %s", e)
         return {"status": "erro", "motivo": str(e)}
-    finally:
-        session.close()
 
-def processar_assinatura_ticto(payload: dict) -> dict:
+def processar_assinatura_ticto(payload: dict, session=None, evento: EventoTicto = None) -> dict:
     """
     Processa webhooks da Ticto que criam/atualizam assinaturas.
     """
-    print("[TICTO] Processando assinatura")
-    transacao_map = mapear_transacao_ticto(payload)
-    print("[TICTO] Transação mapeada:", transacao_map)
-    session = get_session()
+    if evento is None:
+        evento = obter_evento("ticto", payload)
+        if not isinstance(evento, EventoTicto):
+            return {"status": "erro", "motivo": "Payload inválido"}
+    log.debug("[TICTO] Processando assinatura")
     try:
-        # 1. Cliente
-        cliente = get_or_create_cliente(
-            session,
-            nome=payload["customer"].get("name"),
-            email=payload["customer"].get("email"),
-            documento=payload["customer"].get("cpf") or payload["customer"].get("cnpj"),
-            data_criacao=payload["order"].get("order_date")
-        )
-
-        # 2. Identifica tipo de plano e calcula valores
-        product_id = payload.get("item", {}).get("product_id")
-        offer_code = payload.get("item", {}).get("offer_code")
-        valor_total = payload["item"].get("amount", 0) / 100  # Converte de centavos para reais
-        
-        # Usa a nova função para calcular valores corretamente
-        from utils.helpers import calcular_valores_assinatura_por_tipo
-        valor_mensal, valor_anual = calcular_valores_assinatura_por_tipo(
-            valor_total, product_id, "ticto"
-        )
-
-        # 3. Calcula data de expiração
-        data_expiracao = calcular_data_expiracao_ticto(payload)
-        print(f"[TICTO] Data de expiração calculada: {data_expiracao}")
-
-        # 4. Determina status da assinatura baseado no status do webhook
-        status_assinatura = payload.get("status")
-        if status_assinatura == "authorized":
-            status_assinatura = "active"  # Converte para status padrão do sistema
-        
-        # 5. Assinatura
-        nome_oferta = payload.get("item", {}).get("offer_name")
-        assinatura = get_or_create_assinatura(
-            session,
-            id_assinatura_origem=str(payload["subscriptions"][0].get("id")) if payload.get("subscriptions") else None,
-            plataforma="ticto",
-            cliente_id=cliente.id,
-            produto_nome=payload.get("item", {}).get("product_name"),
-            nome_oferta=nome_oferta,
-            status=status_assinatura,
-            data_inicio=payload.get("status_date") or payload["order"].get("order_date"),
-            data_proxima_cobranca=payload["subscriptions"][0].get("next_charge") if payload.get("subscriptions") else None,
-            data_cancelamento=payload["subscriptions"][0].get("canceled_at") if payload.get("subscriptions") else None,
-            data_expiracao_acesso=data_expiracao,
-            valor_mensal=valor_mensal,
-            valor_anual=valor_anual,
-            ultima_atualizacao=payload.get("status_date")
-        )
-        
-        # 6. Cria também a transação associada à assinatura
-        transacao_dict = {
-            "id_transacao_origem": payload.get("order", {}).get("transaction_hash") or payload.get("order", {}).get("hash"),
-            "assinatura_id": assinatura.id,  # Associa à assinatura criada
-            "cliente_id": cliente.id,
-            "plataforma": "ticto",
-            "status": payload.get("status"),
-            "valor": valor_total,
-            "valor_bruto": valor_total,
-            "valor_liquido": float(str(payload.get("producer", {}).get("cms", "0")).replace(",", ".")) if payload.get("producer", {}).get("cms") else None,
-            "metodo_pagamento": payload.get("payment_method"),
-            "data_transacao": converter_data(payload.get("status_date") or payload["order"].get("order_date")),
-            "motivo_recusa": None,
-            "json_completo": payload,
-            "tipo_recusa": None,
-            "produto_nome": payload.get("item", {}).get("product_name")
-        }
-        sucesso = salvar_transacao(transacao_dict)
-        
-        return {"status": "assinatura_processada", "assinatura_id": assinatura.id, "transacao_criada": sucesso}
+        with unit_of_work(session) as uow:
+            # 1. Cliente
+            cliente_id = get_or_create_cliente(
+                uow,
+                nome=evento.customer.name,
+                email=evento.customer.email,
+                documento=evento.customer.documento,
+                data_criacao=evento.order.order_date
+            )
+
+            # 2. Identifica tipo de plano e calcula valores
+            product_id = evento.item.product_id
+            valor_total = evento.item.amount or 0.0  # Já convertido de centavos para reais
+            
+            # Usa a nova função para calcular valores corretamente
+            valor_mensal, valor_anual = calcular_valores_assinatura_por_tipo(
+                valor_total, product_id, "ticto"
+            )
+
+            # 3. Calcula data de expiração
+            data_expiracao = calcular_data_expiracao_ticto(evento)
+            log.debug("[TICTO] Data de expiração calculada: %s", data_expiracao)
+
+            # 4. Determina status da assinatura baseado no status do webhook
+            status_assinatura = evento.status
+            if status_assinatura == "authorized":
+                status_assinatura = "active"  # Converte para status padrão do sistema
+            
+            # 5. Assinatura
+            assinatura = evento.assinatura
+            assinatura_id = get_or_create_assinatura(
+                uow,
+                id_assinatura_origem=assinatura.id if assinatura else None,
+                plataforma="ticto",
+                cliente_id=cliente_id,
+                produto_nome=evento.item.product_name,
+                nome_oferta=evento.item.offer_name,
+                status=status_assinatura,
+                data_inicio=evento.data_evento,
+                data_proxima_cobranca=assinatura.next_charge if assinatura else None,
+                data_cancelamento=assinatura.canceled_at if assinatura else None,
+                data_expiracao_acesso=data_expiracao,
+                valor_mensal=valor_mensal,
+                valor_anual=valor_anual,
+                ultima_atualizacao=evento.status_date,
+                **ids_catalogo_ticto(uow, evento)
+            )
+            
+            # 6. Cria também a transação associada à assinatura
+            transacao_dict = {
+                "id_transacao_origem": evento.order.transaction_hash or evento.order.hash,
+                "assinatura_id": assinatura_id,  # Associa à assinatura criada
+                "cliente_id": cliente_id,
+                "plataforma": "ticto",
+                "status": evento.status,
+                "valor": valor_total,
+                "valor_bruto": valor_total,
+                "valor_liquido": evento.valor_liquido,
+                "metodo_pagamento": evento.payment_method,
+                "data_transacao": evento.data_evento,
+                "motivo_recusa": None,
+                "json_completo": payload,
+                "tipo_recusa": None,
+                "produto_nome": evento.item.product_name,
+                "tipo_plano": tipo_plano_transacao("ticto", evento.item.product_id, evento.item.offer_code),
+                **ids_catalogo_ticto(uow, evento)
+            }
+            sucesso = salvar_transacao(transacao_dict, session=uow)
+            
+            return {"status": "assinatura_processada", "assinatura_id": assinatura_id, "transacao_criada": sucesso}
     except Exception as e:
-        print("[TICTO] Erro no processamento de assinatura:", e)
+        if session is not None:
+            raise
+        log.error("[TICTO] Erro no processamento de assinatura: %s", e)
         return {"status": "erro", "motivo": str(e)}
-    finally:
-        session.close()
 
-def processar_carrinho_abandonado_ticto(payload: dict) -> dict:
+def processar_carrinho_abandonado_ticto(payload: dict, session=None, evento: CarrinhoAbandonadoTicto = None) -> dict:
     """
     Processa webhook de carrinho abandonado da Ticto.
     """
-    print("[TICTO] Processando carrinho abandonado")
-    session = get_session()
+    if evento is None:
+        evento = obter_evento("ticto", payload)
+        if not isinstance(evento, CarrinhoAbandonadoTicto):
+            return {"status": "erro", "motivo": "Payload inválido"}
+    log.debug("[TICTO] Processando carrinho abandonado")
     try:
-        # Cria cliente se não existir
-        cliente = get_or_create_cliente(
-            session,
-            nome=payload.get("name"),
-            email=payload.get("email"),
-            documento=payload.get("document"),
-            data_criacao=payload.get("created_at")
-        )
-        
-        # Registra apenas a transação (não cria assinatura)
-        transacao_dict = {
-            "id_transacao_origem": f"abandoned_{payload.get('email', 'unknown')}_{payload.get('created_at', 'unknown')}",
-            "assinatura_id": None,
-            "cliente_id": cliente.id,
-            "plataforma": "ticto",
-            "status": "abandoned_cart",
-            "valor": 0,
-            "valor_bruto": 0,
-            "valor_liquido": 0,
-            "metodo_pagamento": None,
-            "data_transacao": converter_data(payload.get("created_at")),
-            "motivo_recusa": "Carrinho abandonado",
-            "json_completo": payload
-        }
-        sucesso = salvar_transacao(transacao_dict)
-        if sucesso:
-            return {"status": "carrinho_abandonado_processado", "transacao": transacao_dict}
-        else:
-            return {"status": "erro", "motivo": "Falha ao salvar carrinho abandonado"}
+        with unit_of_work(session) as uow:
+            # Cria cliente se não existir
+            cliente_id = get_or_create_cliente(
+                uow,
+                nome=evento.name,
+                email=evento.email,
+                documento=evento.document,
+                data_criacao=evento.created_at
+            )
+            
+            # Registra apenas a transação (não cria assinatura)
+            transacao_dict = {
+                # Id montado com o texto original de created_at (estável entre reentregas)
+                "id_transacao_origem": f"abandoned_{payload.get('email', 'unknown')}_{payload.get('created_at', 'unknown')}",
+                "assinatura_id": None,
+                "cliente_id": cliente_id,
+                "plataforma": "ticto",
+                "status": "abandoned_cart",
+                "valor": 0,
+                "valor_bruto": 0,
+                "valor_liquido": 0,
+                "metodo_pagamento": None,
+                "data_transacao": evento.created_at,
+                "motivo_recusa": "Carrinho abandonado",
+                "json_completo": payload
+            }
+            sucesso = salvar_transacao(transacao_dict, session=uow)
+            if sucesso:
+                return {"status": "carrinho_abandonado_processado", "transacao": transacao_dict}
+            else:
+                return {"status": "erro", "motivo": "Falha ao salvar carrinho abandonado"}
     except Exception as e:
-        print("[TICTO] Erro no processamento de carrinho abandonado:", e)
+        if session is not None:
+            raise
+        log.error("[TICTO] Erro no processamento de carrinho abandonado: %s", e)
         return {"status": "erro", "motivo": str(e)}
-    finally:
-        session.close()
 
-def processar_evento_especial_ticto(payload: dict) -> dict:
+def processar_evento_especial_ticto(payload: dict, session=None, evento: EventoEspecialTicto = None) -> dict:
     """
     Processa eventos especiais da Ticto (card_exchanged, claimed).
     """
-    print(f"[TICTO] Processando evento especial: {payload.get('status')}")
-    if payload.get("status") == "card_exchanged":
-        print("[TICTO] Evento 'card_exchanged' recebido e ignorado para transações.")
+    if evento is None:
+        evento = obter_evento("ticto", payload)
+        if not isinstance(evento, EventoEspecialTicto):
+            return {"status": "erro", "motivo": "Payload inválido"}
+    log.debug("[TICTO] Processando evento especial: %s", evento.status)
+    if evento.status == "card_exchanged":
+        log.debug("[TICTO] Evento 'card_exchanged' recebido e ignorado para transações.")
         return {"status": "ignorado", "motivo": "Evento de cartão atualizado não impacta transações"}
-    session = get_session()
     try:
-        email = payload.get("customer", {}).get("email")
-        if not email:
-            return {"status": "erro", "motivo": "Email do cliente não encontrado"}
-        cliente = session.query(Cliente).filter_by(email=email).first()
-        if not cliente:
-            return {"status": "erro", "motivo": "Cliente não encontrado"}
-
-        valor = payload.get("item", {}).get("amount", 0)  # Webhook real - valor já em reais
-        valor_bruto = valor
-        try:
-            valor_liquido = float(str(payload.get("producer", {}).get("cms", "0")).replace(",", "."))
-        except Exception:
-            valor_liquido = None
-        product_name = payload.get("item", {}).get("product_name")
-        transaction_hash = payload.get("transaction", {}).get("hash") or payload.get("order", {}).get("transaction_hash")
-
-        # Atualiza transação existente se status for 'claimed'
-        if payload.get("status") == "claimed":
-            transacao = session.query(Transacao).filter_by(id_transacao_origem=transaction_hash, produto_nome=product_name).first()
-            if transacao:
-                transacao.status = payload.get("status")
-                transacao.valor = valor
-                transacao.valor_bruto = valor_bruto
-                transacao.valor_liquido = valor_liquido
-                transacao.metodo_pagamento = payload.get("payment_method")
-                transacao.data_transacao = converter_data(payload.get("status_date") or payload.get("order", {}).get("order_date"))
-                transacao.json_completo = payload
-                session.commit()
-                print(f"[DB] Transação já existente, atualizada: {transaction_hash} (product_name: {product_name})")
-                print(f"[SYNC] ✅ Webhook atualizou transação do backfill: {transaction_hash} - {product_name}")
-                return {"status": "transacao_atualizada", "transacao_id": transacao.id}
-        # Se não encontrou ou não for 'claimed', cria nova transação
-        nome_oferta = payload.get("item", {}).get("offer_name")
-        transacao_dict = {
-            "id_transacao_origem": transaction_hash,
-            "assinatura_id": None,
-            "cliente_id": cliente.id,
-            "plataforma": "ticto",
-            "status": payload.get("status"),
-            "valor": valor,
-            "valor_bruto": valor_bruto,
-            "valor_liquido": valor_liquido,
-            "metodo_pagamento": payload.get("payment_method"),
-            "data_transacao": converter_data(payload.get("status_date") or payload.get("order", {}).get("order_date")),
-            "motivo_recusa": None,
-            "json_completo": payload,
-            "produto_nome": product_name,
-            "nome_oferta": nome_oferta
-        }
-        sucesso = salvar_transacao(transacao_dict)
-        if sucesso:
+        with unit_of_work(session) as uow:
+            email = evento.customer.email
+            if not email:
+                return {"status": "erro", "motivo": "Email do cliente não encontrado"}
+            cliente_id = buscar_cliente_id(email)
+            if cliente_id is None:
+                cliente_id = uow.execute(select(Cliente.id).where(Cliente.email == email)).scalar()
+                lembrar_cliente(uow, email, cliente_id)
+            if not cliente_id:
+                return {"status": "erro", "motivo": "Cliente não encontrado"}
+
+            valor = payload.get("item", {}).get("amount", 0)  # Webhook real - valor já em reais
+            valor_bruto = valor
+            valor_liquido = evento.valor_liquido
+            product_name = evento.item.product_name
+            transaction_hash = evento.hash_transacao
+
+            nome_oferta = evento.item.offer_name
+            transacao_dict = {
+                "id_transacao_origem": transaction_hash,
+                "assinatura_id": None,
+                "cliente_id": cliente_id,
+                "plataforma": "ticto",
+                "status": evento.status,
+                "valor": valor,
+                "valor_bruto": valor_bruto,
+                "valor_liquido": valor_liquido,
+                "metodo_pagamento": evento.payment_method,
+                "data_transacao": evento.data_evento,
+                "motivo_recusa": None,
+                "json_completo": payload,
+                "produto_nome": product_name,
+                "nome_oferta": nome_oferta,
+                "tipo_plano": tipo_plano_transacao("ticto", evento.item.product_id, evento.item.offer_code),
+                **ids_catalogo_ticto(uow, evento)
+            }
+
+            # 'claimed' atualiza a transação existente; se não existir, cria
+            transacao_id, acao = upsert_transacao(uow, transacao_dict, perfil="especial_ticto")
+            if acao == "adiada":
+                return dict(RESULTADO_EM_LOTE)
+            if acao == "atualizada":
+                log.info("[DB] Transação já existente, atualizada: %s (product_name: %s)", transaction_hash, product_name)
+                log.info("[SYNC] ✅ Webhook atualizou transação do backfill: %s - %s", transaction_hash, product_name)
+                return {"status": "transacao_atualizada", "transacao_id": transacao_id}
             return {"status": "evento_especial_processado", "transacao": transacao_dict}
-        else:
-            return {"status": "erro", "motivo": "Falha ao salvar evento especial"}
     except Exception as e:
-        print("[TICTO] Erro no processamento de evento especial:", e)
+        if session is not None:
+            raise
+        log.error("[TICTO] Erro no processamento de evento especial: %s", e)
         return {"status": "erro", "motivo": str(e)}
-    finally:
-        session.close()
 
-def processar_evento_pagamento_ticto(payload: dict) -> dict:
+def processar_evento_pagamento_ticto(payload: dict, session=None, evento: EventoTicto = None) -> dict:
     """
     Processa eventos de pagamento da Ticto (PIX, boleto).
     """
-    print(f"[TICTO] Processando evento de pagamento: {payload.get('status')}")
-    session = get_session()
+    if evento is None:
+        evento = obter_evento("ticto", payload)
+        if not isinstance(evento, EventoTicto):
+            return {"status": "erro", "motivo": "Payload inválido"}
+    log.debug("[TICTO] Processando evento de pagamento: %s", evento.status)
+    transaction_hash = evento.order.transaction_hash
+    if not transaction_hash:
+        return {"status": "erro", "motivo": "Hash da transação não encontrado"}
     try:
-        # Busca transação existente para atualizar
-        transaction_hash = payload.get("order", {}).get("transaction_hash")
-        if not transaction_hash:
-            return {"status": "erro", "motivo": "Hash da transação não encontrado"}
-        product_name = payload.get("item", {}).get("product_name")
-        # Busca transação existente pelo hash e nome do produto
-        transacao = session.query(Transacao).filter_by(id_transacao_origem=transaction_hash, produto_nome=product_name).first()
-        if transacao:
-            # Validação de integridade: verifica se dados do webhook são mais recentes
-            webhook_data_transacao = converter_data(payload.get("status_date") or payload.get("order", {}).get("order_date"))
-            if webhook_data_transacao and transacao.data_transacao and webhook_data_transacao < transacao.data_transacao:
-                print(f"[SYNC] ⚠️ Webhook com data anterior ignorado: {webhook_data_transacao} < {transacao.data_transacao}")
-                return {"status": "ignorado", "motivo": "Webhook com data anterior aos dados existentes"}
-            
-            # Atualiza status da transação existente
-            transacao.status = payload.get("status")
-            transacao.data_transacao = converter_data(payload.get("status_date") or payload.get("order", {}).get("order_date"))
-            session.commit()
-            print(f"[SYNC] ✅ Webhook atualizou transação do backfill: {transaction_hash} - {product_name}")
-            return {"status": "transacao_atualizada", "transacao_id": transacao.id}
-        else:
-            # Cria nova transação se não existir
-            cliente = get_or_create_cliente(
-                session,
-                nome=payload["customer"].get("name"),
-                email=payload["customer"].get("email"),
-                documento=payload["customer"].get("cpf") or payload["customer"].get("cnpj"),
-                data_criacao=payload["order"].get("order_date")
+        with unit_of_work(session) as uow:
+            product_name = evento.item.product_name
+            data_transacao = evento.data_evento
+            cliente_id = get_or_create_cliente(
+                uow,
+                nome=evento.customer.name,
+                email=evento.customer.email,
+                documento=evento.customer.documento,
+                data_criacao=evento.order.order_date
             )
-            nome_oferta = payload.get("item", {}).get("offer_name")
+            nome_oferta = evento.item.offer_name
             transacao_dict = {
                 "id_transacao_origem": transaction_hash,
                 "assinatura_id": None,
-                "cliente_id": cliente.id,
+                "cliente_id": cliente_id,
                 "plataforma": "ticto",
-                "status": payload.get("status"),
-                "valor": payload.get("order", {}).get("paid_amount", 0) / 100,
-                "valor_bruto": payload.get("order", {}).get("paid_amount", 0) / 100,
+                "status": evento.status,
+                "valor": evento.order.paid_amount,
+                "valor_bruto": evento.order.paid_amount,
                 "valor_liquido": None,
-                "metodo_pagamento": payload.get("payment_method"),
-                "data_transacao": converter_data(payload.get("status_date") or payload.get("order", {}).get("order_date")),
+                "metodo_pagamento": evento.payment_method,
+                "data_transacao": data_transacao,
                 "motivo_recusa": None,
                 "json_completo": payload,
                 "produto_nome": product_name,
-                "nome_oferta": nome_oferta
+                "nome_oferta": nome_oferta,
+                "tipo_plano": tipo_plano_transacao("ticto", evento.item.product_id, evento.item.offer_code),
+                **ids_catalogo_ticto(uow, evento)
             }
-            sucesso = salvar_transacao(transacao_dict)
-            if sucesso:
+
+            # Transação existente: atualiza apenas status e data, se o webhook for mais recente
+            transacao_id, acao = upsert_transacao(uow, transacao_dict, perfil="pagamento_ticto")
+            if acao == "adiada":
+                return dict(RESULTADO_EM_LOTE)
+            if acao == "criada":
                 return {"status": "evento_pagamento_processado", "transacao": transacao_dict}
-            else:
-                return {"status": "erro", "motivo": "Falha ao salvar evento de pagamento"}
+            if acao == "atualizada":
+                log.info("[SYNC] ✅ Webhook atualizou transação do backfill: %s - %s", transaction_hash, product_name)
+                return {"status": "transacao_atualizada", "transacao_id": transacao_id}
+            log.warning("[SYNC] ⚠️ Webhook com data anterior ignorado: %s (%s)", transaction_hash, data_transacao)
+            return {"status": "ignorado", "motivo": "Webhook com data anterior aos dados existentes"}
     except Exception as e:
-        print("[TICTO] Erro no processamento de evento de pagamento:", e)
+        if session is not None:
+            raise
+        log.error("[TICTO] Erro no processamento de evento de pagamento: %s", e)
         return {"status": "erro", "motivo": str(e)}
-    finally:
-        session.close() 
\ No newline at end of file
+
+def _rotear_webhook(plataforma: str, payload: dict, session=None, evento=None) -> dict:
+    if plataforma == "guru":
+        if payload.get("webhook_type", "transaction") == "subscription":
+            return processar_guru_assinatura(payload, session=session, evento=evento)
+        return processar_guru_transacao(payload, session=session, evento=evento)
+    return processar_ticto(payload, session=session, evento=evento)
+
+def _resultado_em_lote(adiadas: list, gravadas: list) -> dict:
+    """Resultado de um evento cujas transações foram gravadas em INSERTs multi-linha"""
+    return {
+        "status": "processado_em_lote",
+        "transacoes": [
+            {
+                "id_transacao_origem": valores["id_transacao_origem"],
+                "produto_nome": valores.get("produto_nome"),
+                "transacao_id": transacao_id,
+                "acao": acao,
+            }
+            for (valores, _), (transacao_id, acao) in zip(adiadas, gravadas)
+        ],
+    }
+
+def processar_webhook(plataforma: str, payload: dict, dead_letter: bool = True) -> dict:
+    """
+    Roteia um webhook já autenticado para o handler da plataforma.
+    Usado pelos endpoints (modo inline), pelos workers da inbox e pelo retrier da dead-letter.
+    Reentregas de um evento já processado são respondidas sem tocar nas tabelas principais.
+    Eventos que levantam exceção vão para a dead-letter (exceto com dead_letter=False,
+    usado pelo próprio retrier).
+    Todos os logs do processamento carregam o mesmo evento_id.
+    """
+    with contexto_evento(evento_atual()), medir_webhook(plataforma, tipo_webhook(plataforma, payload)) as medicao:
+        resultado = _processar_webhook(plataforma, payload, dead_letter)
+        medicao["status"] = status_resultado(resultado)
+        return resultado
+
+def falha_retentavel(resultado: dict) -> bool:
+    """Indica se o resultado é um erro por exceção, que deve ser tentado novamente"""
+    return status_resultado(resultado) == "erro" and bool((resultado or {}).get("retentavel"))
+
+def tipo_webhook(plataforma: str, payload: dict) -> str:
+    """Tipo do evento para as métricas: status da Ticto ou webhook_type da Guru (valores conhecidos)"""
+    if not isinstance(payload, dict):
+        return "desconhecido"
+    if plataforma == "guru":
+        payload = payload.get("payload", payload) if isinstance(payload.get("payload"), dict) else payload
+        return "subscription" if payload.get("webhook_type") == "subscription" else "transaction"
+    status = payload.get("status")
+    return status if status in STATUS_TICTO else "desconhecido"
+
+def _processar_webhook(plataforma: str, payload: dict, dead_letter: bool = True) -> dict:
+    if plataforma not in ("guru", "ticto"):
+        return {"status": "erro", "motivo": f"Plataforma não suportada: {plataforma}"}
+    # Extrai payload real se vier aninhado
+    if plataforma == "guru" and "payload" in payload:
+        payload = payload["payload"]
+    # Payload inválido é recusado antes de qualquer consulta ao banco
+    evento = obter_evento(plataforma, payload)
+    if evento is None:
+        return {"status": "erro", "motivo": "Payload inválido"}
+
+    fingerprint = None
+    if ingestion_config.IDEMPOTENCY_ENABLED:
+        fingerprint = calcular_fingerprint(plataforma, payload)
+        resultado_original = buscar_evento_processado(fingerprint)
+        if resultado_original is not None:
+            log.info("[IDEMPOTENCIA] Evento duplicado ignorado (%s): %s", plataforma, fingerprint[:12])
+            return {"status": "duplicado", "resultado_original": resultado_original}
+        limpar_se_necessario()
+    garantir_particoes_se_necessario()
+    consolidar_resumos_se_necessario()
+
+    adiadas = None
+    try:
+        # Cliente, assinatura, transação e fingerprint são gravados na mesma transação
+        with unit_of_work() as uow:
+            # Eventos da mesma entidade não são aplicados em paralelo (nem entre processos)
+            bloquear_raia(uow, raia_do_evento(plataforma, payload))
+            if ingestion_config.BULK_ENABLED:
+                # Transações ficam para o escritor em lote, após o commit de cliente/assinatura
+                uow.info[CHAVE_ADIADAS] = []
+            resultado = _rotear_webhook(plataforma, payload, session=uow, evento=evento)
+            adiadas = uow.info.pop(CHAVE_ADIADAS, None)
+            sucesso = status_resultado(resultado) != "erro"
+            # Eventos com erro não são registrados: a reentrega deve ser processada
+            if sucesso and fingerprint and not adiadas:
+                registrar_evento_processado(uow, fingerprint, plataforma, resultado)
+        if adiadas:
+            registro = (fingerprint, plataforma, resultado) if sucesso and fingerprint else None
+            gravadas = bulk_writer.enviar(adiadas, registro).result(timeout=ingestion_config.EXECUTOR_TIMEOUT)
+            resultado = _resultado_em_lote(adiadas, gravadas)
+    except Exception as e:
+        log.error("[%s] Erro no processamento: %s", plataforma.upper(), e)
+        # Erro por exceção (banco, handler) pode dar certo em nova tentativa; payload inválido não
+        resultado = {"status": "erro", "motivo": str(e), "retentavel": True}
+        if dead_letter and ingestion_config.DLQ_ENABLED:
+            # Se nem a dead-letter puder ser gravada, a exceção sobe: o endpoint
+            # responde 5xx e a plataforma reenvia o evento
+            resultado["dead_letter_id"] = registrar_falha(plataforma, payload, str(e), evento_atual())
+        return resultado
+    if sucesso and fingerprint:
+        lembrar_evento_processado(fingerprint, resultado)
+    return resultado
+
+def processar_lote_webhooks(plataforma: str, payloads: list) -> list:
+    """
+    Processa um lote de webhooks da mesma plataforma em uma única transação.
+    Clientes e assinaturas são gravados evento a evento (cada um em um savepoint);
+    as transações de todos os eventos são gravadas no fim com INSERTs multi-linha.
+    Retorna um resultado por evento, na ordem de `payloads`.
+    """
+    with contexto_evento(evento_atual()):
+        with medir_webhook(plataforma, "lote", contar=False) as medicao:
+            try:
+                resultados = _processar_lote_webhooks(plataforma, payloads)
+            except Exception as e:
+                # Falha no lote como um todo: processa evento a evento (com dead-letter)
+                log.warning("[LOTE] Falha no lote de %s eventos, processando individualmente: %s", len(payloads), e)
+                resultados = [_processar_webhook(plataforma, payload) for payload in payloads]
+            medicao["status"] = "processado"
+        for payload, resultado in zip(payloads, resultados):
+            contar_webhook(plataforma, tipo_webhook(plataforma, payload), status_resultado(resultado))
+        return resultados
+
+def _processar_lote_webhooks(plataforma: str, payloads: list) -> list:
+    if plataforma not in ("guru", "ticto"):
+        return [{"status": "erro", "motivo": f"Plataforma não suportada: {plataforma}"} for _ in payloads]
+    # Extrai payload real se vier aninhado
+    eventos = [
+        payload["payload"] if plataforma == "guru" and "payload" in payload else payload
+        for payload in payloads
+    ]
+    resultados = [None] * len(eventos)
+    # Payloads inválidos são recusados antes de abrir a transação do lote
+    tipados = [obter_evento(plataforma, evento) for evento in eventos]
+    for indice, tipado in enumerate(tipados):
+        if tipado is None:
+            resultados[indice] = {"status": "erro", "motivo": "Payload inválido"}
+
+    fingerprints = [None] * len(eventos)
+    if ingestion_config.IDEMPOTENCY_ENABLED:
+        fingerprints = [calcular_fingerprint(plataforma, evento) for evento in eventos]
+        processados = buscar_eventos_processados(list(set(fingerprints)))
+        vistos = set()
+        for indice, fingerprint in enumerate(fingerprints):
+            if resultados[indice] is not None:
+                continue
+            if fingerprint in processados:
+                resultados[indice] = {"status": "duplicado", "resultado_original": processados[fingerprint]}
+            elif fingerprint in vistos:
+                # Mesmo evento repetido dentro do lote
+                resultados[indice] = {"status": "duplicado", "resultado_original": "lote"}
+            vistos.add(fingerprint)
+        limpar_se_necessario()
+    garantir_particoes_se_necessario()
+    consolidar_resumos_se_necessario()
+    pendentes = [indice for indice, resultado in enumerate(resultados) if resultado is None]
+
+    falhas = []
+    faixas = {}  # índice do evento -> (início, fim) das suas transações em `adiadas`
+    with unit_of_work() as uow:
+        # Raias em ordem crescente: dois lotes concorrentes não se bloqueiam em ciclo
+        raias = {raia_do_evento(plataforma, eventos[indice]) for indice in pendentes}
+        for raia in sorted(raia for raia in raias if raia is not None):
+            bloquear_raia(uow, raia)
+        adiadas = uow.info[CHAVE_ADIADAS] = []
+        for indice in pendentes:
+            inicio = len(adiadas)
+            try:
+                with uow.begin_nested():
+                    resultados[indice] = _rotear_webhook(plataforma, eventos[indice], session=uow, evento=tipados[indice])
+            except Exception as e:
+                # Desfaz apenas este evento; as transações que ele adiou são descartadas
+                del adiadas[inicio:]
+                log.error("[LOTE] Erro no evento %s do lote: %s", indice, e)
+                resultados[indice] = {"status": "erro", "motivo": str(e)}
+                falhas.append(indice)
+                continue
+            faixas[indice] = (inicio, len(adiadas))
+        uow.info.pop(CHAVE_ADIADAS, None)
+
+        gravadas = upsert_transacoes_em_lote(uow, adiadas) if adiadas else []
+        for indice, (inicio, fim) in faixas.items():
+            if fim > inicio:
+                resultados[indice] = _resultado_em_lote(adiadas[inicio:fim], gravadas[inicio:fim])
+
+        # Eventos com erro não são registrados: a reentrega deve ser processada
+        registrados = [
+            (fingerprints[indice], plataforma, resultados[indice])
+            for indice in faixas
+            if fingerprints[indice] and status_resultado(resultados[indice]) != "erro"
+        ]
+        registrar_eventos_processados(uow, registrados)
+
+    for fingerprint, _, resultado in registrados:
+        lembrar_evento_processado(fingerprint, resultado)
+    if ingestion_config.DLQ_ENABLED:
+        for indice in falhas:
+            resultados[indice]["dead_letter_id"] = registrar_falha(
+                plataforma, eventos[indice], resultados[indice]["motivo"], evento_atual()
+            )
+    invalidos = sum(1 for tipado in tipados if tipado is None)
+    log.info("[LOTE] %s eventos %s: %s processados, %s duplicados, %s inválidos, %s com erro",
+             len(eventos), plataforma, len(faixas), len(eventos) - len(pendentes) - invalidos, invalidos, len(falhas))
+    return resultados
@@ -0,0 +1,306 @@
+"""
+Inbox durável de webhooks
+Os endpoints apenas gravam o evento bruto e respondem 202; um pool de workers
+drena a inbox pelos handlers existentes de webhook_handler.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.orm import aliased
+
+from database.connection import get_session
+from database.models import WebhookInbox
+from services.dead_letter import registrar_falha
+from services.idempotencia import status_resultado
+from services.ordenacao import raia_do_evento
+from services.webhook_handler import falha_retentavel, processar_webhook
+from utils.ingestion_config import ingestion_config
+from utils.logging_ingestao import obter_logger, contexto_evento
+from utils.metricas_prometheus import registrar_profundidade
+
+log = obter_logger("inbox")
+
+# Sinaliza aos workers que há evento novo (evita esperar o intervalo de polling)
+_novo_evento = threading.Event()
+
+_lock_recuperacao = threading.Lock()
+_proxima_recuperacao = 0.0
+
+
+def enfileirar_evento(plataforma: str, payload: dict) -> int:
+    """
+    Grava o webhook na inbox e retorna o id do evento.
+    """
+    session = get_session()
+    try:
+        evento = WebhookInbox(
+            plataforma=plataforma, payload=payload, status="pendente", tentativas=0,
+            raia=raia_do_evento(plataforma, payload),
+        )
+        session.add(evento)
+        session.commit()
+        evento_id = evento.id
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    _novo_evento.set()
+    return evento_id
+
+
+def reservar_eventos(limite: int) -> List[Dict[str, Any]]:
+    """
+    Reserva até `limite` eventos pendentes para este worker.
+    FOR UPDATE SKIP LOCKED permite vários workers (e processos) sem disputa.
+    Com ordenação habilitada, só é elegível o evento mais antigo de cada raia,
+    e apenas se nenhum evento da raia estiver em processamento.
+    """
+    session = get_session()
+    try:
+        query = session.query(WebhookInbox).filter(WebhookInbox.status == "pendente")
+        if ingestion_config.ORDERING_ENABLED:
+            anterior = aliased(WebhookInbox)
+            query = query.filter(~exists().where(
+                anterior.raia == WebhookInbox.raia,
+                or_(
+                    anterior.status == "processando",
+                    and_(anterior.status == "pendente", anterior.id < WebhookInbox.id),
+                ),
+            ))
+        eventos = (
+            query
+            .order_by(WebhookInbox.id)
+            .limit(limite)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        agora = datetime.now(timezone.utc)
+        reservados = []
+        for evento in eventos:
+            evento.status = "processando"
+            evento.iniciado_em = agora
+            evento.tentativas = (evento.tentativas or 0) + 1
+            reservados.append({
+                "id": evento.id,
+                "plataforma": evento.plataforma,
+                "payload": evento.payload,
+                "tentativas": evento.tentativas,
+            })
+        session.commit()
+        return reservados
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def finalizar_evento(evento_id: int, resultado: Optional[dict] = None, erro: Optional[str] = None, tentativas: int = 0):
+    """
+    Marca o evento como processado ou, em caso de falha, devolve para a fila
+    até atingir o limite de tentativas.
+    """
+    session = get_session()
+    try:
+        evento = session.get(WebhookInbox, evento_id)
+        if evento is None:
+            return
+        if erro is None:
+            evento.status = "processado"
+            evento.resultado_status = status_resultado(resultado)
+            evento.erro = None
+        elif tentativas >= ingestion_config.INBOX_MAX_ATTEMPTS:
+            evento.status = "erro"
+            evento.erro = erro
+        else:
+            evento.status = "pendente"
+            evento.erro = erro
+        evento.processado_em = datetime.now(timezone.utc)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def recuperar_eventos_travados() -> int:
+    """
+    Devolve para a fila eventos presos em "processando" (worker interrompido).
+    """
+    limite = datetime.now(timezone.utc) - timedelta(seconds=ingestion_config.INBOX_STALE_SECONDS)
+    session = get_session()
+    try:
+        total = (
+            session.query(WebhookInbox)
+            .filter(WebhookInbox.status == "processando", WebhookInbox.iniciado_em < limite)
+            .update({WebhookInbox.status: "pendente"}, synchronize_session=False)
+        )
+        session.commit()
+        return total
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def recuperar_travados_se_necessario():
+    """
+    Executa `recuperar_eventos_travados` no máximo uma vez a cada
+    INBOX_RECOVERY_INTERVAL segundos (chamado pelos workers a cada ciclo).
+    Um evento travado em "processando" bloqueia a sua raia até ser devolvido.
+    """
+    global _proxima_recuperacao
+    agora = time.monotonic()
+    if agora < _proxima_recuperacao or not _lock_recuperacao.acquire(blocking=False):
+        return
+    try:
+        _proxima_recuperacao = agora + ingestion_config.INBOX_RECOVERY_INTERVAL
+        recuperados = recuperar_eventos_travados()
+        if recuperados:
+            log.info("[INBOX] %s eventos travados devolvidos para a fila", recuperados)
+    except Exception as e:
+        log.error("[INBOX] Erro ao recuperar eventos travados: %s", e)
+    finally:
+        _lock_recuperacao.release()
+
+
+def obter_estatisticas_inbox() -> Dict[str, Any]:
+    """
+    Retorna profundidade da inbox por status e o atraso (lag) do evento pendente mais antigo.
+    """
+    session = get_session()
+    try:
+        contagens = dict(
+            session.query(WebhookInbox.status, func.count(WebhookInbox.id))
+            .filter(WebhookInbox.status.in_(["pendente", "processando", "erro"]))
+            .group_by(WebhookInbox.status)
+            .all()
+        )
+        mais_antigo = (
+            session.query(func.min(WebhookInbox.recebido_em))
+            .filter(WebhookInbox.status == "pendente")
+            .scalar()
+        )
+    finally:
+        session.close()
+
+    lag_segundos = 0.0
+    if mais_antigo is not None:
+        if mais_antigo.tzinfo is None:
+            mais_antigo = mais_antigo.replace(tzinfo=timezone.utc)
+        lag_segundos = max((datetime.now(timezone.utc) - mais_antigo).total_seconds(), 0.0)
+
+    return {
+        "pendentes": contagens.get("pendente", 0),
+        "processando": contagens.get("processando", 0),
+        "com_erro": contagens.get("erro", 0),
+        "lag_segundos": round(lag_segundos, 3),
+    }
+
+
+class InboxWorkerPool:
+    """
+    Pool de threads que drena a inbox usando os handlers síncronos existentes.
+    """
+
+    def __init__(self, num_workers: int = None, batch_size: int = None, intervalo_polling: float = None):
+        self.num_workers = num_workers or ingestion_config.INBOX_WORKERS
+        self.batch_size = batch_size or ingestion_config.INBOX_BATCH_SIZE
+        self.intervalo_polling = intervalo_polling or ingestion_config.INBOX_POLL_INTERVAL
+        self._parar = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def ativo(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def iniciar(self):
+        """
+        Inicia os workers (idempotente).
+        """
+        if self.ativo:
+            return
+        self._parar.clear()
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"inbox-worker-{i}", daemon=True)
+            for i in range(self.num_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        log.info("[INBOX] %s workers iniciados", self.num_workers)
+
+    def parar(self, timeout: float = 10.0):
+        """
+        Sinaliza parada e aguarda os workers terminarem o lote atual.
+        """
+        self._parar.set()
+        _novo_evento.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        log.info("[INBOX] Workers parados")
+
+    def _loop(self):
+        while not self._parar.is_set():
+            recuperar_travados_se_necessario()
+            try:
+                eventos = reservar_eventos(self.batch_size)
+            except Exception as e:
+                log.error("[INBOX] Erro ao reservar eventos: %s", e)
+                eventos = []
+            if not eventos:
+                # Acorda antes do intervalo se um evento novo for enfileirado
+                _novo_evento.wait(self.intervalo_polling)
+                _novo_evento.clear()
+                continue
+            for evento in eventos:
+                try:
+                    self._processar(evento)
+                except Exception as e:
+                    # Falha ao finalizar: o evento fica em "processando" e volta à fila na
+                    # varredura periódica, após INBOX_STALE_SECONDS
+                    log.error("[INBOX] Erro ao finalizar evento %s: %s", evento['id'], e)
+
+    def _processar(self, evento: Dict[str, Any]):
+        # Logs do processamento usam o id da inbox como evento_id
+        with contexto_evento(f"inbox-{evento['id']}"):
+            # A inbox faz as próprias novas tentativas: a dead-letter só recebe o evento
+            # depois de INBOX_MAX_ATTEMPTS falhas
+            try:
+                resultado = processar_webhook(evento["plataforma"], evento["payload"], dead_letter=False)
+            except Exception as e:
+                resultado = {"status": "erro", "motivo": str(e), "retentavel": True}
+            if not falha_retentavel(resultado):
+                # Sucesso ou erro definitivo (ex.: payload inválido): não adianta repetir
+                finalizar_evento(evento["id"], resultado=resultado)
+                return
+            erro = resultado.get("motivo") or "erro"
+            log.error("[INBOX] Tentativa %s do evento %s falhou: %s", evento["tentativas"], evento["id"], erro)
+            if evento["tentativas"] >= ingestion_config.INBOX_MAX_ATTEMPTS and ingestion_config.DLQ_ENABLED:
+                # Gravada antes de finalizar: se a dead-letter falhar, o evento volta à fila
+                # na varredura de travados em vez de se perder
+                registrar_falha(evento["plataforma"], evento["payload"], erro, f"inbox-{evento['id']}")
+            finalizar_evento(evento["id"], erro=erro, tentativas=evento["tentativas"])
+
+
+# Instância global do pool
+inbox_worker_pool = InboxWorkerPool()
+
+
+def _profundidade_inbox() -> float:
+    # Lida a cada coleta do Prometheus: falha no banco não derruba o /metrics
+    try:
+        return obter_estatisticas_inbox()["pendentes"]
+    except Exception:
+        return float("nan")
+
+
+if ingestion_config.inbox_enabled():
+    registrar_profundidade("inbox", _profundidade_inbox)
@@ -0,0 +1,53 @@
+"""
+Configurações de conexão com o banco
+Pools separados para a escrita (ingestão de webhooks) e a leitura analítica
+(dashboard); a leitura pode apontar para uma réplica.
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Carrega variáveis de ambiente
+load_dotenv()
+
+def _bool(nome: str, padrao: str) -> bool:
+    return os.getenv(nome, padrao).strip().lower() == "true"
+
+class DatabaseConfig:
+    """Configurações de pool centralizadas"""
+
+    # Primário (escrita) e, opcionalmente, réplica para as leituras do dashboard
+    DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://metrics_user:asdfghjkl@db:5432/metrics_db")
+    DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "").strip() or DATABASE_URL
+
+    # Pool de escrita: webhooks, inbox, bulk writer, autenticação
+    WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", "10"))
+    WRITE_MAX_OVERFLOW = int(os.getenv("DB_WRITE_MAX_OVERFLOW", "5"))
+    WRITE_POOL_TIMEOUT = float(os.getenv("DB_WRITE_POOL_TIMEOUT", "10"))
+    WRITE_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_WRITE_STATEMENT_TIMEOUT_MS", "30000"))
+
+    # Pool de leitura: agregações do dashboard (MetricsCalculator, callbacks)
+    READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "5"))
+    READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", "5"))
+    READ_POOL_TIMEOUT = float(os.getenv("DB_READ_POOL_TIMEOUT", "30"))
+    READ_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_READ_STATEMENT_TIMEOUT_MS", "60000"))
+    # Sessões de leitura abrem transações read-only (escrita acidental falha no banco)
+    READ_ONLY = _bool("DB_READ_ONLY", "true")
+
+    # Partições mensais de transacoes: meses futuros criados com antecedência,
+    # intervalo entre verificações e schema para onde vão meses arquivados
+    PARTITION_MONTHS_AHEAD = int(os.getenv("TRANSACOES_PARTITION_MONTHS_AHEAD", "3"))
+    PARTITION_CHECK_INTERVAL = int(os.getenv("TRANSACOES_PARTITION_CHECK_INTERVAL", "21600"))
+    PARTITION_ARCHIVE_SCHEMA = os.getenv("TRANSACOES_PARTITION_ARCHIVE_SCHEMA", "arquivo")
+    # Espera máxima por locks no DDL de partições (não enfileira webhooks atrás dele)
+    PARTITION_LOCK_TIMEOUT = os.getenv("TRANSACOES_PARTITION_LOCK_TIMEOUT", "5s")
+
+    # Intervalo entre as consolidações dos deltas dos resumos diários (services/resumos.py)
+    RESUMOS_CONSOLIDATION_INTERVAL = float(os.getenv("RESUMOS_CONSOLIDATION_INTERVAL", "10"))
+
+    # Comuns aos dois pools
+    POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    POOL_PRE_PING = _bool("DB_POOL_PRE_PING", "true")
+
+# Instância global da configuração
+database_config = DatabaseConfig()
@@ -0,0 +1,171 @@
+"""
+Extratores compilados para os dicionários de mapeamento
+Os mapeamentos (utils/mapeamento.py, utils/mapeamento_backfill.py) descrevem
+caminhos como "payment.marketplace_id" ou "subscriptions[0].id", conversões
+de tipo ("str", "float"), transformações ("ticto: dividir por 100") e
+caminhos alternativos. Em vez de interpretar esses caminhos a cada payload,
+cada mapeamento é compilado uma vez (na importação) em uma função Python com
+os acessos já encadeados: p["payment"]["marketplace_id"].
+
+Regras dos caminhos:
+- chave ausente, índice fora da lista ou tipo inesperado no meio do caminho -> None
+- lista de caminhos: o primeiro valor diferente de None é usado
+- caminho igual ao nome da plataforma: valor constante (ex.: "plataforma")
+- tipo "json": o próprio payload
+- "CALCULADO_DINAMICAMENTE": None (preenchido pelo handler)
+"""
+
+import re
+from typing import Any, Callable, Dict, List, Optional, Union
+
+Caminhos = Union[str, List[str]]
+
+# Erros que interrompem o caminho (equivalem a "campo ausente")
+_ERROS_CAMINHO = "(KeyError, IndexError, TypeError)"
+
+_PARTE = re.compile(r"^([^\[\]]+)((?:\[\d+\])*)$")
+_INDICE = re.compile(r"\[(\d+)\]")
+
+CALCULADO_DINAMICAMENTE = "CALCULADO_DINAMICAMENTE"
+
+
+def _para_str(valor: Any) -> Any:
+    # Ids numéricos viram texto; outros tipos (dict, lista) ficam como estão
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return str(valor)
+    return valor
+
+
+def _para_float(valor: Any) -> Any:
+    if isinstance(valor, bool):
+        return valor
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return valor
+
+
+def _dividir_por_100(valor: Any) -> Any:
+    return valor / 100 if isinstance(valor, (int, float)) else valor
+
+
+CONVERSOES: Dict[str, Callable[[Any], Any]] = {
+    "str": _para_str,
+    "float": _para_float,
+}
+
+TRANSFORMACOES: Dict[str, Callable[[Any], Any]] = {
+    "dividir por 100": _dividir_por_100,
+}
+
+
+def _expressao(caminho: str, raiz: str = "p") -> str:
+    """'subscriptions[0].id' -> p['subscriptions'][0]['id']"""
+    expressao = raiz
+    for parte in caminho.split("."):
+        casamento = _PARTE.match(parte)
+        if not casamento:
+            raise ValueError(f"Caminho de mapeamento inválido: {caminho!r}")
+        nome, indices = casamento.groups()
+        expressao += f"[{nome!r}]"
+        expressao += "".join(f"[{indice}]" for indice in _INDICE.findall(indices))
+    return expressao
+
+
+def _transformacoes_da_plataforma(info: dict, plataforma: Optional[str]) -> List[str]:
+    """'ticto: dividir por 100' -> ['dividir por 100'] apenas para a Ticto"""
+    transformacao = info.get("transformacao")
+    if not transformacao:
+        return []
+    nomes = []
+    for trecho in transformacao.split(";"):
+        alvo, _, nome = trecho.rpartition(":")
+        if not alvo or plataforma is None or alvo.strip() == plataforma:
+            nomes.append(nome.strip())
+    for nome in nomes:
+        if nome not in TRANSFORMACOES:
+            raise ValueError(f"Transformação desconhecida no mapeamento: {nome!r}")
+    return nomes
+
+
+def _linhas_valor(caminhos: Caminhos, info: dict, plataforma: Optional[str],
+                  ambiente: Dict[str, Any]) -> List[str]:
+    """Código que calcula o valor de um campo na variável v"""
+    if info.get("tipo") == "json":
+        return ["v = p"]
+    if caminhos == CALCULADO_DINAMICAMENTE:
+        return ["v = None"]
+    if plataforma is not None and caminhos == plataforma:
+        return [f"v = {plataforma!r}"]
+
+    if isinstance(caminhos, str):
+        linhas = [
+            "try:",
+            f"    v = {_expressao(caminhos)}",
+            f"except {_ERROS_CAMINHO}:",
+            "    v = None",
+        ]
+    else:
+        linhas = ["v = None"]
+    for caminho in ([] if isinstance(caminhos, str) else caminhos):
+        linhas += [
+            "if v is None:",
+            "    try:",
+            f"        v = {_expressao(caminho)}",
+            f"    except {_ERROS_CAMINHO}:",
+            "        pass",
+        ]
+    funcoes = [CONVERSOES[info["tipo"]]] if info.get("tipo") in CONVERSOES else []
+    funcoes += [TRANSFORMACOES[nome] for nome in _transformacoes_da_plataforma(info, plataforma)]
+    if funcoes:
+        linhas.append("if v is not None:")
+        for funcao in funcoes:
+            nome = f"_f{len(ambiente)}"
+            ambiente[nome] = funcao
+            linhas.append(f"    v = {nome}(v)")
+    if "padrao" in info:
+        nome = f"_d{len(ambiente)}"
+        ambiente[nome] = info["padrao"]
+        linhas += ["if v is None:", f"    v = {nome}"]
+    return linhas
+
+
+def _compilar(nome: str, corpo: List[str], ambiente: Dict[str, Any]) -> Callable[[Any], Any]:
+    fonte = f"def {nome}(p):\n" + "".join(f"    {linha}\n" for linha in corpo)
+    exec(compile(fonte, f"<mapeamento {nome}>", "exec"), ambiente)
+    funcao = ambiente[nome]
+    funcao.__fonte__ = fonte
+    return funcao
+
+
+def compilar_mapeamento(mapeamento: Dict[str, dict], plataforma: Optional[str] = None) -> Callable[[Any], Dict[str, Any]]:
+    """
+    Compila um dicionário de mapeamento em uma função payload -> dict.
+
+    Com `plataforma`, o caminho de cada campo é info[plataforma] (formato de
+    MAPEAMENTO_TRANSACOES); sem ela, info["caminho"]. Campos sem caminho para
+    a plataforma são ignorados.
+    """
+    ambiente: Dict[str, Any] = {}
+    corpo = ["r = {}"]
+    for destino, info in mapeamento.items():
+        caminhos = info.get(plataforma if plataforma is not None else "caminho")
+        if caminhos is None:
+            continue
+        corpo += _linhas_valor(caminhos, info, plataforma, ambiente)
+        corpo.append(f"r[{destino!r}] = v")
+    corpo.append("return r")
+    return _compilar(f"extrair_{plataforma or 'campos'}", corpo, ambiente)
+
+
+def compilar_caminho(caminhos: Caminhos, tipo: Optional[str] = None, padrao: Any = None,
+                     transformacao: Optional[str] = None) -> Callable[[Any], Any]:
+    """
+    Compila um único caminho (ou lista de alternativas) em uma função payload -> valor.
+    """
+    info: Dict[str, Any] = {"tipo": tipo, "transformacao": transformacao}
+    if padrao is not None:
+        info["padrao"] = padrao
+    ambiente: Dict[str, Any] = {}
+    corpo = _linhas_valor(caminhos, info, None, ambiente) + ["return v"]
+    return _compilar("extrair_caminho", corpo, ambiente)
@@ -0,0 +1,84 @@
+"""
+Configurações do pipeline de ingestão de webhooks
+Centraliza os parâmetros de processamento assíncrono (inbox, workers)
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Carrega variáveis de ambiente
+load_dotenv()
+
+class IngestionConfig:
+    """Configurações de ingestão centralizadas"""
+
+    # Modo de ingestão: "inline" processa na requisição, "inbox" grava e responde 202
+    WEBHOOK_INGESTION_MODE = os.getenv("WEBHOOK_INGESTION_MODE", "inline").strip().lower()
+
+    # Workers que drenam a inbox
+    INBOX_WORKERS = int(os.getenv("WEBHOOK_INBOX_WORKERS", "4"))
+    INBOX_BATCH_SIZE = int(os.getenv("WEBHOOK_INBOX_BATCH_SIZE", "10"))
+    INBOX_POLL_INTERVAL = float(os.getenv("WEBHOOK_INBOX_POLL_INTERVAL", "1.0"))
+    INBOX_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_INBOX_MAX_ATTEMPTS", "5"))
+
+    # Eventos em "processando" há mais tempo que isso voltam para a fila (worker morto)
+    INBOX_STALE_SECONDS = int(os.getenv("WEBHOOK_INBOX_STALE_SECONDS", "300"))
+    # Intervalo da varredura desses eventos, feita pelos próprios workers
+    INBOX_RECOVERY_INTERVAL = float(os.getenv("WEBHOOK_INBOX_RECOVERY_INTERVAL", "60"))
+
+    # Executor dos handlers síncronos (fora do event loop)
+    EXECUTOR_MAX_WORKERS = int(os.getenv("WEBHOOK_EXECUTOR_MAX_WORKERS", "8"))
+    EXECUTOR_MAX_QUEUE = int(os.getenv("WEBHOOK_EXECUTOR_MAX_QUEUE", "32"))
+    EXECUTOR_TIMEOUT = float(os.getenv("WEBHOOK_EXECUTOR_TIMEOUT", "30"))
+    RETRY_AFTER_SECONDS = int(os.getenv("WEBHOOK_RETRY_AFTER_SECONDS", "5"))
+
+    # Idempotência: eventos já processados são respondidos sem tocar nas tabelas principais
+    IDEMPOTENCY_ENABLED = os.getenv("WEBHOOK_IDEMPOTENCY_ENABLED", "true").strip().lower() == "true"
+    IDEMPOTENCY_TTL_HOURS = int(os.getenv("WEBHOOK_IDEMPOTENCY_TTL_HOURS", "72"))
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv("WEBHOOK_IDEMPOTENCY_CACHE_SIZE", "10000"))
+    IDEMPOTENCY_CLEANUP_INTERVAL = int(os.getenv("WEBHOOK_IDEMPOTENCY_CLEANUP_INTERVAL", "3600"))
+
+    # Escritor em lote: transações de vários webhooks gravadas em INSERTs multi-linha
+    BULK_ENABLED = os.getenv("WEBHOOK_BULK_ENABLED", "false").strip().lower() == "true"
+    BULK_MAX_ROWS = int(os.getenv("WEBHOOK_BULK_MAX_ROWS", "100"))
+    BULK_WINDOW_MS = float(os.getenv("WEBHOOK_BULK_WINDOW_MS", "5"))
+
+    # Cache de ids (email -> cliente_id, id_assinatura_origem -> assinatura_id)
+    ID_CACHE_ENABLED = os.getenv("WEBHOOK_ID_CACHE_ENABLED", "true").strip().lower() == "true"
+    ID_CACHE_SIZE = int(os.getenv("WEBHOOK_ID_CACHE_SIZE", "50000"))
+    ID_CACHE_TTL_SECONDS = int(os.getenv("WEBHOOK_ID_CACHE_TTL_SECONDS", "3600"))
+
+    # Catálogo de produtos/ofertas em memória: intervalo (s) entre verificações de mudança no banco
+    CATALOG_RELOAD_INTERVAL = float(os.getenv("WEBHOOK_CATALOG_RELOAD_INTERVAL", "60"))
+
+    # Codec JSON do corpo dos webhooks e das colunas JSONB: "auto", "orjson" ou "json"
+    JSON_CODEC = os.getenv("WEBHOOK_JSON_CODEC", "auto").strip().lower()
+
+    # Ordenação por entidade: eventos da mesma assinatura/transação de origem
+    # caem na mesma raia e são processados em ordem; raias diferentes em paralelo
+    ORDERING_ENABLED = os.getenv("WEBHOOK_ORDERING_ENABLED", "true").strip().lower() == "true"
+    ORDERING_LANES = int(os.getenv("WEBHOOK_ORDERING_LANES", "64"))
+
+    # Dead-letter: eventos que falharam são reprocessados com backoff exponencial
+    DLQ_ENABLED = os.getenv("WEBHOOK_DLQ_ENABLED", "true").strip().lower() == "true"
+    DLQ_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_DLQ_MAX_ATTEMPTS", "8"))
+    DLQ_BACKOFF_BASE_SECONDS = float(os.getenv("WEBHOOK_DLQ_BACKOFF_BASE_SECONDS", "30"))
+    DLQ_BACKOFF_MAX_SECONDS = float(os.getenv("WEBHOOK_DLQ_BACKOFF_MAX_SECONDS", "3600"))
+    DLQ_WORKERS = int(os.getenv("WEBHOOK_DLQ_WORKERS", "2"))
+    DLQ_POLL_INTERVAL = float(os.getenv("WEBHOOK_DLQ_POLL_INTERVAL", "5.0"))
+
+    # Endpoint de lote (/webhook/{plataforma}/batch): máximo de eventos por requisição
+    BATCH_MAX_EVENTS = int(os.getenv("WEBHOOK_BATCH_MAX_EVENTS", "500"))
+
+    # Métricas Prometheus (/metrics): contadores, histogramas e tempo por statement SQL
+    METRICS_ENABLED = os.getenv("PROMETHEUS_METRICS_ENABLED", "true").strip().lower() == "true"
+
+    @classmethod
+    def inbox_enabled(cls) -> bool:
+        """
+        Indica se os endpoints devem apenas gravar na inbox e responder 202
+        """
+        return cls.WEBHOOK_INGESTION_MODE == "inbox"
+
+# Instância global da configuração
+ingestion_config = IngestionConfig()
@@ -0,0 +1,168 @@
+"""
+Codec JSON do caminho de ingestão
+Um único ponto de parse/serialização para o corpo dos webhooks e para as
+colunas JSONB (arquivo de payloads, payload da inbox), com backend intercambiável:
+
+- "orjson": parse e serialização em C, várias vezes mais rápidos que o módulo json
+- "json": biblioteca padrão (sempre disponível)
+- "auto" (padrão): orjson se estiver instalado, senão json
+
+O corpo recebido é parseado uma única vez. O dict resultante guarda os bytes
+originais; enquanto não for alterado, ele é gravado no JSONB a partir desses
+bytes, sem ser serializado novamente.
+"""
+
+import json
+from typing import Any, Optional, Union
+
+from utils.ingestion_config import ingestion_config
+
+
+def _padrao(obj: Any) -> Any:
+    """Tipos sem representação JSON nativa (datas, Decimal, ...)"""
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
+
+
+class JsonCodec:
+    """Interface dos codecs: bytes/str -> objeto e objeto -> str"""
+
+    nome = "base"
+
+    def loads(self, dados: Union[bytes, str]) -> Any:
+        raise NotImplementedError
+
+    def dumps(self, obj: Any) -> str:
+        raise NotImplementedError
+
+
+class StdlibCodec(JsonCodec):
+    nome = "json"
+
+    def loads(self, dados: Union[bytes, str]) -> Any:
+        return json.loads(dados)
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_padrao)
+
+
+class OrjsonCodec(JsonCodec):
+    nome = "orjson"
+
+    def __init__(self):
+        import orjson  # dependência opcional
+        self._orjson = orjson
+
+    def loads(self, dados: Union[bytes, str]) -> Any:
+        return self._orjson.loads(dados)
+
+    def dumps(self, obj: Any) -> str:
+        return self._orjson.dumps(obj, default=_padrao, option=self._orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+
+CODECS = {
+    "json": StdlibCodec,
+    "orjson": OrjsonCodec,
+}
+
+
+def criar_codec(nome: Optional[str] = None) -> JsonCodec:
+    """
+    Codec configurado em WEBHOOK_JSON_CODEC ("auto", "orjson" ou "json").
+    """
+    nome = (nome or ingestion_config.JSON_CODEC).strip().lower()
+    if nome == "auto":
+        try:
+            return OrjsonCodec()
+        except ImportError:
+            return StdlibCodec()
+    if nome not in CODECS:
+        raise ValueError(f"Codec JSON desconhecido: {nome}")
+    return CODECS[nome]()
+
+
+# Instância global do codec
+codec = criar_codec()
+
+
+class PayloadBruto(dict):
+    """
+    Dict parseado de um corpo JSON que mantém os bytes originais.
+    Qualquer alteração no nível raiz descarta os bytes (o dict volta a ser
+    serializado normalmente). Alterações em objetos aninhados não são
+    detectadas: o payload recebido deve ser tratado como somente leitura.
+    """
+
+    __slots__ = ("bruto",)
+
+    def __init__(self, dados: dict, bruto: Optional[bytes] = None):
+        super().__init__(dados)
+        self.bruto = bruto
+
+    def _alterado(self):
+        self.bruto = None
+
+    def __setitem__(self, chave, valor):
+        self._alterado()
+        super().__setitem__(chave, valor)
+
+    def __delitem__(self, chave):
+        self._alterado()
+        super().__delitem__(chave)
+
+    def update(self, *args, **kwargs):
+        self._alterado()
+        super().update(*args, **kwargs)
+
+    def setdefault(self, chave, padrao=None):
+        if chave not in self:
+            self._alterado()
+        return super().setdefault(chave, padrao)
+
+    def pop(self, *args):
+        self._alterado()
+        return super().pop(*args)
+
+    def popitem(self):
+        self._alterado()
+        return super().popitem()
+
+    def clear(self):
+        self._alterado()
+        super().clear()
+
+    def __ior__(self, outro):
+        self._alterado()
+        return super().__ior__(outro)
+
+
+def ler_corpo(corpo: Union[bytes, str]) -> Any:
+    """
+    Parse único do corpo da requisição. Objetos JSON retornam um PayloadBruto
+    que reaproveita `corpo` na gravação. Levanta ValueError se o JSON for inválido.
+    """
+    dados = codec.loads(corpo)
+    if isinstance(dados, dict):
+        if isinstance(corpo, str):
+            corpo = corpo.encode("utf-8")
+        return PayloadBruto(dados, corpo)
+    return dados
+
+
+def serializar(obj: Any) -> str:
+    """
+    Serializador das colunas JSON/JSONB (json_serializer do engine).
+    Payloads recebidos e não alterados são gravados a partir dos bytes originais.
+    """
+    if isinstance(obj, PayloadBruto) and obj.bruto is not None:
+        try:
+            return obj.bruto.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+    return codec.dumps(obj)
+
+
+def desserializar(dados: Union[bytes, str]) -> Any:
+    """Desserializador das colunas JSON/JSONB (json_deserializer do engine)"""
+    return codec.loads(dados)
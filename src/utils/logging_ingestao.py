@@ -0,0 +1,273 @@
+"""
+Logging estruturado do caminho de ingestão (webhooks, middleware e backfill)
+
+- Registros em JSON de uma linha, com o id do evento em processamento
+- Escrita em stdout feita por uma thread dedicada (QueueHandler/QueueListener):
+  quem loga apenas enfileira o registro
+- Limite de registros por segundo por nível (ERROR e CRITICAL nunca são limitados)
+- Payloads são logados apenas por amostragem e com campos sensíveis mascarados
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+# Carrega variáveis de ambiente
+load_dotenv()
+
+# Logger raiz do subsistema; os demais são filhos ("ingestao.webhook", ...)
+LOGGER_RAIZ = "ingestao"
+
+
+def _parse_limites(valor: str) -> Dict[int, float]:
+    """Converte "DEBUG=20,INFO=100" em {logging.DEBUG: 20.0, logging.INFO: 100.0}"""
+    limites = {}
+    for parte in valor.split(","):
+        if "=" not in parte:
+            continue
+        nivel, limite = parte.split("=", 1)
+        nivel = logging.getLevelName(nivel.strip().upper())
+        if isinstance(nivel, int):
+            limites[nivel] = float(limite)
+    return limites
+
+
+class LoggingConfig:
+    """Configurações de logging da ingestão"""
+
+    LOG_LEVEL = os.getenv("INGESTION_LOG_LEVEL", "INFO").strip().upper()
+    # json: uma linha JSON por registro; text: formato legível para desenvolvimento
+    LOG_FORMAT = os.getenv("INGESTION_LOG_FORMAT", "json").strip().lower()
+    # Fração dos payloads logados (0.0 = nenhum, 1.0 = todos)
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("INGESTION_LOG_PAYLOAD_SAMPLE_RATE", "0.0"))
+    LOG_REDACT_FIELDS = {
+        campo.strip().lower()
+        for campo in os.getenv(
+            "INGESTION_LOG_REDACT_FIELDS",
+            "api_token,token,email,doc,cpf,cnpj,phone,phone_number,address,name",
+        ).split(",")
+        if campo.strip()
+    }
+    # Registros por segundo por nível; níveis ausentes não são limitados
+    LOG_RATE_LIMITS = _parse_limites(os.getenv("INGESTION_LOG_RATE_LIMITS", "DEBUG=20,INFO=200,WARNING=50"))
+
+
+# Instância global da configuração
+logging_config = LoggingConfig()
+
+# Id do evento em processamento na thread/tarefa atual
+_evento_atual: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("evento_id", default=None)
+
+_MASCARA = "***"
+
+# Atributos padrão do LogRecord (o restante veio de `extra`)
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def novo_evento_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def contexto_evento(evento_id: Optional[str] = None):
+    """
+    Associa um id de evento a todos os registros emitidos dentro do bloco.
+    """
+    token = _evento_atual.set(evento_id or novo_evento_id())
+    try:
+        yield _evento_atual.get()
+    finally:
+        _evento_atual.reset(token)
+
+
+def evento_atual() -> Optional[str]:
+    return _evento_atual.get()
+
+
+def redigir(valor: Any) -> Any:
+    """Cópia do payload com os campos sensíveis mascarados"""
+    if isinstance(valor, dict):
+        return {
+            chave: _MASCARA if str(chave).lower() in logging_config.LOG_REDACT_FIELDS else redigir(item)
+            for chave, item in valor.items()
+        }
+    if isinstance(valor, list):
+        return [redigir(item) for item in valor]
+    return valor
+
+
+def log_payload(logger: logging.Logger, mensagem: str, payload: Any, **campos):
+    """
+    Loga o payload (mascarado) em DEBUG para uma amostra dos eventos.
+    Fora da amostra nada é serializado.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    taxa = logging_config.LOG_PAYLOAD_SAMPLE_RATE
+    if taxa <= 0 or (taxa < 1 and random.random() >= taxa):
+        return
+    logger.debug(mensagem, extra={"campos": {**campos, "payload": redigir(payload)}})
+
+
+class ContextoFilter(logging.Filter):
+    """Anexa o id do evento atual ao registro"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "evento_id", None) is None:
+            record.evento_id = _evento_atual.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket por nível. Registros acima do limite são descartados e a
+    quantidade descartada é informada no próximo registro aceito do mesmo nível.
+    """
+
+    def __init__(self, limites: Dict[int, float]):
+        super().__init__()
+        self.limites = limites
+        self._tokens = {nivel: limite for nivel, limite in limites.items()}
+        self._atualizado = {nivel: time.monotonic() for nivel in limites}
+        self._suprimidos = {nivel: 0 for nivel in limites}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        limite = self.limites.get(record.levelno)
+        if limite is None or record.levelno >= logging.ERROR:
+            return True
+        with self._lock:
+            agora = time.monotonic()
+            decorrido = agora - self._atualizado[record.levelno]
+            self._atualizado[record.levelno] = agora
+            tokens = min(limite, self._tokens[record.levelno] + decorrido * limite)
+            if tokens < 1:
+                self._tokens[record.levelno] = tokens
+                self._suprimidos[record.levelno] += 1
+                return False
+            self._tokens[record.levelno] = tokens - 1
+            suprimidos = self._suprimidos[record.levelno]
+            self._suprimidos[record.levelno] = 0
+        if suprimidos:
+            record.suprimidos = suprimidos
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Um registro por linha, em JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        registro = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        evento_id = getattr(record, "evento_id", None)
+        if evento_id:
+            registro["evento_id"] = evento_id
+        for chave, valor in record.__dict__.items():
+            if chave not in _ATRIBUTOS_RECORD and chave not in ("evento_id", "campos"):
+                registro[chave] = valor
+        campos = getattr(record, "campos", None)
+        if campos:
+            registro.update(campos)
+        if record.exc_info:
+            registro["exc"] = self.formatException(record.exc_info)
+        return json.dumps(registro, ensure_ascii=False, default=str, separators=(",", ":"))
+
+
+class TextoFormatter(logging.Formatter):
+    """Formato legível: campos extras em JSON compacto no fim da linha"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        linha = super().format(record)
+        extras = dict(getattr(record, "campos", None) or {})
+        if getattr(record, "evento_id", None):
+            extras["evento_id"] = record.evento_id
+        if getattr(record, "suprimidos", None):
+            extras["suprimidos"] = record.suprimidos
+        if extras:
+            linha += " " + json.dumps(extras, ensure_ascii=False, default=str, separators=(",", ":"))
+        return linha
+
+
+_lock_config = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_fila: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+
+
+def _iniciar_listener():
+    global _listener
+    if _listener is not None:
+        return
+    saida = logging.StreamHandler(sys.stdout)
+    saida.setFormatter(JsonFormatter() if logging_config.LOG_FORMAT == "json" else TextoFormatter())
+    _listener = logging.handlers.QueueListener(_fila, saida, respect_handler_level=False)
+    _listener.start()
+    atexit.register(parar_logging_ingestao)
+
+
+def criar_handler_console() -> logging.Handler:
+    """
+    Handler não bloqueante: enfileira o registro (com id do evento e limite por
+    nível aplicados) para a thread que escreve em stdout.
+    """
+    with _lock_config:
+        _iniciar_listener()
+    handler = logging.handlers.QueueHandler(_fila)
+    handler.addFilter(ContextoFilter())
+    handler.addFilter(RateLimitFilter(logging_config.LOG_RATE_LIMITS))
+    return handler
+
+
+def configurar_logging_ingestao():
+    """
+    Configura o logger raiz da ingestão (idempotente).
+    """
+    raiz = logging.getLogger(LOGGER_RAIZ)
+    if getattr(raiz, "_ingestao_configurado", False):
+        return raiz
+    handler = criar_handler_console()
+    with _lock_config:
+        if getattr(raiz, "_ingestao_configurado", False):
+            return raiz
+        raiz.setLevel(logging.getLevelName(logging_config.LOG_LEVEL))
+        raiz.addHandler(handler)
+        raiz.propagate = False
+        raiz._ingestao_configurado = True
+    return raiz
+
+
+def parar_logging_ingestao():
+    """Esvazia a fila e para a thread de escrita"""
+    global _listener
+    with _lock_config:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def obter_logger(nome: str) -> logging.Logger:
+    """
+    Logger filho do subsistema de ingestão, ex.: obter_logger("webhook").
+    """
+    configurar_logging_ingestao()
+    return logging.getLogger(f"{LOGGER_RAIZ}.{nome}")
@@ -6,6 +6,61 @@ Separa a lógica de mapeamento de webhooks do mapeamento de dados históricos
 from typing import Dict, Any, Optional
 from datetime import datetime
 
+from utils.extratores import compilar_mapeamento
+
+# Campos das orders da API Ticto (valores em centavos)
+MAPEAMENTO_ORDER_TICTO = {
+    "id_transacao_origem": {"caminho": "transaction.hash"},
+    "status": {"caminho": "transaction.status", "padrao": "authorized"},
+    "valor": {"caminho": "transaction.paid_amount", "transformacao": "dividir por 100", "padrao": 0},
+    "valor_bruto": {"caminho": "order_item.amount", "transformacao": "dividir por 100", "padrao": 0},
+    "comissao": {"caminho": "commission", "transformacao": "dividir por 100", "padrao": 0},
+    "ocorrencia": {"caminho": "transaction.occurrence", "padrao": 0},
+    "motivo_recusa": {"caminho": "transaction.refused_reason"},
+    "metodo_pagamento": {"caminho": "transaction.payment_method"},
+    "data_transacao": {"caminho": ["transaction.updated_at", "updated_at"]},
+    "cliente_nome": {"caminho": "customer.name"},
+    "cliente_email": {"caminho": "customer.email"},
+    "cliente_documento": {"caminho": ["customer.cpf", "customer.cnpj"]},
+    "data_criacao": {"caminho": "created_at"},
+    "produto_nome": {"caminho": "product.name"},
+    "produto_id": {"caminho": "product.id"},
+    "produto_tipo": {"caminho": "product.type"},
+    "produto_assinatura": {"caminho": "product.is_subscription"},
+    "oferta_nome": {"caminho": "offer.name"},
+    "oferta_id": {"caminho": "offer.id"},
+    "oferta_codigo": {"caminho": "offer.code"},
+    "ordem_id": {"caminho": "order.id"},
+    "ordem_hash": {"caminho": "order.hash"},
+    "ordem_tipo": {"caminho": "order.type"},
+    "assinatura_id": {"caminho": "subscription_id"},
+}
+
+# Campos das transactions da API Guru (items[0] é o produto principal)
+MAPEAMENTO_TRANSACTION_GURU = {
+    "id_transacao_origem": {"caminho": "payment.marketplace_id"},
+    "status": {"caminho": "status", "padrao": "approved"},
+    "valor": {"caminho": "payment.total", "padrao": 0},
+    "valor_bruto": {"caminho": "payment.gross", "padrao": 0},
+    "valor_liquido": {"caminho": "payment.net", "padrao": 0},
+    "motivo_recusa": {"caminho": "payment.refuse_reason"},
+    "metodo_pagamento": {"caminho": "payment.method"},
+    "data_criacao": {"caminho": "dates.created_at"},
+    "cliente_nome": {"caminho": "contact.name"},
+    "cliente_email": {"caminho": "contact.email"},
+    "cliente_documento": {"caminho": "contact.doc"},
+    "produto_nome": {"caminho": "items[0].name"},
+    "produto_id": {"caminho": "items[0].id"},
+    "produto_internal_id": {"caminho": "items[0].internal_id"},
+    "produto_marketplace_id": {"caminho": "items[0].marketplace_id"},
+    "produto_tipo": {"caminho": "items[0].type"},
+    "oferta_nome": {"caminho": "items[0].offer.name"},
+    "oferta_id": {"caminho": "items[0].offer.id"},
+}
+
+_EXTRAIR_ORDER_TICTO = compilar_mapeamento(MAPEAMENTO_ORDER_TICTO)
+_EXTRAIR_TRANSACTION_GURU = compilar_mapeamento(MAPEAMENTO_TRANSACTION_GURU)
+
 class MapeamentoBackfillTicto:
     """
     Mapeamento de dados históricos da API Ticto para o formato interno do banco
@@ -16,75 +71,66 @@ class MapeamentoBackfillTicto:
         """
         Mapeia dados de order da API Ticto para formato interno
         """
-        transaction = order_data.get("transaction", {})
-        customer = order_data.get("customer", {})
-        product = order_data.get("product", {})
-        order = order_data.get("order", {})
-        order_item = order_data.get("order_item", {})
-        
-        # Converte valores de centavos para reais
-        paid_amount = transaction.get("paid_amount", 0) / 100 if transaction.get("paid_amount") else 0
-        order_item_amount = order_item.get("amount", 0) / 100 if order_item.get("amount") else 0
-        commission = order_data.get("commission", 0) / 100 if order_data.get("commission") else 0
+        c = _EXTRAIR_ORDER_TICTO(order_data)
         
         # Valor líquido é igual à comissão (já descontada a taxa da plataforma)
-        valor_liquido = commission
+        valor_liquido = c["comissao"]
         
         # Determina status baseado na transação
-        status = transaction.get("status", "authorized")
+        status = c["status"]
         
         # Extrai informações de recusa
         tipo_recusa = None
         motivo_recusa = None
         if status == "refused":
-            tipo_recusa = "recusada_primeira_venda" if transaction.get("occurrence", 0) == 1 else "recusada_cobranca_assinatura"
-            motivo_recusa = transaction.get("refused_reason")
+            tipo_recusa = "recusada_primeira_venda" if c["ocorrencia"] == 1 else "recusada_cobranca_assinatura"
+            motivo_recusa = c["motivo_recusa"]
         
         return {
             # Dados da transação
-            "id_transacao_origem": transaction.get("hash"),
+            "id_transacao_origem": c["id_transacao_origem"],
             "status": status,
-            "valor": paid_amount,  # transaction.paid_amount
-            "valor_bruto": order_item_amount,  # order_item.amount
+            "valor": c["valor"],  # transaction.paid_amount
+            "valor_bruto": c["valor_bruto"],  # order_item.amount
             "valor_liquido": valor_liquido,  # commission (valor líquido já descontada a taxa da plataforma)
-            "metodo_pagamento": transaction.get("payment_method"),
+            "metodo_pagamento": c["metodo_pagamento"],
             "motivo_recusa": motivo_recusa,
             "tipo_recusa": tipo_recusa,
-            "data_transacao": transaction.get("updated_at") or order_data.get("updated_at"),
+            "data_transacao": c["data_transacao"],
             
             # Dados do cliente
             "cliente": {
-                "nome": customer.get("name"),
-                "email": customer.get("email"),
-                "documento": customer.get("cpf") or customer.get("cnpj"),
-                "data_criacao": order_data.get("created_at")
+                "nome": c["cliente_nome"],
+                "email": c["cliente_email"],
+                "documento": c["cliente_documento"],
+                "data_criacao": c["data_criacao"]
             },
             
             # Dados do produto
             "produto": {
-                "nome": product.get("name"),
-                "id": product.get("id"),
-                "tipo": product.get("type"),
-                "is_subscription": product.get("is_subscription")
+                "nome": c["produto_nome"],
+                "id": c["produto_id"],
+                "tipo": c["produto_tipo"],
+                "is_subscription": c["produto_assinatura"]
             },
             
             # Dados da oferta
             "oferta": {
-                "nome": order_data.get("offer", {}).get("name"),
-                "id": order_data.get("offer", {}).get("id"),
-                "codigo": order_data.get("offer", {}).get("code")
+                "nome": c["oferta_nome"],
+                "id": c["oferta_id"],
+                "codigo": c["oferta_codigo"]
             },
             
             # Dados da ordem
             "ordem": {
-                "id": order.get("id"),
-                "hash": order.get("hash"),
-                "tipo": order.get("type")
+                "id": c["ordem_id"],
+                "hash": c["ordem_hash"],
+                "tipo": c["ordem_tipo"]
             },
             
             # Dados da assinatura (se aplicável)
             "assinatura": {
-                "id": order_data.get("subscription_id"),
+                "id": c["assinatura_id"],
                 "intervalo": None,  # Orders não têm intervalo
                 "situacao": None
             },
@@ -108,7 +154,7 @@ class MapeamentoBackfillTicto:
         
         # Calcula valores mensais e anuais baseado no ID do produto
         product_id = product.get("id")
-        from utils.helpers import calcular_valores_assinatura_por_tipo
+        from services.catalogo import calcular_valores_assinatura_por_tipo
         
         # Usa a função consolidada para calcular valores corretos
         valor_mensal, valor_anual = calcular_valores_assinatura_por_tipo(price, product_id, "ticto")
@@ -199,28 +245,16 @@ class MapeamentoBackfillGuru:
         """
         Mapeia dados de transaction da API Guru para formato interno
         """
-        contact = transaction_data.get("contact", {})
-        payment = transaction_data.get("payment", {})
-        invoice = transaction_data.get("invoice", {})
-        items = transaction_data.get("items", [])
+        c = _EXTRAIR_TRANSACTION_GURU(transaction_data)
         subscription = transaction_data.get("subscription", {})
-        dates = transaction_data.get("dates", {})
-        
-        # Pega o primeiro item (produto principal)
-        item = items[0] if items else {}
-        
-        # Converte valores
-        valor_total = payment.get("total", 0)
-        valor_bruto = payment.get("gross", 0)
-        valor_liquido = payment.get("net", 0)
         
         # Determina status
-        status = transaction_data.get("status", "approved")
+        status = c["status"]
         
         # Extrai informações de recusa
         motivo_recusa = None
         if status == "refused":
-            motivo_recusa = payment.get("refuse_reason")
+            motivo_recusa = c["motivo_recusa"]
         
         # Converte timestamps para ISO se necessário
         def converter_timestamp(timestamp):
@@ -247,38 +281,38 @@ class MapeamentoBackfillGuru:
         
         return {
             # Dados da transação
-            "id_transacao_origem": payment.get("marketplace_id"),  # Corrigido: usa marketplace_id do payment
+            "id_transacao_origem": c["id_transacao_origem"],  # Corrigido: usa marketplace_id do payment
             "status": status,
-            "valor": valor_total,
-            "valor_bruto": valor_bruto,
-            "valor_liquido": valor_liquido,
-            "metodo_pagamento": payment.get("method"),
+            "valor": c["valor"],
+            "valor_bruto": c["valor_bruto"],
+            "valor_liquido": c["valor_liquido"],
+            "metodo_pagamento": c["metodo_pagamento"],
             "motivo_recusa": motivo_recusa,
-            "data_transacao": converter_timestamp(dates.get("created_at")),
-            "produto_nome": item.get("name") if item else None,
-            "nome_oferta": item.get("offer", {}).get("name") if item and item.get("offer") else None,
+            "data_transacao": converter_timestamp(c["data_criacao"]),
+            "produto_nome": c["produto_nome"],
+            "nome_oferta": c["oferta_nome"],
             
             # Dados do cliente
             "cliente": {
-                "nome": contact.get("name"),
-                "email": contact.get("email"),
-                "documento": contact.get("doc"),
-                "data_criacao": converter_timestamp(dates.get("created_at"))
+                "nome": c["cliente_nome"],
+                "email": c["cliente_email"],
+                "documento": c["cliente_documento"],
+                "data_criacao": converter_timestamp(c["data_criacao"])
             },
             
             # Dados do produto
             "produto": {
-                "nome": item.get("name") if item else None,
-                "id": item.get("id") if item else None,
-                "internal_id": item.get("internal_id") if item else None,
-                "marketplace_id": item.get("marketplace_id") if item else None,  # Adicionado marketplace_id do produto
-                "tipo": item.get("type") if item else None
+                "nome": c["produto_nome"],
+                "id": c["produto_id"],
+                "internal_id": c["produto_internal_id"],
+                "marketplace_id": c["produto_marketplace_id"],  # Adicionado marketplace_id do produto
+                "tipo": c["produto_tipo"]
             },
             
             # Dados da oferta
             "oferta": {
-                "nome": item.get("offer", {}).get("name") if item and item.get("offer") else None,
-                "id": item.get("offer", {}).get("id") if item and item.get("offer") else None
+                "nome": c["oferta_nome"],
+                "id": c["oferta_id"]
             },
             
             # Dados da assinatura (se aplicável)
@@ -321,7 +355,7 @@ class MapeamentoBackfillGuru:
         
         # Calcula valores baseados no ID do produto
         product_id = str(product.get("id", ""))
-        from utils.helpers import calcular_valores_assinatura_por_tipo
+        from services.catalogo import calcular_valores_assinatura_por_tipo
         
         # Usa dados enriquecidos se disponível
         enriched_values = subscription_data.get("enriched_values", {})
@@ -0,0 +1,237 @@
+"""
+Métricas Prometheus do processo da API
+Séries expostas em /metrics (main.py):
+
+- webhooks_processados_total / webhook_duracao_segundos: por plataforma, tipo
+  (status da Ticto, webhook_type da Guru) e status do resultado
+- db_statement_duracao_segundos: statements SQL por handler (o _count do
+  histograma é a contagem de statements)
+- rate_limit_rejeicoes_total: requisições recusadas com 429
+- profundidade de filas/executor: gauges lidos na hora da coleta
+- cache_hits_total / cache_misses_total / cache_hit_ratio: caches TTLCache registrados
+- metrics_calculator_duracao_segundos: tempo por método do MetricsCalculator
+
+Os módulos do projeto são importados com e sem o prefixo "src."; toda métrica
+é criada por _metrica, que reaproveita a já registrada com o mesmo nome em vez
+de levantar "Duplicated timeseries".
+
+Com vários workers (PROMETHEUS_MULTIPROC_DIR definido), contadores e histogramas
+são somados entre os processos pelo modo multiprocess do prometheus_client;
+filas e caches são lidos no worker que atendeu a coleta.
+"""
+
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from utils.ingestion_config import ingestion_config
+
+# Buckets em segundos: de statements rápidos (1 ms) a handlers lentos (10 s)
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Handler a que os statements SQL da thread/tarefa atual são atribuídos
+_handler_atual: contextvars.ContextVar[str] = contextvars.ContextVar("handler_metricas", default="outro")
+
+# Chave em conn.info com os inícios dos statements em execução
+_CHAVE_INICIOS = "metricas_inicios_statements"
+
+
+def _metrica(tipo, nome: str, descricao: str, rotulos=(), **kwargs):
+    existente = REGISTRY._names_to_collectors.get(nome)
+    if existente is not None:
+        return existente
+    return tipo(nome, descricao, rotulos, **kwargs)
+
+
+webhooks_processados = _metrica(
+    Counter, "webhooks_processados_total", "Webhooks processados por plataforma, tipo e status do resultado",
+    ["plataforma", "tipo", "status"],
+)
+webhook_duracao = _metrica(
+    Histogram, "webhook_duracao_segundos", "Duração do processamento de um webhook",
+    ["plataforma", "tipo"], buckets=_BUCKETS,
+)
+db_statement_duracao = _metrica(
+    Histogram, "db_statement_duracao_segundos", "Duração dos statements SQL por handler",
+    ["handler"], buckets=_BUCKETS,
+)
+rate_limit_rejeicoes = _metrica(
+    Counter, "rate_limit_rejeicoes_total", "Requisições recusadas pelo rate limiting", ["endpoint"],
+)
+metrics_calculator_duracao = _metrica(
+    Histogram, "metrics_calculator_duracao_segundos", "Duração dos métodos do MetricsCalculator",
+    ["metodo"], buckets=_BUCKETS,
+)
+
+
+@contextmanager
+def handler_metricas(nome: str) -> Iterator[None]:
+    """Atribui os statements SQL executados no bloco ao handler `nome`"""
+    token = _handler_atual.set(nome)
+    try:
+        yield
+    finally:
+        _handler_atual.reset(token)
+
+
+@contextmanager
+def medir_webhook(plataforma: str, tipo: str, contar: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Mede um webhook: o bloco preenche medicao["status"] com o status do resultado
+    (um bloco que levanta exceção é contado como "excecao").
+    Com contar=False só a duração é registrada (lotes contam evento a evento).
+    """
+    medicao = {"status": "excecao"}
+    inicio = time.perf_counter()
+    try:
+        with handler_metricas(f"{plataforma}.{tipo}"):
+            yield medicao
+    finally:
+        if ingestion_config.METRICS_ENABLED:
+            webhook_duracao.labels(plataforma, tipo).observe(time.perf_counter() - inicio)
+            if contar:
+                webhooks_processados.labels(plataforma, tipo, medicao["status"] or "desconhecido").inc()
+
+
+def contar_webhook(plataforma: str, tipo: str, status: Optional[str]):
+    """Conta um webhook sem medir duração (eventos processados dentro de um lote)"""
+    if ingestion_config.METRICS_ENABLED:
+        webhooks_processados.labels(plataforma, tipo, status or "desconhecido").inc()
+
+
+def contar_rejeicao_rate_limit(endpoint: str):
+    if ingestion_config.METRICS_ENABLED:
+        rate_limit_rejeicoes.labels(endpoint).inc()
+
+
+def registrar_profundidade(fila: str, funcao: Callable[[], float]):
+    """Gauge da fila `fila` lido na coleta (ex.: lambda: executor.profundidade)"""
+    _coletor_processo.registrar_fila(fila, funcao)
+
+
+def instrumentar_engine(engine):
+    """Mede cada statement SQL do engine, atribuído ao handler do contexto atual"""
+    if not ingestion_config.METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(_CHAVE_INICIOS, []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get(_CHAVE_INICIOS)
+        if inicios:
+            db_statement_duracao.labels(_handler_atual.get()).observe(time.perf_counter() - inicios.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _erro(contexto):
+        # Statement que falhou não chega ao after_cursor_execute
+        conexao = contexto.connection
+        if conexao is not None and conexao.info.get(_CHAVE_INICIOS):
+            conexao.info[_CHAVE_INICIOS].pop()
+
+
+def instrumentar_metodos(prefixos=("calculate_", "get_", "_calculate_")):
+    """
+    Decorador de classe: mede os métodos cujo nome começa com um dos prefixos
+    e atribui os statements SQL executados neles a "metrics.<método>".
+    """
+    def decorar(classe):
+        for nome, metodo in list(vars(classe).items()):
+            if callable(metodo) and nome.startswith(prefixos):
+                setattr(classe, nome, _medir_metodo(nome, metodo))
+        return classe
+    return decorar
+
+
+def _medir_metodo(nome: str, metodo: Callable) -> Callable:
+    @functools.wraps(metodo)
+    def medido(*args, **kwargs):
+        if not ingestion_config.METRICS_ENABLED:
+            return metodo(*args, **kwargs)
+        inicio = time.perf_counter()
+        try:
+            with handler_metricas(f"metrics.{nome}"):
+                return metodo(*args, **kwargs)
+        finally:
+            metrics_calculator_duracao.labels(nome).observe(time.perf_counter() - inicio)
+    return medido
+
+
+class _ColetorProcesso:
+    """
+    Valores lidos na coleta a partir do estado do processo: profundidade das
+    filas e hits, misses e hit ratio dos TTLCache registrados.
+    """
+
+    def __init__(self):
+        self.filas: Dict[str, Callable[[], float]] = {}
+        self.caches: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def registrar_fila(self, nome: str, funcao: Callable[[], float]):
+        with self._lock:
+            self.filas[nome] = funcao
+
+    def registrar_cache(self, nome: str, cache):
+        with self._lock:
+            self.caches[nome] = cache
+
+    def describe(self):
+        return [
+            GaugeMetricFamily("fila_profundidade", "Itens em execução ou aguardando por fila/executor", labels=["fila"]),
+            CounterMetricFamily("cache_hits", "Consultas atendidas pelo cache", labels=["cache"]),
+            CounterMetricFamily("cache_misses", "Consultas não atendidas pelo cache", labels=["cache"]),
+            GaugeMetricFamily("cache_hit_ratio", "Fração de consultas atendidas pelo cache", labels=["cache"]),
+            GaugeMetricFamily("cache_itens", "Entradas no cache", labels=["cache"]),
+        ]
+
+    def collect(self):
+        filas, hits, misses, ratio, itens = self.describe()
+        with self._lock:
+            funcoes = list(self.filas.items())
+            caches = list(self.caches.items())
+        for nome, funcao in funcoes:
+            filas.add_metric([nome], funcao())
+        for nome, cache in caches:
+            estatisticas = cache.estatisticas()
+            hits.add_metric([nome], estatisticas["hits"])
+            misses.add_metric([nome], estatisticas["misses"])
+            ratio.add_metric([nome], estatisticas["hit_ratio"])
+            itens.add_metric([nome], estatisticas["itens"])
+        return [filas, hits, misses, ratio, itens]
+
+
+_coletor_processo = REGISTRY._names_to_collectors.get("fila_profundidade")
+if _coletor_processo is None:
+    _coletor_processo = _ColetorProcesso()
+    REGISTRY.register(_coletor_processo)
+
+
+def registrar_cache(nome: str, cache):
+    """Expõe as estatísticas de um TTLCache com o rótulo cache=`nome`"""
+    _coletor_processo.registrar_cache(nome, cache)
+
+
+def modo_multiprocesso() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def resposta_metricas():
+    """(corpo, content-type) no formato de exposição do Prometheus"""
+    if modo_multiprocesso():
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        registro.register(_coletor_processo)
+        return generate_latest(registro), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
@@ -0,0 +1,383 @@
+"""
+Modelos tipados dos payloads de webhook (Guru e Ticto)
+Cada família de evento tem um modelo pydantic, compilado uma vez na importação
+(pydantic-core). A validação roda antes de qualquer sessão de banco ser aberta
+e já entrega os valores convertidos:
+- datas (ISO, "YYYY-MM-DD HH:MM:SS", "DD/MM/YYYY HH:MM:SS", timestamp) -> datetime
+- valores da Ticto em centavos -> reais
+- status da Ticto restritos aos eventos tratados
+Eventos inválidos levantam ValidationError (rejeitados sem tocar no banco).
+O payload original continua sendo arquivado (payloads_transacoes) pelos handlers.
+"""
+
+from datetime import datetime, timezone
+from typing import Annotated, Any, List, Literal, Optional, Union, get_args
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, ValidationError, model_validator
+
+__all__ = [
+    "ValidationError", "converter_data", "STATUS_TICTO",
+    "EventoTicto", "CarrinhoAbandonadoTicto", "EventoEspecialTicto",
+    "TransacaoGuru", "AssinaturaGuru",
+    "validar_evento", "validar_evento_guru", "validar_evento_ticto", "resumir_erros",
+]
+
+
+def converter_data(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, (int, float)):
+        # Timestamp (segundos) - converte para timezone-aware
+        return datetime.fromtimestamp(valor, tz=timezone.utc)
+    if isinstance(valor, str):
+        try:
+            # Tenta converter string ISO - garante timezone-aware
+            if valor.endswith('Z'):
+                valor = valor.replace('Z', '+00:00')
+            elif '+' not in valor and '-' in valor and 'T' in valor:
+                # Assume UTC se não tem timezone
+                valor = valor + '+00:00'
+            return datetime.fromisoformat(valor)
+        except Exception:
+            pass
+        try:
+            # Tenta converter formato brasileiro: 'DD/MM/YYYY HH:MM:SS'
+            dt = datetime.strptime(valor, "%d/%m/%Y %H:%M:%S")
+            # Assume UTC para datas brasileiras
+            return dt.replace(tzinfo=timezone.utc)
+        except Exception:
+            pass
+    return valor
+
+
+def _data(valor: Any) -> Optional[datetime]:
+    # Vazio ou formato desconhecido: None (o evento não é rejeitado por isso)
+    if valor in (None, ""):
+        return None
+    convertido = converter_data(valor)
+    return convertido if isinstance(convertido, datetime) else None
+
+
+def _centavos(valor: Any) -> Optional[float]:
+    if valor in (None, ""):
+        return None
+    if isinstance(valor, bool):
+        raise ValueError("valor em centavos inválido")
+    return float(valor) / 100
+
+
+def _decimal(valor: Any) -> Optional[float]:
+    # Aceita "13.24" e "13,24"; valores ilegíveis viram None
+    if valor in (None, ""):
+        return None
+    try:
+        return float(str(valor).replace(",", "."))
+    except ValueError:
+        return None
+
+
+def _texto(valor: Any) -> Optional[str]:
+    # Ids numéricos viram texto
+    if valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return str(valor)
+    raise ValueError("texto esperado")
+
+
+Data = Annotated[Optional[datetime], BeforeValidator(_data)]
+Reais = Annotated[Optional[float], BeforeValidator(_centavos)]
+Decimal = Annotated[Optional[float], BeforeValidator(_decimal)]
+Texto = Annotated[Optional[str], BeforeValidator(_texto)]
+
+
+class _Modelo(BaseModel):
+    # Campos não modelados são ignorados (continuam no payload arquivado)
+    model_config = ConfigDict(extra="ignore")
+
+
+# ===== Ticto =====
+
+StatusTicto = Literal[
+    "authorized", "refused", "waiting_payment", "pix_created", "pix_expired",
+    "bank_slip_created", "bank_slip_delayed", "refunded", "chargeback",
+    "subscription_canceled", "subscription_delayed", "uncanceled",
+]
+
+# Vendas pontuais que não trazem subscriptions
+STATUS_TICTO_SEM_ASSINATURA = ("refused", "pix_expired", "bank_slip_delayed")
+
+
+class ClienteTicto(_Modelo):
+    name: Optional[str] = None
+    email: Optional[str] = None
+    cpf: Texto = None
+    cnpj: Texto = None
+
+    @property
+    def documento(self) -> Optional[str]:
+        return self.cpf or self.cnpj
+
+
+class PedidoTicto(_Modelo):
+    hash: Optional[str] = None
+    transaction_hash: Optional[str] = None
+    order_date: Data = None
+    paid_amount: Reais = 0.0
+
+
+class ItemTicto(_Modelo):
+    product_id: Optional[int] = None
+    product_name: Optional[str] = None
+    offer_code: Optional[str] = None
+    offer_name: Optional[str] = None
+    amount: Reais = 0.0
+    days_of_access: Optional[int] = None
+
+
+class AssinaturaTicto(_Modelo):
+    id: Texto = None
+    next_charge: Data = None
+    canceled_at: Data = None
+    failed_charges: Optional[int] = 0
+    successful_charges: Optional[int] = 0
+
+
+class TransacaoTicto(_Modelo):
+    hash: Optional[str] = None
+
+
+class ProdutorTicto(_Modelo):
+    cms: Decimal = None
+
+
+class EventoTicto(_Modelo):
+    """Vendas, cobranças, pagamentos (PIX/boleto), reembolsos e eventos de assinatura"""
+    status: StatusTicto
+    status_date: Data = None
+    payment_method: Optional[str] = None
+    order: PedidoTicto
+    customer: ClienteTicto
+    item: ItemTicto = ItemTicto()
+    subscriptions: Annotated[List[AssinaturaTicto], BeforeValidator(lambda valor: valor or [])] = []
+    transaction: Optional[TransacaoTicto] = None
+    producer: Optional[ProdutorTicto] = None
+    # Preenchidos pelo backfill (scripts/backfill_ticto.py)
+    tipo_recusa: Optional[str] = None
+    motivo_recusa: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _exigir_assinatura(self):
+        if self.status not in STATUS_TICTO_SEM_ASSINATURA and "subscriptions" not in self.model_fields_set:
+            raise ValueError("subscriptions é obrigatório para este status")
+        if not self.customer.email:
+            raise ValueError("customer.email é obrigatório")
+        return self
+
+    @property
+    def assinatura(self) -> Optional[AssinaturaTicto]:
+        return self.subscriptions[0] if self.subscriptions else None
+
+    @property
+    def data_evento(self) -> Optional[datetime]:
+        return self.status_date or self.order.order_date
+
+    @property
+    def valor_liquido(self) -> Optional[float]:
+        return self.producer.cms if self.producer else None
+
+
+class CarrinhoAbandonadoTicto(_Modelo):
+    status: Literal["abandoned_cart"]
+    email: str
+    name: Optional[str]
+    product_name: Optional[str]
+    document: Texto = None
+    created_at: Data = None
+
+
+class EventoEspecialTicto(_Modelo):
+    """card_exchanged e claimed: estrutura variável, exige order ou transaction"""
+    status: Literal["card_exchanged", "claimed"]
+    status_date: Data = None
+    payment_method: Optional[str] = None
+    order: Optional[PedidoTicto] = None
+    transaction: Optional[TransacaoTicto] = None
+    customer: ClienteTicto = ClienteTicto()
+    item: ItemTicto = ItemTicto()
+    producer: Optional[ProdutorTicto] = None
+
+    @model_validator(mode="after")
+    def _exigir_identificador(self):
+        if self.order is None and self.transaction is None:
+            raise ValueError("evento deve ter order ou transaction")
+        return self
+
+    @property
+    def hash_transacao(self) -> Optional[str]:
+        return (self.transaction.hash if self.transaction else None) or (
+            self.order.transaction_hash if self.order else None
+        )
+
+    @property
+    def data_evento(self) -> Optional[datetime]:
+        return self.status_date or (self.order.order_date if self.order else None)
+
+    @property
+    def valor_liquido(self) -> Optional[float]:
+        return self.producer.cms if self.producer else None
+
+
+EventoTictoQualquer = Union[EventoTicto, CarrinhoAbandonadoTicto, EventoEspecialTicto]
+
+_MODELOS_TICTO = {
+    "abandoned_cart": CarrinhoAbandonadoTicto,
+    "card_exchanged": EventoEspecialTicto,
+    "claimed": EventoEspecialTicto,
+}
+
+# Todos os status de webhook da Ticto aceitos
+STATUS_TICTO = get_args(StatusTicto) + tuple(_MODELOS_TICTO)
+
+
+# ===== Guru =====
+
+def _assinatura_ou_none(valor: Any) -> Any:
+    # subscription pode vir como dict, lista ou None; só o dict é usado
+    return valor if isinstance(valor, dict) else None
+
+
+class OfertaGuru(_Modelo):
+    name: Optional[str] = None
+
+
+class ProdutoGuru(_Modelo):
+    id: Texto = None
+    name: Optional[str] = None
+    offer: Optional[OfertaGuru] = None
+
+    @property
+    def nome_oferta(self) -> Optional[str]:
+        return self.offer.name if self.offer else None
+
+
+class ContatoGuru(_Modelo):
+    name: Optional[str] = None
+    email: str
+    doc: Texto = None
+
+
+class PagamentoGuru(_Modelo):
+    marketplace_id: Texto = None
+    method: Optional[str] = None
+    total: Optional[float] = None
+    net: Optional[float] = None
+    marketplace_value: Optional[float] = None
+    refuse_reason: Optional[str] = None
+    refund_reason: Optional[str] = None
+
+
+class DatasTransacaoGuru(_Modelo):
+    created_at: Data = None
+    confirmed_at: Data = None
+
+
+class AssinaturaRefGuru(_Modelo):
+    id: Texto = None
+    subscription_code: Optional[str] = None
+    charged_every_days: Optional[int] = None
+    started_at: Data = None
+
+
+class TransacaoGuru(_Modelo):
+    """Webhook de transação (webhook_type "transaction")"""
+    webhook_type: Literal["transaction"] = "transaction"
+    id: Texto = None
+    # Status da Guru não são restritos: novos status são gravados como vierem
+    status: str
+    contact: ContatoGuru
+    payment: PagamentoGuru
+    dates: DatasTransacaoGuru = DatasTransacaoGuru()
+    product: ProdutoGuru = ProdutoGuru()
+    subscription: Annotated[Optional[AssinaturaRefGuru], BeforeValidator(_assinatura_ou_none)]
+    is_order_bump: Optional[int] = 0
+
+
+class AssinanteGuru(_Modelo):
+    name: Optional[str] = None
+    email: Optional[str] = None
+    doc: Texto = None
+    created_at: Data = None
+
+
+class FaturaGuru(_Modelo):
+    status: Optional[str] = None
+    value: Optional[float] = None
+
+
+class DatasAssinaturaGuru(_Modelo):
+    started_at: Data = None
+    next_cycle_at: Data = None
+    canceled_at: Data = None
+    last_status_at: Data = None
+    cycle_end_date: Data = None
+
+
+class UltimaTransacaoGuru(_Modelo):
+    product: ProdutoGuru = ProdutoGuru()
+
+
+class AssinaturaGuru(_Modelo):
+    """Webhook de assinatura (webhook_type "subscription")"""
+    webhook_type: Literal["subscription"]
+    id: Texto
+    subscription_code: Optional[str] = None
+    name: Optional[str] = None
+    last_status: str
+    subscriber: AssinanteGuru
+    product: ProdutoGuru = ProdutoGuru()
+    current_invoice: FaturaGuru = FaturaGuru()
+    last_transaction: UltimaTransacaoGuru = UltimaTransacaoGuru()
+    cancel_at_cycle_end: Optional[int] = 0
+    cancel_reason: Optional[str] = None
+    dates: DatasAssinaturaGuru = DatasAssinaturaGuru()
+
+    @model_validator(mode="after")
+    def _exigir_identificacao(self):
+        if not self.id or not self.last_status:
+            raise ValueError("id e last_status são obrigatórios")
+        return self
+
+
+# ===== Entrada =====
+
+def validar_evento_ticto(payload: dict) -> EventoTictoQualquer:
+    """Valida e converte um webhook da Ticto (levanta ValidationError)"""
+    status = payload.get("status") if isinstance(payload, dict) else None
+    return _MODELOS_TICTO.get(status, EventoTicto).model_validate(payload)
+
+
+def validar_evento_guru(payload: dict) -> Union[TransacaoGuru, AssinaturaGuru]:
+    """Valida e converte um webhook da Guru, aninhado ou não (levanta ValidationError)"""
+    if isinstance(payload, dict) and "payload" in payload:
+        payload = payload["payload"]
+    if isinstance(payload, dict) and payload.get("webhook_type") == "subscription":
+        return AssinaturaGuru.model_validate(payload)
+    return TransacaoGuru.model_validate(payload)
+
+
+def validar_evento(plataforma: str, payload: dict):
+    if plataforma == "guru":
+        return validar_evento_guru(payload)
+    return validar_evento_ticto(payload)
+
+
+def resumir_erros(erro: ValidationError, limite: int = 3) -> str:
+    """Resumo curto dos erros de validação, para logs e respostas"""
+    partes = [
+        f"{'.'.join(str(parte) for parte in item['loc']) or 'payload'}: {item['msg']}"
+        for item in erro.errors()[:limite]
+    ]
+    return "; ".join(partes)
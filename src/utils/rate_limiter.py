@@ -0,0 +1,134 @@
+"""
+Rate limiting por chave (ex.: IP) com contadores de janela fixa
+Cada verificação é O(1): um contador por (chave, janela), sem listas de timestamps.
+
+Backends:
+- "memory" (padrão): contadores no processo, com descarte de chaves ociosas
+- "redis": contadores compartilhados entre workers/processos (INCR + EXPIRE)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from .logging_ingestao import obter_logger
+from .security_config import security_config
+
+log = obter_logger("rate_limiter")
+
+# (duração da janela em segundos, limite de requisições na janela)
+Limite = Tuple[int, int]
+
+
+class MemoriaBackend:
+    """
+    Contadores em memória. Chaves sem acesso há mais de `ttl_ocioso` segundos
+    são descartadas e o total de chaves é limitado a `max_chaves` (LRU).
+    """
+
+    def __init__(self, max_chaves: int = 100000, ttl_ocioso: float = 3600):
+        self.max_chaves = max_chaves
+        self.ttl_ocioso = ttl_ocioso
+        # (chave, janela) -> [índice da janela, contagem, último acesso]
+        self._contadores: "OrderedDict[tuple, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def incrementar(self, chave: str, janelas: Iterable[int], custo: int = 1) -> List[int]:
+        agora = time.time()
+        contagens = []
+        with self._lock:
+            for janela in janelas:
+                indice = int(agora // janela)
+                id_contador = (chave, janela)
+                contador = self._contadores.get(id_contador)
+                if contador is None or contador[0] != indice:
+                    contador = [indice, 0, agora]
+                    self._contadores[id_contador] = contador
+                contador[1] += custo
+                contador[2] = agora
+                self._contadores.move_to_end(id_contador)
+                contagens.append(contador[1])
+            self._descartar_ociosos(agora)
+        return contagens
+
+    def _descartar_ociosos(self, agora: float):
+        # Ordem de acesso: os mais antigos ficam no início (custo amortizado O(1))
+        while self._contadores:
+            id_contador, contador = next(iter(self._contadores.items()))
+            if len(self._contadores) <= self.max_chaves and agora - contador[2] < self.ttl_ocioso:
+                break
+            self._contadores.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._contadores)
+
+
+class RedisBackend:
+    """
+    Contadores compartilhados em um Redis (ou qualquer cliente com a mesma
+    interface de pipeline/incr/expire). A chave expira junto com a janela.
+    """
+
+    def __init__(self, cliente=None, url: str = None, prefixo: str = "rate_limit"):
+        if cliente is None:
+            import redis  # dependência opcional, só necessária com RATE_LIMIT_BACKEND=redis
+            cliente = redis.Redis.from_url(url or security_config.RATE_LIMIT_REDIS_URL)
+        self.cliente = cliente
+        self.prefixo = prefixo
+
+    def incrementar(self, chave: str, janelas: Iterable[int], custo: int = 1) -> List[int]:
+        agora = time.time()
+        pipe = self.cliente.pipeline()
+        for janela in janelas:
+            id_contador = f"{self.prefixo}:{chave}:{janela}:{int(agora // janela)}"
+            pipe.incr(id_contador, custo)
+            pipe.expire(id_contador, janela)
+        resultados = pipe.execute()
+        # incr e expire alternados: os contadores estão nas posições pares
+        return [int(valor) for valor in resultados[0::2]]
+
+    def __len__(self) -> int:
+        return 0
+
+
+class RateLimiter:
+    """
+    Permite uma requisição se nenhuma das janelas excedeu o seu limite.
+    `custo` é o número de unidades cobradas (ex.: eventos de um lote).
+    Falhas do backend compartilhado não bloqueiam requisições (fail-open).
+    """
+
+    def __init__(self, backend=None, limites: Optional[List[Limite]] = None):
+        self.backend = backend if backend is not None else MemoriaBackend()
+        self.limites = limites or [
+            (60, security_config.RATE_LIMIT_PER_MINUTE),
+            (3600, security_config.RATE_LIMIT_PER_HOUR),
+        ]
+
+    def permitir(self, chave: str, limites: Optional[List[Limite]] = None, custo: int = 1) -> bool:
+        limites = [(janela, limite) for janela, limite in (limites or self.limites) if limite and limite > 0]
+        if not limites:
+            return True
+        try:
+            contagens = self.backend.incrementar(chave, [janela for janela, _ in limites], custo)
+        except Exception as e:
+            log.error("[RATE_LIMIT] Falha no backend de rate limiting: %s", e)
+            return True
+        return all(contagem <= limite for contagem, (_, limite) in zip(contagens, limites))
+
+
+def criar_backend():
+    """
+    Backend configurado em RATE_LIMIT_BACKEND ("memory" ou "redis").
+    """
+    if security_config.RATE_LIMIT_BACKEND == "redis":
+        try:
+            return RedisBackend()
+        except Exception as e:
+            log.error("[RATE_LIMIT] Redis indisponível, usando contadores em memória: %s", e)
+    return MemoriaBackend(max_chaves=security_config.RATE_LIMIT_MAX_KEYS)
+
+
+# Instância global (compartilhada pelos middlewares do processo)
+rate_limiter = RateLimiter(criar_backend())
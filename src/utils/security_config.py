@@ -23,6 +23,10 @@ class SecurityConfig:
     # Configurações de rate limiting
     RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
     RATE_LIMIT_PER_HOUR = int(os.getenv("RATE_LIMIT_PER_HOUR", "1000"))
+    # Backend dos contadores: "memory" (por processo) ou "redis" (compartilhado entre workers)
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+    RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://redis:6379/0")
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
     
     # Configurações de segurança
     ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "localhost").split(",")
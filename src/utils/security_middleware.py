@@ -3,251 +3,252 @@ Middlewares de segurança para autenticação de webhooks
 Implementa validação de tokens, rate limiting e logs de segurança
 """
 
-import time
-import json
+import logging
+from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
 from .security_config import security_config
+from .logging_ingestao import obter_logger
+from .rate_limiter import rate_limiter
+from .ingestion_config import ingestion_config
+# Mesmo módulo usado pelo engine (database.connection), que importa sem prefixo "src."
+from utils.json_codec import ler_corpo
+from utils.metricas_prometheus import contar_rejeicao_rate_limit
 
-class SecurityMiddleware:
+log = obter_logger("security")
+
+class SecurityMiddleware(ABC):
     """Classe base para middlewares de segurança"""
     
-    def __init__(self):
-        self.request_counts = {}  # Para rate limiting
-    
-    def log_security_event(self, event_type: str, details: Dict[str, Any], request: Request):
+    def log_security_event(self, event_type: str, details: Dict[str, Any], request: Request, nivel: int = logging.WARNING):
         """
-        Registra eventos de segurança
+        Registra eventos de segurança (rejeições em WARNING, autenticações em INFO)
         """
         client_ip = request.client.host if request.client else "unknown"
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
         
-        log_entry = {
-            "timestamp": timestamp,
+        # Registro de uma linha, enfileirado (não bloqueia o event loop escrevendo em stdout)
+        log.log(nivel, "[SECURITY] %s", event_type, extra={"campos": {
             "event_type": event_type,
             "client_ip": client_ip,
             "endpoint": str(request.url.path),
             "method": request.method,
             "details": details
-        }
-        
-        print(f"[SECURITY] {json.dumps(log_entry, indent=2)}")
+        }})
     
-    def check_rate_limit(self, request: Request, limit_per_minute: int = 60) -> bool:
+    def check_rate_limit(self, request: Request, limit_per_minute: int = None, limit_per_hour: int = None, custo: int = 1) -> bool:
         """
-        Verifica rate limiting por IP
+        Verifica rate limiting por IP (limites por minuto e por hora).
+        `custo` é o número de eventos cobrados.
         """
         client_ip = request.client.host if request.client else "unknown"
-        current_time = time.time()
-        
-        # Inicializa contador para o IP
-        if client_ip not in self.request_counts:
-            self.request_counts[client_ip] = []
-        
-        # Remove requisições antigas (mais de 1 minuto)
-        self.request_counts[client_ip] = [
-            req_time for req_time in self.request_counts[client_ip]
-            if current_time - req_time < 60
-        ]
+        return rate_limiter.permitir(client_ip, [
+            (60, limit_per_minute or security_config.RATE_LIMIT_PER_MINUTE),
+            (3600, limit_per_hour or security_config.RATE_LIMIT_PER_HOUR),
+        ], custo)
+    
+    def verificar_rate_limit(self, request: Request, custo: int = 1):
+        """
+        Cobra `custo` eventos do limite do IP; levanta 429 se algum limite for excedido
+        """
+        if not self.check_rate_limit(request, security_config.RATE_LIMIT_PER_MINUTE, security_config.RATE_LIMIT_PER_HOUR, custo):
+            self.log_security_event("RATE_LIMIT_EXCEEDED", {
+                "client_ip": request.client.host if request.client else "unknown",
+                "eventos": custo
+            }, request)
+            contar_rejeicao_rate_limit(str(request.url.path))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded. Too many requests."
+            )
+    
+    async def ler_corpo_json(self, request: Request) -> Any:
+        """
+        Rate limiting, leitura e parse único do corpo da requisição
+        """
+        # Verifica rate limiting (a requisição conta como um evento)
+        self.verificar_rate_limit(request)
         
-        # Verifica se excedeu o limite
-        if len(self.request_counts[client_ip]) >= limit_per_minute:
-            return False
+        # Lê o corpo da requisição
+        body = await request.body()
+        if not body:
+            self.log_security_event("EMPTY_PAYLOAD", {}, request)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Empty payload"
+            )
         
-        # Adiciona requisição atual
-        self.request_counts[client_ip].append(current_time)
-        return True
-
-class GuruWebhookMiddleware(SecurityMiddleware):
-    """
-    Middleware de autenticação para webhooks da Guru
-    Valida o token no campo payload.api_token
-    """
+        # Parse do JSON
+        try:
+            return ler_corpo(body)
+        except ValueError:
+            self.log_security_event("INVALID_JSON", {}, request)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid JSON payload"
+            )
+    
+    @abstractmethod
+    def validar_evento(self, payload: Any, request: Request, indice: Optional[int] = None):
+        """
+        Valida estrutura e token de um evento (implementado por plataforma).
+        `indice` identifica o evento dentro de um lote nas mensagens de erro.
+        """
+    
+    def _erro(self, status_code: int, detail: str, indice: Optional[int]) -> HTTPException:
+        if indice is not None:
+            detail = f"Event {indice}: {detail}"
+        return HTTPException(status_code=status_code, detail=detail)
+    
+    @abstractmethod
+    def log_sucesso(self, payload: Any, request: Request):
+        """Registra a autenticação bem-sucedida de um evento"""
     
     async def __call__(self, request: Request):
         """
-        Valida webhook da Guru antes do processamento
+        Valida o webhook antes do processamento
         """
         try:
-            # Verifica rate limiting
-            if not self.check_rate_limit(request, security_config.RATE_LIMIT_PER_MINUTE):
-                self.log_security_event("RATE_LIMIT_EXCEEDED", {
-                    "client_ip": request.client.host if request.client else "unknown"
-                }, request)
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="Rate limit exceeded. Too many requests."
-                )
-            
-            # Lê o corpo da requisição
-            body = await request.body()
-            if not body:
-                self.log_security_event("EMPTY_PAYLOAD", {}, request)
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Empty payload"
-                )
-            
-            # Parse do JSON
-            try:
-                payload = json.loads(body)
-            except json.JSONDecodeError:
-                self.log_security_event("INVALID_JSON", {}, request)
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid JSON payload"
-                )
-            
-            # Valida estrutura do payload
-            if "payload" not in payload:
-                self.log_security_event("INVALID_PAYLOAD_STRUCTURE", {
-                    "payload_keys": list(payload.keys())
-                }, request)
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid payload structure. Missing 'payload' field."
-                )
-            
-            # Extrai token do payload
-            api_token = payload.get("payload", {}).get("api_token")
-            if not api_token:
-                self.log_security_event("MISSING_API_TOKEN", {
-                    "payload_keys": list(payload.get("payload", {}).keys())
-                }, request)
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Missing API token in payload"
-                )
-            
-            # Valida token
-            if not security_config.validate_guru_token(api_token):
-                self.log_security_event("INVALID_GURU_TOKEN", {
-                    "provided_token": api_token[:10] + "..." if len(api_token) > 10 else api_token
-                }, request)
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid API token"
-                )
+            payload = await self.ler_corpo_json(request)
+            self.validar_evento(payload, request)
             
             # Log de sucesso
-            self.log_security_event("GURU_WEBHOOK_AUTHENTICATED", {
-                "token_valid": True,
-                "payload_type": payload.get("webhook_type", "unknown")
-            }, request)
+            self.log_sucesso(payload, request)
             
             # Adiciona payload validado ao request para uso posterior
             request.state.validated_payload = payload
             return None
-            
+        
         except HTTPException:
             # Re-raise HTTP exceptions
             raise
         except Exception as e:
-            # Log de erro inesperado
-            self.log_security_event("AUTHENTICATION_ERROR", {
-                "error": str(e),
-                "error_type": type(e).__name__
-            }, request)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Internal authentication error"
-            )
-
-class TictoWebhookMiddleware(SecurityMiddleware):
-    """
-    Middleware de autenticação para webhooks da Ticto
-    Valida o token no campo raiz 'token'
-    """
+            self._erro_inesperado(e, request)
     
-    async def __call__(self, request: Request):
+    async def validar_lote(self, request: Request):
         """
-        Valida webhook da Ticto antes do processamento
+        Valida um lote de webhooks (array JSON): todos os eventos precisam
+        passar pelas mesmas regras de token do endpoint individual.
         """
         try:
-            # Verifica rate limiting
-            if not self.check_rate_limit(request, security_config.RATE_LIMIT_PER_MINUTE):
-                self.log_security_event("RATE_LIMIT_EXCEEDED", {
-                    "client_ip": request.client.host if request.client else "unknown"
-                }, request)
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="Rate limit exceeded. Too many requests."
-                )
-            
-            # Lê o corpo da requisição
-            body = await request.body()
-            if not body:
-                self.log_security_event("EMPTY_PAYLOAD", {}, request)
+            eventos = await self.ler_corpo_json(request)
+            if not isinstance(eventos, list) or not eventos:
+                self.log_security_event("INVALID_BATCH_STRUCTURE", {}, request)
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Empty payload"
+                    detail="Invalid batch payload. Expected a non-empty JSON array of events."
                 )
-            
-            # Parse do JSON
-            try:
-                payload = json.loads(body)
-            except json.JSONDecodeError:
-                self.log_security_event("INVALID_JSON", {}, request)
+            if len(eventos) > ingestion_config.BATCH_MAX_EVENTS:
+                self.log_security_event("BATCH_TOO_LARGE", {"eventos": len(eventos)}, request)
                 raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid JSON payload"
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Batch too large. Maximum {ingestion_config.BATCH_MAX_EVENTS} events."
                 )
+            # A leitura já cobrou um evento; os demais do lote são cobrados aqui
+            if len(eventos) > 1:
+                self.verificar_rate_limit(request, len(eventos) - 1)
+            for indice, payload in enumerate(eventos):
+                self.validar_evento(payload, request, indice)
             
-            # Valida estrutura do payload
-            if "token" not in payload:
-                self.log_security_event("INVALID_PAYLOAD_STRUCTURE", {
-                    "payload_keys": list(payload.keys())
-                }, request)
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid payload structure. Missing 'token' field."
-                )
-            
-            # Extrai token do payload
-            webhook_token = payload.get("token")
-            if not webhook_token:
-                self.log_security_event("MISSING_TOKEN", {
-                    "payload_keys": list(payload.keys())
-                }, request)
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Missing token in payload"
-                )
-            
-            # Valida token
-            if not security_config.validate_ticto_token(webhook_token):
-                self.log_security_event("INVALID_TICTO_TOKEN", {
-                    "provided_token": webhook_token[:10] + "..." if len(webhook_token) > 10 else webhook_token
-                }, request)
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid webhook token"
-                )
-            
-            # Log de sucesso
-            self.log_security_event("TICTO_WEBHOOK_AUTHENTICATED", {
+            self.log_security_event("WEBHOOK_BATCH_AUTHENTICATED", {
                 "token_valid": True,
-                "status": payload.get("status", "unknown")
-            }, request)
+                "eventos": len(eventos)
+            }, request, logging.INFO)
             
-            # Adiciona payload validado ao request para uso posterior
-            request.state.validated_payload = payload
+            request.state.validated_payloads = eventos
             return None
-            
+        
         except HTTPException:
-            # Re-raise HTTP exceptions
             raise
         except Exception as e:
-            # Log de erro inesperado
-            self.log_security_event("AUTHENTICATION_ERROR", {
-                "error": str(e),
-                "error_type": type(e).__name__
+            self._erro_inesperado(e, request)
+    
+    def _erro_inesperado(self, e: Exception, request: Request):
+        # Log de erro inesperado
+        self.log_security_event("AUTHENTICATION_ERROR", {
+            "error": str(e),
+            "error_type": type(e).__name__
+        }, request)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal authentication error"
+        )
+
+class GuruWebhookMiddleware(SecurityMiddleware):
+    """
+    Middleware de autenticação para webhooks da Guru
+    Valida o token no campo payload.api_token
+    """
+    
+    def validar_evento(self, payload: Any, request: Request, indice: Optional[int] = None):
+        # Valida estrutura do payload
+        if not isinstance(payload, dict) or "payload" not in payload:
+            self.log_security_event("INVALID_PAYLOAD_STRUCTURE", {
+                "payload_keys": list(payload.keys()) if isinstance(payload, dict) else [],
+                "indice": indice
             }, request)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Internal authentication error"
-            )
+            raise self._erro(status.HTTP_400_BAD_REQUEST, "Invalid payload structure. Missing 'payload' field.", indice)
+        
+        # Extrai token do payload
+        api_token = payload.get("payload", {}).get("api_token")
+        if not api_token:
+            self.log_security_event("MISSING_API_TOKEN", {
+                "payload_keys": list(payload.get("payload", {}).keys()),
+                "indice": indice
+            }, request)
+            raise self._erro(status.HTTP_401_UNAUTHORIZED, "Missing API token in payload", indice)
+        
+        # Valida token
+        if not security_config.validate_guru_token(api_token):
+            self.log_security_event("INVALID_GURU_TOKEN", {
+                "provided_token": api_token[:10] + "..." if len(api_token) > 10 else api_token,
+                "indice": indice
+            }, request)
+            raise self._erro(status.HTTP_401_UNAUTHORIZED, "Invalid API token", indice)
+    
+    def log_sucesso(self, payload: Any, request: Request):
+        self.log_security_event("GURU_WEBHOOK_AUTHENTICATED", {
+            "token_valid": True,
+            "payload_type": payload.get("webhook_type", "unknown")
+        }, request, logging.INFO)
+
+class TictoWebhookMiddleware(SecurityMiddleware):
+    """
+    Middleware de autenticação para webhooks da Ticto
+    Valida o token no campo raiz 'token'
+    """
+    
+    def validar_evento(self, payload: Any, request: Request, indice: Optional[int] = None):
+        # Valida estrutura do payload
+        if not isinstance(payload, dict) or "token" not in payload:
+            self.log_security_event("INVALID_PAYLOAD_STRUCTURE", {
+                "payload_keys": list(payload.keys()) if isinstance(payload, dict) else [],
+                "indice": indice
+            }, request)
+            raise self._erro(status.HTTP_400_BAD_REQUEST, "Invalid payload structure. Missing 'token' field.", indice)
+        
+        # Extrai token do payload
+        webhook_token = payload.get("token")
+        if not webhook_token:
+            self.log_security_event("MISSING_TOKEN", {
+                "payload_keys": list(payload.keys()),
+                "indice": indice
+            }, request)
+            raise self._erro(status.HTTP_401_UNAUTHORIZED, "Missing token in payload", indice)
+        
+        # Valida token
+        if not security_config.validate_ticto_token(webhook_token):
+            self.log_security_event("INVALID_TICTO_TOKEN", {
+                "provided_token": webhook_token[:10] + "..." if len(webhook_token) > 10 else webhook_token,
+                "indice": indice
+            }, request)
+            raise self._erro(status.HTTP_401_UNAUTHORIZED, "Invalid webhook token", indice)
+    
+    def log_sucesso(self, payload: Any, request: Request):
+        self.log_security_event("TICTO_WEBHOOK_AUTHENTICATED", {
+            "token_valid": True,
+            "status": payload.get("status", "unknown")
+        }, request, logging.INFO)
 
 # Instâncias dos middlewares
 guru_webhook_middleware = GuruWebhookMiddleware()
@@ -0,0 +1,53 @@
+"""
+Configurações dos processos servidores
+API (uvicorn) e dashboard (gunicorn) rodam em processos separados, cada um
+com os seus workers; os dois leem as mesmas variáveis de ambiente.
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Carrega variáveis de ambiente
+load_dotenv()
+
+class ServidorConfig:
+    """Configurações de processo centralizadas"""
+
+    # API FastAPI (webhooks, autenticação, /metrics) sob uvicorn
+    API_HOST = os.getenv("API_HOST", "0.0.0.0")
+    API_PORT = int(os.getenv("API_PORT", "8000"))
+    API_WORKERS = int(os.getenv("API_WORKERS", "2"))
+
+    # Dashboard Dash (Flask) sob gunicorn com workers de threads
+    DASHBOARD_HOST = os.getenv("DASHBOARD_HOST", "0.0.0.0")
+    DASHBOARD_PORT = int(os.getenv("DASHBOARD_PORT", "8052"))
+    DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", "2"))
+    DASHBOARD_THREADS = int(os.getenv("DASHBOARD_THREADS", "4"))
+    # Callbacks mais lentos que isso têm o worker reiniciado
+    DASHBOARD_TIMEOUT = int(os.getenv("DASHBOARD_TIMEOUT_SECONDS", "120"))
+
+    # Tempo para requisições em andamento terminarem no desligamento (SIGTERM)
+    GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+
+    # Diretório das métricas Prometheus compartilhadas entre workers
+    # (um subdiretório por processo servidor)
+    METRICS_DIR = os.getenv("PROMETHEUS_METRICS_DIR", "/tmp/dashboard_comu_metrics")
+
+    @classmethod
+    def preparar_metricas(cls, processo: str) -> str:
+        """
+        Ativa o modo multiprocess do prometheus_client para os workers de `processo`.
+        Chamado pelo processo pai antes de criar os workers (e antes de qualquer
+        import de prometheus_client neles); limpa os arquivos de uma execução
+        anterior, que somariam contagens antigas.
+        """
+        diretorio = os.path.join(cls.METRICS_DIR, processo)
+        os.makedirs(diretorio, exist_ok=True)
+        for nome in os.listdir(diretorio):
+            if nome.endswith(".db"):
+                os.remove(os.path.join(diretorio, nome))
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = diretorio
+        return diretorio
+
+# Instância global da configuração
+servidor_config = ServidorConfig()
@@ -0,0 +1,22 @@
+"""
+Configuração dos testes unitários
+Os módulos de src/ usam imports sem prefixo (como na API, com PYTHONPATH=src);
+os testes não abrem conexão com o banco.
+"""
+
+import json
+import os
+import sys
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..', '..')
+sys.path.insert(0, os.path.join(RAIZ, 'src'))
+
+PASTA_EXEMPLOS = os.path.join(RAIZ, 'Jsons (exemplos)')
+
+
+def carregar_exemplo(plataforma: str, nome: str) -> dict:
+    """Payload de um webhook de exemplo (sem o envelope de entrega da Guru)"""
+    pasta = "Guru" if plataforma == "guru" else "Ticto"
+    with open(os.path.join(PASTA_EXEMPLOS, pasta, f"{nome}.json"), encoding="utf-8") as arquivo:
+        dados = json.load(arquivo)
+    return dados.get("payload", dados)
@@ -0,0 +1,51 @@
+"""
+Testes do registro de produtos/ofertas no catálogo (services/catalogo.py)
+A sessão usa SQLite só para ter transações e savepoints reais; o INSERT do
+PostgreSQL é substituído.
+"""
+
+import pytest
+from sqlalchemy import create_engine
+
+from database.connection import SessionLocal
+from services import catalogo as modulo
+from services.catalogo import catalogo
+
+
+@pytest.fixture
+def sessao(monkeypatch):
+    ids = iter(range(100, 200))
+    monkeypatch.setattr(modulo, "_registrar_linha", lambda session, sql, parametros: (next(ids), None))
+    monkeypatch.setattr(catalogo, "recarregar_se_necessario", lambda: None)
+    monkeypatch.setattr(catalogo, "_produtos", {})
+    monkeypatch.setattr(catalogo, "_ofertas", {})
+    session = SessionLocal(bind=create_engine("sqlite://"))
+    yield session
+    session.close()
+
+
+def test_registro_entra_no_catalogo_apos_o_commit(sessao):
+    ids = catalogo.registrar(sessao, "ticto", 123, "Comunidade", "OF1", "Anual")
+    assert ids == {"produto_id": 100, "oferta_id": 101}
+    assert catalogo.produto("ticto", 123) is None
+    sessao.commit()
+    assert catalogo.produto("ticto", 123) == (100, None)
+    assert catalogo.oferta("ticto", "OF1") == (101, None)
+
+
+def test_rollback_descarta_o_registro(sessao):
+    catalogo.registrar(sessao, "ticto", 123, "Comunidade")
+    sessao.rollback()
+    sessao.commit()
+    assert catalogo.produto("ticto", 123) is None
+
+
+def test_savepoint_desfeito_descarta_apenas_o_seu_registro(sessao):
+    catalogo.registrar(sessao, "guru", "p1", "Produto 1")
+    with pytest.raises(RuntimeError):
+        with sessao.begin_nested():
+            catalogo.registrar(sessao, "guru", "p2", "Produto 2")
+            raise RuntimeError("evento do lote com erro")
+    sessao.commit()
+    assert catalogo.produto("guru", "p1") == (100, None)
+    assert catalogo.produto("guru", "p2") is None
@@ -0,0 +1,57 @@
+"""
+Testes do fingerprint de idempotência (services/idempotencia.py)
+"""
+
+import copy
+
+from conftest import carregar_exemplo
+from services.idempotencia import calcular_fingerprint
+
+
+def test_reentrega_tem_o_mesmo_fingerprint():
+    """O mesmo evento reenviado (cópia do corpo) gera o mesmo fingerprint"""
+    payload = carregar_exemplo("ticto", "Webhook - Ticto (Venda Realizada) (Anual)")
+    assert calcular_fingerprint("ticto", payload) == calcular_fingerprint("ticto", copy.deepcopy(payload))
+
+
+def test_assinatura_guru_cancelada_difere_do_pagamento():
+    """
+    Cancelamento agendado chega com o mesmo id, last_status e last_status_at
+    do pagamento: o fingerprint precisa diferir para o evento não ser descartado
+    """
+    pagamento = carregar_exemplo("guru", "Webhook Assinatura - Guru (Pagamento Realizado)")
+    cancelamento = carregar_exemplo("guru", "Webhook Assinatura - Guru (Assinatura Cancelada)")
+    assert pagamento["id"] == cancelamento["id"]
+    assert pagamento["last_status"] == cancelamento["last_status"]
+    assert pagamento["dates"]["last_status_at"] == cancelamento["dates"]["last_status_at"]
+    assert calcular_fingerprint("guru", pagamento) != calcular_fingerprint("guru", cancelamento)
+
+
+def test_assinatura_guru_fatura_pendente_difere():
+    """A fatura aguardando pagamento muda o status gravado da assinatura"""
+    pagamento = carregar_exemplo("guru", "Webhook Assinatura - Guru (Pagamento Realizado)")
+    pendente = copy.deepcopy(pagamento)
+    pendente["current_invoice"]["status"] = "waiting_payment"
+    assert calcular_fingerprint("guru", pagamento) != calcular_fingerprint("guru", pendente)
+
+
+def test_order_bump_ticto_difere_da_venda_principal():
+    """Order bumps compartilham o hash da transação principal"""
+    venda = carregar_exemplo("ticto", "Webhook - Ticto (Venda Autorizada) (G)")
+    bump = copy.deepcopy(venda)
+    bump["item"]["product_name"] = "Produto do order bump"
+    assert calcular_fingerprint("ticto", venda) != calcular_fingerprint("ticto", bump)
+
+
+def test_status_diferente_gera_fingerprint_diferente():
+    venda = carregar_exemplo("guru", "Webhook Transação - Guru (Venda Realizada)")
+    reembolso = copy.deepcopy(venda)
+    reembolso["status"] = "refunded"
+    assert calcular_fingerprint("guru", venda) != calcular_fingerprint("guru", reembolso)
+
+
+def test_sem_campos_chave_usa_o_corpo_canonico():
+    """Sem id/status/data, o fingerprint é o hash do corpo (independe da ordem das chaves)"""
+    assert calcular_fingerprint("ticto", {"b": 1, "a": 2}) == calcular_fingerprint("ticto", {"a": 2, "b": 1})
+    assert calcular_fingerprint("ticto", {"a": 1}) != calcular_fingerprint("ticto", {"a": 2})
+    assert calcular_fingerprint("ticto", {"a": 1}) != calcular_fingerprint("guru", {"a": 1})
@@ -0,0 +1,156 @@
+"""
+Testes dos modelos tipados de payload (utils/modelos_payload.py)
+"""
+
+import copy
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from conftest import PASTA_EXEMPLOS, carregar_exemplo
+from utils.modelos_payload import (
+    AssinaturaGuru, CarrinhoAbandonadoTicto, EventoEspecialTicto, EventoTicto, TransacaoGuru,
+    ValidationError, resumir_erros, validar_evento, validar_evento_guru, validar_evento_ticto,
+)
+from utils.validators import validar_payload_guru, validar_payload_ticto
+
+
+def _exemplos(plataforma: str):
+    pasta = "Guru" if plataforma == "guru" else "Ticto"
+    return sorted(nome[:-5] for nome in os.listdir(os.path.join(PASTA_EXEMPLOS, pasta)) if nome.endswith(".json"))
+
+
+# ===== Aceitos =====
+
+@pytest.mark.parametrize("plataforma,nome", [
+    (plataforma, nome) for plataforma in ("guru", "ticto") for nome in _exemplos(plataforma)
+])
+def test_exemplos_sao_aceitos(plataforma, nome):
+    """Todos os webhooks de exemplo passam pela validação"""
+    assert validar_evento(plataforma, carregar_exemplo(plataforma, nome)) is not None
+
+
+@pytest.mark.parametrize("nome,modelo", [
+    ("Webhook - Ticto (Venda Realizada) (Anual)", EventoTicto),
+    ("Webhook - Ticto (Pix Expirado)", EventoTicto),
+    ("Webhook - Ticto (Carrinho Abandonado)", CarrinhoAbandonadoTicto),
+    ("Webhook - Ticto (Cartão Atualizado) (J)", EventoEspecialTicto),
+    ("Webhook - Ticto (Reclamado) (L)", EventoEspecialTicto),
+])
+def test_ticto_escolhe_modelo_pelo_status(nome, modelo):
+    assert isinstance(validar_evento_ticto(carregar_exemplo("ticto", nome)), modelo)
+
+
+@pytest.mark.parametrize("nome,modelo", [
+    ("Webhook Transação - Guru (Venda Realizada)", TransacaoGuru),
+    ("Webhook Assinatura - Guru (Assinatura Cancelada)", AssinaturaGuru),
+])
+def test_guru_escolhe_modelo_pelo_webhook_type(nome, modelo):
+    assert isinstance(validar_evento_guru(carregar_exemplo("guru", nome)), modelo)
+
+
+def test_guru_aceita_envelope_de_entrega():
+    payload = carregar_exemplo("guru", "Webhook Transação - Guru (Venda Realizada)")
+    assert isinstance(validar_evento_guru({"payload": payload}), TransacaoGuru)
+
+
+def test_ticto_converte_centavos_e_datas():
+    evento = validar_evento_ticto(carregar_exemplo("ticto", "Webhook - Ticto (Venda Realizada) (Anual)"))
+    assert evento.order.paid_amount == 376.70
+    assert evento.item.amount == 358.80
+    assert evento.valor_liquido == 262.87
+    # "YYYY-MM-DD HH:MM:SS" sem fuso continua naive (como na conversão original)
+    assert evento.data_evento == datetime(2024, 6, 23, 19, 34, 13)
+
+
+def test_guru_converte_datas_e_ids():
+    evento = validar_evento_guru(carregar_exemplo("guru", "Webhook Transação - Guru (Venda Realizada)"))
+    assert evento.dates.confirmed_at == datetime(2025, 6, 15, 12, 47, 40, tzinfo=timezone.utc)
+    assert evento.payment.total == 358.8
+    pagamento = carregar_exemplo("guru", "Webhook Transação - Guru (Venda Realizada)")
+    pagamento["id"] = 123
+    assert validar_evento_guru(pagamento).id == "123"
+
+
+def test_data_em_formato_desconhecido_vira_none():
+    """Data ilegível não rejeita o evento"""
+    payload = carregar_exemplo("ticto", "Webhook - Ticto (Venda Realizada) (Anual)")
+    payload["status_date"] = "ontem"
+    assert validar_evento_ticto(payload).status_date is None
+
+
+# ===== Rejeitados =====
+
+def _sem(payload: dict, *caminho: str) -> dict:
+    payload = copy.deepcopy(payload)
+    alvo = payload
+    for chave in caminho[:-1]:
+        alvo = alvo[chave]
+    del alvo[caminho[-1]]
+    return payload
+
+
+@pytest.mark.parametrize("alterar", [
+    lambda p: {**p, "status": "status_desconhecido"},
+    lambda p: _sem(p, "customer", "email"),
+    lambda p: _sem(p, "order"),
+    lambda p: _sem(p, "subscriptions"),
+    lambda p: {**p, "order": {**p["order"], "paid_amount": "abc"}},
+    lambda p: {**p, "order": {**p["order"], "paid_amount": True}},
+], ids=["status", "email", "order", "subscriptions", "valor_texto", "valor_bool"])
+def test_ticto_rejeita_payload_invalido(alterar):
+    payload = alterar(carregar_exemplo("ticto", "Webhook - Ticto (Venda Realizada) (Anual)"))
+    with pytest.raises(ValidationError):
+        validar_evento_ticto(payload)
+    assert validar_payload_ticto(payload) is False
+
+
+def test_ticto_venda_pontual_dispensa_subscriptions():
+    payload = _sem(carregar_exemplo("ticto", "Webhook - Ticto (Pix Expirado)"), "subscriptions")
+    assert validar_evento_ticto(payload).assinatura is None
+
+
+def test_ticto_evento_especial_exige_order_ou_transaction():
+    payload = carregar_exemplo("ticto", "Webhook - Ticto (Cartão Atualizado) (J)")
+    payload.pop("order", None)
+    payload.pop("transaction", None)
+    with pytest.raises(ValidationError):
+        validar_evento_ticto(payload)
+
+
+def test_ticto_carrinho_abandonado_exige_email():
+    payload = _sem(carregar_exemplo("ticto", "Webhook - Ticto (Carrinho Abandonado)"), "email")
+    with pytest.raises(ValidationError):
+        validar_evento_ticto(payload)
+
+
+@pytest.mark.parametrize("alterar", [
+    lambda p: _sem(p, "contact", "email"),
+    lambda p: _sem(p, "payment"),
+    lambda p: _sem(p, "status"),
+    lambda p: {**p, "id": {"id": 1}},
+], ids=["email", "payment", "status", "id_objeto"])
+def test_guru_transacao_rejeita_payload_invalido(alterar):
+    payload = alterar(carregar_exemplo("guru", "Webhook Transação - Guru (Venda Realizada)"))
+    with pytest.raises(ValidationError):
+        validar_evento_guru(payload)
+    assert validar_payload_guru(payload) is False
+
+
+@pytest.mark.parametrize("alterar", [
+    lambda p: {**p, "id": ""},
+    lambda p: {**p, "last_status": ""},
+    lambda p: _sem(p, "subscriber"),
+], ids=["id", "last_status", "subscriber"])
+def test_guru_assinatura_rejeita_payload_invalido(alterar):
+    payload = alterar(carregar_exemplo("guru", "Webhook Assinatura - Guru (Pagamento Realizado)"))
+    with pytest.raises(ValidationError):
+        validar_evento_guru(payload)
+
+
+def test_resumir_erros_indica_o_campo():
+    payload = _sem(carregar_exemplo("guru", "Webhook Transação - Guru (Venda Realizada)"), "contact", "email")
+    with pytest.raises(ValidationError) as erro:
+        validar_evento_guru(payload)
+    assert "contact.email" in resumir_erros(erro.value)
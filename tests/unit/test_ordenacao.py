@@ -0,0 +1,42 @@
+"""
+Testes da chave de ordenação por entidade (services/ordenacao.py)
+"""
+
+import copy
+
+import pytest
+
+from conftest import carregar_exemplo
+from services.ordenacao import chave_entidade, raia_do_evento
+from utils.ingestion_config import ingestion_config
+
+
+@pytest.fixture(autouse=True)
+def ordenacao(monkeypatch):
+    monkeypatch.setattr(ingestion_config, "ORDERING_ENABLED", True)
+    monkeypatch.setattr(ingestion_config, "ORDERING_LANES", 64)
+
+
+def test_ticto_mesmo_pedido_com_e_sem_assinatura_cai_na_mesma_raia():
+    com_assinatura = carregar_exemplo("ticto", "Webhook - Ticto (Pix Gerado)")
+    sem_assinatura = copy.deepcopy(carregar_exemplo("ticto", "Webhook - Ticto (Pix Expirado)"))
+    sem_assinatura.pop("subscriptions")
+    assert com_assinatura["order"]["hash"] == sem_assinatura["order"]["hash"]
+    assert chave_entidade("ticto", com_assinatura) == chave_entidade("ticto", sem_assinatura)
+    assert raia_do_evento("ticto", com_assinatura) == raia_do_evento("ticto", sem_assinatura)
+
+
+def test_guru_transacao_usa_o_id_da_transacao():
+    pagamento = carregar_exemplo("guru", "Webhook Transação - Guru (Venda Realizada)")
+    sem_assinatura = {**pagamento, "subscription": None}
+    assert chave_entidade("guru", pagamento) == chave_entidade("guru", sem_assinatura) == f"guru:transacao:{pagamento['id']}"
+    assert chave_entidade("guru", {"payload": pagamento}) == chave_entidade("guru", pagamento)
+
+
+def test_guru_webhook_de_assinatura_usa_o_id_da_assinatura():
+    payload = carregar_exemplo("guru", "Webhook Assinatura - Guru (Assinatura Cancelada)")
+    assert chave_entidade("guru", payload) == f"guru:assinatura:{payload['id']}"
+
+
+def test_evento_sem_entidade_nao_tem_raia():
+    assert raia_do_evento("ticto", carregar_exemplo("ticto", "Webhook - Ticto (Carrinho Abandonado)")) is None
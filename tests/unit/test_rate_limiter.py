@@ -0,0 +1,89 @@
+"""
+Testes do rate limiter de janela fixa (utils/rate_limiter.py), backend em memória
+"""
+
+import types
+
+import pytest
+
+from utils import rate_limiter as modulo
+from utils.rate_limiter import MemoriaBackend, RateLimiter
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """Relógio controlado pelo teste (segundos desde a época)"""
+    agora = [1_000_020.0]
+    monkeypatch.setattr(modulo, "time", types.SimpleNamespace(time=lambda: agora[0]))
+    return agora
+
+
+def test_contagem_por_janela(relogio):
+    backend = MemoriaBackend()
+    assert backend.incrementar("1.1.1.1", [60, 3600]) == [1, 1]
+    assert backend.incrementar("1.1.1.1", [60, 3600]) == [2, 2]
+    assert backend.incrementar("2.2.2.2", [60, 3600]) == [1, 1]
+
+
+def test_contador_reinicia_na_janela_seguinte(relogio):
+    backend = MemoriaBackend()
+    backend.incrementar("ip", [60, 3600])
+    backend.incrementar("ip", [60, 3600])
+    relogio[0] += 60
+    assert backend.incrementar("ip", [60, 3600]) == [1, 3]
+
+
+def test_descarta_chaves_ociosas(relogio):
+    backend = MemoriaBackend(ttl_ocioso=10)
+    backend.incrementar("antiga", [60])
+    relogio[0] += 11
+    backend.incrementar("nova", [60])
+    assert len(backend) == 1
+
+
+def test_limita_total_de_chaves_lru(relogio):
+    backend = MemoriaBackend(max_chaves=2)
+    backend.incrementar("a", [60])
+    backend.incrementar("b", [60])
+    backend.incrementar("a", [60])
+    backend.incrementar("c", [60])
+    assert len(backend) == 2
+    # "b" foi descartada (menos recente); "a" mantém a contagem
+    assert backend.incrementar("a", [60]) == [3]
+    assert backend.incrementar("b", [60]) == [1]
+
+
+def test_permitir_bloqueia_acima_do_limite(relogio):
+    limiter = RateLimiter(MemoriaBackend(), limites=[(60, 3), (3600, 100)])
+    assert [limiter.permitir("ip") for _ in range(4)] == [True, True, True, False]
+    assert limiter.permitir("outro_ip")
+    relogio[0] += 60
+    assert limiter.permitir("ip")
+
+
+def test_permitir_considera_todas_as_janelas(relogio):
+    limiter = RateLimiter(MemoriaBackend(), limites=[(60, 100), (3600, 2)])
+    assert limiter.permitir("ip")
+    assert limiter.permitir("ip")
+    relogio[0] += 60
+    assert not limiter.permitir("ip")
+
+
+def test_limite_zero_desabilita_a_janela(relogio):
+    limiter = RateLimiter(MemoriaBackend(), limites=[(60, 0)])
+    assert all(limiter.permitir("ip") for _ in range(10))
+
+
+def test_custo_cobra_varias_unidades(relogio):
+    """Um lote de eventos consome o limite por evento"""
+    limiter = RateLimiter(MemoriaBackend(), limites=[(60, 10)])
+    assert limiter.permitir("ip", custo=8)
+    assert not limiter.permitir("ip", custo=3)
+
+
+def test_falha_do_backend_nao_bloqueia():
+    class BackendComFalha:
+        def incrementar(self, chave, janelas, custo=1):
+            raise ConnectionError("indisponível")
+
+    assert RateLimiter(BackendComFalha(), limites=[(60, 1)]).permitir("ip")
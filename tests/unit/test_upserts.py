@@ -0,0 +1,37 @@
+"""
+Testes dos upserts que não dependem do banco (database/upserts.py)
+"""
+
+from sqlalchemy.sql import Select
+
+from database.upserts import CHAVE_ASSINATURAS_SOMENTE_LEITURA, upsert_assinatura
+
+
+class _Resultado:
+    def __init__(self, valor):
+        self.valor = valor
+
+    def scalar(self):
+        return self.valor
+
+
+class _Sessao:
+    """Registra os statements executados e responde a SELECTs com `assinatura_id`"""
+
+    def __init__(self, assinatura_id, info=None):
+        self.assinatura_id = assinatura_id
+        self.info = info or {}
+        self.executados = []
+
+    def execute(self, stmt):
+        self.executados.append(stmt)
+        if not isinstance(stmt, Select):
+            raise AssertionError("statement de escrita inesperado")
+        return _Resultado(self.assinatura_id)
+
+
+def test_somente_leitura_mantem_assinatura_existente():
+    """Na re-projeção, uma assinatura existente é apenas lida (nenhum INSERT/UPDATE)"""
+    sessao = _Sessao(42, {CHAVE_ASSINATURAS_SOMENTE_LEITURA: True})
+    assert upsert_assinatura(sessao, id_assinatura_origem="sub_1", status="canceled") == (42, "mantida")
+    assert len(sessao.executados) == 1
@@ -0,0 +1,105 @@
+"""
+Testes das novas tentativas da inbox (services/webhook_inbox.py), sem banco
+"""
+
+import types
+
+import pytest
+
+from conftest import carregar_exemplo
+from services import webhook_handler, webhook_inbox
+from services.webhook_inbox import InboxWorkerPool, finalizar_evento, reservar_eventos
+from utils.ingestion_config import ingestion_config
+
+
+class _Consulta:
+    def __init__(self, linhas):
+        self.linhas = linhas
+
+    def filter(self, *_, **__):
+        return self
+
+    order_by = limit = with_for_update = filter
+
+    def all(self):
+        return self.linhas
+
+
+class _Sessao:
+    """Sessão que entrega sempre a mesma linha da inbox"""
+
+    def __init__(self, linha):
+        self.linha = linha
+
+    def query(self, _):
+        return _Consulta([self.linha])
+
+    def get(self, _, evento_id):
+        return self.linha if evento_id == self.linha.id else None
+
+    def commit(self):
+        pass
+
+    rollback = close = commit
+
+
+@pytest.fixture
+def linha(monkeypatch):
+    linha = types.SimpleNamespace(
+        id=7, plataforma="ticto", payload=carregar_exemplo("ticto", "Webhook - Ticto (Venda Realizada) (Anual)"),
+        status="pendente", tentativas=0, iniciado_em=None, processado_em=None, erro=None, resultado_status=None,
+    )
+    monkeypatch.setattr(webhook_inbox, "get_session", lambda: _Sessao(linha))
+    monkeypatch.setattr(ingestion_config, "ORDERING_ENABLED", False)
+    monkeypatch.setattr(ingestion_config, "IDEMPOTENCY_ENABLED", False)
+    monkeypatch.setattr(ingestion_config, "INBOX_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(webhook_handler, "garantir_particoes_se_necessario", lambda: None)
+    monkeypatch.setattr(webhook_handler, "consolidar_resumos_se_necessario", lambda: None)
+    return linha
+
+
+@pytest.fixture
+def dead_letter(monkeypatch):
+    registradas = []
+    monkeypatch.setattr(webhook_handler, "registrar_falha", lambda *args: registradas.append(args) or 1)
+    monkeypatch.setattr(webhook_inbox, "registrar_falha", lambda *args: registradas.append(args) or 1)
+    return registradas
+
+
+def _uow_com_falha(*_, **__):
+    raise ConnectionError("banco indisponível")
+
+
+def test_excecao_no_handler_devolve_evento_para_a_fila(linha, dead_letter, monkeypatch):
+    monkeypatch.setattr(webhook_handler, "unit_of_work", _uow_com_falha)
+    evento, = reservar_eventos(1)
+    InboxWorkerPool()._processar(evento)
+    assert linha.status == "pendente"
+    assert linha.tentativas == 1
+    assert linha.erro == "banco indisponível"
+    assert dead_letter == []
+
+
+def test_dead_letter_apenas_na_ultima_tentativa(linha, dead_letter, monkeypatch):
+    monkeypatch.setattr(webhook_handler, "unit_of_work", _uow_com_falha)
+    for _ in range(3):
+        InboxWorkerPool()._processar(reservar_eventos(1)[0])
+    assert linha.status == "erro"
+    assert linha.tentativas == 3
+    assert [(plataforma, erro, evento_id) for plataforma, _, erro, evento_id in dead_letter] == [
+        ("ticto", "banco indisponível", "inbox-7")
+    ]
+
+
+def test_payload_invalido_nao_e_repetido(linha, dead_letter):
+    linha.payload = {"status": "status_desconhecido"}
+    InboxWorkerPool()._processar(reservar_eventos(1)[0])
+    assert linha.status == "processado"
+    assert linha.resultado_status == "erro"
+    assert dead_letter == []
+
+
+def test_finalizar_sem_erro_marca_processado(linha):
+    finalizar_evento(linha.id, resultado={"status": "evento_pagamento_processado"})
+    assert linha.status == "processado"
+    assert linha.resultado_status == "evento_pagamento_processado"